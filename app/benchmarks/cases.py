@@ -0,0 +1,418 @@
+r"""Benchmark cases of the hot paths of the app, see benchmarks.harness
+
+The open-plan cases run on the scenarios of the shipped fixtures, their simulation results are generated by
+synthetic_mvs_response() from the topology of the scenario. The cases of the CP Nigeria tool need a community
+project with demand profiles, which are Timeseries and can therefore only be created on postgres.
+"""
+
+import json
+from datetime import datetime
+
+import numpy as np
+from django.core.management import call_command
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from benchmarks.harness import benchmark
+from business_model.helpers import B_MODELS
+from business_model.models import BusinessModel, EquityData
+from cp_nigeria.models import ConsumerGroup, ConsumerType, DemandTimeseries, ImplementationPlanContent, Options
+from dashboard.models import KPICostsMatrixResults, KPIScalarResults, get_costs, graph_sankey, graph_timeseries
+from projects.constants import DONE
+from projects.dtos import convert_to_dto
+from projects.helpers import format_scenario_for_mvs
+from projects.models import Asset, AssetType, Bus, ConnectionLink, EconomicData, Project, Scenario, Simulation
+from projects.requests import parse_mvs_results
+from projects.scenario_diff import scenario_diff
+from users.models import CustomUser
+
+ASSET_TYPES_FIXTURE = "fixtures/fixture.json"
+# the storages of the other fixtures do not follow the naming of their power assets expected by get_costs(), the
+# multivector fixture relies on the asset types of the default fixture
+RESULTS_FIXTURES = (ASSET_TYPES_FIXTURE, "fixtures/multivector_fixture.json")
+TOPOLOGY_FIXTURES = ("fixtures/two_scenarios_fixture.json",)
+CP_PROJECT_DURATION = 20
+HOURS_PER_YEAR = 8760
+
+
+def synthetic_mvs_response(simulation, seed=0):
+    """Return a MVS results payload for the scenario of the simulation, as parsed by parse_mvs_results()
+
+    The flows are random, one flow per connection link of the topology in the "split" format of the raw results,
+    the last row holding the optimized capacity. The kpis are copied from the stored results if there are any, otherwise
+    only the levelized costs of electricity are provided.
+    """
+    scenario = simulation.scenario
+    n_timesteps = len(scenario.get_timestamps())
+    rng = np.random.default_rng(seed)
+
+    columns = []
+    capacities = []
+    # the results of an energy storage are labeled by the storage itself, not by its capacity and power assets
+    links = ConnectionLink.objects.filter(scenario=scenario, asset__parent_asset__isnull=True).select_related(
+        "bus", "asset__asset_type"
+    )
+    for link in links.order_by("id"):
+        asset = link.asset
+        direction = "in" if link.flow_direction == "A2B" else "out"
+        mvs_type = asset.asset_type.mvs_type
+        columns.append([link.bus.name, link.bus.type, direction, asset.name, asset.asset_type.asset_type, mvs_type])
+        # the optimized capacity is held by the output flow of an asset, by both flows of a storage
+        has_capacity = mvs_type == "storage" or (mvs_type != "sink" and direction == "in")
+        capacities.append(round(float(rng.random()) * 100, 3) if has_capacity else None)
+    flows = (rng.random((n_timesteps, len(columns))) * 10).round(4).tolist()
+    raw_results = {"columns": columns, "index": list(range(n_timesteps + 1)), "data": flows + [capacities]}
+
+    scalars = KPIScalarResults.objects.filter(simulation=simulation).values_list("scalar_values", flat=True).first()
+    scalars = json.loads(scalars) if scalars else {"levelized_costs_of_electricity_equivalent": 0.2}
+    cost_matrix = KPICostsMatrixResults.objects.filter(simulation=simulation).values_list("cost_values", flat=True)
+    response = {
+        "kpi": {
+            "scalars": scalars,
+            "cost_matrix": json.loads(cost_matrix.first()) if cost_matrix.exists() else {},
+        },
+        "energy_consumption": {},
+        "energy_conversion": {},
+        "energy_production": {},
+        "energy_providers": {},
+        "energy_storage": {},
+        "raw_results": json.dumps(raw_results),
+    }
+    return json.dumps(response)
+
+
+def load_fixture_scenario(fixtures=RESULTS_FIXTURES):
+    call_command("loaddata", *fixtures, verbosity=0)
+    return Scenario.objects.order_by("id").first()
+
+
+def simulated_scenario(fixtures=RESULTS_FIXTURES):
+    scenario = load_fixture_scenario(fixtures)
+    simulation = scenario.simulation
+    parse_mvs_results(simulation, synthetic_mvs_response(simulation))
+    return {"scenario": scenario, "simulation": simulation}
+
+
+def demand_profile(rng, daily_peak):
+    """Hourly demand profile in kWh with an evening peak"""
+    hours = np.arange(HOURS_PER_YEAR) % 24
+    shape = 0.3 + 0.7 * np.exp(-((hours - 19) ** 2) / 8)
+    return (daily_peak * shape * rng.uniform(0.8, 1.2, HOURS_PER_YEAR)).round(4).tolist()
+
+
+def create_asset(scenario, name, asset_type, **kwargs):
+    return Asset.objects.create(
+        scenario=scenario, name=name, asset_type=AssetType.objects.get(asset_type=asset_type), **kwargs
+    )
+
+
+def cp_project(seed=0):
+    """Create a simulated CP Nigeria project with a PV, diesel and battery mini-grid, as set up by the cpn views"""
+    call_command("loaddata", ASSET_TYPES_FIXTURE, verbosity=0)
+    # the fixture lacks the asset types specific to the cp nigeria app (i.e. reducable_demand)
+    call_command("update_assettype")
+    rng = np.random.default_rng(seed)
+    user = CustomUser.objects.first()
+
+    economic_data = EconomicData.objects.create(
+        duration=CP_PROJECT_DURATION, currency="NGN", discount=0.12, tax=0.075, exchange_rate=774
+    )
+    project = Project.objects.create(
+        name="Benchmark community",
+        country="NIGERIA",
+        latitude=9.08,
+        longitude=7.49,
+        user=user,
+        economic_data=economic_data,
+    )
+    scenario = Scenario.objects.create(
+        name="benchmark", project=project, start_date=datetime(2023, 1, 1), time_step=60, evaluated_period=365
+    )
+    Options.objects.create(
+        project=project, user_case=json.dumps(["pv_plant", "diesel_generator", "bess"]), main_grid=False
+    )
+    EquityData.objects.create(scenario=scenario, debt_start=2023, fuel_price_increase=0.038)
+    BusinessModel.objects.create(scenario=scenario, grid_condition="isolated", model_name=list(B_MODELS.keys())[0])
+
+    # the consumer types ids are used by get_aggregated_cgs()
+    consumer_types = [
+        ConsumerType.objects.create(consumer_type=name)
+        for name in ("Household", "Enterprise", "Public facility", "Machinery")
+    ]
+    for consumer_type in consumer_types:
+        for i, daily_peak in enumerate((0.2, 0.5, 1.5)):
+            timeseries = DemandTimeseries.objects.create(
+                name=f"{consumer_type.consumer_type} {i}",
+                consumer_type=consumer_type,
+                values=demand_profile(rng, daily_peak),
+                units="kWh",
+                start_time=datetime(2023, 1, 1),
+                end_time=datetime(2023, 12, 31, 23),
+                time_step=60,
+            )
+            ConsumerGroup.objects.create(
+                project=project,
+                consumer_type=consumer_type,
+                timeseries=timeseries,
+                number_consumers=int(rng.integers(5, 50)),
+                expected_consumer_increase=0,
+                expected_demand_increase=0,
+            )
+
+    ac_bus = Bus.objects.create(type="Electricity", scenario=scenario, name="ac_bus")
+    dc_bus = Bus.objects.create(type="Electricity", scenario=scenario, name="dc_bus")
+    diesel_bus = Bus.objects.create(type="Gas", scenario=scenario, name="diesel_bus")
+    costs = dict(capex_fix=0, age_installed=0, installed_capacity=0, optimize_cap=True, opex_var=0)
+
+    def connect(bus, asset, flow_direction):
+        port = "input_1" if flow_direction == "A2B" else "output_1"
+        ConnectionLink.objects.create(
+            bus=bus, bus_connection_port=port, asset=asset, flow_direction=flow_direction, scenario=scenario
+        )
+
+    inverter = create_asset(
+        scenario,
+        "inverter",
+        "transformer_station_in",
+        capex_var=415,
+        opex_fix=8.3,
+        lifetime=10,
+        efficiency=0.95,
+        **costs,
+    )
+    connect(dc_bus, inverter, "B2A")
+    connect(ac_bus, inverter, "A2B")
+    pv_plant = create_asset(scenario, "pv_plant", "pv_plant", capex_var=800, opex_fix=10, lifetime=25, **costs)
+    connect(dc_bus, pv_plant, "A2B")
+    diesel = create_asset(
+        scenario, "diesel_generator", "diesel_generator", capex_var=400, opex_fix=20, lifetime=8, **costs
+    )
+    diesel.opex_var_extra = 0.6
+    diesel.save()
+    diesel_fuel = create_asset(scenario, "diesel_fuel", "gas_dso", energy_price="0.06", feedin_tariff="0")
+    connect(diesel_bus, diesel_fuel, "A2B")
+    connect(diesel_bus, diesel, "B2A")
+    connect(ac_bus, diesel, "A2B")
+    battery = create_asset(scenario, "battery", "bess")
+    create_asset(
+        scenario, "battery capacity", "capacity", parent_asset=battery, capex_var=350, opex_fix=5, lifetime=10, **costs
+    )
+    for name, asset_type in (("battery input power", "charging_power"), ("battery output power", "discharging_power")):
+        create_asset(scenario, name, asset_type, parent_asset=battery, capex_var=0, opex_fix=0, lifetime=10, **costs)
+    connect(dc_bus, battery, "B2A")
+    connect(dc_bus, battery, "A2B")
+    for name in ("electricity_demand_hh", "electricity_demand_ent", "electricity_demand_pf"):
+        demand = create_asset(scenario, name, "reducable_demand", efficiency=1)
+        demand.input_timeseries = json.dumps(demand_profile(rng, 5))
+        demand.save()
+        connect(ac_bus, demand, "B2A")
+
+    simulation = Simulation.objects.create(scenario=scenario, status=DONE)
+    parse_mvs_results(simulation, synthetic_mvs_response(simulation, seed=seed))
+    return {"project": project, "scenario": scenario, "simulation": simulation}
+
+
+def logged_in_client(user):
+    client = Client()
+    client.force_login(user)
+    return client
+
+
+def get_page(client, url):
+    # a redirection or an error page would not measure the view
+    response = client.get(url)
+    if response.status_code != 200:
+        raise AssertionError(f"GET {url} returned the status {response.status_code}")
+    return response
+
+
+@benchmark("parse_mvs_results", setup=lambda: {"simulation": load_fixture_scenario().simulation})
+def bench_parse_mvs_results(context):
+    simulation = context["simulation"]
+    if "response" not in context:
+        context["response"] = synthetic_mvs_response(simulation)
+    parse_mvs_results(simulation, context["response"])
+
+
+@benchmark("graph_timeseries", setup=simulated_scenario)
+def bench_graph_timeseries(context):
+    graph_timeseries([context["simulation"]])
+
+
+@benchmark("get_costs", setup=simulated_scenario)
+def bench_get_costs(context):
+    get_costs(context["simulation"])
+
+
+@benchmark("graph_sankey", setup=simulated_scenario)
+def bench_graph_sankey(context):
+    graph_sankey(context["simulation"], context["scenario"].energy_vectors)
+
+
+@benchmark("convert_to_dto", setup=lambda: {"scenario": load_fixture_scenario(TOPOLOGY_FIXTURES)})
+def bench_convert_to_dto(context):
+    convert_to_dto(context["scenario"], testing=True)
+
+
+@benchmark("format_scenario_for_mvs", setup=lambda: {"scenario": load_fixture_scenario(TOPOLOGY_FIXTURES)})
+def bench_format_scenario_for_mvs(context):
+    format_scenario_for_mvs(context["scenario"], testing=True)
+
+
+def two_scenarios():
+    call_command("loaddata", *TOPOLOGY_FIXTURES, verbosity=0)
+    reference, scenario = Scenario.objects.order_by("id")
+    return {"reference": reference, "scenario": scenario}
+
+
+@benchmark("scenario_diff", setup=two_scenarios)
+def bench_scenario_diff(context):
+    scenario_diff(context["scenario"], context["reference"])
+
+
+@benchmark("financial_tool_tariff", setup=cp_project, postgres_only=True)
+def bench_financial_tool_tariff(context):
+    from cp_nigeria.helpers import FinancialTool
+
+    FinancialTool(context["project"]).calculate_tariff()
+
+
+@benchmark("financial_sweep", setup=cp_project, postgres_only=True)
+def bench_financial_sweep(context):
+    from cp_nigeria.financial_sweep import FinancialSweep, distribution, parameter_grid
+    from cp_nigeria.helpers import FinancialTool
+
+    sweep = FinancialSweep(FinancialTool(context["project"]))
+    # 1000 parameter sets
+    parameters = parameter_grid(
+        grant_share=np.linspace(0, 0.8, 10),
+        debt_interest_MG=np.linspace(0.05, 0.15, 10),
+        fuel_price_increase=np.linspace(0, 0.1, 10),
+    )
+    result = sweep.evaluate(tariff=sweep.tariffs(**parameters), **parameters)
+    distribution(result.irr(20))
+
+
+def loan_parameters(n_loans=10000, seed=0):
+    rng = np.random.default_rng(seed)
+    return {
+        "amount": rng.uniform(1e6, 1e8, n_loans),
+        "interest_rate": rng.uniform(0.02, 0.2, n_loans),
+        "tenor": rng.integers(5, 15, n_loans),
+        "grace_period": rng.integers(0, 3, n_loans),
+        "debt_start": rng.integers(2025, 2035, n_loans),
+    }
+
+
+@benchmark("amortization_schedules", setup=loan_parameters)
+def bench_amortization_schedules(context):
+    from cp_nigeria.amortization import amortization_schedules
+
+    amortization_schedules(years=range(2024, 2050), **context)
+
+
+@benchmark("financial_tool_outputs", setup=cp_project, postgres_only=True)
+def bench_financial_tool_outputs(context):
+    """Financial tables, KPIs and tariffs with and without grant, as computed for the outputs page of cpn_outputs"""
+    from cp_nigeria.graphs import cash_flow_graph_data
+    from cp_nigeria.helpers import FinancialTool
+
+    ft = FinancialTool(context["project"])
+    ft.calculate_tariff()
+    for table in ("revenue_over_lifetime", "losses_over_lifetime", "replacement_loan_table", "om_costs_over_lifetime"):
+        getattr(ft, table)
+    ft.initial_loan_table
+    ft.cash_flow_over_lifetime
+    ft.financial_kpis
+    ft.internal_return_on_investment(10)
+    ft.internal_return_on_investment(20)
+    cash_flow_graph_data(ft)
+    ft.remove_grant()
+    ft.calculate_tariff()
+    ft.financial_kpis
+    ft.internal_return_on_investment(10)
+    ft.internal_return_on_investment(20)
+
+
+def cp_large_community(n_groups=500, seed=0):
+    """CP Nigeria project whose community has many consumer groups, sharing the demand profiles of cp_project()"""
+    context = cp_project(seed=seed)
+    rng = np.random.default_rng(seed)
+    project = context["project"]
+    groups = list(ConsumerGroup.objects.filter(project=project))
+    ConsumerGroup.objects.bulk_create(
+        ConsumerGroup(
+            project=project,
+            consumer_type=groups[i % len(groups)].consumer_type,
+            timeseries=groups[i % len(groups)].timeseries,
+            number_consumers=int(rng.integers(1, 20)),
+        )
+        for i in range(n_groups - len(groups))
+    )
+    return context
+
+
+@benchmark("aggregated_demand", setup=cp_large_community, postgres_only=True)
+def bench_aggregated_demand(context):
+    from cp_nigeria.helpers import aggregate_demand, demand_consumer_groups, get_aggregated_demand
+
+    project = context["project"]
+    for consumer_type in (None, "Enterprise", "Household", "Public facility"):
+        get_aggregated_demand(project, consumer_type=consumer_type)
+    aggregate_demand(demand_consumer_groups(project), with_timeseries=False)
+
+
+def cp_project_with_report():
+    """Simulated CP Nigeria project with the tariff and report content stored by the outputs page"""
+    from cp_nigeria.helpers import FinancialTool
+
+    context = cp_project()
+    project = context["project"]
+    ImplementationPlanContent.objects.create(simulation=context["simulation"])
+    EquityData.objects.filter(scenario=project.scenario).update(
+        estimated_tariff=FinancialTool(project).calculate_tariff()
+    )
+    return context
+
+
+@benchmark("report_handler", setup=cp_project_with_report, postgres_only=True)
+# the region of the community is resolved offline, a geocoding request would dominate the measure
+@override_settings(REGION_PROVIDERS=["nearest_capital"])
+def bench_report_handler(context):
+    from cp_nigeria.report import ReportHandler
+
+    report = ReportHandler(context["project"])
+    report.create_cover_sheet()
+    report.create_report_content()
+    report.add_footer()
+
+
+@benchmark("view_project_search", setup=simulated_scenario)
+def bench_view_project_search(context):
+    client = logged_in_client(context["scenario"].project.user)
+    get_page(client, reverse("project_search"))
+
+
+@benchmark("view_scenario_review", setup=simulated_scenario)
+def bench_view_scenario_review(context):
+    scenario = context["scenario"]
+    client = logged_in_client(scenario.project.user)
+    get_page(client, reverse("scenario_review", args=[scenario.project.id, scenario.id]))
+
+
+@benchmark("view_scenario_results", setup=simulated_scenario)
+def bench_view_scenario_results(context):
+    scenario = context["scenario"]
+    client = logged_in_client(scenario.project.user)
+    get_page(client, reverse("scenario_visualize_results", args=[scenario.project.id, scenario.id]))
+    get_page(client, reverse("scenario_visualize_timeseries", args=[scenario.project.id, scenario.id]))
+    get_page(client, reverse("scenario_visualize_sankey", args=[scenario.id]))
+
+
+@benchmark("view_asset_create_form", setup=simulated_scenario)
+def bench_view_asset_create_form(context):
+    scenario = context["scenario"]
+    client = logged_in_client(scenario.project.user)
+    # the asset modals of the scenario topology page, for new assets
+    for asset_type_name in ("pv_plant", "diesel_generator", "dso", "heat_pump", "wind_plant"):
+        get_page(client, reverse("get_asset_create_form", args=[scenario.id, asset_type_name]))
@@ -0,0 +1,131 @@
+r"""Latency of the small AJAX endpoints with a new, a persistent or a pooled database connection per request.
+
+The requests go through the in-process WSGI transport of httpx, so that the request_started and request_finished
+signals close the connections as a WSGI server would (the test client of Django keeps them open). The configurations
+are
+
+- new: CONN_MAX_AGE=0, a connection is opened and closed by every request
+- persistent: CONN_MAX_AGE=60, the connection is kept open between the requests
+- pooled: the psycopg pool of Django, only available on postgres with psycopg[pool] installed
+
+The database should be a test database, a scenario with simulation results is loaded in it.
+"""
+
+import contextlib
+import copy
+import io
+import statistics
+import time
+from dataclasses import dataclass
+
+import httpx
+from django.core.wsgi import get_wsgi_application
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.urls import reverse
+
+from benchmarks.cases import simulated_scenario
+from benchmarks.load_test import BASE_URL, session_cookies
+
+try:
+    import psycopg_pool
+except ImportError:
+    psycopg_pool = None
+
+CONFIGURATIONS = {
+    "new": {"CONN_MAX_AGE": 0},
+    "persistent": {"CONN_MAX_AGE": 60},
+    "pooled": {"CONN_MAX_AGE": 0, "OPTIONS": {"pool": True}},
+}
+
+
+@dataclass
+class LatencyResult:
+    configuration: str
+    endpoint: str
+    requests: int
+    median: float
+    mean: float
+
+    def __str__(self):
+        return (
+            f"{self.configuration:<10} {self.endpoint:<32} {self.requests:>5} requests "
+            f"{self.median * 1000:>8.2f} ms median {self.mean * 1000:>8.2f} ms mean"
+        )
+
+
+def is_available(configuration, alias=DEFAULT_DB_ALIAS):
+    if configuration == "pooled":
+        return psycopg_pool is not None and connections[alias].vendor == "postgresql"
+    return True
+
+
+@contextlib.contextmanager
+def connection_settings(overrides, alias=DEFAULT_DB_ALIAS):
+    """Apply overrides to the settings of the connection, restored on exit"""
+    connection = connections[alias]
+    saved = copy.deepcopy(connection.settings_dict)
+    connection.close()
+    options = {**connection.settings_dict.get("OPTIONS", {}), **overrides.get("OPTIONS", {})}
+    connection.settings_dict.update({**overrides, "OPTIONS": options})
+    try:
+        yield
+    finally:
+        connection.close()
+        if hasattr(connection, "close_pool"):
+            connection.close_pool()
+        connection.settings_dict.clear()
+        connection.settings_dict.update(saved)
+
+
+def small_endpoints(scenario):
+    return {
+        "fetch_simulation_results": reverse("fetch_simulation_results", args=[scenario.simulation.id]),
+        "scenario_visualize_sankey": reverse("scenario_visualize_sankey", args=[scenario.id]),
+    }
+
+
+def measure_latency(client, url, n_requests):
+    timings = []
+    for _ in range(n_requests):
+        start = time.perf_counter()
+        response = client.get(url)
+        timings.append(time.perf_counter() - start)
+        if response.status_code != 200:
+            raise AssertionError(f"GET {url} returned the status {response.status_code}")
+    return timings
+
+
+def run_connection_benchmark(n_requests=50, configurations=tuple(CONFIGURATIONS)):
+    """Return the LatencyResult of each configuration and endpoint, the unavailable configurations are skipped"""
+    # the progress messages printed while loading the results would be interleaved with the results
+    with contextlib.redirect_stdout(io.StringIO()):
+        scenario = simulated_scenario()["scenario"]
+    cookies = session_cookies(scenario.project.user)
+    endpoints = small_endpoints(scenario)
+    app = get_wsgi_application()
+
+    results = []
+    for configuration in configurations:
+        if is_available(configuration) is False:
+            continue
+        with connection_settings(CONFIGURATIONS[configuration]):
+            with httpx.Client(
+                transport=httpx.WSGITransport(app=app),
+                base_url=BASE_URL,
+                cookies=cookies,
+                headers={"x-requested-with": "XMLHttpRequest"},
+            ) as client:
+                for endpoint, url in endpoints.items():
+                    # warm up, i.e. the pool is opened by the first request
+                    measure_latency(client, url, 1)
+                    timings = measure_latency(client, url, n_requests)
+                    results.append(
+                        LatencyResult(
+                            configuration=configuration,
+                            endpoint=endpoint,
+                            requests=n_requests,
+                            median=statistics.median(timings),
+                            mean=statistics.mean(timings),
+                        )
+                    )
+    return results
@@ -0,0 +1,238 @@
+r"""Minimal benchmark harness for the hot paths of the app.
+
+A benchmark case is a function decorated with @benchmark, it receives the context prepared by its setup function
+and runs the code to measure. Each run happens within a transaction which is rolled back, so that a case which
+writes to the database (i.e. parse_mvs_results) measures the same work on every run.
+
+For every case the harness records
+
+- wall_time: median wall time of the runs in seconds
+- peak_memory: peak memory allocated by python during one run in MB (tracemalloc)
+- queries: number of SQL queries of one run
+- file_operations: number of files opened, created, renamed or deleted during one run, after the warm up run (i.e.
+  a request handler should neither read static files nor write to disk once warm)
+
+and compares them with a stored baseline, a metric regresses if it exceeds the baseline by more than the budget.
+"""
+
+import contextlib
+import io
+import json
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+from dataclasses import dataclass, field, asdict
+
+from django.db import connection, transaction
+
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+METRICS = ("wall_time", "peak_memory", "queries", "file_operations")
+# allowed relative increase of each metric compared to the baseline
+DEFAULT_BUDGET = {"wall_time": 0.25, "peak_memory": 0.25, "queries": 0.0, "file_operations": 0.0}
+# audit events of the file operations, see https://docs.python.org/3/library/audit_events.html
+FILE_EVENTS = {
+    "open",
+    "os.mkdir",
+    "os.remove",
+    "os.rename",
+    "os.rmdir",
+    "os.truncate",
+    "os.utime",
+    "shutil.copyfile",
+    "shutil.move",
+    "shutil.rmtree",
+}
+# wall times below this threshold (in seconds) are too noisy to be compared
+MIN_WALL_TIME = 0.005
+
+BENCHMARKS = {}
+
+
+@dataclass
+class Benchmark:
+    name: str
+    func: callable
+    setup: callable
+    # the cases relying on postgres specific fields (i.e. Timeseries values) cannot run on sqlite
+    postgres_only: bool = False
+
+    @property
+    def available(self):
+        return self.postgres_only is False or connection.vendor == "postgresql"
+
+
+@dataclass
+class Result:
+    name: str
+    wall_time: float
+    peak_memory: float
+    queries: int
+    file_operations: int = 0
+    runs: int = 1
+    regressions: list = field(default_factory=list)
+
+    def metrics(self):
+        return {metric: getattr(self, metric) for metric in METRICS}
+
+
+def benchmark(name, setup, postgres_only=False):
+    """Register the decorated function as the benchmark case 'name'"""
+
+    def decorator(func):
+        BENCHMARKS[name] = Benchmark(name=name, func=func, setup=setup, postgres_only=postgres_only)
+        return func
+
+    return decorator
+
+
+class QueryCounter:
+    """Count the queries executed on the connection, unlike CaptureQueriesContext it is not reset by the
+    request_started signal of the views"""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+    def __len__(self):
+        return self.count
+
+
+class FileOperationCounter:
+    """Count the file operations while entered, from the audit events of the interpreter
+
+    An audit hook cannot be removed, a single hook is installed on first use and counts for the active counters.
+    """
+
+    _active = []
+    _installed = False
+
+    def __init__(self):
+        self.count = 0
+
+    @classmethod
+    def _hook(cls, event, args):
+        if event in FILE_EVENTS:
+            for counter in cls._active:
+                counter.count += 1
+
+    def __enter__(self):
+        if FileOperationCounter._installed is False:
+            sys.addaudithook(FileOperationCounter._hook)
+            FileOperationCounter._installed = True
+        FileOperationCounter._active.append(self)
+        return self
+
+    def __exit__(self, *exc_info):
+        FileOperationCounter._active.remove(self)
+
+    def __len__(self):
+        return self.count
+
+
+def _rolled_back(func, context):
+    with transaction.atomic():
+        func(context)
+        transaction.set_rollback(True)
+
+
+def measure(case, context, repeat=5):
+    """Run a benchmark case and return its Result, the context is the output of the case's setup function"""
+    # warm up run, also used to count the queries
+    queries = QueryCounter()
+    with connection.execute_wrapper(queries):
+        _rolled_back(case.func, context)
+
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        _rolled_back(case.func, context)
+        timings.append(time.perf_counter() - start)
+
+    file_operations = FileOperationCounter()
+    tracemalloc.start()
+    try:
+        with file_operations:
+            _rolled_back(case.func, context)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return Result(
+        name=case.name,
+        wall_time=statistics.median(timings),
+        peak_memory=peak / 1024**2,
+        queries=len(queries),
+        file_operations=len(file_operations),
+        runs=repeat,
+    )
+
+
+def run_benchmarks(names=None, repeat=5):
+    """Run the benchmark cases within a transaction which is rolled back, yield their Result
+
+    Cases which cannot run on the current database are skipped.
+    """
+    # the cases are registered when their module is imported
+    import benchmarks.cases  # noqa: F401
+
+    names = names or list(BENCHMARKS.keys())
+    unknown = set(names) - set(BENCHMARKS.keys())
+    if unknown:
+        raise KeyError(f"Unknown benchmarks {sorted(unknown)}, available are {sorted(BENCHMARKS.keys())}")
+
+    for name in names:
+        case = BENCHMARKS[name]
+        if case.available is False:
+            continue
+        # the progress messages printed by the measured code would be interleaved with the results
+        with contextlib.redirect_stdout(io.StringIO()), transaction.atomic():
+            context = case.setup()
+            result = measure(case, context, repeat=repeat)
+            transaction.set_rollback(True)
+        yield result
+
+
+def load_baseline(path=BASELINE_FILE):
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as fp:
+        return json.load(fp)
+
+
+def save_baseline(results, path=BASELINE_FILE):
+    """Store the metrics of the results in the baseline file, the other cases of the baseline are kept"""
+    baseline = load_baseline(path)
+    baseline.update({result.name: result.metrics() for result in results})
+    with open(path, "w", encoding="utf-8") as fp:
+        json.dump(baseline, fp, indent=4, sort_keys=True)
+        fp.write("\n")
+
+
+def compare(result, baseline, budget=None):
+    """Fill and return the regressions of a result compared to the baseline metrics of the same case"""
+    budget = {**DEFAULT_BUDGET, **(budget or {})}
+    reference = baseline.get(result.name)
+    result.regressions = []
+    if reference is None:
+        return result.regressions
+
+    for metric in METRICS:
+        value, reference_value = getattr(result, metric), reference.get(metric)
+        if reference_value is None:
+            continue
+        if metric == "wall_time" and max(value, reference_value) < MIN_WALL_TIME:
+            continue
+        if value > reference_value * (1 + budget[metric]):
+            result.regressions.append(
+                f"{metric} {value:.4g} exceeds the baseline {reference_value:.4g} by more than {budget[metric]:.0%}"
+            )
+    return result.regressions
+
+
+def as_dict(result):
+    return asdict(result)
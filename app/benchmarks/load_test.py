@@ -0,0 +1,125 @@
+r"""Throughput of the app served as WSGI (sync workers) and as ASGI when the simulation server is slow.
+
+Both modes serve the same burst of concurrent requests to the fetch_simulation_results view, which polls the status of
+a pending simulation from a local FakeMVSServer answering after a delay:
+
+- wsgi: the requests are handled by a pool of sync workers, each blocked while the simulation server answers
+- asgi: the requests are handled by the event loop of a single worker, the status requests overlap
+
+The requests go through the in-process httpx transports of the WSGI and ASGI applications, so no server has to be
+started. The database should be a test database, a user and a pending simulation are created in it.
+"""
+
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime
+
+import httpx
+from asgiref.sync import async_to_sync
+from django.core.asgi import get_asgi_application
+from django.core.wsgi import get_wsgi_application
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from projects.constants import PENDING
+from projects.fake_mvs import FakeMVSServer
+from projects.models import Project, Scenario, Simulation
+from users.models import CustomUser
+
+BASE_URL = "http://testserver"
+# the simulation stays pending for the whole load test
+CHECKS_UNTIL_DONE = 10**9
+
+
+@dataclass
+class LoadTestResult:
+    mode: str
+    requests: int
+    errors: int
+    wall_time: float
+
+    @property
+    def throughput(self):
+        return self.requests / self.wall_time if self.wall_time else 0.0
+
+    def __str__(self):
+        return (
+            f"{self.mode:<5} {self.requests:>5} requests in {self.wall_time:>7.2f} s "
+            f"{self.throughput:>8.1f} req/s {self.errors:>4} errors"
+        )
+
+
+def pending_simulation(username="load_test"):
+    """Create a user owning a scenario with a pending simulation, return the user and the simulation"""
+    user, _ = CustomUser.objects.get_or_create(username=username, defaults={"email": f"{username}@localhost"})
+    project = Project.objects.create(
+        name="load test", description="", country="NG", latitude=9.08, longitude=7.49, user=user
+    )
+    scenario = Scenario.objects.create(
+        name="load test", project=project, start_date=datetime.now(), time_step=60, evaluated_period=1
+    )
+    simulation = Simulation.objects.create(
+        scenario=scenario, start_date=datetime.now(), status=PENDING, mvs_token="load-test"
+    )
+    return user, simulation
+
+
+def session_cookies(user):
+    client = Client()
+    client.force_login(user)
+    return {name: morsel.value for name, morsel in client.cookies.items()}
+
+
+def run_wsgi(url, cookies, n_requests, workers):
+    """Serve the requests with a pool of sync workers, each handling one request at a time"""
+    app = get_wsgi_application()
+
+    def worker_client():
+        return httpx.Client(transport=httpx.WSGITransport(app=app), base_url=BASE_URL, cookies=cookies)
+
+    def get(client):
+        return client.get(url).status_code
+
+    clients = [worker_client() for _ in range(workers)]
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        statuses = list(pool.map(get, (clients[i % workers] for i in range(n_requests))))
+    wall_time = time.perf_counter() - start
+    for client in clients:
+        client.close()
+    return LoadTestResult("wsgi", n_requests, sum(status != 200 for status in statuses), wall_time)
+
+
+def run_asgi(url, cookies, n_requests):
+    """Serve the requests concurrently with the event loop of a single ASGI worker"""
+    app = get_asgi_application()
+
+    async def burst():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url=BASE_URL, cookies=cookies) as client:
+            start = time.perf_counter()
+            responses = await asyncio.gather(*(client.get(url) for _ in range(n_requests)))
+            return [response.status_code for response in responses], time.perf_counter() - start
+
+    statuses, wall_time = async_to_sync(burst)()
+    return LoadTestResult("asgi", n_requests, sum(status != 200 for status in statuses), wall_time)
+
+
+def run_load_test(n_requests=20, delay=0.2, workers=2, modes=("wsgi", "asgi")):
+    """Return the LoadTestResult of each mode for a simulation server answering after delay seconds"""
+    user, simulation = pending_simulation()
+    cookies = session_cookies(user)
+    url = reverse("fetch_simulation_results", args=[simulation.id])
+    results = []
+    with FakeMVSServer(checks_until_done=CHECKS_UNTIL_DONE, delay=delay) as server:
+        with override_settings(MVS_GET_URL=server.get_url, PROXY_CONFIG={}):
+            # the token of the simulation has to be known by the server
+            Simulation.objects.filter(pk=simulation.pk).update(mvs_token=server.submit({})["id"])
+            for mode in modes:
+                if mode == "wsgi":
+                    results.append(run_wsgi(url, cookies, n_requests, workers))
+                else:
+                    results.append(run_asgi(url, cookies, n_requests))
+    return results
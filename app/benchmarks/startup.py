@@ -0,0 +1,58 @@
+r"""Measure the startup cost of the app: the wall time of `python manage.py check` and the memory of a process
+after django has been set up and the url configuration imported (as a web or qcluster worker would do).
+
+Run from the app folder:
+
+    python benchmarks/startup.py --runs 5
+"""
+
+import argparse
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import time
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+WORKER_SNIPPET = """
+import django
+django.setup()
+from django.urls import get_resolver
+get_resolver().url_patterns
+"""
+
+
+def time_check(runs):
+    """Return the wall times in seconds of `runs` executions of `manage.py check`"""
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "manage.py", "check"], cwd=APP_DIR, check=True, capture_output=True)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def worker_memory():
+    """Return the peak resident memory in MB of a process which set up django and imported the urls"""
+    env = dict(os.environ, DJANGO_SETTINGS_MODULE=os.environ.get("DJANGO_SETTINGS_MODULE", "epa.settings"))
+    subprocess.run([sys.executable, "-c", WORKER_SNIPPET], cwd=APP_DIR, env=env, check=True, capture_output=True)
+    # ru_maxrss is in kilobytes on linux and the maximum over all the waited for children
+    return resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5, help="number of executions of manage.py check")
+    args = parser.parse_args()
+
+    # measured first so that the maximum resident memory of the children is the one of the worker
+    memory = worker_memory()
+    timings = time_check(args.runs)
+    print(f"manage.py check: median {statistics.median(timings):.2f}s, min {min(timings):.2f}s over {args.runs} runs")
+    print(f"worker memory after setup: {memory:.0f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+import os
+import tempfile
+
+from django.test import TestCase, tag
+
+from benchmarks.harness import BENCHMARKS, FileOperationCounter, Result, compare, load_baseline, run_benchmarks
+
+
+@tag("benchmark")
+class BenchmarkTest(TestCase):
+    """Run every benchmark case once, the number of queries and file operations of a case may not exceed its baseline
+
+    The wall time and memory depend on the machine and are only compared by the run_benchmarks command
+    """
+
+    def test_cases_within_query_baseline(self):
+        baseline = load_baseline()
+        for result in run_benchmarks(repeat=1):
+            with self.subTest(case=result.name):
+                self.assertIn(result.name, baseline)
+                self.assertLessEqual(result.queries, baseline[result.name]["queries"])
+                self.assertLessEqual(result.file_operations, baseline[result.name]["file_operations"])
+
+    def test_unknown_case(self):
+        with self.assertRaises(KeyError):
+            list(run_benchmarks(["not_a_case"]))
+
+
+class BenchmarkCompareTest(TestCase):
+    baseline = {"case": {"wall_time": 0.1, "peak_memory": 2.0, "queries": 10}}
+
+    def test_within_budget(self):
+        result = Result(name="case", wall_time=0.12, peak_memory=2.4, queries=10)
+        self.assertEqual(compare(result, self.baseline), [])
+
+    def test_regressions(self):
+        result = Result(name="case", wall_time=0.2, peak_memory=2.0, queries=11)
+        regressions = compare(result, self.baseline)
+        self.assertEqual([regression.split()[0] for regression in regressions], ["wall_time", "queries"])
+        self.assertEqual(compare(result, self.baseline, budget={"wall_time": 1.5, "queries": 0.1}), [])
+
+    def test_short_wall_times_are_ignored(self):
+        result = Result(name="case", wall_time=0.004, peak_memory=2.0, queries=10)
+        self.assertEqual(compare(result, {"case": {"wall_time": 0.001}}), [])
+
+    def test_case_without_baseline(self):
+        result = Result(name="new_case", wall_time=1, peak_memory=1, queries=1)
+        self.assertEqual(compare(result, self.baseline), [])
+
+    def test_file_operations(self):
+        result = Result(name="case", wall_time=0.1, peak_memory=2.0, queries=10, file_operations=1)
+        self.assertEqual([regression.split()[0] for regression in compare(result, self.baseline)], [])
+        regressions = compare(result, {"case": {"file_operations": 0}})
+        self.assertEqual([regression.split()[0] for regression in regressions], ["file_operations"])
+
+
+class FileOperationCounterTest(TestCase):
+    def test_count(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "file.txt")
+            with FileOperationCounter() as outer:
+                with open(path, "w") as fp:
+                    fp.write("")
+                with FileOperationCounter() as inner:
+                    os.remove(path)
+                os.path.exists(path)
+        self.assertEqual((len(outer), len(inner)), (2, 1))
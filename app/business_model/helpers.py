@@ -1,9 +1,7 @@
-import os
-import csv
 import json
 from django.core.exceptions import ValidationError
-from django.contrib.staticfiles.storage import staticfiles_storage
 from django.utils.translation import gettext_lazy as _
+from projects.registry import LazyRegistry, csv_rows
 
 BM_QUESTIONS_CATEGORIES = {
     "dialogue": _("Engagement, dialogue, and co-determination"),
@@ -62,32 +60,25 @@ BM_DEFAULT_ECONOMIC_VALUES = {
 }
 
 
-B_MODELS = {}
+def load_business_models():
+    business_models = {}
+    rows = csv_rows("business_model_list.csv")
+    if len(rows) > 0:
+        # Name,Category,Description,Graph,Responsibilities
+        hdr = rows[0]
+        label_idx = hdr.index("Name")
+        for row in rows[1:]:
+            label = row[label_idx]
+            business_models[label] = {}
+            for k, v in zip(hdr, row):
+                if k not in ("Advantages", "Disadvantages"):
+                    business_models[label][k] = v
+                else:
+                    business_models[label][k] = json.loads(v)
+    return business_models
 
-if os.path.exists(staticfiles_storage.path("business_model_list.csv")) is True:
-    with open(staticfiles_storage.path("business_model_list.csv"), encoding="utf-8") as csvfile:
-        csvreader = csv.reader(csvfile, delimiter=",", quotechar='"')
-        for i, row in enumerate(csvreader):
-            if i == 0:
-                hdr = row
-                # Name,Category,Description,Graph,Responsibilities
-                label_idx = hdr.index("Name")
-                verbose_idx = hdr.index("Verbose")
-                graph_idx = hdr.index("Graph")
-                description_idx = hdr.index("Description")
-                cat_idx = hdr.index("Category")
-                resp_idx = hdr.index("Responsibilities")
-                adv_idx = hdr.index("Advantages")
-                disadv_idx = hdr.index("Disadvantages")
-                report_idx = hdr.index("Report")
-            else:
-                label = row[label_idx]
-                B_MODELS[label] = {}
-                for k, v in zip(hdr, row):
-                    if k not in ("Advantages", "Disadvantages"):
-                        B_MODELS[label][k] = v
-                    else:
-                        B_MODELS[label][k] = json.loads(v)
+
+B_MODELS = LazyRegistry(load_business_models, name="business_models")
 
 
 def available_models(score, grid_condition):
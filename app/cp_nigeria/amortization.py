@@ -0,0 +1,60 @@
+r"""Amortization schedules of annuity loans with a grace period, computed for arrays of loans at once.
+
+A loan of a given amount starts in the year debt_start, only its interest is paid during the grace period and the
+principal is then repaid in constant annuities until the end of the tenor:
+
+    schedules = amortization_schedules(
+        amount=[1e6, 5e5], interest_rate=[0.1, 0.12], tenor=10, grace_period=1, debt_start=2025, years=range(2024, 2045)
+    )
+    schedules["Principal"]  # array of shape (loan, year)
+
+The rows are those of FinancialTool.debt_service_table(). The balance before the start of the loan (in debt_start - 1)
+is the amount, all the rows are 0 outside of the loan. The balances are accumulated with the same subtractions, in the
+same order, as a year by year computation, so that the schedules only differ from it where the vectorized power of
+numpy rounds the last bit of a repayment differently from its scalar power.
+"""
+
+import numpy as np
+import numpy_financial as npf
+
+SCHEDULE_ROWS = ("Interest", "Principal", "Balance opening", "Balance closing", "Capital service")
+
+
+def amortization_schedules(amount, interest_rate, tenor, grace_period, debt_start, years):
+    """
+    Return the rows of the amortization schedules as a dict of arrays of shape (loan, year). The loan parameters are
+    scalars or arrays of shape (loan,), broadcast together, years are the years of the schedules.
+    """
+    amount, interest_rate, tenor, grace_period, debt_start = (
+        np.asarray(param)[:, None]
+        for param in np.broadcast_arrays(
+            *[np.atleast_1d(param) for param in (amount, interest_rate, tenor, grace_period, debt_start)]
+        )
+    )
+    amount = amount.astype(float)
+    interest_rate = interest_rate.astype(float)
+    years = np.asarray(years)[None, :]
+
+    # year of the loan, 0 in the year before its start and 1 in its first year
+    index = years - debt_start + 1
+    in_loan = (index >= 1) & (index <= tenor)
+    repaid = in_loan & (index > grace_period)
+    nper = tenor - grace_period
+    # the periods outside of the repayment are clipped to a valid period, their principal is masked out
+    per = np.clip(index - grace_period, 1, np.maximum(nper, 1))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        principal = np.where(repaid, -npf.ppmt(interest_rate, per, nper, amount), 0.0)
+
+    # the closing balance of year j is amount - principal[0] - ... - principal[j]
+    balance = np.subtract.accumulate(np.column_stack([amount, principal]), axis=1)
+    closing = np.where((index >= 0) & (index <= tenor), balance[:, 1:], 0.0)
+    opening = np.where(index == 0, amount, np.where(in_loan, balance[:, :-1], 0.0))
+    interest = np.where(in_loan, opening * interest_rate, 0.0)
+
+    return {
+        "Interest": interest,
+        "Principal": principal,
+        "Balance opening": opening,
+        "Balance closing": closing,
+        "Capital service": interest + principal,
+    }
@@ -0,0 +1,247 @@
+r"""Vectorized evaluation of the FinancialTool chain for many parameter sets at once.
+
+FinancialSweep extracts from a FinancialTool the parts of the revenue, O&M, capex and loan computations which do not
+depend on the swept parameters. The revenue, O&M, loan, loss and cash flow chain is then evaluated as numpy arrays of
+shape (scenario, year) for vectors of the swept parameters, i.e. for a sensitivity table
+
+    sweep = FinancialSweep(FinancialTool(project))
+    parameters = parameter_grid(grant_share=[0.0, 0.25, 0.5], debt_interest_MG=[0.08, 0.1, 0.12])
+    tariffs = sweep.tariffs(**parameters)
+    result = sweep.evaluate(tariff=tariffs, **parameters)
+    result.irr(20)
+
+or for a Monte Carlo range, with parameters drawn by the caller
+
+    rng = np.random.default_rng()
+    result = sweep.evaluate(fuel_price_increase=rng.normal(0.038, 0.01, 5000))
+    distribution(result.cash_flow_after_debt_service)
+
+The swept parameters are listed in SWEPT_PARAMETERS, the parameters which are not given keep the value of the
+FinancialTool. For a single parameter set the results are those of the FinancialTool, up to floating point rounding.
+"""
+
+from dataclasses import dataclass, field
+
+import numpy as np
+import numpy_financial as npf
+
+from cp_nigeria.amortization import amortization_schedules
+
+SWEPT_PARAMETERS = (
+    "tariff",
+    "grant_share",
+    "debt_interest_MG",
+    "equity_community_amount",
+    "equity_developer_amount",
+    "fuel_price_increase",
+)
+# tariffs of the goal seek of FinancialTool.calculate_tariff()
+GOAL_SEEK_TARIFFS = np.arange(0.1, 0.5, 0.1)
+# number of project years whose cash flow after debt service should sum up to 0 for the goal seek tariff
+GOAL_SEEK_YEARS = 5
+
+
+def parameter_grid(**values):
+    """Return the cartesian product of the given parameter values, as a dict of flat arrays of the same length"""
+    grids = np.meshgrid(*[np.atleast_1d(np.asarray(v, dtype=float)) for v in values.values()], indexing="ij")
+    return {name: grid.ravel() for name, grid in zip(values, grids)}
+
+
+def distribution(values, percentiles=(5, 25, 50, 75, 95)):
+    """Return the mean and the percentiles of values over the scenarios (first axis), i.e. per year for the arrays of
+    shape (scenario, year)"""
+    values = np.asarray(values, dtype=float)
+    summary = {"mean": np.nanmean(values, axis=0)}
+    for percentile, value in zip(percentiles, np.nanpercentile(values, percentiles, axis=0)):
+        summary[f"p{percentile:g}"] = value
+    return summary
+
+
+@dataclass
+class SweepResult:
+    """Financial flows of each scenario, the flows over the project lifetime are arrays of shape (scenario, year)"""
+
+    parameters: dict
+    years: np.ndarray
+    gross_capex: float
+    total_grant: np.ndarray
+    initial_loan_amount: np.ndarray
+    wacc: np.ndarray
+    revenue: np.ndarray
+    opex: np.ndarray
+    ebitda: np.ndarray
+    depreciation: np.ndarray
+    equity_interest: np.ndarray
+    debt_interest: np.ndarray
+    debt_repayments: np.ndarray
+    ebt: np.ndarray
+    corporate_tax: np.ndarray
+    net_income: np.ndarray
+    cash_flow_operating: np.ndarray
+    cash_flow_after_debt_service: np.ndarray
+    _irr: dict = field(default_factory=dict, repr=False)
+
+    def __len__(self):
+        return self.revenue.shape[0]
+
+    @property
+    def free_cash_flow(self):
+        return self.cash_flow_after_debt_service
+
+    @property
+    def goal_seek(self):
+        """Sum of the cash flow after debt service over the first project years, see FinancialTool.goal_seek_helper()"""
+        return self.cash_flow_after_debt_service[:, :GOAL_SEEK_YEARS].sum(axis=1)
+
+    def irr(self, years):
+        """Internal rate of return of each scenario after the given number of project years, see
+        FinancialTool.internal_return_on_investment()"""
+        if years not in self._irr:
+            grant = self.parameters["grant_share"] * self.gross_capex
+            cash_flows = np.column_stack([-self.gross_capex + grant, self.cash_flow_operating[:, :years]])
+            # npf.irr() finds the roots of one polynomial at a time
+            self._irr[years] = np.array([npf.irr(row) for row in cash_flows])
+        return self._irr[years]
+
+
+class FinancialSweep:
+    def __init__(self, ft):
+        """
+        The sweep is initialized with a FinancialTool, whose capex, O&M costs, revenue assumptions and system growth
+        over the project lifetime are read once. The tariff and financial parameters of the tool are the default values
+        of the swept parameters.
+        """
+        self.project_start = ft.project_start
+        self.project_duration = ft.project_duration
+        self.years = np.arange(ft.project_start, ft.project_start + ft.project_duration)
+        exponents = np.arange(ft.project_duration)
+        params = ft.financial_params
+
+        tariff_rows = ft.cost_assumptions["Description"] == "Community tariff"
+        tariff = ft.cost_assumptions.loc[tariff_rows, "USD/Unit"].iloc[0]
+        self.defaults = {
+            "tariff": float(tariff),
+            **{name: float(params[name]) for name in SWEPT_PARAMETERS[1:]},
+        }
+        self.tax = params["tax"]
+        self.equity_interest = params["equity_interest_MG"]
+        self.usable_grant = ft.usable_grant
+        self.loan_maturity = params["loan_maturity"]
+        self.grace_period = params["grace_period"]
+
+        # revenue of the other revenue rows and of a tariff of 1 USD/Unit, the revenue is linear in the tariff
+        revenue = ft.revenue_over_lifetime.drop(("Total operating revenues", "operating_revenues_total"))
+        is_tariff = revenue.index.get_level_values(0) == "Community tariff"
+        self.other_revenue = np.nansum(revenue[~is_tariff].to_numpy(dtype=float), axis=0)
+        tariff_target = ft.cost_assumptions.loc[tariff_rows, "Target"].iloc[0]
+        tariff_quantity = ft.system_lifetime.reindex([tariff_target]).fillna(0.0).to_numpy(dtype=float)[0]
+        self.revenue_per_tariff = (1 + ft.tariff_growth_rate) ** exponents * ft.exchange_rate * tariff_quantity
+
+        # O&M costs, the fuel costs grow with the fuel price increase and the other costs at a fixed rate
+        om_costs = ft.om_costs
+        amounts = om_costs[f"Total costs [{ft.currency}]"].to_numpy(dtype=float)
+        growth_rates = om_costs["Growth rate"].to_numpy(dtype=float)
+        is_fuel = np.asarray(om_costs.index.str.endswith("_fuel_costs_total"), dtype=bool)
+        self.other_opex = np.nansum(
+            amounts[~is_fuel, None] * (1 + growth_rates[~is_fuel, None]) ** exponents[None, :], axis=0
+        )
+        self.fuel_costs = np.nansum(amounts[is_fuel])
+        self.exponents = exponents
+
+        capex = ft.capex
+        costs = capex[f"Total costs [{ft.currency}]"]
+        self.gross_capex = costs.sum()
+        self.system_capex = costs[capex["Category"] == "Power supply system"].sum()
+        replacement_amount = costs[capex["Description"].isin(["Battery", "Inverter", "Diesel Generator"])].sum()
+        replacement_start = ft.project_start + ft.loan_assumptions["Cum. replacement years"]
+        self.replacement_interest, self.replacement_principal = self.debt_service(
+            np.array([replacement_amount]), np.array([params["debt_interest_replacement"]]), replacement_start
+        )
+
+    def parameters(self, **values):
+        """Return the swept parameters broadcast to arrays of the same length, the missing ones set to their defaults"""
+        unknown = set(values) - set(SWEPT_PARAMETERS)
+        if unknown:
+            raise ValueError(f"Unknown swept parameters: {', '.join(sorted(unknown))}")
+        values = {name: values.get(name, default) for name, default in self.defaults.items()}
+        arrays = np.broadcast_arrays(*[np.atleast_1d(np.asarray(v, dtype=float)) for v in values.values()])
+        if arrays[0].ndim != 1:
+            raise ValueError("The swept parameters should be scalars or one dimensional arrays")
+        return {name: array for name, array in zip(values, arrays)}
+
+    def debt_service(self, amount, interest_rate, debt_start):
+        """Interest and principal of the loans over the project years as in FinancialTool.debt_service_table(), amount
+        and interest_rate are arrays of shape (scenario,)"""
+        schedules = amortization_schedules(
+            amount, interest_rate, self.loan_maturity, self.grace_period, debt_start, self.years
+        )
+        return schedules["Interest"], schedules["Principal"]
+
+    def evaluate(self, **values):
+        """Return the SweepResult of the parameter sets given as scalars or arrays of the swept parameters"""
+        p = self.parameters(**values)
+        n = len(p["tariff"])
+
+        revenue = self.other_revenue + p["tariff"][:, None] * self.revenue_per_tariff
+        opex = self.other_opex + self.fuel_costs * (1 + p["fuel_price_increase"][:, None]) ** self.exponents
+        ebitda = revenue - opex
+
+        total_equity = p["equity_community_amount"] + p["equity_developer_amount"]
+        total_grant = p["grant_share"] * self.gross_capex * self.usable_grant
+        initial_amount = np.maximum(self.gross_capex - total_grant - total_equity, 0)
+        wacc = (initial_amount / self.gross_capex) * p["debt_interest_MG"] + (
+            total_equity / self.gross_capex
+        ) * self.equity_interest
+        initial_interest, initial_principal = self.debt_service(
+            initial_amount, p["debt_interest_MG"], self.project_start
+        )
+
+        depreciation_yrs = self.project_duration
+        # FinancialTool.losses_over_lifetime() applies the depreciation to the columns labelled up to the number of
+        # depreciation years, its columns being labelled by year
+        depreciation = np.broadcast_to(
+            np.where(self.years <= depreciation_yrs, self.system_capex / depreciation_yrs, 0.0), (n, len(self.years))
+        )
+        equity_interest = np.broadcast_to((total_equity * self.equity_interest)[:, None], (n, len(self.years)))
+        debt_interest = initial_interest + self.replacement_interest
+        debt_repayments = initial_principal + self.replacement_principal
+        ebt = ebitda - depreciation - equity_interest - debt_interest
+        corporate_tax = np.where(ebt > 0, ebt * self.tax, 0.0)
+        cash_flow_operating = ebitda - corporate_tax
+
+        return SweepResult(
+            parameters=p,
+            years=self.years,
+            gross_capex=self.gross_capex,
+            total_grant=total_grant,
+            initial_loan_amount=initial_amount,
+            wacc=wacc,
+            revenue=revenue,
+            opex=opex,
+            ebitda=ebitda,
+            depreciation=depreciation,
+            equity_interest=equity_interest,
+            debt_interest=debt_interest,
+            debt_repayments=debt_repayments,
+            ebt=ebt,
+            corporate_tax=corporate_tax,
+            net_income=ebt - corporate_tax,
+            cash_flow_operating=cash_flow_operating,
+            cash_flow_after_debt_service=cash_flow_operating - equity_interest - debt_interest - debt_repayments,
+        )
+
+    def tariffs(self, **values):
+        """Return the tariff of each parameter set for which the cash flow after debt service of the first project
+        years sums up to 0, fitted on the same tariffs as FinancialTool.calculate_tariff()"""
+        p = self.parameters(**values)
+        n = len(p["tariff"])
+        x = GOAL_SEEK_TARIFFS
+        # each parameter set is evaluated for each goal seek tariff
+        repeated = {name: np.repeat(array, len(x)) for name, array in p.items()}
+        repeated["tariff"] = np.tile(x, n)
+        y = self.evaluate(**repeated).goal_seek.reshape(n, len(x))
+        # least squares line through the points of each row, as np.polyfit(x, y, deg=1)
+        dx = x - x.mean()
+        m = (y - y.mean(axis=1, keepdims=True)) @ dx / (dx @ dx)
+        h = y.mean(axis=1) - m * x.mean()
+        return -h / m
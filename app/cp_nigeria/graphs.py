@@ -0,0 +1,271 @@
+"""Graph data and plotly figures shared by the results page and the implementation plan report.
+
+The results page receives the graph data as JSON and draws it with plotly.js (see static/js/report_items.js), the
+functions building the figures here mirror those layouts so that the report graphs can be rendered headless on
+the server and stored as binary images in ReportGraph
+"""
+
+import base64
+import binascii
+import logging
+import re
+import plotly.graph_objects as go
+import plotly.io as pio
+from django.db import transaction
+from dashboard.models import graph_timeseries_stacked_cpn
+from cp_nigeria.models import ReportGraph
+from cp_nigeria.helpers import FinancialTool, get_aggregated_cgs, OUTPUT_PARAMS
+
+logger = logging.getLogger(__name__)
+
+try:
+    import kaleido
+except ImportError:
+    kaleido = None
+
+# same colors as used by plotly.js on the results page
+COLORWAY = ["#008753", "#F2CD5D", "#B2916C", "#778EB5", "#824670", "#991818", "#E86C1A"]
+CPN_FLOW_COLORS = {
+    "pv_plant_flow": "#F2CD5D",
+    "battery_flow": "#12AB6D",
+    "battery_charge_flow": "#12AB6D",
+    "battery_discharge_flow": "#71D0A1",
+    "total_demand_flow": "#A69F99",
+    "fulfilled_demand_flow": "#716A64",
+    "electricity_demand_flow": "#716A64",
+    "diesel_generator_flow": "#814400",
+    "diesel_fuel_consumption_flow": "#814400",
+    "excess_flow": "#EA9822",
+    "ac_bus_excess_flow": "#EA9822",
+    "dc_bus_excess_flow": "#EA9822",
+}
+IMAGE_WIDTH = 800
+IMAGE_HEIGHT = 500
+IMAGE_FORMATS = ReportGraph.IMAGE_FORMATS
+# number of hourly timesteps displayed in the report (first week of the year)
+REPORT_TIMESTEPS = 168
+MARGIN = dict(b=100, l=100, r=100, t=100)
+
+
+def cash_flow_graph_data(ft):
+    """Return the x values and traces of the cash flow graph for a FinancialTool instance"""
+    initial_loan = ft.initial_loan_table
+    replacement_loan = ft.replacement_loan_table
+    revenue = ft.revenue_over_lifetime
+    costs = ft.om_costs_over_lifetime
+    cash_flow = ft.cash_flow_over_lifetime
+
+    graph_contents = {
+        "Cash flow after debt service": {"values": cash_flow.loc["Cash flow after debt service"].tolist()},
+        "Debt repayments": {"values": (initial_loan.loc["Principal"] + replacement_loan.loc["Principal"]).tolist()[1:]},
+        "Debt interest payments": {
+            "values": (initial_loan.loc["Interest"] + replacement_loan.loc["Interest"]).tolist()[1:]
+        },
+        "Operating revenues net": {
+            "values": revenue.loc[("Total operating revenues", "operating_revenues_total"), :].tolist()
+        },
+        "Operating expenses": {"values": costs.loc["opex_total"].tolist()},
+    }
+    for trace in graph_contents:
+        graph_contents[trace]["description"] = OUTPUT_PARAMS[trace]["description"]
+
+    return {"x": cash_flow.columns.tolist(), "graph_contents": graph_contents, "title": "Cash flow"}
+
+
+def system_costs_data(ft):
+    """Return the capex, opex and fuel costs per supply source with a total row"""
+    system_costs = ft.system_params[
+        ft.system_params["category"].isin(["capex_initial", "opex_total", "fuel_costs_total"])
+    ].copy()
+    system_costs.drop(columns=["growth_rate", "label"], inplace=True)
+    system_costs = system_costs.pivot(columns="category", index="supply_source")
+    system_costs.columns = [col[1] for col in system_costs.columns]
+    system_costs.loc["total"] = system_costs.sum()
+    return system_costs
+
+
+def capex_by_category(ft):
+    """Return the total capex per cost category with a total row"""
+    capex = ft.capex.groupby("Category")[f"Total costs [{ft.currency}]"].sum()
+    capex.loc["total"] = capex.sum()
+    return capex
+
+
+def opex_by_category(ft):
+    """Return the total opex per cost category with a total row"""
+    opex = ft.om_costs[f"Total costs [{ft.currency}]"].copy()
+    opex.loc["total"] = opex.sum()
+    return opex
+
+
+def demand_graph_data(scenario, aggregated_cgs=None):
+    """Return the stacked mini-grid demand per consumer type (solar home systems excluded)"""
+    if aggregated_cgs is None:
+        aggregated_cgs = get_aggregated_cgs(scenario.project, as_ts=True)
+
+    graph_data = {"labels": [], "values": [], "descriptions": []}
+    graph_data["timestamps"] = scenario.get_timestamps(json_format=True)
+    for key in aggregated_cgs:
+        if key != "shs":
+            graph_data["labels"].append(OUTPUT_PARAMS[key]["verbose"])
+            graph_data["descriptions"].append(OUTPUT_PARAMS[key]["description"])
+            graph_data["values"].append(aggregated_cgs[key]["total_demand"].tolist())
+    return graph_data
+
+
+def stacked_timeseries_descriptions(timeseries_labels):
+    """Return the verbose name, description, line style and color of the flows of the stacked timeseries graph"""
+    return {
+        param: {
+            "verbose": OUTPUT_PARAMS[param]["verbose"] if param in OUTPUT_PARAMS else param,
+            "description": OUTPUT_PARAMS[param]["description"] if param in OUTPUT_PARAMS else "bla",
+            "line": {"shape": "hv", "dash": "dash" if param == "total_demand_flow" else "solid"},
+            # the flows of the additional demands (i.e. enterprises) have no color of their own
+            "color": CPN_FLOW_COLORS.get(param, COLORWAY[i % len(COLORWAY)]),
+        }
+        for i, param in enumerate(timeseries_labels)
+    }
+
+
+def cash_flow_figure(data):
+    fig = go.Figure()
+    for name, trace in data["graph_contents"].items():
+        fig.add_trace(go.Scatter(x=data["x"], y=trace["values"], name=name))
+    fig.update_layout(margin=MARGIN, xaxis_title="Time", yaxis_title="currency", colorway=COLORWAY)
+    return fig
+
+
+def costs_pie_figure(costs):
+    """Pie chart of the costs per category, the total row is only needed in tables and is dropped here"""
+    costs = costs.drop("total", errors="ignore")
+    labels = [OUTPUT_PARAMS[param]["verbose"] if param in OUTPUT_PARAMS else param for param in costs.index]
+    fig = go.Figure(go.Pie(labels=labels, values=costs.round().tolist(), automargin=True))
+    fig.update_layout(margin=MARGIN, showlegend=True, colorway=COLORWAY)
+    return fig
+
+
+def system_costs_figure(system_costs):
+    system_costs = system_costs.drop("total", errors="ignore")
+    assets = [OUTPUT_PARAMS[asset]["verbose"] for asset in system_costs.index]
+    fig = go.Figure()
+    for cost_type in system_costs.columns:
+        fig.add_trace(go.Bar(x=assets, y=system_costs[cost_type].tolist(), name=OUTPUT_PARAMS[cost_type]["verbose"]))
+    fig.update_layout(margin=MARGIN, barmode="stack", colorway=COLORWAY)
+    return fig
+
+
+def demand_figure(graph_data):
+    timestamps = graph_data["timestamps"]
+    fig = go.Figure()
+    for label, values in zip(graph_data["labels"], graph_data["values"]):
+        fig.add_trace(go.Scatter(x=timestamps, y=values, mode="lines", fill="tonexty", stackgroup="one", name=label))
+    fig.update_layout(
+        xaxis=dict(title="Time", range=[timestamps[0], timestamps[REPORT_TIMESTEPS]]),
+        yaxis_title="Demand [kWh]",
+        colorway=COLORWAY,
+    )
+    return fig
+
+
+def stacked_timeseries_figure(simulation, energy_vector="Electricity"):
+    scenario_results = graph_timeseries_stacked_cpn(
+        simulations=[simulation], y_variables=None, energy_vector=energy_vector
+    )[0]
+    timestamps = scenario_results["timestamps"]
+    descriptions = stacked_timeseries_descriptions(
+        [f"{timeseries['label']}_flow" for timeseries in scenario_results["timeseries"]]
+    )
+    fig = go.Figure()
+    for timeseries in scenario_results["timeseries"]:
+        description = descriptions[f"{timeseries['label']}_flow"]
+        fig.add_trace(
+            go.Scatter(
+                x=timestamps,
+                y=timeseries["value"],
+                name=description["verbose"],
+                line=dict(description["line"], color=description["color"]),
+                stackgroup=timeseries["group"],
+                fill=timeseries["fill"],
+                mode=timeseries["mode"],
+            )
+        )
+    fig.update_layout(
+        xaxis=dict(title="Time", range=[timestamps[0], timestamps[REPORT_TIMESTEPS]]),
+        yaxis_title="Energy (kW)",
+        hovermode="x unified",
+    )
+    return fig
+
+
+def report_figures(project):
+    """Build the plotly figures of the implementation plan, keyed by their ReportGraph name"""
+    scenario = project.scenario
+    ft = FinancialTool(project)
+    return {
+        "mini_grid_demand_graph": demand_figure(demand_graph_data(scenario)),
+        "stacked_timeseries_graph": stacked_timeseries_figure(scenario.simulation),
+        "capex_graph": costs_pie_figure(capex_by_category(ft)),
+        "opex_graph": costs_pie_figure(opex_by_category(ft)),
+        "cash_flow_graph": cash_flow_figure(cash_flow_graph_data(ft)),
+        "system_costs_graph": system_costs_figure(system_costs_data(ft)),
+    }
+
+
+def figure_to_image(fig, image_format="png"):
+    """Render a plotly figure to image bytes, requires the optional kaleido package"""
+    if kaleido is None:
+        raise ImportError("The kaleido package is required to render graphs on the server")
+    if image_format not in IMAGE_FORMATS:
+        raise ValueError(f"Image format '{image_format}' is not supported, use one of {IMAGE_FORMATS}")
+    return pio.to_image(fig, format=image_format, width=IMAGE_WIDTH, height=IMAGE_HEIGHT)
+
+
+def decode_image_url(image_url):
+    """Return the bytes and the format of a base64 image data url like "data:image/png;base64,<data>"
+
+    Raises a ValueError if the data url is malformed or the image format cannot be embedded in the report
+    """
+    match = re.fullmatch(r"data:image/(\w+);base64,(.+)", image_url or "", flags=re.DOTALL)
+    if match is None:
+        raise ValueError("The image is not a base64 data url")
+    image_format, image_data = match.groups()
+    if image_format not in IMAGE_FORMATS:
+        raise ValueError(f"Image format '{image_format}' is not supported, use one of {IMAGE_FORMATS}")
+    try:
+        return base64.b64decode(image_data, validate=True), image_format
+    except binascii.Error as e:
+        raise ValueError(f"The image data could not be decoded: {e}")
+
+
+def save_report_graph(simulation, name, image, image_format="png"):
+    ReportGraph.objects.update_or_create(
+        simulation=simulation, name=name, defaults={"image": image, "image_format": image_format}
+    )
+
+
+def render_report_graphs(project, image_format="png", figures=None):
+    """Render the implementation plan graphs of a project and store them as binary images
+
+    Parameters
+    ----------
+    project: Project
+        the project must have a finished simulation
+    image_format: str
+        one of IMAGE_FORMATS
+    figures: dict, optional
+        plotly figures keyed by graph name, default is all the graphs of the report
+
+    Returns
+    -------
+    list of the names of the graphs which were stored
+    """
+    simulation = project.scenario.simulation
+    if figures is None:
+        figures = report_figures(project)
+
+    images = {name: figure_to_image(fig, image_format) for name, fig in figures.items()}
+    with transaction.atomic():
+        for name, image in images.items():
+            save_report_graph(simulation, name, image, image_format)
+    logger.info(f"Rendered {len(images)} report graphs for project {project.id}")
+    return list(images.keys())
@@ -1,27 +1,17 @@
-from datetime import date
-from docx import Document
-from docx.table import Table
-from docx.shape import InlineShape
-from docx.shared import Pt, Inches, RGBColor
-from docx.enum.text import WD_PARAGRAPH_ALIGNMENT
-from docx.enum.table import WD_CELL_VERTICAL_ALIGNMENT, WD_TABLE_ALIGNMENT
-from docx.oxml import parse_xml, OxmlElement, ns
-from docx.opc.constants import RELATIONSHIP_TYPE
 import pandas as pd
 import numpy as np
 import numpy_financial as npf
-import os
 import json
-import csv
-import base64
-import io
 import logging
+from functools import lru_cache
 from cp_nigeria.models import ConsumerGroup, DemandTimeseries, Options, ImplementationPlanContent
-from projects.models import Asset, Simulation
+from projects.models import Asset, Simulation, Timeseries, TimeseriesPayload
 from projects.constants import ENERGY_DENSITY_DIESEL, CURRENCY_SYMBOLS
+from projects.profiling import profile_section
 from business_model.models import EquityData, BusinessModel, BMAnswer
 from business_model.helpers import B_MODELS
 from dashboard.models import FancyResults, KPIScalarResults
+from dashboard.results import simulation_flows
 from projects.models import EconomicData
 from django.shortcuts import get_object_or_404
 from django.db.models import Func, Sum, Avg, Max
@@ -29,9 +19,12 @@ from django.contrib.staticfiles.storage import staticfiles_storage
 from django.templatetags.static import static
 from dashboard.models import get_costs
 from django.db.models import Case
-from django.db import transaction
+from django.db import connection, transaction
 from django.utils.functional import cached_property
-from geopy.geocoders import Nominatim
+from projects.registry import LazyRegistry, csv_to_dict
+from cp_nigeria.regions import get_location_region
+from cp_nigeria.amortization import SCHEDULE_ROWS, amortization_schedules
+from cp_nigeria.financial_sweep import FinancialSweep
 
 
 class Unnest(Func):
@@ -50,28 +43,10 @@ HOUSEHOLD_TIERS = [
 ]
 
 
-def csv_to_dict(filepath, label_col="label"):
-    # the csv must contain a column named "label" containing the variable name, which will be used to construct the
-    # nested dictionaries
-    dict = {}
-    if os.path.exists(staticfiles_storage.path(filepath)) is True:
-        with open(staticfiles_storage.path(filepath), encoding="utf-8") as csvfile:
-            csvreader = csv.reader(csvfile, delimiter=",", quotechar='"')
-            for i, row in enumerate(csvreader):
-                if i == 0:
-                    hdr = row
-                    label_idx = hdr.index(label_col)
-                else:
-                    label = row[label_idx]
-                    dict[label] = {}
-                    for k, v in zip(hdr, row):
-                        dict[label][k] = v
-
-    return dict
-
-
-FINANCIAL_PARAMS = csv_to_dict("financial_tool/financial_parameters_list.csv")
-OUTPUT_PARAMS = csv_to_dict("cpn_output_params.csv")
+FINANCIAL_PARAMS = LazyRegistry(
+    lambda: csv_to_dict("financial_tool/financial_parameters_list.csv"), name="financial_parameters"
+)
+OUTPUT_PARAMS = LazyRegistry(lambda: csv_to_dict("cpn_output_params.csv"), name="output_parameters")
 
 
 def calculate_co2_mitigation(project):
@@ -243,7 +218,7 @@ def get_aggregated_cgs(project, as_ts=False):
 
         # calculate total consumers and total demand as sum of array elements in kWh
         for group in group_qs:
-            ts = DemandTimeseries.objects.get(pk=group.timeseries_id)
+            ts = DemandTimeseries.objects.with_payload().get(pk=group.timeseries_id)
 
             if shs_consumers is not None and ts.name in shs_consumers:
                 total_demand_shs += np.array(ts.get_values_with_unit("kWh")) * group.number_consumers
@@ -275,36 +250,163 @@ def get_aggregated_cgs(project, as_ts=False):
     return results_dict
 
 
-def get_aggregated_demand(project, consumer_type=None):
+# conversion factors of the demand profiles units to kWh, as in Timeseries.get_values_with_unit()
+DEMAND_UNIT_FACTORS = {"Wh": 0.001, "kWh": 1}
+
+AGGREGATED_DEMAND_SQL = """
+WITH weights AS (
+    SELECT cg.timeseries_id, SUM(cg.number_consumers) AS consumers,
+        CASE ts.units {unit_cases} END AS factor
+    FROM {consumer_group} cg JOIN {timeseries} ts ON ts.id = cg.timeseries_id
+    WHERE cg.id IN ({consumer_groups})
+    GROUP BY cg.timeseries_id, ts.units
+), demand AS (
+    SELECT t.hour, SUM(t.value * w.factor * w.consumers) AS value
+    FROM weights w JOIN {timeseries} ts ON ts.id = w.timeseries_id
+    LEFT JOIN {payload} p ON p.digest = ts.payload_id
+    -- the values are read from the payload of the timeseries if they are not stored in the row itself (an empty or
+    -- NULL column, as for PayloadAttribute)
+    CROSS JOIN LATERAL unnest(
+        CASE WHEN COALESCE(cardinality(ts.values), 0) = 0 AND p.digest IS NOT NULL THEN ARRAY(
+            SELECT e.value::double precision FROM json_array_elements_text(p.data::json) WITH ORDINALITY AS e(value, i)
+            ORDER BY e.i
+        ) ELSE ts.values END
+    ) WITH ORDINALITY AS t(value, hour)
+    GROUP BY t.hour
+)
+SELECT {columns}, (SELECT COUNT(*) FROM weights WHERE factor IS NULL) AS unsupported_units FROM demand t {order_by}
+"""
+
+
+def _aggregate_demand_postgres(cg_qs, with_timeseries):
+    """Sum the weighted demand profiles with a single query, only the aggregated profile or its total and peak are
+    transferred"""
+    consumer_groups, params = cg_qs.values("id").query.sql_with_params()
+    unit_cases = " ".join(
+        f"WHEN '{unit}' THEN {factor}::double precision" for unit, factor in DEMAND_UNIT_FACTORS.items()
+    )
+    if with_timeseries is True:
+        columns, order_by = "t.hour, t.value", "ORDER BY t.hour"
+    else:
+        columns, order_by = "COUNT(*), SUM(t.value), MAX(t.value)", ""
+    sql = AGGREGATED_DEMAND_SQL.format(
+        unit_cases=unit_cases,
+        consumer_group=connection.ops.quote_name(ConsumerGroup._meta.db_table),
+        timeseries=connection.ops.quote_name(Timeseries._meta.db_table),
+        payload=connection.ops.quote_name(TimeseriesPayload._meta.db_table),
+        consumer_groups=consumer_groups,
+        columns=columns,
+        order_by=order_by,
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        rows = cursor.fetchall()
+
+    if rows and rows[0][-1] > 0:
+        raise ValueError("Unsupported units")
+    if with_timeseries is True:
+        demand = np.zeros(max(8760, len(rows)))
+        if rows:
+            hours, values, _ = zip(*rows)
+            demand[np.array(hours) - 1] = values
+        return demand, demand.sum(), demand.max()
+
+    n_hours, total, peak, _ = rows[0]
+    if n_hours == 0:
+        return None, 0.0, 0.0
+    # the profiles shorter than a year are padded with zeros
+    return None, total, max(peak, 0.0) if n_hours < 8760 else peak
+
+
+def _aggregate_demand_python(cg_qs, with_timeseries):
+    consumers = {}
+    for cg in cg_qs.filter(timeseries__isnull=False).select_related("timeseries__payload"):
+        timeseries, count = consumers.get(cg.timeseries_id, (cg.timeseries, 0))
+        consumers[cg.timeseries_id] = (timeseries, count + cg.number_consumers)
+    profiles = [np.array(timeseries.get_values_with_unit("kWh")) for timeseries, _ in consumers.values()]
+    demand = np.zeros(max([8760] + [len(profile) for profile in profiles]))
+    for profile, (_, count) in zip(profiles, consumers.values()):
+        demand[: len(profile)] += profile * count
+    return demand if with_timeseries is True else None, demand.sum(), demand.max()
+
+
+def aggregate_demand(cg_qs, with_timeseries=True):
+    """Sum the demand profiles of the consumer groups in kWh, weighted by their number of consumers
+
+    On postgres the profiles are summed by the database (unnest with ordinality), the other backends sum them in
+    python. Both give the same results up to the floating point rounding of the sums.
+
+    :param cg_qs: queryset of the ConsumerGroup to aggregate
+    :param with_timeseries: when False the aggregated profile is not returned, only its total and peak
+    :return: tuple of the aggregated profile (numpy array of at least 8760 values, None if with_timeseries is False),
+    the total and the peak demand
+    """
+    if connection.vendor == "postgresql":
+        return _aggregate_demand_postgres(cg_qs, with_timeseries)
+    return _aggregate_demand_python(cg_qs, with_timeseries)
+
+
+def demand_consumer_groups(project, consumer_type=None):
+    """Return the consumer groups of the project taken into account in the aggregated demand"""
     options = get_object_or_404(Options, project=project)
-    shs_threshold = options.shs_threshold
-    # Prevent error if no timeseries are present
-    total_demand = [np.zeros(8760)]
     cg_qs = ConsumerGroup.objects.filter(project=project)
+    # exclude SHS users from aggregated demand for system optimization
+    if len(options.shs_threshold) != 0:
+        shs_consumers = get_shs_threshold(options.shs_threshold)
+        # TODO need to warn the user if the total_demand is empty due to shs threshold
+        cg_qs = cg_qs.exclude(timeseries__name__in=shs_consumers)
+    if consumer_type is not None:
+        # include the machinery demand in the enterprise demand
+        if consumer_type == "Enterprise":
+            consumer_types = ["Enterprise", "Machinery"]
+            cg_qs = cg_qs.filter(consumer_type__consumer_type__in=consumer_types)
+        else:
+            cg_qs = cg_qs.filter(consumer_type__consumer_type=consumer_type)
+    return cg_qs
 
-    if cg_qs.exists():
-        # exclude SHS users from aggregated demand for system optimization
-        if len(shs_threshold) != 0:
-            shs_consumers = get_shs_threshold(options.shs_threshold)
-            # TODO need to warn the user if the total_demand is empty due to shs threshold
-            cg_qs = cg_qs.exclude(timeseries__name__in=shs_consumers)
-        if consumer_type is not None:
-            # include the machinery demand in the enterprise demand
-            if consumer_type == "Enterprise":
-                consumer_types = ["Enterprise", "Machinery"]
-                cg_qs = cg_qs.filter(consumer_type__consumer_type__in=consumer_types)
-            else:
-                cg_qs = cg_qs.filter(consumer_type__consumer_type=consumer_type)
-        for cg in cg_qs:
-            timeseries_values = np.array(cg.timeseries.get_values_with_unit("kWh"))
-            nr_consumers = cg.number_consumers
-            total_demand.append(timeseries_values * nr_consumers)
-        total_demand_list = np.vstack(total_demand).sum(axis=0).tolist()
-        return total_demand_list
+
+def get_aggregated_demand(project, consumer_type=None):
+    if ConsumerGroup.objects.filter(project=project).exists():
+        return aggregate_demand(demand_consumer_groups(project, consumer_type))[0].tolist()
     else:
         return []
 
 
+def get_aggregated_demands(project, consumer_types=("Enterprise", "Household", "Public facility")):
+    """Provide the aggregated demand of each consumer type from a single pass over the project's consumer groups
+
+    The result for each consumer type is identical to get_aggregated_demand(project, consumer_type=...), the
+    machinery demand is included in the enterprise demand
+
+    :param consumer_types: the consumer types to aggregate the demand for
+    :return: dict with the consumer types as keys and the aggregated demand lists as values
+    """
+    options = get_object_or_404(Options, project=project)
+    cg_qs = ConsumerGroup.objects.filter(project=project).select_related("consumer_type", "timeseries__payload")
+    consumer_groups = list(cg_qs)
+    if len(consumer_groups) == 0:
+        return {consumer_type: [] for consumer_type in consumer_types}
+
+    # exclude SHS users from aggregated demand for system optimization
+    shs_consumers = get_shs_threshold(options.shs_threshold) if len(options.shs_threshold) != 0 else []
+    # Prevent error if no timeseries are present
+    total_demands = {consumer_type: [np.zeros(8760)] for consumer_type in consumer_types}
+    for cg in consumer_groups:
+        if cg.timeseries is not None and cg.timeseries.name in shs_consumers:
+            continue
+        consumer_type = cg.consumer_type.consumer_type if cg.consumer_type is not None else None
+        if consumer_type == "Machinery":
+            consumer_type = "Enterprise"
+        if consumer_type in total_demands:
+            timeseries_values = np.array(cg.timeseries.get_values_with_unit("kWh"))
+            total_demands[consumer_type].append(timeseries_values * cg.number_consumers)
+
+    return {
+        consumer_type: np.vstack(total_demand).sum(axis=0).tolist()
+        for consumer_type, total_demand in total_demands.items()
+    }
+
+
 def get_demand_indicators(project, with_timeseries=False):
     """Provide the aggregated, peak and daily averaged demand
 
@@ -313,15 +415,19 @@ def get_demand_indicators(project, with_timeseries=False):
     qs_demand = Asset.objects.filter(scenario=project.scenario, asset_type__asset_type="reducable_demand")
     if qs_demand.exists():
         demand_np = []
-        for dem in qs_demand:
+        for dem in qs_demand.with_payload():
             demand = json.loads(dem.input_timeseries)
             demand_np.append(demand)
         demand_np = np.vstack(demand_np).sum(axis=0)
+        total_demand = demand_np.sum()
+        peak_demand = demand_np.max()
     else:
-        demand_np = np.array(get_aggregated_demand(project))
+        # the aggregated demand is only transferred from the database if it is returned
+        demand_np, total_demand, peak_demand = aggregate_demand(
+            demand_consumer_groups(project), with_timeseries=with_timeseries
+        )
 
-    total_demand = demand_np.sum()
-    peak_demand = round(demand_np.max(), 1)
+    peak_demand = round(peak_demand, 1)
     daily_demand = round(total_demand / 365, 1)
     if with_timeseries is True:
         return (demand_np.tolist(), total_demand, peak_demand, daily_demand)
@@ -342,10 +448,8 @@ def get_fulfilled_demand_indicators(project, total_only=False):
     else:
         total_fulfilled_demand = qs_res.aggregate(delivered_demand=Sum("total_flow"))["delivered_demand"]
         if total_only is False:
-            delivered_demand = []
-            for dem in qs_res:
-                delivered_demand.append(dem.timeseries)
-            delivered_demand_np = np.vstack(delivered_demand).sum(axis=0)
+            flows = simulation_flows(project.scenario.simulation)
+            delivered_demand_np = flows.total_timeseries(flows.select_ids(qs_res.values_list("id", flat=True)))
             peak_demand = round(delivered_demand_np.max(), 1)
             daily_demand = round(total_fulfilled_demand / 365, 1)
 
@@ -398,56 +502,8 @@ def get_asset_assumptions(project):
 
 
 def get_community_region(project):
-    """Returns a tuple containing the state and geopolitical zone by extracting the state from the
-    address returned by reverse geocoding the coordinates"""
-    state_region_mapping = {
-        "Yobe": "North East",
-        "Borno": "North East",
-        "Bauchi": "North East",
-        "Gombe": "North East",
-        "Adamawa": "North East",
-        "Taraba": "North East",
-        "Niger": "North Central",
-        "Nasarawa": "North Central",
-        "Kwara": "North Central",
-        "Kogi": "North Central",
-        "Benue": "North Central",
-        "Plateau": "North Central",
-        "FCT": "North Central",
-        "Sokoto": "North West",
-        "Katsina": "North West",
-        "Jigawa": "North West",
-        "Kano": "North West",
-        "Zamfara": "North West",
-        "Kaduna": "North West",
-        "Kebbi": "North West",
-        "Anambra": "South East",
-        "Abia": "South East",
-        "Enugu": "South East",
-        "Ebonyi": "South East",
-        "Imo": "South East",
-        "Edo": "South South",
-        "Delta": "South South",
-        "Cross River": "South South",
-        "Akwa Ibom": "South South",
-        "Rivers": "South South",
-        "Bayelsa": "South South",
-        "Oyo": "South West",
-        "Osun": "South West",
-        "Ekiti": "South West",
-        "Ogun": "South West",
-        "Ondo": "South West",
-        "Lagos": "South West",
-    }
-    try:
-        geolocator = Nominatim(user_agent="cp_nigeria_app")
-        location = geolocator.reverse(f"{project.latitude}, {project.longitude}")
-        state = location.raw["address"]["state"]
-        region = state_region_mapping[state]
-    except:
-        state = "[could not locate state]"
-        region = "[region unavailable]"
-    return state, region
+    """Returns a tuple containing the state and geopolitical zone of the project's location"""
+    return get_location_region(project.latitude, project.longitude)
 
 
 def get_renewable_share(project):
@@ -469,821 +525,42 @@ def get_renewable_share(project):
     return renewable_share
 
 
-class ReportHandler:
-    def __init__(self, project):
-        self.doc = Document()
-        self.logo_path = "static/assets/logos/cpnigeria-logo.png"
-        self.table_counter = 0
-        self.figure_counter = 0
-        self.heading_counter = 0
-        self.subheading_counter = 0
-
-        # set style of the document
-        try:
-            # Set font "Lato" for the entire self.doc
-            self.doc.styles["Normal"].font.name = "Lato"
-        except ValueError:
-            # Handle the exception when "Lato" is not available and set a fallback font
-            self.doc.styles["Normal"].font.name = "Arial"
-
-        # get parameters needed for implementation plan
-        self.options = Options.objects.get(project=project)
-        if self.options.community is not None:
-            community_name = self.options.community.name
-        else:
-            community_name = project.name
-        self.bm = BusinessModel.objects.get(scenario=project.scenario)
-        self.bm_name = self.bm.model_name
-
-        # get optimized capacities
-        qs_res = FancyResults.objects.filter(simulation__scenario=project.scenario)
-        opt_caps = qs_res.filter(
-            optimized_capacity__gt=0, asset__in=["pv_plant", "battery", "inverter", "diesel_generator"], direction="in"
-        )
-
-        opt_caps = opt_caps.values("asset", "optimized_capacity", "total_flow")
-
-        # Make a sentence with system assets and their optimized capacities
-        system_assets = []
-        assets_text = {
-            "battery": "battery system",
-            "pv_plant": "solar PV plant",
-            "diesel_generator": "diesel generator",
-        }
-        for asset in opt_caps.values_list("asset", "optimized_capacity"):
-            if asset[0] != "inverter":
-                unit = "kW"
-                if asset[0] == "battery":
-                    unit = "kWh"
-                system_assets.append(f"{assets_text[asset[0]]} [{round(asset[1], 1)} {unit}]")
-        if len(system_assets) == 1:
-            system_assets = "a {}".format(system_assets[0])
-        else:
-            system_assets = (
-                "a {}, " * (len(system_assets) - 2) + "a {}" * (len(system_assets) > 1) + " and a {}"
-            ).format(*system_assets)
-
-        self.project = project
-        self.report_obj = ImplementationPlanContent.objects.get(simulation=self.project.scenario.simulation)
-        self.image_path = dict(
-            es_schema="static/assets/gui/" + self.options.schema_name,
-            bm_graph="static/assets/cp_nigeria/business_models/" + B_MODELS[self.bm_name]["Graph"],
-            bm_resp="static/assets/cp_nigeria/business_models/" + B_MODELS[self.bm_name]["Responsibilities"],
-        )
-
-        scenario_results = json.loads(KPIScalarResults.objects.get(simulation__scenario=project.scenario).scalar_values)
-
-        lcoe = (
-            round(scenario_results["levelized_costs_of_electricity_equivalent"], 2)
-            * self.project.economic_data.exchange_rate
-        )
-
-        ft = FinancialTool(project)
-        self.cost_assumptions = ft.cost_assumption_tables
-
-        fulfilled_demand, peak_demand, daily_demand = get_fulfilled_demand_indicators(project)
-        total_demand = np.sum(get_aggregated_demand(project))
-
-        if "inverter" in ft.system_params["supply_source"].tolist():
-            inverter_aggregated_flow = ft.system_params.loc[
-                (ft.system_params["category"] == "total_flow") & (ft.system_params["supply_source"] == "inverter"),
-                "value",
-            ].iloc[0]
-        else:
-            inverter_aggregated_flow = 0
-
-        self.aggregated_cgs = get_aggregated_cgs(self.project)
-
-        # Make a sentence with existing enterprises and public facilities
-        self.cgs = ConsumerGroup.objects.filter(project=project)
-        cg_sentences = {}
-        for consumer_type in ["Enterprise", "Public facility"]:
-            consumers = []
-            # Get the 4 most commonly found consumers for each consumer type and construct into sentence list
-            most_consumers = (
-                self.cgs.filter(consumer_type__consumer_type=consumer_type)
-                .order_by("-number_consumers")
-                .values_list("timeseries__name", "number_consumers")[:4]
-            )
-            for name, nr_consumers in most_consumers:
-                consumers.append(f"{name.replace('_', ': ')} ({nr_consumers})")
-
-            cg_sentences[consumer_type] = ", ".join(consumers[:-1]) + f" and {consumers[-1]}"
-
-        state, region = get_community_region(self.project)
-        self.text_parameters = dict(
-            grid_option=self.bm.grid_condition,
-            bm_name=B_MODELS[self.bm_name]["Verbose"],
-            community_name=community_name,
-            community_state=state,
-            community_region=region,
-            co2_mitigation=calculate_co2_mitigation(self.project),
-            hh_number_mg=self.aggregated_cgs["households"]["nr_consumers"],
-            ent_number=self.aggregated_cgs["enterprises"]["nr_consumers"],
-            pf_number=self.aggregated_cgs["public"]["nr_consumers"],
-            shs_number=self.aggregated_cgs["shs"]["nr_consumers"],
-            hh_number_total=self.aggregated_cgs["households"]["nr_consumers"]
-            + self.aggregated_cgs["shs"]["nr_consumers"],
-            shs_threshold=dict(HOUSEHOLD_TIERS)[self.options.shs_threshold],
-            system_assets=system_assets,
-            system_capex=round(ft.system_params[ft.system_params["category"] == "capex_initial"].value.sum(), -3),
-            system_opex=round(ft.total_opex(), -3),
-            grant_share=ft.financial_params["grant_share"] * 100,
-            yearly_production=ft.yearly_production_electricity,
-            total_demand=total_demand,
-            avg_daily_demand=daily_demand,
-            peak_demand=peak_demand,
-            diesel_price_increase=ft.financial_params["fuel_price_increase"],
-            renewable_share=get_renewable_share(project),
-            lcoe=lcoe,
-            opex_total=round(ft.total_opex(), -3),
-            opex_growth_rate=ft.opex_growth_rate * 100,
-            tariff_growth_rate=ft.tariff_growth_rate * 100,
-            fuel_costs=round(ft.fuel_costs, -3),
-            fuel_consumption_liter=ft.fuel_consumption_liter,
-            energy_system_components_string=self.options.component_list,
-            community_latitude=self.project.latitude,
-            community_longitude=self.project.longitude,
-            project_name=self.project.name,
-            project_lifetime=self.project.economic_data.duration,
-            total_investments=ft.total_capex,
-            disco="DiscoName",
-            ent_demand_categories=cg_sentences["Enterprise"],
-            pf_demand_categories=cg_sentences["Public facility"],
-            demand_coverage_factor=self.options.demand_coverage_factor * 100,
-            fulfilled_demand=fulfilled_demand,
-            fulfilled_demand_share=fulfilled_demand / total_demand * 100,
-            grant_deduction=(1 - ft.usable_grant) * 100,
-            currency=project.economic_data.currency,
-        )
-        if self.text_parameters["grid_option"] == "isolated":
-            self.text_parameters["grid_option"] = "not connected to the national grid"
-        else:
-            self.text_parameters[
-                "grid_option"
-            ] = "connected to the national grid, however, the electricity level provided is insufficient"
-
-    def add_heading(self, text, level=1):
-        text = text.format(**self.text_parameters).upper()
-        if level == 1:
-            self.heading_counter += 1
-            self.subheading_counter = 0
-            number = f"{str(self.heading_counter)}. "
-        elif level == 2 and self.heading_counter > 0:
-            self.subheading_counter += 1
-            number = f"{self.heading_counter}.{self.subheading_counter}. "
-        else:
-            number = ""
-
-        h = self.doc.add_heading(number + text, level)
-        h.runs[0].font.color.rgb = RGBColor(0, 135, 83)
-        h.runs[0].font.bold = False
-        h.paragraph_format.space_after = Pt(8)
-
-    def add_table(self, rows, cols, caption=None):
-        self.table_counter += 1
-        # styles = ["Light Grid", "Light List", "Light Shading", "Medium Grid 1", "Medium List 1", "Medium Shading 1"]
-        t = self.doc.add_table(rows, cols, style="Light Shading")
-
-        if caption is not None:
-            self.add_caption(t, caption)
-
-        t.alignment = WD_TABLE_ALIGNMENT.CENTER
-
-        return t
-
-    def add_paragraph(self, text=None, style=None, emph=[]):
-        if text is not None:
-            try:
-                text = text.format(**self.text_parameters)
-            except ValueError as e:
-                print(text)
-                raise (e)
-        p = self.doc.add_paragraph(style=style)
-        p.alignment = WD_PARAGRAPH_ALIGNMENT.JUSTIFY
-        runner = p.add_run(text)
-        if "italic" in emph:
-            runner.italic = True
-        if "bold" in emph:
-            runner.bold = True
-        if "red" in emph:
-            runner.font.color.rgb = RGBColor(255, 0, 0)
-
-        p.paragraph_format.line_spacing = 1.25
-        return p
-
-    def add_image(self, path, width=Inches(6), caption=None):
-        self.figure_counter += 1
-        fig = self.doc.add_picture(path, width=width)
-        self.doc.paragraphs[-1].alignment = WD_PARAGRAPH_ALIGNMENT.CENTER
-        if caption is not None:
-            self.add_caption(fig, caption)
-
-    def add_image_from_db(self, name, width=Inches(6), caption=None):
-        image_data = getattr(self.report_obj, name)
-        if image_data:
-            image_data = image_data.split(",")[1]
-            image_bytes = base64.b64decode(image_data)
-            image = io.BytesIO(image_bytes)
-
-            self.add_image(image, width, caption)
-
-        else:
-            print(f"Image {name} was not found in session storage")
-
-    def add_caption(self, tab_or_figure, caption):
-        target = {Table: "Table", InlineShape: "Figure"}[type(tab_or_figure)]
-        if target == "Table":
-            number = self.table_counter
-        else:
-            number = self.figure_counter
-
-        # caption type
-        paragraph = self.doc.add_paragraph(style="Caption")
-        paragraph.paragraph_format.space_before = Pt(3)
-
-        # TODO numbering field: code works but only when manually updating the document, replaced with manual numbering for now (see: https://github.com/python-openxml/python-docx/issues/359)
-        # run = paragraph.add_run()
-        #
-        # fldChar = OxmlElement("w:fldChar")
-        # fldChar.set(ns.qn("w:fldCharType"), "begin")
-        # run._r.append(fldChar)
-        #
-        # instrText = OxmlElement("w:instrText")
-        # instrText.text = f" SEQ {target} \\* ARABIC"
-        # run._r.append(instrText)
-        #
-        # fldChar = OxmlElement("w:fldChar")
-        # fldChar.set(ns.qn("w:fldCharType"), "end")
-        # run._r.append(fldChar)
-
-        # caption text
-        caption_run = paragraph.add_run(f"{target} {number}: {caption}")
-        caption_run.font.color.rgb = RGBColor(0, 135, 83)
-        paragraph.alignment = WD_PARAGRAPH_ALIGNMENT.CENTER
-
-    def add_dict_as_table(self, dict, caption=None):
-        t = self.doc.add_table(len(dict), 2, caption)
-
-        for i, (key, value) in enumerate(dict.items()):
-            t.cell(i, 0).text = key
-            t.cell(i, 0).paragraphs[0].runs[0].font.bold = True
-            t.cell(i, 1).text = value
-
-    def add_df_as_table(self, df, caption=None, index=True):
-        if not isinstance(df, pd.DataFrame):
-            print("Invalid format, table data must be a pd.DataFrame")
-            return
-
-        if index is True:
-            start_idx = 1
-        else:
-            start_idx = 0
-
-        rows = df.shape[0]
-        cols = df.shape[1]
-
-        t = self.add_table(rows + 1, cols + start_idx, caption)
-
-        # add indices
-        if index is True:
-            for j in range(rows):
-                t.cell(j + 1, 0).text = df.index[j]
-
-        # add headers
-        for j in range(cols):
-            t.cell(0, j + start_idx).text = df.columns[j]
-            p = t.cell(0, j + start_idx).paragraphs[0]
-            p.alignment = WD_PARAGRAPH_ALIGNMENT.RIGHT
-
-        for i in range(rows):
-            for j in range(cols):
-                t.cell(i + 1, j + start_idx).text = str(df.values[i, j])
-                p = t.cell(i + 1, j + start_idx).paragraphs[0]
-                p.alignment = WD_PARAGRAPH_ALIGNMENT.RIGHT
-
-        # shade and make bold if rows contain total
-        for j in range(rows):
-            if "total" in df.index[j].lower():
-                for cell in t.rows[j + 1].cells:
-                    shading_elm = parse_xml(r'<w:shd {} w:fill="4CC58C"/>'.format(ns.nsdecls("w")))
-                    cell._tc.get_or_add_tcPr().append(shading_elm)
-                    cell.paragraphs[0].runs[0].font.bold = True
-
-    def get_df_from_db(self, name):
-        table_json = getattr(self.report_obj, name)
-        if table_json:
-            table_data = json.loads(table_json)
-            table_df = pd.DataFrame.from_dict(table_data["data"], orient="index", columns=table_data["headers"])
-            return table_df
-        else:
-            print(f"Table {name} was not found in session storage")
-
-    def add_table_from_records(self, records, columns=None):
-        tot_rows = len(records)
-        col_spacer = 0
-        if columns is not None:
-            tot_rows += 1
-            col_spacer = 1
-
-        table = self.add_table(rows=tot_rows, cols=len(records[0]))
-
-        if columns is not None:
-            hdr_cells = table.rows[0].cells
-            for i, item in enumerate(columns):
-                hdr_cells[i].text = item.format(**self.text_parameters)
-
-        for j, record in enumerate(records):
-            row_cells = table.rows[j + col_spacer].cells
-            # row_cells = table.add_row().cells
-            for i, item in enumerate(record):
-                if isinstance(item, str):
-                    try:
-                        row_cells[i].text = item.format(**self.text_parameters)
-                    except ValueError as e:
-                        print(item)
-                        raise (e)
-                else:
-                    row_cells[i].text = str(item)
-
-    def add_financial_table(self, records, title=""):
-        table = self.add_table(rows=1, cols=2)
-        row_cells = table.rows[0].cells
-        row_cells[0].merge(row_cells[-1])
-
-        # Set a cell background (shading) color and align center
-        shading_elm = parse_xml(r'<w:shd {} w:fill="008753"/>'.format(ns.nsdecls("w")))
-        row_cells[0]._tc.get_or_add_tcPr().append(shading_elm)
-        row_cells[0].text = title
-        p = row_cells[0].paragraphs[0]
-        p.alignment = WD_PARAGRAPH_ALIGNMENT.CENTER
-
-        for j, record in enumerate(records):
-            row_cells = table.add_row().cells
-            for i, item in enumerate(record):
-                try:
-                    row_cells[i].text = item.format(**self.text_parameters)
-                except ValueError as e:
-                    print(item)
-                    raise (e)
-
-        # TODO add a thick line
-
-        row_cells = table.add_row().cells
-        row_cells[0].text = "Total"
-        row_cells[0].bold = True
-
-    def add_list(self, list_items, style=None, emph=[]):
-        if isinstance(list_items, str):
-            list_items = [list_items]
-        if style is None:
-            style = "List Bullet"
-        for bullet in list_items:
-            self.add_paragraph(bullet, style=style, emph=emph)
-
-    def create_attribute(self, element, name, value):
-        # used for page numbering
-        element.set(ns.qn(name), value)
-
-    def add_page_number(self, run):
-        # code from https://stackoverflow.com/questions/56658872/add-page-number-using-python-docx
-        fldChar1 = OxmlElement("w:fldChar")
-        self.create_attribute(fldChar1, "w:fldCharType", "begin")
-
-        instrText = OxmlElement("w:instrText")
-        self.create_attribute(instrText, "xml:space", "preserve")
-        instrText.text = "PAGE"
-
-        fldChar2 = OxmlElement("w:fldChar")
-        self.create_attribute(fldChar2, "w:fldCharType", "end")
-
-        run._r.append(fldChar1)
-        run._r.append(instrText)
-        run._r.append(fldChar2)
-
-    def add_footer(self):
-        self.add_page_number(self.doc.sections[0].footer.paragraphs[0].add_run())
-        footer_text = f"    {self.project.name} \t \t https://community-minigrid.ng/en"
-        footer_run = self.doc.sections[0].footer.paragraphs[0].add_run(footer_text)
-        footer_run.font.size = Pt(9)
-
-    def prevent_table_splitting(self):
-        tags = self.doc.element.xpath("//w:tr[position() < last()]/w:tc/w:p")
-        for tag in tags:
-            ppr = tag.get_or_add_pPr()
-            ppr.keepNext_val = True
-
-    def add_hyperlink_into_run(self, paragraph, run, url):
-        # code from: https://github.com/python-openxml/python-docx/issues/74#issuecomment-441351994
-        runs = paragraph.runs
-        for i in range(len(runs)):
-            if runs[i].text == run.text:
-                break
-
-        # This gets access to the document.xml.rels file and gets a new relation id value
-        part = paragraph.part
-        r_id = part.relate_to(url, RELATIONSHIP_TYPE.HYPERLINK, is_external=True)
-
-        # Create the w:hyperlink tag and add needed values
-        hyperlink = OxmlElement("w:hyperlink")
-        self.create_attribute(hyperlink, "r:id", r_id)
-        hyperlink.append(run._r)
-        paragraph._p.insert(i + 1, hyperlink)
-
-    def add_paragraph_with_hyperlink(self, paragraph_text, hyperlink_text, url):
-        p = self.add_paragraph()
-
-        # Add the first run (text before the hyperlink)
-        p.add_run(paragraph_text.split(hyperlink_text)[0])
-
-        # Add the second run (hyperlink text)
-        run_hyperlink = p.add_run(hyperlink_text)
-        run_hyperlink.bold = True
-        run_hyperlink.underline = True
-        run_hyperlink.font.color.rgb = RGBColor(0, 102, 204)
-        self.add_hyperlink_into_run(p, run_hyperlink, url)
-
-        # Add the third run (text after the hyperlink)
-        p.add_run(paragraph_text.split(hyperlink_text)[1])
-
-        return p
-
-    @staticmethod
-    def create_community_criteria_list(bmanswer_qs):
-        BM_CRITERIA = csv_to_dict("business_model_report_criteria.csv", label_col="Criteria")
-        criteria_list = []
-        for criteria, values in BM_CRITERIA.items():
-            total_score_qs = bmanswer_qs.filter(question_id__in=json.loads(values["Questions"])).aggregate(
-                total_score=Sum("score")
-            )
-            score = total_score_qs["total_score"]
-            if score > json.loads(values["Threshold"]):
-                criteria_list.append(criteria)
-
-        return criteria_list
-
-    def save(self, response):
-        self.doc.save(response)
-
-    def create_cover_sheet(self):
-        title = f"Mini-Grid Implementation Plan for {self.project.name}"
-        subtitle = f"Date: {date.today().strftime('%d.%m.%Y')}"
-        summary = f"{self.project.description}"
-
-        # Add logo in the right top corner
-        header = self.doc.sections[0].header
-        run = header.paragraphs[0].add_run()
-        run.add_picture(self.logo_path, width=Pt(70))
-        header.paragraphs[0].alignment = WD_PARAGRAPH_ALIGNMENT.RIGHT
-        header.paragraphs[0].paragraph_format.space_after = Pt(3)
-
-        # Add title
-        title_paragraph = self.add_paragraph()
-        title_paragraph.paragraph_format.space_before = Inches(0.5)
-        title_run = title_paragraph.add_run(title)
-        title_run.font.size = Pt(16)
-        title_run.font.bold = True
-        title_paragraph.alignment = WD_PARAGRAPH_ALIGNMENT.CENTER
-
-        # Add subtitle
-        subtitle_paragraph = self.add_paragraph()
-        subtitle_run = subtitle_paragraph.add_run(subtitle)
-        subtitle_run.font.size = Pt(12)
-        self.doc.paragraphs[-1].alignment = WD_PARAGRAPH_ALIGNMENT.CENTER
-
-        # Add project details
-        self.add_heading("Project details", level=2)
-
-        # Add project summary table
-        project_summary = get_project_summary(self.project)
-        summary_table = {}
-        for key in project_summary:
-            summary_table[OUTPUT_PARAMS[key]["verbose"]] = project_summary[key]
-
-        self.add_dict_as_table(summary_table)
-
-        # Add project summary
-        self.add_heading("Project summary", level=2)
-        self.add_paragraph(
-            "The {community_name} community is a rural community in {community_state} State ({community_region} Region). The community "
-            "comprises about {hh_number_total} households as well as {ent_number} enterprises and {pf_number} public "
-            "facilities. Currently, the community is {grid_option}. In light of the community's aspiration to achieve a "
-            "constant and reliable electricity supply, the community is willing to engage with project partners to "
-            "construct a suitable mini-grid system. The system proposed in this implementation plan, by using the "
-            "CP-Nigeria Toolbox, comprises {system_assets}. The project does not only present a robust business case "
-            "but electrifying the community will also deliver vital socioeconomic benefits to its members. In "
-            "addition, the project approximately mitigates {co2_mitigation:,.1f} tonnes of CO2 over the project lifetime."
-        )
-
-        # Add page break
-        self.doc.add_page_break()
-
-    def create_report_content(self):
-        ### INTRODUCTION ###
-        self.add_heading("Context and Background")
-        self.add_heading("Community Background", level=2)
-        self.add_list(
-            (
-                "The community is located in {community_state} State ({community_region} Region)",
-                "The community comprises about {hh_number_total} households as well as {ent_number} enterprises and {pf_number} public facilities.",
-                "Some of the most commonly found enterprises in the community include {ent_demand_categories}",
-                "Existing public facilities include {pf_demand_categories}",
-                "Currently, the community is {grid_option}",
-            )
-        )
-
-        # self.add_table(
-        #     (
-        #         ("Consumption Level", "Very Low", "Low", "Middle", "High", "Very High"),
-        #         ("Number of households", "XX", "XX", "XX", "XX", "XX"),
-        #     )
-        # )
-
-        self.add_paragraph(
-            "--------------------------------------\nDear toolbox user, it is recommended to enrich this section by providing the following information",
-            emph=["italic", "red"],
-        )
-        self.add_list("Description of the current electricity access situation", emph=["italic", "red"])
-        self.add_list(
-            ("Use of diesel generators", "Most common cooking practices", "Use of lighting"),
-            style="List Bullet 2",
-            emph=["italic", "red"],
-        )
-        self.add_list(
-            (
-                "Experiences with community-led projects",
-                "Existing community organizational structures, e.g. (energy) cooperatives, associations, committees, etc.",
-                "Skills of community members in the context of energy/electricity supply",
-            ),
-            emph=["italic", "red"],
-        )
-
-        self.add_heading("CP-Nigeria Toolbox Context", level=2)
-        self.add_paragraph_with_hyperlink(
-            "This implementation plan is the output of an open source online toolbox.",
-            "open source online toolbox.",
-            "https://community-minigrid.ng/en/",
-        )
-        self.add_paragraph_with_hyperlink(
-            "The toolbox has been "
-            "developed within the frame of the project CP Nigeria: Communities of Practice as driver of a bottom-up "
-            "energy transition in Nigeria. This project is funded by the International Climate Initiative (IKI). "
-            "The overall objective of the project is to achieve a climate-friendly energy supply through "
-            "decentralized renewable energy (DRE) in Nigeria by 2030. In order to achieve this, civil society must "
-            'play a driving role. The project therefore aims to create exemplary civil society nuclei ("Communities '
-            'of Practice") and to empower them to plan and implement DRE projects (local level). Based on this, '
-            "it works transdisciplinary on improving the political framework for local decentralized RE projects ("
-            "national level). In this way, civil society can be empowered to implement DRE independently and make a "
-            "significant contribution to the achievement of climate change mitigation goals.  ",
-            "International Climate Initiative (IKI)",
-            "https://www.international-climate-initiative.com/en/project/communities-of-practice-as-driver-of-a-bottom-up-energy-transition-in-nigeria-img2020-i-003-nga-energy-transition-communities-of-practice/",
-        )
-
-        ### DEMAND SECTION ###
-        self.add_heading("Electricity Demand Profile")
-
-        p = self.add_paragraph_with_hyperlink(
-            "The total electricity demand is estimated by assigning demand profiles to the households, enterprises "
-            "and public facilities present in the community, based on demand profiles calculated within the "
-            "PeopleSun project, which were derived from surveys and appliance audits conducted within "
-            "electrified communities. As the demand is based on proxy data for already electrified communities, "
-            "the system does not consider any demand increase over the project lifetime, but instead assumes that the "
-            "proposed supply system would be able to satisfy future demand for all consumers connected to the "
-            "mini-grid. In the case of new connections, the system may require upsizing.",
-            "PeopleSun project",
-            "https://energypedia.info/wiki/Nigeria_Off-Grid_Solar_Knowledge_Hub",
-        )
-
-        if self.options.shs_threshold == "very_high":
-            self.add_paragraph(
-                "To avoid system oversizing, the system was assumed to only serve enterprises and public facilities. "
-                "Therefore, all households were excluded from the supply system optimization. This approach assumes "
-                "that the mini-grid capacity will be increased and expanded to serve households as the project "
-                "progresses. Households are assumed to be served by Solar Home Systems (SHS) instead."
-            )
-        else:
-            self.add_paragraph(
-                "Given that not all households may be connected to the mini-grid, but some may be served by Solar Home "
-                'Systems (SHS) instead, all households assigned to the "{shs_threshold}" tier and below are excluded from the '
-                "supply system optimization. In this case, {shs_number} households were assumed to be served by SHS."
-            )
-
-        self.add_paragraph(
-            "In total, {hh_number_mg} households, {ent_number} enterprises and {pf_number} public "
-            "facilities would be connected to the mini-grid. Table 1 displays the "
-            "number of consumers and their respective yearly electricity demand to be fulfilled by the mini-grid."
-        )
-
-        self.add_df_as_table(self.get_df_from_db("demand_table"), caption="Community demand summary")
-
-        self.add_paragraph(
-            "The total estimated yearly demand for the {community_name} community is {total_demand:,.0f} kWh/year. The "
-            "average daily demand is {avg_daily_demand:,.1f} kWh/day, while the peak demand for the simulated year is "
-            "{peak_demand:,.1f} kW. Figure 1 displays how the cumulated demand is aggregated based on the given community "
-            "characteristics for one week."
-        )
-
-        self.add_image_from_db("mini_grid_demand_graph", caption="Total mini-grid demand")
-
-        ### ELECTRICITY SYSTEM SECTION ###
-        self.add_heading("Electricity Supply System Size and Composition")
-        self.add_image(self.image_path["es_schema"], width=Inches(3), caption="System schematic")
-
-        system_paragraph = (
-            "Based on the calculated yearly demand, a least-cost-optimization was conducted for a supply system with "
-            "the following components: {energy_system_components_string}."
-            + (
-                " The optimization assumes a minimum " "{demand_coverage_factor}% household demand coverage."
-                if self.options.shs_threshold != "very_high"
-                else ""
-            )
-            + " The cost and asset characteristics used to conduct the system optimization can be seen in the Annex. Based on the given system setup, the following "
-            "asset sizes displayed in Table 2 result in the least-cost solution."
-        )
-
-        self.add_paragraph(system_paragraph)
-
-        # Table with optimized capacities
-        self.add_df_as_table(self.get_df_from_db("system_table"), caption="System size")
-
-        self.add_paragraph(
-            "Based on the given asset sizes, the system is able to fulfill {fulfilled_demand_share:.2f}% of the total demand, "
-            "providing {fulfilled_demand:,.0f} kWh of electricity during the simulated year. "
-            "The system presents a levelized cost of electricity (LCOE) of {lcoe:.2f} {currency}/kWh, "
-            "with {renewable_share:.1f}% of the generation coming from renewable sources."
-        )
-
-        self.add_paragraph(
-            "Table 3 displays the total costs for the mini-grid system during the first year of operation, which "
-            "include asset investment costs, operational expenditures and fuel costs."
-        )
-
-        self.add_df_as_table(self.get_df_from_db("cost_table"), "Total system costs during first year")
-
-        self.add_paragraph(
-            "In total, the investment costs for the assets relating to the power supply system total to {system_capex:,.0f} {currency}. The "
-            "operational expenditures for the simulated year amount to {opex_total:,.0f} {currency}. Additionally, {fuel_costs:,.0f} {currency} are "
-            "spent on fuel costs, equaling {fuel_consumption_liter:,.1f} litres consumed. The "
-            "following graph displays the power flow for the system during one week:"
-        )
-
-        self.add_paragraph(
-            "These expenditures do not "
-            "include other costs not directly related to the power supply system operation, which will be listed "
-            "in more detail in Section 4."
-        )
-        # Stacked timeseries graph
-        self.add_image_from_db("stacked_timeseries_graph", caption="Power flows during first week")
-
-        ### FINANCIAL ANALYSIS SECTION ###
-        self.add_heading("Financial Analysis")
-        self.add_heading("Total Investment Costs", level=2)
-
-        self.add_paragraph(
-            "Table and Fig. 4 display the project's total capital expenditures (CAPEX), which need to be covered "
-            "during the installation of technical equipment, i.e. the power supply system outlined in Section 3 and the "
-            "transmission network. CAPEX are considered in a conservative way and also include "
-            "logistical costs, insurance for construction as well as planning and labor costs. VAT is"
-            " considered for non-technical equipment costs only."
-        )
-
-        self.add_df_as_table(self.get_df_from_db("capex_table"), caption="Distribution of mini-grid CAPEX")
-        self.add_image_from_db("capex_graph", caption="Total mini-grid CAPEX")
-
-        self.add_paragraph(
-            "Additionally, the project includes operational expenditures (OPEX) that need to be covered"
-            " during the operation of the power supply system and the transmission network. Apart from service and "
-            "maintenance, total OPEX includes costs such as management and bookkeeping, land lease or security. Table "
-            "and Fig. 5 display total OPEX costs for the first year of operation. During the project lifetime, "
-            "operational expenditures are assumed to increase an average of {opex_growth_rate} per year. Cost "
-            "assumptions made for this financial analysis are listed in Tables 9 and 10 (see Annex)"
-        )
-
-        self.add_df_as_table(self.get_df_from_db("opex_table"), caption="Distribution of mini-grid OPEX")
-        self.add_image_from_db("opex_graph", caption="Total mini-grid OPEX")
-
-        self.add_heading("Key Financial Parameters", level=2)
-        self.add_paragraph(
-            "The following key financial parameters describe the economic viability and profitability "
-            "of the project. They include the resulting community tariff "
-            "as well as the internal rate of return (IRR) of the project activity over 10 and 20 years. "
-            "Several parameters flow into the tariff calculation, such as investment and operational costs, the "
-            "community’s electricity demand as well as assumptions regarding the composition of financial instruments "
-            "or interest rate levels. A key parameter that determines the tariff height is the potential "
-            "acquisition of a grant. For instance, the Nigerian Rural Electrification Agency (REA) offers the "
-            "opportunity to apply for grant financing for mini-grid projects in rural areas. The Annex of this document"
-            " provides a list of potential financing sources, including also other financial instruments. In the grant "
-            "scenario, the tool assumes a grant component of {grant_share:.0f}% of the total investment costs. "
-        )
-
-        self.add_df_as_table(self.get_df_from_db("financial_kpi_table"), caption="Key Financial Parameters")
-
-        self.add_paragraph(
-            "The estimated tariff (as per Table 6) represents an average cost per consumer per kWh of "
-            "used electricity from the mini-grid. Furthermore, an increase rate of {tariff_growth_rate:.0f}% "
-            "per year is assumed. Applying different tariff models will be subject to the further "
-            "project development process. Project partners should, for instance, evaluate the following"
-            " tariff models:"
-        )
-
-        self.add_list(
-            [
-                "Customer-class tariffs: Diverse tariffs are set according to consumer group, e.g. residents, institutions and businesses.",
-                "Time-based tariffs: This model applying a higher tariff during night hours and a cheaper tariff"
-                " at the daytime during the peak hours of the electricity generation to enhance the system's efficiency.",
-            ]
-        )
-
-        self.add_paragraph(
-            "Moreover, the final project tariff requires clearance from the Nigerian Electricity "
-            "Regulatory Commission (NERC). The NREC Mini-grid Tariff Tool is obligatory to use for the tariff calculation."
-        )
-
-        self.add_heading("Financing Structure", level=2)
-        self.add_paragraph(
-            "The financing structure shows the key financial conditions including the communities’ and "
-            "mini-grid companies’ equity share and interest, the grant and the debt volume and its "
-            "average interest rate. For the grant, a deduction of {grant_deduction}% is considered, since typically "
-            "performance-based grants are applied that are provided after the implementation of the "
-            "project. Thus a domestic bank loan with high interest rates has to be taken up for "
-            "one year to cover a portion of the investment costs, effectively reducing the volume of the grant by "
-            "{grant_deduction}%. WACC describes the resulting weighted average costs of capital for the project activity."
-        )
-
-        self.add_df_as_table(
-            self.get_df_from_db("financing_structure_table"), caption="Financing structure for the project"
-        )
-
-        self.add_paragraph(
-            "*In addition to the parameters in Table 7, the overall tool calculation also "
-            "considers an additional loan that is required for the replacement of certain mini-grid "
-            "assets during the project lifetime. As it does not add to the total investment costs, "
-            "it is not included here. The replacement is assumed to happen after approx. ten years of "
-            "operation and typically impacts the battery system and diesel generator (see Annex for "
-            "more information about assumed asset lifetimes)."
-        )
+@lru_cache(maxsize=None)
+def load_cost_assumptions():
+    return pd.read_csv(staticfiles_storage.path("financial_tool/cost_assumptions.csv"), sep=";")
 
-        self.add_heading("Cash Flow Diagram", level=2)
-        self.add_paragraph(
-            "Figure 5 shows the net cash flow over time, including debt repayment and debt "
-            "interest payments. These flows consider the repayment of both the initial loan and the loan taken up "
-            "after half of the project lifetime for the replacement of certain assets. The graph also displays the "
-            "comparison of net operating revenues and operating expenses."
-        )
-        self.add_image_from_db("cash_flow_graph", caption="Cash flow over project lifetime")
 
-        ### BUSINESS MODEL SECTION ###
-        self.add_heading("Business Model of the Mini-grid Project")
+class financial_node:
+    """
+    Cached property of the FinancialTool, which is only computed again once one of the inputs or nodes it depends on
+    has changed. The dependencies are the names of other nodes or of the inputs of the tool, i.e. the tariff and the
+    keys of financial_params, see FinancialTool.invalidate(). The cached tables are shared by all the callers, they
+    should be copied before being modified.
+    """
 
-        self.add_paragraph(B_MODELS[self.bm_name]["Report"])
+    def __init__(self, *depends_on):
+        self.depends_on = depends_on
+        self.func = None
+        self.name = None
 
-        self.add_image(self.image_path["bm_graph"], width=Inches(4), caption="Business model structure")
-        self.add_image(self.image_path["bm_resp"], width=Inches(5), caption="Business model responsibilities")
+    def __call__(self, func):
+        self.func = func
+        self.__doc__ = func.__doc__
+        return self
 
-        # Add additional text and criteria bullet points if community-led model is chosen
-        if "cooperative" in self.bm_name:
-            self.add_paragraph(
-                "A cooperative-led model is an innovative approach in Nigeria that strongly enhances "
-                "local awareness and engagement. Additionally, the community-led approach can increase "
-                "the affordability of tariffs for customers in the community. It is, however, "
-                "challenging for communities to attract adequate financial resources, therefore, the "
-                "community is reaching out to financial partners."
-            )
+    def __set_name__(self, owner, name):
+        self.name = name
 
-            qs = BMAnswer.objects.filter(business_model=self.bm)
-            if qs.exists():
-                self.add_paragraph(
-                    "Within the process of the CP-Nigeria Toolbox, the community’s suitability for following "
-                    "a community-led approach for the realisation of a mini-grid system has been assessed "
-                    "based on several research-based criteria. The community meets the following criteria "
-                    "to choose the cooperative-led model and has in place:"
-                )
-                self.add_list(self.create_community_criteria_list(qs))
-        self.doc.add_page_break()
-        self.add_heading("Annex")
-        # TODO decide if these documents should be a part of the implementation plan or separate
-        # self.add_heading("Next steps guideline for community", level=2)
-        # self.add_heading("Financing sources database", level=2)
-        # TODO add tables about cost assumptions etc here
-        self.add_heading("Tool assumptions", level=2)
-        self.add_df_as_table(get_asset_assumptions(self.project), caption="Asset assumptions")
-        self.add_df_as_table(self.cost_assumptions[0], caption="CAPEX cost assumptions")
-        self.add_df_as_table(self.cost_assumptions[1], caption="OPEX cost assumptions")
-        self.add_heading("CO2 mitigation assumptions", level=2)
-        self.add_paragraph_with_hyperlink(
-            "The projected CO2 mitigation is calculated by comparing the business-as-usual (BAU) "
-            "emissions with the emissions generated by the mini-grid, and is based on the following CDM methodology. The BAU scenario assumes the "
-            "same demand as the project scenario. Of this demand, 55kWh for each household are assumed "
-            "to be covered by kerosene, while the rest is covered by diesel generators. In the mini-grid"
-            " scenario, the total emissions from the diesel genset generation are considered. "
-            "For information about the methodology and used emission factors, please refer to the methodology.",
-            "CDM methodology",
-            "https://cdm.unfccc.int/methodologies/DB/KHK371SOJH99Z35OBUWUTWZ9KMW9YN",
-        )
+    def __get__(self, instance, owner=None):
+        if instance is None:
+            return self
+        if self.name not in instance.__dict__:
+            instance.node_computations[self.name] = instance.node_computations.get(self.name, 0) + 1
+            instance.__dict__[self.name] = self.func(instance)
+        return instance.__dict__[self.name]
 
 
 class FinancialTool:
-    cost_assumptions = pd.read_csv(staticfiles_storage.path("financial_tool/cost_assumptions.csv"), sep=";")
     loan_assumptions = {"Tenor": 10, "Grace period": 1, "Cum. replacement years": 10}
 
     def __init__(self, project):
@@ -1296,6 +573,10 @@ class FinancialTool:
         # TODO there are a number of loose variables (unclear if default or missing in tool) - see list in PR and
         #  discuss along with best approach to display results
         self.project = project
+        # number of times each financial_node was computed
+        self.node_computations = {}
+        # copied as set_tariff() modifies the assumptions of this instance only
+        self.cost_assumptions = load_cost_assumptions().copy()
         self.exchange_rate = project.economic_data.exchange_rate
         self.project_start = project.scenario.start_date.year
         self.project_duration = project.economic_data.duration
@@ -1320,6 +601,7 @@ class FinancialTool:
             0.875  # this factor assumes that part of the grant is directly used for loan interest payments
         )
 
+    @profile_section("pandas")
     def collect_system_params(self):
         """
         This method takes the optimized capacities and cost results as inputs and returns a dataframe with all the
@@ -1500,7 +782,7 @@ class FinancialTool:
 
         return df
 
-    @cached_property
+    @financial_node("tax", "capex_fix")
     def capex(self):
         """
         This method takes the given general cost assumptions and merges them with the specific project results
@@ -1573,11 +855,11 @@ class FinancialTool:
             self.cost_assumptions["Description"] == "Community tariff", "Growth rate"
         ].iloc[0]
 
-    @cached_property
+    @financial_node("capex", "equity_developer_share")
     def equity_developer(self):
         return self.total_capex * self.financial_params["equity_developer_share"]
 
-    @property
+    @financial_node("tariff")
     def revenue_over_lifetime(self):
         """
         This method returns a wide table calculating the revenue flows over project lifetime based on the cost
@@ -1606,7 +888,7 @@ class FinancialTool:
 
         return revenue_flows
 
-    @cached_property
+    @financial_node("fuel_price_increase")
     def om_costs(self):
         # get the opex costs for the system
         costs_om_system = self.system_params[self.system_params["category"].isin(["opex_total", "fuel_costs_total"])]
@@ -1658,7 +940,7 @@ class FinancialTool:
 
         return costs_om_total
 
-    @cached_property
+    @financial_node("om_costs")
     def om_costs_over_lifetime(self):
         """
         This method returns a wide table calculating the OM cost flows over project lifetime based on the OM costs of
@@ -1686,35 +968,15 @@ class FinancialTool:
         return costs_om_lifetime
 
     def debt_service_table(self, amount, tenor, gp, ir, debt_start):
-        debt_service = pd.DataFrame(
-            index=["Interest", "Principal", "Balance opening", "Balance closing", "Capital service"],
-            columns=range(self.project_start - 1, self.project_start + self.project_duration),
-            data=0.0,
+        # the years of the loan after the end of the project are appended to the table
+        years = sorted(
+            set(range(self.project_start - 1, self.project_start + self.project_duration))
+            | set(range(debt_start - 1, debt_start + tenor))
         )
-        debt_service[debt_start - 1] = [0, 0, amount, amount, 0]
-
-        for index, year in enumerate(range(debt_start, debt_start + tenor), 1):
-            per = index - gp
-            nper = tenor - gp
-            if index <= tenor:
-                if index > gp:
-                    debt_service.at["Principal", year] = -npf.ppmt(ir, per, nper, amount)
-                else:
-                    debt_service.at["Principal", year] = 0
-                debt_service.at["Balance opening", year] = debt_service.loc["Balance closing", year - 1]
-                debt_service.at["Interest", year] = debt_service.loc["Balance opening", year] * ir
-                debt_service.at["Balance closing", year] = (
-                    debt_service.loc["Balance opening", year] - debt_service.at["Principal", year]
-                )
-                debt_service.at["Capital service", year] = (
-                    debt_service.loc["Interest", year] + debt_service.at["Principal", year]
-                )
-            else:
-                debt_service.at[:, year] = 0
+        schedule = amortization_schedules(amount, ir, tenor, gp, debt_start, years)
+        return pd.DataFrame([schedule[row][0] for row in SCHEDULE_ROWS], index=list(SCHEDULE_ROWS), columns=years)
 
-        return debt_service
-
-    @property
+    @financial_node("financial_kpis", "loan_maturity", "grace_period", "debt_interest_MG")
     def initial_loan_table(self):
         """
         This method creates a table for the initial CAPEX debt according to the debt share (CAPEX - grant and equity).
@@ -1729,7 +991,7 @@ class FinancialTool:
             amount=amount, tenor=tenor, gp=grace_period, ir=interest_rate, debt_start=debt_start
         )
 
-    @cached_property
+    @financial_node("replacement_loan_amount", "loan_maturity", "grace_period", "debt_interest_replacement")
     def replacement_loan_table(self):
         """
         This method creates a table for the replacement costs debt (accounts for replacing battery, inverter and diesel
@@ -1739,14 +1001,24 @@ class FinancialTool:
         tenor = self.financial_params["loan_maturity"]
         debt_start = self.project_start + self.loan_assumptions["Cum. replacement years"]
         grace_period = self.financial_params["grace_period"]
-        amount = self.financial_kpis["replacement_loan_amount"]
+        amount = self.replacement_loan_amount
         interest_rate = self.financial_params["debt_interest_replacement"]
 
         return self.debt_service_table(
             amount=amount, tenor=tenor, gp=grace_period, ir=interest_rate, debt_start=debt_start
         )
 
-    @property
+    @financial_node(
+        "revenue_over_lifetime",
+        "om_costs_over_lifetime",
+        "capex",
+        "initial_loan_table",
+        "replacement_loan_table",
+        "equity_community_amount",
+        "equity_developer_amount",
+        "equity_interest_MG",
+        "tax",
+    )
     def losses_over_lifetime(self):
         """
         This method first calculates the EBITDA (earnings before interest, tax, depreciation and amortization), then
@@ -1787,7 +1059,7 @@ class FinancialTool:
 
         return losses
 
-    @property
+    @financial_node("losses_over_lifetime")
     def cash_flow_over_lifetime(self):
         """
         This method calculates the cash flows over system lifetime considering the previously calculated loan debt,
@@ -1833,7 +1105,22 @@ class FinancialTool:
         cashflow_helper = np.sum(self.cash_flow_over_lifetime.loc["Cash flow after debt service"].tolist()[0:5])
         return cashflow_helper
 
-    @property
+    @financial_node("capex")
+    def replacement_loan_amount(self):
+        return self.capex[self.capex["Description"].isin(["Battery", "Inverter", "Diesel Generator"])][
+            f"Total costs [{self.currency}]"
+        ].sum()
+
+    @financial_node(
+        "capex",
+        "grant_share",
+        "equity_community_amount",
+        "equity_developer_amount",
+        "debt_interest_MG",
+        "equity_interest_MG",
+        "loan_maturity",
+        "grace_period",
+    )
     def financial_kpis(self):
         gross_capex = self.capex[f"Total costs [{self.currency}]"].sum()
         total_equity = (
@@ -1841,9 +1128,7 @@ class FinancialTool:
         )
         total_grant = self.financial_params["grant_share"] * gross_capex * self.usable_grant
         initial_amount = max(gross_capex - total_grant - total_equity, 0)
-        replacement_amount = self.capex[self.capex["Description"].isin(["Battery", "Inverter", "Diesel Generator"])][
-            f"Total costs [{self.currency}]"
-        ].sum()
+        replacement_amount = self.replacement_loan_amount
 
         loan_fraction = initial_amount / gross_capex
         equity_fraction = total_equity / gross_capex
@@ -1875,21 +1160,49 @@ class FinancialTool:
             rounding_magnitude = 2
         return rounding_magnitude
 
+    @profile_section("pandas")
     def calculate_tariff(self):
-        x = np.arange(0.1, 0.5, 0.1)
-        # compute the sum of the cashflow for the first 4 years for different tariff (x)
+        # compute the sum of the cashflow for the first 5 years for different tariffs
         # as this is a linear function of the tariff, we can fit it and then find the tariff value x0
-        # for which the sum of the cashflow for the first 5 years is 0
-        m, h = np.polyfit(x, [self.goal_seek_helper(xi) for xi in x], deg=1)
-        x0 = -h / m
+        # for which the sum of the cashflow for the first 5 years is 0, see FinancialSweep.tariffs()
+        x0 = FinancialSweep(self).tariffs()[0]
 
         # set the tariff to the calculated value
         self.set_tariff(x0)
         return x0
 
     def remove_grant(self):
-        self.financial_params["grant_share"] = 0.0
+        self.update_financial_params(grant_share=0.0)
 
     def set_tariff(self, tariff):
         # set FinancialTool tariff value to the computed tariff
         self.cost_assumptions.loc[self.cost_assumptions["Description"] == "Community tariff", "USD/Unit"] = tariff
+        self.invalidate("tariff")
+
+    def update_financial_params(self, **params):
+        self.financial_params.update(params)
+        if "fuel_price_increase" in params:
+            # the fuel price increase is the growth rate of the fuel costs, see collect_system_params()
+            self.system_params.loc[self.system_params["category"] == "fuel_costs_total", "growth_rate"] = params[
+                "fuel_price_increase"
+            ]
+        self.invalidate(*params)
+
+    @classmethod
+    def downstream_nodes(cls, names):
+        """Return the names of the financial nodes depending, directly or through other nodes, on the given names"""
+        nodes = {name: node for name, node in vars(cls).items() if isinstance(node, financial_node)}
+        downstream = set()
+        changed = set(names)
+        while changed:
+            changed = {name for name, node in nodes.items() if changed & set(node.depends_on)} - downstream
+            downstream |= changed
+        return downstream
+
+    def invalidate(self, *names):
+        """
+        Drop the cached financial nodes depending on the given inputs, they are computed again on their next access
+        while the other nodes are reused.
+        """
+        for name in self.downstream_nodes(names):
+            self.__dict__.pop(name, None)
@@ -1,28 +1,49 @@
+import json
+import os
+from collections import Counter
 from django.core.management.base import BaseCommand
 from django.core.management import call_command
+from django.db import transaction
 from cp_nigeria.models import DemandTimeseries, Community, ConsumerType, ConsumerGroup
 from projects.models import Timeseries
 
+FIXTURES = ["fixtures/cp_data/all_demand_profiles.json", "fixtures/cp_data/cp_setup.json"]
+
 
 class Command(BaseCommand):
     help = "Create base cases for communities of practice"
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dry-run", action="store_true", help="Only report the number of rows which would be deleted and loaded"
+        )
+
     def handle(self, *args, **options):
-        # delete existing entries
         communities = ["Ebute-Ipare", "Ezere", "Usungwe", "Unguwar Kure", "Egbuniwa (Okpanam)"]
-        for model in [DemandTimeseries, Community, ConsumerType]:
-            qs = model.objects.all()
-            if qs.exists():
-                qs.delete()
-
         pv_ts = [f"{community} PV Output" for community in communities]
-        qs = Timeseries.objects.filter(name__in=pv_ts)
-        if qs.exists():
-            qs.delete()
+        existing = [
+            DemandTimeseries.objects.all(),
+            Community.objects.all(),
+            ConsumerType.objects.all(),
+            Timeseries.objects.filter(name__in=pv_ts),
+            ConsumerGroup.objects.filter(community__isnull=False),
+        ]
 
-        qs = ConsumerGroup.objects.filter(community__isnull=False)
-        if qs.exists():
-            qs.delete()
+        if options["dry_run"] is True:
+            for qs in existing:
+                self.stdout.write(f"Would delete {qs.count()} {qs.model.__name__}")
+            for fixture in FIXTURES:
+                if os.path.exists(fixture) is False:
+                    self.stderr.write(f"The fixture {fixture} is missing")
+                    continue
+                with open(fixture, "r") as fp:
+                    counts = Counter(obj["model"] for obj in json.load(fp))
+                for model, count in sorted(counts.items()):
+                    self.stdout.write(f"Would load {count} {model} from {fixture}")
+            return
 
-        call_command("loaddata", "fixtures/cp_data/all_demand_profiles.json")
-        call_command("loaddata", "fixtures/cp_data/cp_setup.json")
+        # the existing entries are only deleted if the fixtures could be loaded
+        with transaction.atomic():
+            for qs in existing:
+                qs.delete()
+            call_command("loaddata", *FIXTURES)
@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand, CommandError
+from projects.constants import DONE
+from projects.models import Project
+from cp_nigeria.graphs import render_report_graphs, IMAGE_FORMATS
+
+
+class Command(BaseCommand):
+    help = "Render the implementation plan graphs of simulated projects on the server and store them in the database"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--projects", nargs="+", type=int, help="ids of the projects, default is all projects with a simulation"
+        )
+        parser.add_argument("--format", choices=IMAGE_FORMATS, default="png", help="image format of the graphs")
+
+    def handle(self, *args, **options):
+        projects = Project.objects.filter(scenario__simulation__status=DONE).distinct()
+        if options["projects"]:
+            projects = projects.filter(id__in=options["projects"])
+            missing = set(options["projects"]) - set(projects.values_list("id", flat=True))
+            if missing:
+                raise CommandError(f"Projects {sorted(missing)} do not exist or have no successful simulation")
+
+        failed = []
+        for project in projects:
+            try:
+                graphs = render_report_graphs(project, image_format=options["format"])
+            except ImportError as e:
+                raise CommandError(e)
+            except Exception as e:
+                failed.append(project.id)
+                self.stderr.write(f"Could not render the graphs of project {project.id}: {e}")
+            else:
+                self.stdout.write(f"Rendered {', '.join(graphs)} for project {project.id}")
+
+        if failed:
+            raise CommandError(f"Rendering failed for projects {failed}")
+        self.stdout.write(self.style.SUCCESS(f"Successfully rendered the report graphs of {projects.count()} projects"))
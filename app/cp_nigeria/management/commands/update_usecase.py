@@ -1,16 +1,25 @@
 import json
 from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
 from projects.models import UseCase
-from projects.models.usecases import load_usecase_from_dict
+from projects.scenario_topology_helpers import load_projects_in_bulk
 
 
 class Command(BaseCommand):
-    help = "Create a usecase from a project provided its id"
+    help = "Replace the cp_usecases usecase with the content of fixtures/cp_usecases.json"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dry-run", action="store_true", help="Only report the number of rows which would be inserted"
+        )
 
     def handle(self, *args, **options):
-        qs = UseCase.objects.filter(name="cp_usecases")
-        if qs.exists():
-            qs.delete()
         with open("fixtures/cp_usecases.json", "r") as fp:
             dm = json.load(fp)
-        load_usecase_from_dict(dm)
+        with transaction.atomic():
+            if options["dry_run"] is False:
+                UseCase.objects.filter(name="cp_usecases").delete()
+            loader = load_projects_in_bulk([dm], model=UseCase, dry_run=options["dry_run"])
+        verb = "Would insert" if options["dry_run"] else "Inserted"
+        for model, count in sorted(loader.counts.items()):
+            self.stdout.write(f"{verb} {count} {model}")
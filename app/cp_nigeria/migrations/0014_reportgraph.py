@@ -0,0 +1,32 @@
+# Generated by Django 5.1.3 on 2026-10-19 18:23
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("cp_nigeria", "0013_options_demand_coverage_factor"),
+        ("projects", "0024_bus_price_alter_assettype_asset_type"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ReportGraph",
+            fields=[
+                ("id", models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("name", models.CharField(max_length=60)),
+                ("image_format", models.CharField(default="png", max_length=10)),
+                ("image", models.BinaryField()),
+                ("date_updated", models.DateTimeField(auto_now=True)),
+                (
+                    "simulation",
+                    models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to="projects.simulation"),
+                ),
+            ],
+            options={
+                "constraints": [models.UniqueConstraint(fields=("simulation", "name"), name="unique_report_graph")],
+            },
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.1.3 on 2026-10-19 18:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("cp_nigeria", "0014_reportgraph"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="LocationRegion",
+            fields=[
+                ("id", models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("latitude", models.FloatField()),
+                ("longitude", models.FloatField()),
+                ("state", models.CharField(max_length=30)),
+                ("region", models.CharField(max_length=30)),
+                ("provider", models.CharField(max_length=30)),
+                ("date_created", models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                "constraints": [
+                    models.UniqueConstraint(fields=("latitude", "longitude"), name="unique_location_region")
+                ],
+            },
+        ),
+    ]
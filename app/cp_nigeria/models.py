@@ -115,12 +115,43 @@ class ImplementationPlanContent(models.Model):
 
     @property
     def empty_fields(self):
+        rendered_graphs = set(ReportGraph.objects.filter(simulation=self.simulation).values_list("name", flat=True))
         for field in self._meta.fields:
-            if getattr(self, field.name) == "":
+            if getattr(self, field.name) == "" and field.name not in rendered_graphs:
                 return True
         return False
 
 
+class ReportGraph(models.Model):
+    """Binary image of a report graph, rendered server-side or uploaded from the results page"""
+
+    # formats which python-docx can embed in the implementation plan report
+    IMAGE_FORMATS = ("png", "jpeg")
+
+    simulation = models.ForeignKey(Simulation, on_delete=models.CASCADE)
+    name = models.CharField(max_length=60)
+    image_format = models.CharField(max_length=10, default="png")
+    image = models.BinaryField()
+    date_updated = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=["simulation", "name"], name="unique_report_graph")]
+
+
+class LocationRegion(models.Model):
+    """State and geopolitical zone of a location, see cp_nigeria.regions"""
+
+    latitude = models.FloatField()
+    longitude = models.FloatField()
+    state = models.CharField(max_length=30)
+    region = models.CharField(max_length=30)
+    provider = models.CharField(max_length=30)
+    date_created = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=["latitude", "longitude"], name="unique_location_region")]
+
+
 def copy_energy_system_from_usecase(usecase_name, scenario):
     """Given a scenario, copy the topology of the usecase"""
     # Filter the name of the project and the usecasename within this project
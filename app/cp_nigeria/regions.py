@@ -0,0 +1,334 @@
+r"""Resolution of the Nigerian state and geopolitical zone of a location.
+
+The providers are tried in the order given by the REGION_PROVIDERS setting:
+
+- "nominatim": reverse geocodes the coordinates with the OpenStreetMap Nominatim service
+- "nearest_capital": offline approximation, the state whose capital is the closest to the location
+
+A location resolved by a cacheable provider is stored in the LocationRegion table (keyed by its coordinates rounded
+like the renewables resources) and kept in memory, so it is only ever resolved once. The offline approximation is not
+stored, the location is resolved again until a cacheable provider is available, which also replaces the rows stored
+by earlier versions from the approximation.
+"""
+
+import logging
+from functools import lru_cache
+
+import httpx
+import numpy as np
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from geopy.geocoders import Nominatim
+from geopy.exc import GeopyError
+from projects.profiling import profile_section
+from projects.services import RESOURCE_LOCATION_DECIMALS
+from projects.single_flight import aget_or_compute, get_or_compute
+from cp_nigeria.models import LocationRegion
+
+logger = logging.getLogger(__name__)
+
+UNKNOWN_STATE = "[could not locate state]"
+UNKNOWN_REGION = "[region unavailable]"
+
+STATE_REGIONS = {
+    "Yobe": "North East",
+    "Borno": "North East",
+    "Bauchi": "North East",
+    "Gombe": "North East",
+    "Adamawa": "North East",
+    "Taraba": "North East",
+    "Niger": "North Central",
+    "Nasarawa": "North Central",
+    "Kwara": "North Central",
+    "Kogi": "North Central",
+    "Benue": "North Central",
+    "Plateau": "North Central",
+    "FCT": "North Central",
+    "Sokoto": "North West",
+    "Katsina": "North West",
+    "Jigawa": "North West",
+    "Kano": "North West",
+    "Zamfara": "North West",
+    "Kaduna": "North West",
+    "Kebbi": "North West",
+    "Anambra": "South East",
+    "Abia": "South East",
+    "Enugu": "South East",
+    "Ebonyi": "South East",
+    "Imo": "South East",
+    "Edo": "South South",
+    "Delta": "South South",
+    "Cross River": "South South",
+    "Akwa Ibom": "South South",
+    "Rivers": "South South",
+    "Bayelsa": "South South",
+    "Oyo": "South West",
+    "Osun": "South West",
+    "Ekiti": "South West",
+    "Ogun": "South West",
+    "Ondo": "South West",
+    "Lagos": "South West",
+}
+
+# (latitude, longitude) of the state capitals
+STATE_CAPITALS = {
+    "Abia": (5.53, 7.49),
+    "Adamawa": (9.21, 12.48),
+    "Akwa Ibom": (5.04, 7.91),
+    "Anambra": (6.21, 7.07),
+    "Bauchi": (10.31, 9.84),
+    "Bayelsa": (4.92, 6.26),
+    "Benue": (7.73, 8.54),
+    "Borno": (11.85, 13.16),
+    "Cross River": (4.95, 8.32),
+    "Delta": (6.20, 6.73),
+    "Ebonyi": (6.32, 8.11),
+    "Edo": (6.34, 5.63),
+    "Ekiti": (7.62, 5.22),
+    "Enugu": (6.45, 7.51),
+    "FCT": (9.08, 7.40),
+    "Gombe": (10.29, 11.17),
+    "Imo": (5.48, 7.03),
+    "Jigawa": (11.76, 9.34),
+    "Kaduna": (10.52, 7.44),
+    "Kano": (12.00, 8.52),
+    "Katsina": (12.99, 7.60),
+    "Kebbi": (12.45, 4.20),
+    "Kogi": (7.80, 6.74),
+    "Kwara": (8.50, 4.55),
+    "Lagos": (6.60, 3.35),
+    "Nasarawa": (8.49, 8.52),
+    "Niger": (9.61, 6.56),
+    "Ogun": (7.15, 3.35),
+    "Ondo": (7.25, 5.20),
+    "Osun": (7.77, 4.56),
+    "Oyo": (7.38, 3.95),
+    "Plateau": (9.90, 8.86),
+    "Rivers": (4.82, 7.03),
+    "Sokoto": (13.06, 5.24),
+    "Taraba": (8.89, 11.36),
+    "Yobe": (11.75, 11.96),
+    "Zamfara": (12.16, 6.66),
+}
+
+
+class RegionUnavailable(Exception):
+    pass
+
+
+def normalize_state(name):
+    """Map the state names returned by geocoders (i.e. "Kano State", "Federal Capital Territory") to the keys of
+    STATE_REGIONS"""
+    name = name.strip()
+    if name.endswith(" State"):
+        name = name[: -len(" State")]
+    if name in ("Federal Capital Territory", "Abuja"):
+        name = "FCT"
+    return name
+
+
+class RegionProvider:
+    name = ""
+    # the states resolved by cacheable providers are stored in the LocationRegion table
+    cacheable = True
+
+    def get_state(self, latitude, longitude):
+        """Return the state of the location, raise RegionUnavailable if the provider cannot resolve it"""
+        raise NotImplementedError
+
+    async def aget_state(self, latitude, longitude):
+        """Async version of get_state(), run in a thread by default"""
+        return await sync_to_async(self.get_state, thread_sensitive=False)(latitude, longitude)
+
+
+class NominatimProvider(RegionProvider):
+    name = "nominatim"
+    user_agent = "cp_nigeria_app"
+    reverse_url = "https://nominatim.openstreetmap.org/reverse"
+
+    def __init__(self, timeout=None):
+        self.timeout = timeout if timeout is not None else settings.GEOCODING_TIMEOUT
+
+    @profile_section("http")
+    def get_state(self, latitude, longitude):
+        geolocator = Nominatim(user_agent=self.user_agent, timeout=self.timeout)
+        try:
+            location = geolocator.reverse(f"{latitude}, {longitude}")
+        except GeopyError as e:
+            raise RegionUnavailable(f"Reverse geocoding failed: {e}")
+        return self.parse_state(getattr(location, "raw", None), latitude, longitude)
+
+    async def aget_state(self, latitude, longitude):
+        # same request as geopy's reverse(), through an async client
+        params = {"lat": latitude, "lon": longitude, "format": "json", "addressdetails": 1}
+        try:
+            with profile_section("http"):
+                async with httpx.AsyncClient(headers={"User-Agent": self.user_agent}, timeout=self.timeout) as client:
+                    r = await client.get(self.reverse_url, params=params)
+            r.raise_for_status()
+            raw = r.json()
+        except (httpx.HTTPError, ValueError) as e:
+            raise RegionUnavailable(f"Reverse geocoding failed: {e}")
+        return self.parse_state(raw, latitude, longitude)
+
+    @staticmethod
+    def parse_state(raw, latitude, longitude):
+        try:
+            return normalize_state(raw["address"]["state"])
+        except (TypeError, KeyError):
+            raise RegionUnavailable(f"No state found at ({latitude}, {longitude})")
+
+
+class NearestCapitalProvider(RegionProvider):
+    """Offline approximation, may be wrong close to state borders or in large states whose capital is off-center"""
+
+    name = "nearest_capital"
+    cacheable = False
+    # locations further away from any capital are considered to be outside of Nigeria
+    max_distance = 400  # km
+    states = list(STATE_CAPITALS.keys())
+    capitals = np.radians(np.array(list(STATE_CAPITALS.values())))
+
+    def get_state(self, latitude, longitude):
+        lat, lon = np.radians(latitude), np.radians(longitude)
+        # haversine distance to every capital
+        a = (
+            np.sin((self.capitals[:, 0] - lat) / 2) ** 2
+            + np.cos(lat) * np.cos(self.capitals[:, 0]) * np.sin((self.capitals[:, 1] - lon) / 2) ** 2
+        )
+        distances = 2 * 6371 * np.arcsin(np.sqrt(a))
+        idx = int(np.argmin(distances))
+        if distances[idx] > self.max_distance:
+            raise RegionUnavailable(f"({latitude}, {longitude}) is not located in Nigeria")
+        return self.states[idx]
+
+
+REGION_PROVIDERS = {provider.name: provider for provider in (NominatimProvider, NearestCapitalProvider)}
+
+
+def get_region_providers(names=None):
+    if names is None:
+        names = settings.REGION_PROVIDERS
+    return [REGION_PROVIDERS[name.strip()]() for name in names]
+
+
+def _is_known(provider, state):
+    if state in STATE_REGIONS:
+        return True
+    logger.warning(f"Provider {provider.name} returned the unknown state '{state}'")
+    return False
+
+
+def lookup_state(latitude, longitude, providers=None):
+    """Return the state of the location from the first provider which can resolve it, along with that provider"""
+    if providers is None:
+        providers = get_region_providers()
+    for provider in providers:
+        try:
+            state = provider.get_state(latitude, longitude)
+        except RegionUnavailable as e:
+            logger.warning(f"Provider {provider.name} could not resolve the state: {e}")
+            continue
+        if _is_known(provider, state):
+            return state, provider
+    raise RegionUnavailable(f"None of the region providers could resolve the state of ({latitude}, {longitude})")
+
+
+async def alookup_state(latitude, longitude, providers=None):
+    """Async version of lookup_state()"""
+    if providers is None:
+        providers = get_region_providers()
+    for provider in providers:
+        try:
+            state = await provider.aget_state(latitude, longitude)
+        except RegionUnavailable as e:
+            logger.warning(f"Provider {provider.name} could not resolve the state: {e}")
+            continue
+        if _is_known(provider, state):
+            return state, provider
+    raise RegionUnavailable(f"None of the region providers could resolve the state of ({latitude}, {longitude})")
+
+
+def region_key(latitude, longitude):
+    return round(float(latitude), RESOURCE_LOCATION_DECIMALS), round(float(longitude), RESOURCE_LOCATION_DECIMALS)
+
+
+def _store_region(latitude, longitude):
+    state, provider = lookup_state(latitude, longitude)
+    return _save_region(latitude, longitude, state, provider)
+
+
+async def _astore_region(latitude, longitude):
+    state, provider = await alookup_state(latitude, longitude)
+    return await sync_to_async(_save_region)(latitude, longitude, state, provider)
+
+
+def _save_region(latitude, longitude, state, provider):
+    if provider.cacheable is False:
+        return LocationRegion(
+            latitude=latitude, longitude=longitude, state=state, region=STATE_REGIONS[state], provider=provider.name
+        )
+    # replaces a row stored from an approximation, another process may resolve the same location in the meantime
+    location, _ = LocationRegion.objects.update_or_create(
+        latitude=latitude,
+        longitude=longitude,
+        defaults={"state": state, "region": STATE_REGIONS[state], "provider": provider.name},
+    )
+    return location
+
+
+def _stored_locations(latitude, longitude):
+    """The LocationRegion of the location resolved by a cacheable provider, if any"""
+    cacheable = [name for name, provider in REGION_PROVIDERS.items() if provider.cacheable is True]
+    return LocationRegion.objects.filter(latitude=latitude, longitude=longitude, provider__in=cacheable)
+
+
+@lru_cache(maxsize=4096)
+def stored_region(latitude, longitude):
+    """Return the stored (state, geopolitical zone) of the location, raise LocationRegion.DoesNotExist otherwise"""
+    location = _stored_locations(latitude, longitude).get()
+    return location.state, location.region
+
+
+def resolve_region(latitude, longitude):
+    """Return the (state, geopolitical zone) of the location (given rounded with region_key)
+
+    A location requested by several workers at once is only resolved by one of them. Unresolved and approximated
+    locations are not cached, so that they are attempted again once a provider is available
+    """
+    try:
+        return stored_region(latitude, longitude)
+    except LocationRegion.DoesNotExist:
+        pass
+    location = get_or_compute(
+        f"location_region:{latitude}:{longitude}",
+        lookup=lambda: _stored_locations(latitude, longitude).first(),
+        compute=lambda: _store_region(latitude, longitude),
+    )
+    return location.state, location.region
+
+
+def get_location_region(latitude, longitude):
+    """Return the (state, geopolitical zone) of the location, or placeholders if it could not be resolved"""
+    if latitude is None or longitude is None:
+        return UNKNOWN_STATE, UNKNOWN_REGION
+    try:
+        return resolve_region(*region_key(latitude, longitude))
+    except RegionUnavailable:
+        return UNKNOWN_STATE, UNKNOWN_REGION
+
+
+async def aprefetch_location_region(latitude, longitude):
+    """Resolve the region of the location without blocking the event loop, so that the synchronous
+    get_location_region() called while rendering the page reads it from the database"""
+    if latitude is None or longitude is None:
+        return
+    latitude, longitude = region_key(latitude, longitude)
+    try:
+        await aget_or_compute(
+            f"location_region:{latitude}:{longitude}",
+            lookup=lambda: _stored_locations(latitude, longitude).first(),
+            compute=lambda: _astore_region(latitude, longitude),
+        )
+    except RegionUnavailable:
+        pass
@@ -0,0 +1,853 @@
+"""Implementation plan of a community project, exported as a docx document"""
+
+from datetime import date
+from docx import Document
+from docx.table import Table
+from docx.shape import InlineShape
+from docx.shared import Pt, Inches, RGBColor
+from docx.enum.text import WD_PARAGRAPH_ALIGNMENT
+from docx.enum.table import WD_TABLE_ALIGNMENT
+from docx.oxml import parse_xml, OxmlElement, ns
+from docx.opc.constants import RELATIONSHIP_TYPE
+import pandas as pd
+import numpy as np
+import json
+import base64
+import io
+from django.db.models import Sum
+from cp_nigeria.models import ConsumerGroup, Options, ImplementationPlanContent, ReportGraph
+from business_model.models import BusinessModel, BMAnswer
+from business_model.helpers import B_MODELS
+from dashboard.models import FancyResults, KPIScalarResults
+from projects.registry import csv_to_dict
+from cp_nigeria.helpers import (
+    HOUSEHOLD_TIERS,
+    OUTPUT_PARAMS,
+    FinancialTool,
+    calculate_co2_mitigation,
+    get_aggregated_cgs,
+    get_aggregated_demand,
+    get_asset_assumptions,
+    get_community_region,
+    get_fulfilled_demand_indicators,
+    get_project_summary,
+    get_renewable_share,
+)
+
+
+class ReportHandler:
+    def __init__(self, project):
+        self.doc = Document()
+        self.logo_path = "static/assets/logos/cpnigeria-logo.png"
+        self.table_counter = 0
+        self.figure_counter = 0
+        self.heading_counter = 0
+        self.subheading_counter = 0
+
+        # set style of the document
+        try:
+            # Set font "Lato" for the entire self.doc
+            self.doc.styles["Normal"].font.name = "Lato"
+        except ValueError:
+            # Handle the exception when "Lato" is not available and set a fallback font
+            self.doc.styles["Normal"].font.name = "Arial"
+
+        # get parameters needed for implementation plan
+        self.options = Options.objects.get(project=project)
+        if self.options.community is not None:
+            community_name = self.options.community.name
+        else:
+            community_name = project.name
+        self.bm = BusinessModel.objects.get(scenario=project.scenario)
+        self.bm_name = self.bm.model_name
+
+        # get optimized capacities
+        qs_res = FancyResults.objects.filter(simulation__scenario=project.scenario)
+        opt_caps = qs_res.filter(
+            optimized_capacity__gt=0, asset__in=["pv_plant", "battery", "inverter", "diesel_generator"], direction="in"
+        )
+
+        opt_caps = opt_caps.values("asset", "optimized_capacity", "total_flow")
+
+        # Make a sentence with system assets and their optimized capacities
+        system_assets = []
+        assets_text = {
+            "battery": "battery system",
+            "pv_plant": "solar PV plant",
+            "diesel_generator": "diesel generator",
+        }
+        for asset in opt_caps.values_list("asset", "optimized_capacity"):
+            if asset[0] != "inverter":
+                unit = "kW"
+                if asset[0] == "battery":
+                    unit = "kWh"
+                system_assets.append(f"{assets_text[asset[0]]} [{round(asset[1], 1)} {unit}]")
+        if len(system_assets) == 1:
+            system_assets = "a {}".format(system_assets[0])
+        else:
+            system_assets = (
+                "a {}, " * (len(system_assets) - 2) + "a {}" * (len(system_assets) > 1) + " and a {}"
+            ).format(*system_assets)
+
+        self.project = project
+        self.report_obj = ImplementationPlanContent.objects.get(simulation=self.project.scenario.simulation)
+        self.image_path = dict(
+            es_schema="static/assets/gui/" + self.options.schema_name,
+            bm_graph="static/assets/cp_nigeria/business_models/" + B_MODELS[self.bm_name]["Graph"],
+            bm_resp="static/assets/cp_nigeria/business_models/" + B_MODELS[self.bm_name]["Responsibilities"],
+        )
+
+        scenario_results = json.loads(KPIScalarResults.objects.get(simulation__scenario=project.scenario).scalar_values)
+
+        lcoe = (
+            round(scenario_results["levelized_costs_of_electricity_equivalent"], 2)
+            * self.project.economic_data.exchange_rate
+        )
+
+        ft = FinancialTool(project)
+        self.cost_assumptions = ft.cost_assumption_tables
+
+        fulfilled_demand, peak_demand, daily_demand = get_fulfilled_demand_indicators(project)
+        total_demand = np.sum(get_aggregated_demand(project))
+
+        if "inverter" in ft.system_params["supply_source"].tolist():
+            inverter_aggregated_flow = ft.system_params.loc[
+                (ft.system_params["category"] == "total_flow") & (ft.system_params["supply_source"] == "inverter"),
+                "value",
+            ].iloc[0]
+        else:
+            inverter_aggregated_flow = 0
+
+        self.aggregated_cgs = get_aggregated_cgs(self.project)
+
+        # Make a sentence with existing enterprises and public facilities
+        self.cgs = ConsumerGroup.objects.filter(project=project)
+        cg_sentences = {}
+        for consumer_type in ["Enterprise", "Public facility"]:
+            consumers = []
+            # Get the 4 most commonly found consumers for each consumer type and construct into sentence list
+            most_consumers = (
+                self.cgs.filter(consumer_type__consumer_type=consumer_type)
+                .order_by("-number_consumers")
+                .values_list("timeseries__name", "number_consumers")[:4]
+            )
+            for name, nr_consumers in most_consumers:
+                consumers.append(f"{name.replace('_', ': ')} ({nr_consumers})")
+
+            cg_sentences[consumer_type] = ", ".join(consumers[:-1]) + f" and {consumers[-1]}"
+
+        state, region = get_community_region(self.project)
+        self.text_parameters = dict(
+            grid_option=self.bm.grid_condition,
+            bm_name=B_MODELS[self.bm_name]["Verbose"],
+            community_name=community_name,
+            community_state=state,
+            community_region=region,
+            co2_mitigation=calculate_co2_mitigation(self.project),
+            hh_number_mg=self.aggregated_cgs["households"]["nr_consumers"],
+            ent_number=self.aggregated_cgs["enterprises"]["nr_consumers"],
+            pf_number=self.aggregated_cgs["public"]["nr_consumers"],
+            shs_number=self.aggregated_cgs["shs"]["nr_consumers"],
+            hh_number_total=self.aggregated_cgs["households"]["nr_consumers"]
+            + self.aggregated_cgs["shs"]["nr_consumers"],
+            shs_threshold=dict(HOUSEHOLD_TIERS)[self.options.shs_threshold],
+            system_assets=system_assets,
+            system_capex=round(ft.system_params[ft.system_params["category"] == "capex_initial"].value.sum(), -3),
+            system_opex=round(ft.total_opex(), -3),
+            grant_share=ft.financial_params["grant_share"] * 100,
+            yearly_production=ft.yearly_production_electricity,
+            total_demand=total_demand,
+            avg_daily_demand=daily_demand,
+            peak_demand=peak_demand,
+            diesel_price_increase=ft.financial_params["fuel_price_increase"],
+            renewable_share=get_renewable_share(project),
+            lcoe=lcoe,
+            opex_total=round(ft.total_opex(), -3),
+            opex_growth_rate=ft.opex_growth_rate * 100,
+            tariff_growth_rate=ft.tariff_growth_rate * 100,
+            fuel_costs=round(ft.fuel_costs, -3),
+            fuel_consumption_liter=ft.fuel_consumption_liter,
+            energy_system_components_string=self.options.component_list,
+            community_latitude=self.project.latitude,
+            community_longitude=self.project.longitude,
+            project_name=self.project.name,
+            project_lifetime=self.project.economic_data.duration,
+            total_investments=ft.total_capex,
+            disco="DiscoName",
+            ent_demand_categories=cg_sentences["Enterprise"],
+            pf_demand_categories=cg_sentences["Public facility"],
+            demand_coverage_factor=self.options.demand_coverage_factor * 100,
+            fulfilled_demand=fulfilled_demand,
+            fulfilled_demand_share=fulfilled_demand / total_demand * 100,
+            grant_deduction=(1 - ft.usable_grant) * 100,
+            currency=project.economic_data.currency,
+        )
+        if self.text_parameters["grid_option"] == "isolated":
+            self.text_parameters["grid_option"] = "not connected to the national grid"
+        else:
+            self.text_parameters["grid_option"] = (
+                "connected to the national grid, however, the electricity level provided is insufficient"
+            )
+
+    def add_heading(self, text, level=1):
+        text = text.format(**self.text_parameters).upper()
+        if level == 1:
+            self.heading_counter += 1
+            self.subheading_counter = 0
+            number = f"{str(self.heading_counter)}. "
+        elif level == 2 and self.heading_counter > 0:
+            self.subheading_counter += 1
+            number = f"{self.heading_counter}.{self.subheading_counter}. "
+        else:
+            number = ""
+
+        h = self.doc.add_heading(number + text, level)
+        h.runs[0].font.color.rgb = RGBColor(0, 135, 83)
+        h.runs[0].font.bold = False
+        h.paragraph_format.space_after = Pt(8)
+
+    def add_table(self, rows, cols, caption=None):
+        self.table_counter += 1
+        # styles = ["Light Grid", "Light List", "Light Shading", "Medium Grid 1", "Medium List 1", "Medium Shading 1"]
+        t = self.doc.add_table(rows, cols, style="Light Shading")
+
+        if caption is not None:
+            self.add_caption(t, caption)
+
+        t.alignment = WD_TABLE_ALIGNMENT.CENTER
+
+        return t
+
+    def add_paragraph(self, text=None, style=None, emph=[]):
+        if text is not None:
+            try:
+                text = text.format(**self.text_parameters)
+            except ValueError as e:
+                print(text)
+                raise (e)
+        p = self.doc.add_paragraph(style=style)
+        p.alignment = WD_PARAGRAPH_ALIGNMENT.JUSTIFY
+        runner = p.add_run(text)
+        if "italic" in emph:
+            runner.italic = True
+        if "bold" in emph:
+            runner.bold = True
+        if "red" in emph:
+            runner.font.color.rgb = RGBColor(255, 0, 0)
+
+        p.paragraph_format.line_spacing = 1.25
+        return p
+
+    def add_image(self, path, width=Inches(6), caption=None):
+        self.figure_counter += 1
+        fig = self.doc.add_picture(path, width=width)
+        self.doc.paragraphs[-1].alignment = WD_PARAGRAPH_ALIGNMENT.CENTER
+        if caption is not None:
+            self.add_caption(fig, caption)
+
+    def add_image_from_db(self, name, width=Inches(6), caption=None):
+        report_graph = ReportGraph.objects.filter(simulation=self.report_obj.simulation, name=name).first()
+        # images which were stored before graphs were saved as binaries are base64 data urls
+        image_data = getattr(self.report_obj, name)
+        if report_graph is not None and report_graph.image_format in ReportGraph.IMAGE_FORMATS:
+            self.add_image(io.BytesIO(report_graph.image), width, caption)
+
+        elif image_data:
+            image_data = image_data.split(",")[1]
+            image_bytes = base64.b64decode(image_data)
+            image = io.BytesIO(image_bytes)
+
+            self.add_image(image, width, caption)
+
+        else:
+            print(f"Image {name} was not found in session storage")
+
+    def add_caption(self, tab_or_figure, caption):
+        target = {Table: "Table", InlineShape: "Figure"}[type(tab_or_figure)]
+        if target == "Table":
+            number = self.table_counter
+        else:
+            number = self.figure_counter
+
+        # caption type
+        paragraph = self.doc.add_paragraph(style="Caption")
+        paragraph.paragraph_format.space_before = Pt(3)
+
+        # TODO numbering field: code works but only when manually updating the document, replaced with manual numbering for now (see: https://github.com/python-openxml/python-docx/issues/359)
+        # run = paragraph.add_run()
+        #
+        # fldChar = OxmlElement("w:fldChar")
+        # fldChar.set(ns.qn("w:fldCharType"), "begin")
+        # run._r.append(fldChar)
+        #
+        # instrText = OxmlElement("w:instrText")
+        # instrText.text = f" SEQ {target} \\* ARABIC"
+        # run._r.append(instrText)
+        #
+        # fldChar = OxmlElement("w:fldChar")
+        # fldChar.set(ns.qn("w:fldCharType"), "end")
+        # run._r.append(fldChar)
+
+        # caption text
+        caption_run = paragraph.add_run(f"{target} {number}: {caption}")
+        caption_run.font.color.rgb = RGBColor(0, 135, 83)
+        paragraph.alignment = WD_PARAGRAPH_ALIGNMENT.CENTER
+
+    def add_dict_as_table(self, dict, caption=None):
+        t = self.doc.add_table(len(dict), 2, caption)
+
+        for i, (key, value) in enumerate(dict.items()):
+            t.cell(i, 0).text = key
+            t.cell(i, 0).paragraphs[0].runs[0].font.bold = True
+            t.cell(i, 1).text = value
+
+    def add_df_as_table(self, df, caption=None, index=True):
+        if not isinstance(df, pd.DataFrame):
+            print("Invalid format, table data must be a pd.DataFrame")
+            return
+
+        if index is True:
+            start_idx = 1
+        else:
+            start_idx = 0
+
+        rows = df.shape[0]
+        cols = df.shape[1]
+
+        t = self.add_table(rows + 1, cols + start_idx, caption)
+
+        # add indices
+        if index is True:
+            for j in range(rows):
+                t.cell(j + 1, 0).text = df.index[j]
+
+        # add headers
+        for j in range(cols):
+            t.cell(0, j + start_idx).text = df.columns[j]
+            p = t.cell(0, j + start_idx).paragraphs[0]
+            p.alignment = WD_PARAGRAPH_ALIGNMENT.RIGHT
+
+        for i in range(rows):
+            for j in range(cols):
+                t.cell(i + 1, j + start_idx).text = str(df.values[i, j])
+                p = t.cell(i + 1, j + start_idx).paragraphs[0]
+                p.alignment = WD_PARAGRAPH_ALIGNMENT.RIGHT
+
+        # shade and make bold if rows contain total
+        for j in range(rows):
+            if "total" in df.index[j].lower():
+                for cell in t.rows[j + 1].cells:
+                    shading_elm = parse_xml(r'<w:shd {} w:fill="4CC58C"/>'.format(ns.nsdecls("w")))
+                    cell._tc.get_or_add_tcPr().append(shading_elm)
+                    cell.paragraphs[0].runs[0].font.bold = True
+
+    def get_df_from_db(self, name):
+        table_json = getattr(self.report_obj, name)
+        if table_json:
+            table_data = json.loads(table_json)
+            table_df = pd.DataFrame.from_dict(table_data["data"], orient="index", columns=table_data["headers"])
+            return table_df
+        else:
+            print(f"Table {name} was not found in session storage")
+
+    def add_table_from_records(self, records, columns=None):
+        tot_rows = len(records)
+        col_spacer = 0
+        if columns is not None:
+            tot_rows += 1
+            col_spacer = 1
+
+        table = self.add_table(rows=tot_rows, cols=len(records[0]))
+
+        if columns is not None:
+            hdr_cells = table.rows[0].cells
+            for i, item in enumerate(columns):
+                hdr_cells[i].text = item.format(**self.text_parameters)
+
+        for j, record in enumerate(records):
+            row_cells = table.rows[j + col_spacer].cells
+            # row_cells = table.add_row().cells
+            for i, item in enumerate(record):
+                if isinstance(item, str):
+                    try:
+                        row_cells[i].text = item.format(**self.text_parameters)
+                    except ValueError as e:
+                        print(item)
+                        raise (e)
+                else:
+                    row_cells[i].text = str(item)
+
+    def add_financial_table(self, records, title=""):
+        table = self.add_table(rows=1, cols=2)
+        row_cells = table.rows[0].cells
+        row_cells[0].merge(row_cells[-1])
+
+        # Set a cell background (shading) color and align center
+        shading_elm = parse_xml(r'<w:shd {} w:fill="008753"/>'.format(ns.nsdecls("w")))
+        row_cells[0]._tc.get_or_add_tcPr().append(shading_elm)
+        row_cells[0].text = title
+        p = row_cells[0].paragraphs[0]
+        p.alignment = WD_PARAGRAPH_ALIGNMENT.CENTER
+
+        for j, record in enumerate(records):
+            row_cells = table.add_row().cells
+            for i, item in enumerate(record):
+                try:
+                    row_cells[i].text = item.format(**self.text_parameters)
+                except ValueError as e:
+                    print(item)
+                    raise (e)
+
+        # TODO add a thick line
+
+        row_cells = table.add_row().cells
+        row_cells[0].text = "Total"
+        row_cells[0].bold = True
+
+    def add_list(self, list_items, style=None, emph=[]):
+        if isinstance(list_items, str):
+            list_items = [list_items]
+        if style is None:
+            style = "List Bullet"
+        for bullet in list_items:
+            self.add_paragraph(bullet, style=style, emph=emph)
+
+    def create_attribute(self, element, name, value):
+        # used for page numbering
+        element.set(ns.qn(name), value)
+
+    def add_page_number(self, run):
+        # code from https://stackoverflow.com/questions/56658872/add-page-number-using-python-docx
+        fldChar1 = OxmlElement("w:fldChar")
+        self.create_attribute(fldChar1, "w:fldCharType", "begin")
+
+        instrText = OxmlElement("w:instrText")
+        self.create_attribute(instrText, "xml:space", "preserve")
+        instrText.text = "PAGE"
+
+        fldChar2 = OxmlElement("w:fldChar")
+        self.create_attribute(fldChar2, "w:fldCharType", "end")
+
+        run._r.append(fldChar1)
+        run._r.append(instrText)
+        run._r.append(fldChar2)
+
+    def add_footer(self):
+        self.add_page_number(self.doc.sections[0].footer.paragraphs[0].add_run())
+        footer_text = f"    {self.project.name} \t \t https://community-minigrid.ng/en"
+        footer_run = self.doc.sections[0].footer.paragraphs[0].add_run(footer_text)
+        footer_run.font.size = Pt(9)
+
+    def prevent_table_splitting(self):
+        tags = self.doc.element.xpath("//w:tr[position() < last()]/w:tc/w:p")
+        for tag in tags:
+            ppr = tag.get_or_add_pPr()
+            ppr.keepNext_val = True
+
+    def add_hyperlink_into_run(self, paragraph, run, url):
+        # code from: https://github.com/python-openxml/python-docx/issues/74#issuecomment-441351994
+        runs = paragraph.runs
+        for i in range(len(runs)):
+            if runs[i].text == run.text:
+                break
+
+        # This gets access to the document.xml.rels file and gets a new relation id value
+        part = paragraph.part
+        r_id = part.relate_to(url, RELATIONSHIP_TYPE.HYPERLINK, is_external=True)
+
+        # Create the w:hyperlink tag and add needed values
+        hyperlink = OxmlElement("w:hyperlink")
+        self.create_attribute(hyperlink, "r:id", r_id)
+        hyperlink.append(run._r)
+        paragraph._p.insert(i + 1, hyperlink)
+
+    def add_paragraph_with_hyperlink(self, paragraph_text, hyperlink_text, url):
+        p = self.add_paragraph()
+
+        # Add the first run (text before the hyperlink)
+        p.add_run(paragraph_text.split(hyperlink_text)[0])
+
+        # Add the second run (hyperlink text)
+        run_hyperlink = p.add_run(hyperlink_text)
+        run_hyperlink.bold = True
+        run_hyperlink.underline = True
+        run_hyperlink.font.color.rgb = RGBColor(0, 102, 204)
+        self.add_hyperlink_into_run(p, run_hyperlink, url)
+
+        # Add the third run (text after the hyperlink)
+        p.add_run(paragraph_text.split(hyperlink_text)[1])
+
+        return p
+
+    @staticmethod
+    def create_community_criteria_list(bmanswer_qs):
+        BM_CRITERIA = csv_to_dict("business_model_report_criteria.csv", label_col="Criteria")
+        criteria_list = []
+        for criteria, values in BM_CRITERIA.items():
+            total_score_qs = bmanswer_qs.filter(question_id__in=json.loads(values["Questions"])).aggregate(
+                total_score=Sum("score")
+            )
+            score = total_score_qs["total_score"]
+            if score > json.loads(values["Threshold"]):
+                criteria_list.append(criteria)
+
+        return criteria_list
+
+    def save(self, response):
+        self.doc.save(response)
+
+    def create_cover_sheet(self):
+        title = f"Mini-Grid Implementation Plan for {self.project.name}"
+        subtitle = f"Date: {date.today().strftime('%d.%m.%Y')}"
+        summary = f"{self.project.description}"
+
+        # Add logo in the right top corner
+        header = self.doc.sections[0].header
+        run = header.paragraphs[0].add_run()
+        run.add_picture(self.logo_path, width=Pt(70))
+        header.paragraphs[0].alignment = WD_PARAGRAPH_ALIGNMENT.RIGHT
+        header.paragraphs[0].paragraph_format.space_after = Pt(3)
+
+        # Add title
+        title_paragraph = self.add_paragraph()
+        title_paragraph.paragraph_format.space_before = Inches(0.5)
+        title_run = title_paragraph.add_run(title)
+        title_run.font.size = Pt(16)
+        title_run.font.bold = True
+        title_paragraph.alignment = WD_PARAGRAPH_ALIGNMENT.CENTER
+
+        # Add subtitle
+        subtitle_paragraph = self.add_paragraph()
+        subtitle_run = subtitle_paragraph.add_run(subtitle)
+        subtitle_run.font.size = Pt(12)
+        self.doc.paragraphs[-1].alignment = WD_PARAGRAPH_ALIGNMENT.CENTER
+
+        # Add project details
+        self.add_heading("Project details", level=2)
+
+        # Add project summary table
+        project_summary = get_project_summary(self.project)
+        summary_table = {}
+        for key in project_summary:
+            summary_table[OUTPUT_PARAMS[key]["verbose"]] = project_summary[key]
+
+        self.add_dict_as_table(summary_table)
+
+        # Add project summary
+        self.add_heading("Project summary", level=2)
+        self.add_paragraph(
+            "The {community_name} community is a rural community in {community_state} State ({community_region} Region). The community "
+            "comprises about {hh_number_total} households as well as {ent_number} enterprises and {pf_number} public "
+            "facilities. Currently, the community is {grid_option}. In light of the community's aspiration to achieve a "
+            "constant and reliable electricity supply, the community is willing to engage with project partners to "
+            "construct a suitable mini-grid system. The system proposed in this implementation plan, by using the "
+            "CP-Nigeria Toolbox, comprises {system_assets}. The project does not only present a robust business case "
+            "but electrifying the community will also deliver vital socioeconomic benefits to its members. In "
+            "addition, the project approximately mitigates {co2_mitigation:,.1f} tonnes of CO2 over the project lifetime."
+        )
+
+        # Add page break
+        self.doc.add_page_break()
+
+    def create_report_content(self):
+        ### INTRODUCTION ###
+        self.add_heading("Context and Background")
+        self.add_heading("Community Background", level=2)
+        self.add_list(
+            (
+                "The community is located in {community_state} State ({community_region} Region)",
+                "The community comprises about {hh_number_total} households as well as {ent_number} enterprises and {pf_number} public facilities.",
+                "Some of the most commonly found enterprises in the community include {ent_demand_categories}",
+                "Existing public facilities include {pf_demand_categories}",
+                "Currently, the community is {grid_option}",
+            )
+        )
+
+        # self.add_table(
+        #     (
+        #         ("Consumption Level", "Very Low", "Low", "Middle", "High", "Very High"),
+        #         ("Number of households", "XX", "XX", "XX", "XX", "XX"),
+        #     )
+        # )
+
+        self.add_paragraph(
+            "--------------------------------------\nDear toolbox user, it is recommended to enrich this section by providing the following information",
+            emph=["italic", "red"],
+        )
+        self.add_list("Description of the current electricity access situation", emph=["italic", "red"])
+        self.add_list(
+            ("Use of diesel generators", "Most common cooking practices", "Use of lighting"),
+            style="List Bullet 2",
+            emph=["italic", "red"],
+        )
+        self.add_list(
+            (
+                "Experiences with community-led projects",
+                "Existing community organizational structures, e.g. (energy) cooperatives, associations, committees, etc.",
+                "Skills of community members in the context of energy/electricity supply",
+            ),
+            emph=["italic", "red"],
+        )
+
+        self.add_heading("CP-Nigeria Toolbox Context", level=2)
+        self.add_paragraph_with_hyperlink(
+            "This implementation plan is the output of an open source online toolbox.",
+            "open source online toolbox.",
+            "https://community-minigrid.ng/en/",
+        )
+        self.add_paragraph_with_hyperlink(
+            "The toolbox has been "
+            "developed within the frame of the project CP Nigeria: Communities of Practice as driver of a bottom-up "
+            "energy transition in Nigeria. This project is funded by the International Climate Initiative (IKI). "
+            "The overall objective of the project is to achieve a climate-friendly energy supply through "
+            "decentralized renewable energy (DRE) in Nigeria by 2030. In order to achieve this, civil society must "
+            'play a driving role. The project therefore aims to create exemplary civil society nuclei ("Communities '
+            'of Practice") and to empower them to plan and implement DRE projects (local level). Based on this, '
+            "it works transdisciplinary on improving the political framework for local decentralized RE projects ("
+            "national level). In this way, civil society can be empowered to implement DRE independently and make a "
+            "significant contribution to the achievement of climate change mitigation goals.  ",
+            "International Climate Initiative (IKI)",
+            "https://www.international-climate-initiative.com/en/project/communities-of-practice-as-driver-of-a-bottom-up-energy-transition-in-nigeria-img2020-i-003-nga-energy-transition-communities-of-practice/",
+        )
+
+        ### DEMAND SECTION ###
+        self.add_heading("Electricity Demand Profile")
+
+        p = self.add_paragraph_with_hyperlink(
+            "The total electricity demand is estimated by assigning demand profiles to the households, enterprises "
+            "and public facilities present in the community, based on demand profiles calculated within the "
+            "PeopleSun project, which were derived from surveys and appliance audits conducted within "
+            "electrified communities. As the demand is based on proxy data for already electrified communities, "
+            "the system does not consider any demand increase over the project lifetime, but instead assumes that the "
+            "proposed supply system would be able to satisfy future demand for all consumers connected to the "
+            "mini-grid. In the case of new connections, the system may require upsizing.",
+            "PeopleSun project",
+            "https://energypedia.info/wiki/Nigeria_Off-Grid_Solar_Knowledge_Hub",
+        )
+
+        if self.options.shs_threshold == "very_high":
+            self.add_paragraph(
+                "To avoid system oversizing, the system was assumed to only serve enterprises and public facilities. "
+                "Therefore, all households were excluded from the supply system optimization. This approach assumes "
+                "that the mini-grid capacity will be increased and expanded to serve households as the project "
+                "progresses. Households are assumed to be served by Solar Home Systems (SHS) instead."
+            )
+        else:
+            self.add_paragraph(
+                "Given that not all households may be connected to the mini-grid, but some may be served by Solar Home "
+                'Systems (SHS) instead, all households assigned to the "{shs_threshold}" tier and below are excluded from the '
+                "supply system optimization. In this case, {shs_number} households were assumed to be served by SHS."
+            )
+
+        self.add_paragraph(
+            "In total, {hh_number_mg} households, {ent_number} enterprises and {pf_number} public "
+            "facilities would be connected to the mini-grid. Table 1 displays the "
+            "number of consumers and their respective yearly electricity demand to be fulfilled by the mini-grid."
+        )
+
+        self.add_df_as_table(self.get_df_from_db("demand_table"), caption="Community demand summary")
+
+        self.add_paragraph(
+            "The total estimated yearly demand for the {community_name} community is {total_demand:,.0f} kWh/year. The "
+            "average daily demand is {avg_daily_demand:,.1f} kWh/day, while the peak demand for the simulated year is "
+            "{peak_demand:,.1f} kW. Figure 1 displays how the cumulated demand is aggregated based on the given community "
+            "characteristics for one week."
+        )
+
+        self.add_image_from_db("mini_grid_demand_graph", caption="Total mini-grid demand")
+
+        ### ELECTRICITY SYSTEM SECTION ###
+        self.add_heading("Electricity Supply System Size and Composition")
+        self.add_image(self.image_path["es_schema"], width=Inches(3), caption="System schematic")
+
+        system_paragraph = (
+            "Based on the calculated yearly demand, a least-cost-optimization was conducted for a supply system with "
+            "the following components: {energy_system_components_string}."
+            + (
+                " The optimization assumes a minimum " "{demand_coverage_factor}% household demand coverage."
+                if self.options.shs_threshold != "very_high"
+                else ""
+            )
+            + " The cost and asset characteristics used to conduct the system optimization can be seen in the Annex. Based on the given system setup, the following "
+            "asset sizes displayed in Table 2 result in the least-cost solution."
+        )
+
+        self.add_paragraph(system_paragraph)
+
+        # Table with optimized capacities
+        self.add_df_as_table(self.get_df_from_db("system_table"), caption="System size")
+
+        self.add_paragraph(
+            "Based on the given asset sizes, the system is able to fulfill {fulfilled_demand_share:.2f}% of the total demand, "
+            "providing {fulfilled_demand:,.0f} kWh of electricity during the simulated year. "
+            "The system presents a levelized cost of electricity (LCOE) of {lcoe:.2f} {currency}/kWh, "
+            "with {renewable_share:.1f}% of the generation coming from renewable sources."
+        )
+
+        self.add_paragraph(
+            "Table 3 displays the total costs for the mini-grid system during the first year of operation, which "
+            "include asset investment costs, operational expenditures and fuel costs."
+        )
+
+        self.add_df_as_table(self.get_df_from_db("cost_table"), "Total system costs during first year")
+
+        self.add_paragraph(
+            "In total, the investment costs for the assets relating to the power supply system total to {system_capex:,.0f} {currency}. The "
+            "operational expenditures for the simulated year amount to {opex_total:,.0f} {currency}. Additionally, {fuel_costs:,.0f} {currency} are "
+            "spent on fuel costs, equaling {fuel_consumption_liter:,.1f} litres consumed. The "
+            "following graph displays the power flow for the system during one week:"
+        )
+
+        self.add_paragraph(
+            "These expenditures do not "
+            "include other costs not directly related to the power supply system operation, which will be listed "
+            "in more detail in Section 4."
+        )
+        # Stacked timeseries graph
+        self.add_image_from_db("stacked_timeseries_graph", caption="Power flows during first week")
+
+        ### FINANCIAL ANALYSIS SECTION ###
+        self.add_heading("Financial Analysis")
+        self.add_heading("Total Investment Costs", level=2)
+
+        self.add_paragraph(
+            "Table and Fig. 4 display the project's total capital expenditures (CAPEX), which need to be covered "
+            "during the installation of technical equipment, i.e. the power supply system outlined in Section 3 and the "
+            "transmission network. CAPEX are considered in a conservative way and also include "
+            "logistical costs, insurance for construction as well as planning and labor costs. VAT is"
+            " considered for non-technical equipment costs only."
+        )
+
+        self.add_df_as_table(self.get_df_from_db("capex_table"), caption="Distribution of mini-grid CAPEX")
+        self.add_image_from_db("capex_graph", caption="Total mini-grid CAPEX")
+
+        self.add_paragraph(
+            "Additionally, the project includes operational expenditures (OPEX) that need to be covered"
+            " during the operation of the power supply system and the transmission network. Apart from service and "
+            "maintenance, total OPEX includes costs such as management and bookkeeping, land lease or security. Table "
+            "and Fig. 5 display total OPEX costs for the first year of operation. During the project lifetime, "
+            "operational expenditures are assumed to increase an average of {opex_growth_rate} per year. Cost "
+            "assumptions made for this financial analysis are listed in Tables 9 and 10 (see Annex)"
+        )
+
+        self.add_df_as_table(self.get_df_from_db("opex_table"), caption="Distribution of mini-grid OPEX")
+        self.add_image_from_db("opex_graph", caption="Total mini-grid OPEX")
+
+        self.add_heading("Key Financial Parameters", level=2)
+        self.add_paragraph(
+            "The following key financial parameters describe the economic viability and profitability "
+            "of the project. They include the resulting community tariff "
+            "as well as the internal rate of return (IRR) of the project activity over 10 and 20 years. "
+            "Several parameters flow into the tariff calculation, such as investment and operational costs, the "
+            "community’s electricity demand as well as assumptions regarding the composition of financial instruments "
+            "or interest rate levels. A key parameter that determines the tariff height is the potential "
+            "acquisition of a grant. For instance, the Nigerian Rural Electrification Agency (REA) offers the "
+            "opportunity to apply for grant financing for mini-grid projects in rural areas. The Annex of this document"
+            " provides a list of potential financing sources, including also other financial instruments. In the grant "
+            "scenario, the tool assumes a grant component of {grant_share:.0f}% of the total investment costs. "
+        )
+
+        self.add_df_as_table(self.get_df_from_db("financial_kpi_table"), caption="Key Financial Parameters")
+
+        self.add_paragraph(
+            "The estimated tariff (as per Table 6) represents an average cost per consumer per kWh of "
+            "used electricity from the mini-grid. Furthermore, an increase rate of {tariff_growth_rate:.0f}% "
+            "per year is assumed. Applying different tariff models will be subject to the further "
+            "project development process. Project partners should, for instance, evaluate the following"
+            " tariff models:"
+        )
+
+        self.add_list(
+            [
+                "Customer-class tariffs: Diverse tariffs are set according to consumer group, e.g. residents, institutions and businesses.",
+                "Time-based tariffs: This model applying a higher tariff during night hours and a cheaper tariff"
+                " at the daytime during the peak hours of the electricity generation to enhance the system's efficiency.",
+            ]
+        )
+
+        self.add_paragraph(
+            "Moreover, the final project tariff requires clearance from the Nigerian Electricity "
+            "Regulatory Commission (NERC). The NREC Mini-grid Tariff Tool is obligatory to use for the tariff calculation."
+        )
+
+        self.add_heading("Financing Structure", level=2)
+        self.add_paragraph(
+            "The financing structure shows the key financial conditions including the communities’ and "
+            "mini-grid companies’ equity share and interest, the grant and the debt volume and its "
+            "average interest rate. For the grant, a deduction of {grant_deduction}% is considered, since typically "
+            "performance-based grants are applied that are provided after the implementation of the "
+            "project. Thus a domestic bank loan with high interest rates has to be taken up for "
+            "one year to cover a portion of the investment costs, effectively reducing the volume of the grant by "
+            "{grant_deduction}%. WACC describes the resulting weighted average costs of capital for the project activity."
+        )
+
+        self.add_df_as_table(
+            self.get_df_from_db("financing_structure_table"), caption="Financing structure for the project"
+        )
+
+        self.add_paragraph(
+            "*In addition to the parameters in Table 7, the overall tool calculation also "
+            "considers an additional loan that is required for the replacement of certain mini-grid "
+            "assets during the project lifetime. As it does not add to the total investment costs, "
+            "it is not included here. The replacement is assumed to happen after approx. ten years of "
+            "operation and typically impacts the battery system and diesel generator (see Annex for "
+            "more information about assumed asset lifetimes)."
+        )
+
+        self.add_heading("Cash Flow Diagram", level=2)
+        self.add_paragraph(
+            "Figure 5 shows the net cash flow over time, including debt repayment and debt "
+            "interest payments. These flows consider the repayment of both the initial loan and the loan taken up "
+            "after half of the project lifetime for the replacement of certain assets. The graph also displays the "
+            "comparison of net operating revenues and operating expenses."
+        )
+        self.add_image_from_db("cash_flow_graph", caption="Cash flow over project lifetime")
+
+        ### BUSINESS MODEL SECTION ###
+        self.add_heading("Business Model of the Mini-grid Project")
+
+        self.add_paragraph(B_MODELS[self.bm_name]["Report"])
+
+        self.add_image(self.image_path["bm_graph"], width=Inches(4), caption="Business model structure")
+        self.add_image(self.image_path["bm_resp"], width=Inches(5), caption="Business model responsibilities")
+
+        # Add additional text and criteria bullet points if community-led model is chosen
+        if "cooperative" in self.bm_name:
+            self.add_paragraph(
+                "A cooperative-led model is an innovative approach in Nigeria that strongly enhances "
+                "local awareness and engagement. Additionally, the community-led approach can increase "
+                "the affordability of tariffs for customers in the community. It is, however, "
+                "challenging for communities to attract adequate financial resources, therefore, the "
+                "community is reaching out to financial partners."
+            )
+
+            qs = BMAnswer.objects.filter(business_model=self.bm)
+            if qs.exists():
+                self.add_paragraph(
+                    "Within the process of the CP-Nigeria Toolbox, the community’s suitability for following "
+                    "a community-led approach for the realisation of a mini-grid system has been assessed "
+                    "based on several research-based criteria. The community meets the following criteria "
+                    "to choose the cooperative-led model and has in place:"
+                )
+                self.add_list(self.create_community_criteria_list(qs))
+        self.doc.add_page_break()
+        self.add_heading("Annex")
+        # TODO decide if these documents should be a part of the implementation plan or separate
+        # self.add_heading("Next steps guideline for community", level=2)
+        # self.add_heading("Financing sources database", level=2)
+        # TODO add tables about cost assumptions etc here
+        self.add_heading("Tool assumptions", level=2)
+        self.add_df_as_table(get_asset_assumptions(self.project), caption="Asset assumptions")
+        self.add_df_as_table(self.cost_assumptions[0], caption="CAPEX cost assumptions")
+        self.add_df_as_table(self.cost_assumptions[1], caption="OPEX cost assumptions")
+        self.add_heading("CO2 mitigation assumptions", level=2)
+        self.add_paragraph_with_hyperlink(
+            "The projected CO2 mitigation is calculated by comparing the business-as-usual (BAU) "
+            "emissions with the emissions generated by the mini-grid, and is based on the following CDM methodology. The BAU scenario assumes the "
+            "same demand as the project scenario. Of this demand, 55kWh for each household are assumed "
+            "to be covered by kerosene, while the rest is covered by diesel generators. In the mini-grid"
+            " scenario, the total emissions from the diesel genset generation are considered. "
+            "For information about the methodology and used emission factors, please refer to the methodology.",
+            "CDM methodology",
+            "https://cdm.unfccc.int/methodologies/DB/KHK371SOJH99Z35OBUWUTWZ9KMW9YN",
+        )
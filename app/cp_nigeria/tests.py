@@ -0,0 +1,494 @@
+import base64
+import time
+from contextlib import contextmanager
+from types import SimpleNamespace
+from unittest import mock, skipUnless
+
+import numpy as np
+import numpy_financial as npf
+import plotly.graph_objects as go
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from geopy.exc import GeocoderUnavailable
+
+from cp_nigeria.amortization import SCHEDULE_ROWS, amortization_schedules
+from cp_nigeria.financial_sweep import FinancialSweep, distribution, parameter_grid
+from cp_nigeria.graphs import decode_image_url, kaleido, render_report_graphs, report_figures
+from cp_nigeria.helpers import (
+    FinancialTool,
+    _aggregate_demand_python,
+    aggregate_demand,
+    demand_consumer_groups,
+    get_aggregated_demand,
+    get_community_region,
+    get_demand_indicators,
+)
+from cp_nigeria.models import ConsumerGroup, ConsumerType, DemandTimeseries, LocationRegion, Options, ReportGraph
+from projects.models import Project, Simulation, Timeseries, TimeseriesPayload
+from projects.tests import run_concurrently
+from cp_nigeria.regions import (
+    NearestCapitalProvider,
+    NominatimProvider,
+    RegionUnavailable,
+    UNKNOWN_REGION,
+    UNKNOWN_STATE,
+    normalize_state,
+    resolve_region,
+    stored_region,
+)
+
+
+def unreachable_geocoder(*args, **kwargs):
+    raise GeocoderUnavailable("no network")
+
+
+@override_settings(REGION_PROVIDERS=["nominatim", "nearest_capital"])
+class CommunityRegionTest(TestCase):
+    def setUp(self):
+        stored_region.cache_clear()
+        patcher = mock.patch("geopy.geocoders.Nominatim.reverse", side_effect=unreachable_geocoder)
+        self.reverse = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_region_falls_back_on_offline_provider(self):
+        project = SimpleNamespace(latitude=12.01, longitude=8.53)
+        self.assertEqual(get_community_region(project), ("Kano", "North West"))
+        # the approximation is neither stored nor kept in memory, nominatim is asked again on the next call
+        self.assertFalse(LocationRegion.objects.exists())
+        with mock.patch.object(NominatimProvider, "get_state", return_value="Kano") as get_state:
+            self.assertEqual(get_community_region(project), ("Kano", "North West"))
+        get_state.assert_called_once()
+        self.assertEqual(LocationRegion.objects.get().provider, "nominatim")
+
+    def test_stored_approximation_is_replaced(self):
+        LocationRegion.objects.create(
+            latitude=9.6, longitude=6.56, state="Niger", region="North Central", provider="nearest_capital"
+        )
+        with mock.patch.object(NominatimProvider, "get_state", return_value="Kaduna"):
+            self.assertEqual(
+                get_community_region(SimpleNamespace(latitude=9.6, longitude=6.56)), ("Kaduna", "North West")
+            )
+        self.assertEqual(LocationRegion.objects.values_list("state", "provider").get(), ("Kaduna", "nominatim"))
+
+    def test_region_is_resolved_once_per_location(self):
+        with mock.patch.object(NominatimProvider, "get_state", return_value="Lagos") as get_state:
+            self.assertEqual(
+                get_community_region(SimpleNamespace(latitude=6.601, longitude=3.351)), ("Lagos", "South West")
+            )
+            # same rounded coordinates, answered from memory
+            get_community_region(SimpleNamespace(latitude=6.6012, longitude=3.3508))
+            # answered from the database in a new process
+            stored_region.cache_clear()
+            get_community_region(SimpleNamespace(latitude=6.601, longitude=3.351))
+        self.assertEqual(get_state.call_count, 1)
+        self.assertEqual(LocationRegion.objects.count(), 1)
+
+    def test_location_outside_nigeria_is_not_stored(self):
+        project = SimpleNamespace(latitude=52.52, longitude=13.40)
+        self.assertEqual(get_community_region(project), (UNKNOWN_STATE, UNKNOWN_REGION))
+        self.assertFalse(LocationRegion.objects.exists())
+
+    def test_state_names_are_normalized(self):
+        self.assertEqual(normalize_state("Kano State"), "Kano")
+        self.assertEqual(normalize_state("Federal Capital Territory"), "FCT")
+        self.assertEqual(normalize_state("Cross River"), "Cross River")
+
+    def test_nearest_capital(self):
+        provider = NearestCapitalProvider()
+        self.assertEqual(provider.get_state(9.07, 7.45), "FCT")
+        self.assertEqual(provider.get_state(4.80, 7.00), "Rivers")
+        with self.assertRaises(RegionUnavailable):
+            provider.get_state(-33.9, 18.4)
+
+
+@override_settings(REGION_PROVIDERS=["nominatim"])
+class ConcurrentRegionTest(TransactionTestCase):
+    def test_parallel_callers_resolve_the_location_once(self):
+        def slow_state(latitude, longitude):
+            time.sleep(0.2)
+            return "Lagos"
+
+        stored_region.cache_clear()
+        with mock.patch.object(NominatimProvider, "get_state", side_effect=slow_state) as get_state:
+            regions = run_concurrently(lambda: resolve_region(6.6, 3.35))
+        stored_region.cache_clear()
+        self.assertEqual(get_state.call_count, 1)
+        self.assertEqual(regions, [("Lagos", "South West")] * 8)
+        self.assertEqual(LocationRegion.objects.count(), 1)
+
+
+# the demand profiles are Timeseries, whose values can only be stored on postgres
+@skipUnless(connection.vendor == "postgresql", "requires postgres")
+class AggregatedDemandTest(TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.project = Project.objects.create(name="community", country="NIGERIA", latitude=9.08, longitude=7.49)
+        Options.objects.create(project=self.project, shs_threshold="")
+        household, enterprise, machinery = [
+            ConsumerType.objects.create(consumer_type=name) for name in ("Household", "Enterprise", "Machinery")
+        ]
+        self.groups = []
+        for i, (consumer_type, units) in enumerate(((household, "kWh"), (enterprise, "Wh"), (machinery, "kWh"))):
+            timeseries = DemandTimeseries.objects.create(
+                name=f"profile {i}", consumer_type=consumer_type, values=rng.random(8760).tolist(), units=units
+            )
+            # several groups share the same profile
+            for number_consumers in (3, 10):
+                self.groups.append(
+                    ConsumerGroup.objects.create(
+                        project=self.project,
+                        consumer_type=consumer_type,
+                        timeseries=timeseries,
+                        number_consumers=number_consumers,
+                    )
+                )
+
+    def expected_demand(self, groups):
+        return np.vstack(
+            [np.zeros(8760)]
+            + [np.array(cg.timeseries.get_values_with_unit("kWh")) * cg.number_consumers for cg in groups]
+        ).sum(axis=0)
+
+    def test_demand_is_aggregated_by_the_database(self):
+        cg_qs = demand_consumer_groups(self.project)
+        with self.assertNumQueries(1):
+            demand, total, peak = aggregate_demand(cg_qs)
+        expected = self.expected_demand(self.groups)
+        np.testing.assert_allclose(demand, expected)
+        self.assertAlmostEqual(total, expected.sum())
+        self.assertAlmostEqual(peak, expected.max())
+
+        with self.assertNumQueries(1):
+            self.assertIsNone(aggregate_demand(cg_qs, with_timeseries=False)[0])
+        np.testing.assert_allclose(aggregate_demand(cg_qs, with_timeseries=False)[1:], (total, peak))
+        # the python fallback of the other backends gives the same results
+        fallback = _aggregate_demand_python(cg_qs, with_timeseries=True)
+        np.testing.assert_allclose(fallback[0], demand)
+        np.testing.assert_allclose(fallback[1:], (total, peak))
+
+    def test_payload_is_read_when_the_column_is_null(self):
+        timeseries = DemandTimeseries.objects.get(name="profile 1")
+        self.assertIsNotNone(timeseries.payload_id)
+        table = connection.ops.quote_name(Timeseries._meta.db_table)
+        with connection.cursor() as cursor:
+            # the column is not nullable, the constraint is restored when the transaction of the test is rolled back
+            cursor.execute("SET CONSTRAINTS ALL IMMEDIATE")
+            cursor.execute(f'ALTER TABLE {table} ALTER COLUMN "values" DROP NOT NULL')
+            cursor.execute(f'UPDATE {table} SET "values" = NULL WHERE id = %s', [timeseries.id])
+
+        cg_qs = demand_consumer_groups(self.project)
+        demand, total, peak = aggregate_demand(cg_qs)
+        np.testing.assert_allclose(demand, self.expected_demand(self.groups))
+        fallback = _aggregate_demand_python(cg_qs, with_timeseries=True)
+        np.testing.assert_allclose(fallback[0], demand)
+        np.testing.assert_allclose(fallback[1:], (total, peak))
+
+    def test_consumer_type_demand(self):
+        enterprise_demand = get_aggregated_demand(self.project, consumer_type="Enterprise")
+        # the machinery demand is included in the enterprise demand
+        np.testing.assert_allclose(enterprise_demand, self.expected_demand(self.groups[2:]))
+        np.testing.assert_allclose(get_aggregated_demand(self.project, consumer_type="Public facility"), np.zeros(8760))
+
+    def test_demand_indicators(self):
+        expected = self.expected_demand(self.groups)
+        total, peak, daily = get_demand_indicators(self.project)
+        self.assertAlmostEqual(total, expected.sum())
+        self.assertEqual((peak, daily), (round(expected.max(), 1), round(expected.sum() / 365, 1)))
+        np.testing.assert_allclose(get_demand_indicators(self.project, with_timeseries=True)[0], expected)
+
+    def test_unsupported_units(self):
+        DemandTimeseries.objects.filter(name="profile 0").update(units=None)
+        with self.assertRaises(ValueError):
+            aggregate_demand(demand_consumer_groups(self.project), with_timeseries=False)
+
+
+class PayloadValuesTest(SimpleTestCase):
+    def test_payload_is_read_when_the_column_is_empty(self):
+        payload = TimeseriesPayload(digest=TimeseriesPayload.digest_of("[1.0, 2.0]"), data="[1.0, 2.0]")
+        for values in (None, []):
+            with self.subTest(values=values):
+                timeseries = DemandTimeseries(values=values)
+                timeseries.payload = payload
+                self.assertEqual(timeseries.values, [1.0, 2.0])
+
+
+def year_by_year_schedule(amount, ir, tenor, gp, debt_start, years):
+    schedule = {row: dict.fromkeys(years, 0.0) for row in SCHEDULE_ROWS}
+    schedule["Balance opening"][debt_start - 1] = schedule["Balance closing"][debt_start - 1] = amount
+    for index, year in enumerate(range(debt_start, debt_start + tenor), 1):
+        with np.errstate(invalid="ignore"):
+            principal = -npf.ppmt(ir, index - gp, tenor - gp, amount) if index > gp else 0
+        schedule["Principal"][year] = principal
+        schedule["Balance opening"][year] = schedule["Balance closing"][year - 1]
+        schedule["Interest"][year] = schedule["Balance opening"][year] * ir
+        schedule["Balance closing"][year] = schedule["Balance opening"][year] - principal
+        schedule["Capital service"][year] = schedule["Interest"][year] + principal
+    return {row: np.array([values[year] for year in years]) for row, values in schedule.items()}
+
+
+class AmortizationTest(SimpleTestCase):
+    years = range(2024, 2050)
+    loans = [
+        {"amount": 1e8, "ir": 0.1, "tenor": 10, "gp": 1, "debt_start": 2025},
+        {"amount": 2.5e7, "ir": 0.08, "tenor": 10, "gp": 1, "debt_start": 2035},
+        {"amount": 3e6, "ir": 0.0, "tenor": 5, "gp": 0, "debt_start": 2030},
+        {"amount": 0.0, "ir": 0.12, "tenor": 8, "gp": 2, "debt_start": 2025},
+        {"amount": 4e6, "ir": 0.15, "tenor": 12, "gp": 3, "debt_start": 2041},
+    ]
+
+    def test_schedules_match_the_year_by_year_computation(self):
+        schedules = amortization_schedules(
+            amount=[loan["amount"] for loan in self.loans],
+            interest_rate=[loan["ir"] for loan in self.loans],
+            tenor=[loan["tenor"] for loan in self.loans],
+            grace_period=[loan["gp"] for loan in self.loans],
+            debt_start=[loan["debt_start"] for loan in self.loans],
+            years=self.years,
+        )
+        for i, loan in enumerate(self.loans):
+            expected = year_by_year_schedule(years=self.years, **loan)
+            for row in SCHEDULE_ROWS:
+                with self.subTest(row=row, **loan):
+                    # the vectorized and scalar powers of numpy may round the last bit differently
+                    np.testing.assert_allclose(schedules[row][i], expected[row], rtol=1e-12, atol=1e-9 * loan["amount"])
+
+    def test_scalar_parameters_are_broadcast(self):
+        schedules = amortization_schedules([1e6, 2e6], 0.1, 10, 1, 2025, self.years)
+        self.assertEqual(schedules["Interest"].shape, (2, len(self.years)))
+        np.testing.assert_allclose(schedules["Principal"][1], 2 * schedules["Principal"][0])
+        np.testing.assert_allclose(schedules["Principal"].sum(axis=1), [1e6, 2e6])
+
+
+class FinancialNodesTest(SimpleTestCase):
+    def test_downstream_nodes(self):
+        self.assertEqual(
+            FinancialTool.downstream_nodes(["tariff"]),
+            {"revenue_over_lifetime", "losses_over_lifetime", "cash_flow_over_lifetime"},
+        )
+        self.assertEqual(
+            FinancialTool.downstream_nodes(["grant_share"]),
+            {"financial_kpis", "initial_loan_table", "losses_over_lifetime", "cash_flow_over_lifetime"},
+        )
+        self.assertIn("replacement_loan_table", FinancialTool.downstream_nodes(["capex"]))
+        self.assertEqual(FinancialTool.downstream_nodes(["discount"]), set())
+
+
+# the simulated project needs the demand profiles, whose values can only be stored on postgres
+@skipUnless(connection.vendor == "postgresql", "requires postgres")
+class FinancialToolTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        from benchmarks.cases import cp_project
+
+        cls.project = cp_project()["project"]
+
+    def test_changed_inputs_only_invalidate_their_downstream_nodes(self):
+        ft = FinancialTool(self.project)
+        ft.set_tariff(0.3)
+        ft.cash_flow_over_lifetime
+        computations = dict(ft.node_computations)
+        for name in ("revenue_over_lifetime", "initial_loan_table", "cash_flow_over_lifetime"):
+            self.assertEqual(computations[name], 1)
+
+        ft.set_tariff(0.4)
+        cash_flow = ft.cash_flow_over_lifetime
+        self.assertEqual(ft.node_computations["revenue_over_lifetime"], 2)
+        self.assertEqual(ft.node_computations["cash_flow_over_lifetime"], 2)
+        for name in ("initial_loan_table", "replacement_loan_table", "om_costs_over_lifetime", "capex"):
+            self.assertEqual(ft.node_computations[name], computations[name])
+
+        ft.remove_grant()
+        ft.cash_flow_over_lifetime
+        self.assertEqual(ft.node_computations["revenue_over_lifetime"], 2)
+        self.assertEqual(ft.node_computations["initial_loan_table"], 2)
+        self.assertEqual(ft.node_computations["replacement_loan_table"], 1)
+
+        # the cached tables are those of a new tool with the same inputs
+        fresh = FinancialTool(self.project)
+        fresh.set_tariff(0.4)
+        fresh.remove_grant()
+        self.assertTrue(ft.cash_flow_over_lifetime.equals(fresh.cash_flow_over_lifetime))
+        self.assertFalse(ft.cash_flow_over_lifetime.equals(cash_flow))
+
+
+# the simulated project needs the demand profiles, whose values can only be stored on postgres
+@skipUnless(connection.vendor == "postgresql", "requires postgres")
+class FinancialSweepTest(TestCase):
+    points = [
+        {},
+        {"tariff": 0.3, "grant_share": 0.0},
+        {"tariff": 0.45, "grant_share": 0.8, "debt_interest_MG": 0.05, "fuel_price_increase": 0.1},
+        {"tariff": 0.2, "equity_community_amount": 2e6, "equity_developer_amount": 5e7},
+    ]
+
+    @classmethod
+    def setUpTestData(cls):
+        from benchmarks.cases import cp_project
+
+        cls.project = cp_project()["project"]
+
+    def financial_tool(self, tariff=None, **params):
+        ft = FinancialTool(self.project)
+        ft.update_financial_params(**params)
+        if tariff is not None:
+            ft.set_tariff(tariff)
+        return ft
+
+    def test_single_points_match_the_financial_tool(self):
+        ft = self.financial_tool()
+        ft.calculate_tariff()
+        sweep = FinancialSweep(ft)
+        results = [sweep.evaluate(**point) for point in self.points]
+        for point, result in zip(self.points, results):
+            with self.subTest(**point):
+                ft = self.financial_tool(**{"tariff": sweep.defaults["tariff"], **point})
+                losses = ft.losses_over_lifetime
+                cash_flow = ft.cash_flow_over_lifetime
+                kpis = ft.financial_kpis
+                for row, values in (
+                    ("EBITDA", result.ebitda),
+                    ("Debt interest", result.debt_interest),
+                    ("Debt repayments", result.debt_repayments),
+                    ("Corporate tax", result.corporate_tax),
+                    ("Net income", result.net_income),
+                ):
+                    np.testing.assert_allclose(values[0], losses.loc[row].astype(float), rtol=1e-9, atol=1e-6)
+                np.testing.assert_allclose(
+                    result.cash_flow_after_debt_service[0],
+                    cash_flow.loc["Cash flow after debt service"].astype(float),
+                    rtol=1e-9,
+                    atol=1e-6,
+                )
+                self.assertAlmostEqual(result.initial_loan_amount[0], kpis["initial_loan_amount"], delta=1e-6)
+                self.assertAlmostEqual(result.wacc[0], kpis["wacc"], places=12)
+                for years in (10, 20):
+                    np.testing.assert_allclose(result.irr(years)[0], ft.internal_return_on_investment(years), rtol=1e-9)
+
+    def test_tariffs_match_the_goal_seek(self):
+        for point in self.points[1:]:
+            point = {name: value for name, value in point.items() if name != "tariff"}
+            with self.subTest(**point):
+                ft = self.financial_tool(**point)
+                x = np.arange(0.1, 0.5, 0.1)
+                m, h = np.polyfit(x, [ft.goal_seek_helper(xi) for xi in x], deg=1)
+                self.assertAlmostEqual(FinancialSweep(ft).tariffs()[0], -h / m, places=9)
+
+    def test_sweep(self):
+        sweep = FinancialSweep(self.financial_tool())
+        parameters = parameter_grid(grant_share=[0.0, 0.5], debt_interest_MG=[0.05, 0.1, 0.15])
+        tariffs = sweep.tariffs(**parameters)
+        result = sweep.evaluate(tariff=tariffs, **parameters)
+        self.assertEqual(len(result), 6)
+        self.assertEqual(result.cash_flow_operating.shape, (6, self.project.economic_data.duration))
+        # the tariff decreases with the grant
+        self.assertTrue(np.all(tariffs[:3] > tariffs[3:]))
+        summary = distribution(result.cash_flow_after_debt_service)
+        self.assertEqual(set(summary), {"mean", "p5", "p25", "p50", "p75", "p95"})
+        self.assertEqual(summary["p50"].shape, (self.project.economic_data.duration,))
+        with self.assertRaises(ValueError):
+            sweep.evaluate(discount=0.1)
+
+
+# 1x1 pixel png image
+PNG_DATA = "iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAIAAACQd1PeAAAADElEQVR4nGP4//8/AAX+Av4N70a4AAAAAElFTkSuQmCC"
+
+
+class ImageUrlTest(SimpleTestCase):
+    def test_decode(self):
+        image, image_format = decode_image_url(f"data:image/png;base64,{PNG_DATA}")
+        self.assertEqual(image_format, "png")
+        self.assertTrue(image.startswith(b"\x89PNG"))
+
+    def test_invalid_image_urls(self):
+        for image_url in (
+            None,
+            "",
+            PNG_DATA,
+            "data:image/png,abc",
+            "data:image/svg+xml;base64,PHN2Zz48L3N2Zz4=",
+            "data:image/png;base64,not base64!",
+        ):
+            with self.subTest(image_url=image_url), self.assertRaises(ValueError):
+                decode_image_url(image_url)
+
+
+@contextmanager
+def stub_kaleido():
+    """Patch the headless rendering of the figures, so that the graphs are rendered without kaleido and chromium"""
+    with mock.patch("cp_nigeria.graphs.kaleido"), mock.patch(
+        "cp_nigeria.graphs.pio.to_image", return_value=base64.b64decode(PNG_DATA)
+    ) as to_image:
+        yield to_image
+
+
+class RenderReportGraphsTest(TestCase):
+    fixtures = ["fixtures/benchmarks_fixture.json"]
+
+    def test_rendered_graphs_are_stored(self):
+        simulation = Simulation.objects.get()
+        figures = {"capex_graph": go.Figure(), "opex_graph": go.Figure()}
+        with stub_kaleido() as to_image:
+            graphs = render_report_graphs(simulation.scenario.project, figures=figures)
+        self.assertEqual(graphs, ["capex_graph", "opex_graph"])
+        to_image.assert_called_with(figures["opex_graph"], format="png", width=800, height=500)
+        stored = ReportGraph.objects.filter(simulation=simulation).order_by("name")
+        self.assertEqual([graph.name for graph in stored], graphs)
+        self.assertEqual(bytes(stored[0].image), base64.b64decode(PNG_DATA))
+
+        # the graphs are replaced when rendered again
+        with stub_kaleido():
+            render_report_graphs(simulation.scenario.project, figures=figures)
+        self.assertEqual(ReportGraph.objects.count(), 2)
+
+
+# the simulated project needs the demand profiles, whose values can only be stored on postgres
+@skipUnless(connection.vendor == "postgresql", "requires postgres")
+# the region of the community is resolved offline
+@override_settings(REGION_PROVIDERS=["nearest_capital"])
+class ReportGraphTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        from benchmarks.cases import cp_project_with_report
+        from users.models import CustomUser
+
+        cls.project = cp_project_with_report()["project"]
+        cls.user = CustomUser.objects.create(username="reporter", email="reporter@test.com")
+
+    def report_images(self, name):
+        from cp_nigeria.report import ReportHandler
+
+        report = ReportHandler(self.project)
+        report.add_image_from_db(name)
+        return report.doc.inline_shapes
+
+    def save_graph(self, image_url, graph_id="capex"):
+        self.client.force_login(self.user)
+        return self.client.post(
+            reverse("save_graph_to_db", args=[self.project.id]),
+            {"graph_id": graph_id, "image_url": image_url},
+            headers={"x-requested-with": "XMLHttpRequest"},
+        ).json()
+
+    def test_uploaded_graph_is_added_to_the_report(self):
+        self.assertEqual(len(self.report_images("capex_graph")), 0)
+        self.assertEqual(self.save_graph(f"data:image/png;base64,{PNG_DATA}")["status"], "success")
+        self.assertEqual(len(self.report_images("capex_graph")), 1)
+
+    def test_invalid_upload_is_not_stored(self):
+        for image_url in ("", "data:image/svg+xml;base64,PHN2Zz48L3N2Zz4="):
+            with self.subTest(image_url=image_url):
+                self.assertEqual(self.save_graph(image_url)["status"], "failed")
+        self.assertFalse(ReportGraph.objects.exists())
+
+    def test_stub_rendered_graph_is_added_to_the_report(self):
+        with stub_kaleido():
+            render_report_graphs(self.project)
+        for name in report_figures(self.project):
+            self.assertEqual(len(self.report_images(name)), 1)
+
+    @skipUnless(kaleido, "requires the kaleido package")
+    def test_rendered_graph_is_added_to_the_report(self):
+        figures = {"opex_graph": report_figures(self.project)["opex_graph"]}
+        self.assertEqual(render_report_graphs(self.project, figures=figures), ["opex_graph"])
+        self.assertEqual(len(self.report_images("opex_graph")), 1)
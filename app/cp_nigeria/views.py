@@ -1,5 +1,6 @@
 import io
 
+from asgiref.sync import sync_to_async
 from django.contrib.auth.decorators import login_required
 import json
 import logging
@@ -20,14 +21,15 @@ from epa.settings import MVS_GET_URL, MVS_LP_FILE_URL
 from .forms import *
 from .helpers import *
 from business_model.forms import *
-from projects.requests import fetch_mvs_simulation_results
+from projects.requests import afetch_mvs_simulation_results, fetch_mvs_simulation_results
 from projects.models import *
-from projects.views import project_duplicate, project_delete
+from projects.views import call_view, editable_project, project_duplicate, project_delete, viewable_simulation
 from business_model.models import *
 from cp_nigeria.models import ConsumerGroup
-from cp_nigeria.helpers import ReportHandler
+from cp_nigeria.graphs import decode_image_url, save_report_graph
 from projects.forms import UploadFileForm, ProjectShareForm, ProjectRevokeForm, UseCaseForm
-from projects.services import RenewablesNinja
+from projects.services import aget_renewables_resource, get_renewables_resource
+from projects.single_flight import single_flight
 from projects.constants import DONE, PENDING, ERROR
 from projects.views import request_mvs_simulation, simulation_cancel
 from business_model.helpers import B_MODELS
@@ -308,37 +310,45 @@ def cpn_demand_params(request, proj_id, step_id=STEP_MAPPING["demand_profile"]):
                     pass
 
         if formset.is_valid():
+            new_groups = []
+            updated_groups = []
+            deleted_group_ids = []
+            updated_fields = set()
             for form in formset:
                 # update consumer group if already in database and create new entry if not
                 if len(form.cleaned_data) == 0:
                     continue
-                try:
-                    group_id = form.cleaned_data["id"].id
-                    consumer_group = ConsumerGroup.objects.get(id=group_id)
-                    if form.cleaned_data["DELETE"] is True:
-                        consumer_group.delete()
-                    else:
-                        for field_name, field_value in form.cleaned_data.items():
-                            if field_name == "id":
-                                continue
-                            setattr(consumer_group, field_name, field_value)
-                            consumer_group.save()
-
-                # AttributeError gets thrown when form id field is empty -> not yet in db
-                except AttributeError:
+                # the id field is empty if the consumer group is not yet in db
+                consumer_group = form.cleaned_data["id"]
+                if consumer_group is None:
                     if form.cleaned_data["DELETE"] is True:
                         continue
-
                     consumer_group = form.save(commit=False)
                     consumer_group.project = project
-                    consumer_group.save()
-
-            # update demand if exists
-            if qs_demand.exists():
-                for demand, cg_type in zip(qs_demand.order_by("name"), ("Enterprise", "Household", "Public facility")):
-                    total_demand = get_aggregated_demand(project, consumer_type=cg_type)
-                    demand.input_timeseries = json.dumps(total_demand)
-                    demand.save()
+                    new_groups.append(consumer_group)
+                elif form.cleaned_data["DELETE"] is True:
+                    deleted_group_ids.append(consumer_group.id)
+                else:
+                    for field_name, field_value in form.cleaned_data.items():
+                        if field_name in ("id", "DELETE"):
+                            continue
+                        setattr(consumer_group, field_name, field_value)
+                        updated_fields.add(field_name)
+                    updated_groups.append(consumer_group)
+
+            with transaction.atomic():
+                ConsumerGroup.objects.filter(project=project, id__in=deleted_group_ids).delete()
+                if updated_groups:
+                    ConsumerGroup.objects.bulk_update(updated_groups, sorted(updated_fields))
+                ConsumerGroup.objects.bulk_create(new_groups)
+
+                # update demand if exists
+                demands = list(qs_demand.order_by("name"))
+                if demands:
+                    total_demands = get_aggregated_demands(project)
+                    for demand, cg_type in zip(demands, ("Enterprise", "Household", "Public facility")):
+                        demand.input_timeseries = json.dumps(total_demands[cg_type])
+                    Asset.objects.bulk_update(demands, ["input_timeseries"])
 
             step_id = STEP_MAPPING["demand_profile"] + 1
             return HttpResponseRedirect(reverse("cpn_steps", args=[proj_id, step_id]))
@@ -398,7 +408,19 @@ def cpn_demand_params(request, proj_id, step_id=STEP_MAPPING["demand_profile"]):
 
 @login_required
 @require_http_methods(["GET", "POST"])
-def cpn_scenario(request, proj_id, step_id=STEP_MAPPING["scenario_setup"]):
+async def cpn_scenario(request, proj_id, step_id=STEP_MAPPING["scenario_setup"]):
+    # the PV profile of a newly set up system is fetched without blocking the worker before the sync view uses it
+    if request.method == "POST":
+        # the profile is only fetched for the users allowed to set up the system
+        project = await sync_to_async(editable_project)(request.user, proj_id)
+        scenario = await Scenario.objects.filter(project=project).alast()
+        if scenario is not None and project.latitude is not None and project.longitude is not None:
+            if not await Timeseries.objects.filter(scenario=scenario).aexists():
+                await aget_renewables_resource("pv", project.latitude, project.longitude)
+    return await sync_to_async(cpn_scenario_page)(request, proj_id, step_id=step_id)
+
+
+def cpn_scenario_page(request, proj_id, step_id=STEP_MAPPING["scenario_setup"]):
     project = get_object_or_404(Project, id=proj_id)
 
     if (project.user != request.user) and (
@@ -566,9 +588,9 @@ def cpn_scenario(request, proj_id, step_id=STEP_MAPPING["scenario_setup"]):
         demand_ent.save()
         demand_pf.save()
         if created is True:
+            total_demands = get_aggregated_demands(project)
             for dem, cg_type in zip((demand_ent, demand_hh, demand_pf), ("Enterprise", "Household", "Public facility")):
-                total_demand = get_aggregated_demand(project, consumer_type=cg_type)
-                dem.input_timeseries = json.dumps(total_demand)
+                dem.input_timeseries = json.dumps(total_demands[cg_type])
                 dem.save()
 
         peak_demand = (
@@ -1013,7 +1035,19 @@ def cpn_constraints(request, proj_id, step_id=STEP_MAPPING["economic_params"]):
 
 @login_required
 @require_http_methods(["GET", "POST"])
-def cpn_review(request, proj_id, step_id=STEP_MAPPING["simulation"]):
+async def cpn_review(request, proj_id, step_id=STEP_MAPPING["simulation"]):
+    # MVS is polled without blocking the worker, the page itself is rendered synchronously
+    if request.method == "GET":
+        # the scenario of the project, as in Project.scenario
+        scenario = await Scenario.objects.filter(project_id=proj_id).alast()
+        if scenario is not None:
+            simulation = await sync_to_async(viewable_simulation)(request.user, scenario.id)
+            if simulation is not None and simulation.status == PENDING:
+                await afetch_mvs_simulation_results(simulation)
+    return await sync_to_async(cpn_review_page)(request, proj_id, step_id=step_id, refresh=False)
+
+
+def cpn_review_page(request, proj_id, step_id=STEP_MAPPING["simulation"], refresh=True):
     project = get_object_or_404(Project, id=proj_id)
 
     if (project.user != request.user) and (
@@ -1039,7 +1073,7 @@ def cpn_review(request, proj_id, step_id=STEP_MAPPING["simulation"]):
         if qs.exists():
             simulation = qs.first()
 
-            if simulation.status == PENDING:
+            if simulation.status == PENDING and refresh is True:
                 fetch_mvs_simulation_results(simulation)
 
             context.update(
@@ -1209,7 +1243,8 @@ def cpn_outputs(request, proj_id, step_id=STEP_MAPPING["outputs"], complex=False
             sub_capex.fillna("", inplace=True)
             capex_assumptions[cat] = sub_capex
 
-        revenue_flows = ft.revenue_over_lifetime
+        # the tables of the financial tool are cached, they are copied before being modified
+        revenue_flows = ft.revenue_over_lifetime.copy()
         revenue_flows.index = revenue_flows.index.droplevel(1)
         losses = ft.losses_over_lifetime
         replacement_loan_table = ft.replacement_loan_table
@@ -1217,11 +1252,11 @@ def cpn_outputs(request, proj_id, step_id=STEP_MAPPING["outputs"], complex=False
         exchange_rate = ft.exchange_rate
         tariff_currency = tariff * exchange_rate
         senior_debt = ft.initial_loan_table
-        cash_flow = ft.cash_flow_over_lifetime
+        cash_flow = ft.cash_flow_over_lifetime.copy()
         cash_flow.loc["DSCR"] = cash_flow.loc["Cash flow from operating activity"] / (
             losses.loc["Equity interest"] + losses.loc["Debt interest"] + senior_debt.loc["Principal"]
         )
-        financial_kpis = ft.financial_kpis
+        financial_kpis = ft.financial_kpis.copy()
         # calculate the financial KPIs with 0% grant
         ft.remove_grant()
         no_grant_tariff = ft.calculate_tariff()
@@ -1293,11 +1328,11 @@ CPN_STEPS = [CPN_STEPS[k] for k, v in sorted(STEP_MAPPING.items(), key=lambda x:
 
 @login_required
 @require_http_methods(["GET", "POST"])
-def cpn_steps(request, proj_id, step_id=None):
+async def cpn_steps(request, proj_id, step_id=None):
     if step_id is None:
         return HttpResponseRedirect(reverse("cpn_steps", args=[proj_id, 1]))
 
-    return CPN_STEPS[step_id - 1](request, proj_id, step_id)
+    return await call_view(CPN_STEPS[step_id - 1], request, proj_id, step_id)
 
 
 @login_required
@@ -1328,16 +1363,19 @@ def cpn_simulation_request(request, proj_id=0):
 
 def get_pv_output(proj_id):
     project = Project.objects.get(id=proj_id)
-    coordinates = {"lat": project.latitude, "lon": project.longitude}
-    location = RenewablesNinja()
-    location.get_pv_data(coordinates)
-    pv_ts, _ = Timeseries.objects.get_or_create(scenario=project.scenario, open_source=True, ts_type="source")
+    # the profile is shared between projects at the same location and only fetched once
+    resource = get_renewables_resource("pv", project.latitude, project.longitude)
+    if resource is None:
+        return None
+    # concurrent requests for the same scenario would otherwise both create a timeseries
+    with single_flight(f"pv_output:{project.scenario.id}"):
+        pv_ts, _ = Timeseries.objects.get_or_create(scenario=project.scenario, open_source=True, ts_type="source")
 
-    pv_ts.values = np.squeeze(location.data.values).tolist()
-    pv_ts.start_time = location.data.index[0]
-    pv_ts.end_time = location.data.index[-1]
-    pv_ts.time_step = 60
-    pv_ts.save()
+        pv_ts.values = resource.get_profile("electricity")
+        pv_ts.start_time = resource.start_time
+        pv_ts.end_time = resource.end_time
+        pv_ts.time_step = resource.time_step
+        pv_ts.save()
 
     return pv_ts.values
 
@@ -1583,18 +1621,15 @@ def save_graph_to_db(request, proj_id):
         if graph_id == "cpn_stacked_timeseriesElectricity":
             graph_id = "stacked_timeseries"
         attr_name = f"{graph_id}_graph"
-        image_url = request.POST.get("image_url")
+        try:
+            image, image_format = decode_image_url(request.POST.get("image_url"))
+        except ValueError as e:
+            return JsonResponse({"status": "failed", "message": f"Could not save {attr_name}: {e}"})
 
         with transaction.atomic():
-            report_qs = ImplementationPlanContent.objects.select_for_update().filter(
-                simulation=project.scenario.simulation
-            )
-            if report_qs.exists():
-                if report_qs.count() > 1:
-                    logging.error("ImplementationPlanContent returned more than one object")
-                report_content = report_qs.first()
-                setattr(report_content, attr_name, image_url)
-                report_content.save()
+            simulation = project.scenario.simulation
+            if ImplementationPlanContent.objects.filter(simulation=simulation).exists():
+                save_report_graph(simulation, attr_name, image, image_format)
                 answer = JsonResponse({"status": "success", "message": "Saved " + attr_name + " to database"})
             else:
                 answer = JsonResponse({"status": "failed", "message": "Database object could not be found"})
@@ -1611,6 +1646,9 @@ def ajax_download_report(request):
         sanitized_project_name = re.sub(r"\W+", "_", project.name)
         logging.info("Downloading implementation plan")
 
+        # imported here as python-docx is only needed to generate the report
+        from cp_nigeria.report import ReportHandler
+
         implementation_plan = ReportHandler(project)
         implementation_plan.create_cover_sheet()
         implementation_plan.create_report_content()
@@ -1,6 +1,7 @@
 import os
 import copy
 import csv
+from functools import lru_cache
 from django.contrib.staticfiles.storage import staticfiles_storage
 from django.utils.translation import gettext_lazy as _
 from django.db.models import Value, Q, F, Case, When
@@ -8,97 +9,98 @@ from django.db.models.functions import Concat, Replace
 from numbers import Number
 
 from projects.models import Viewer, Project
+from projects.registry import LazyRegistry, csv_rows
 import pickle
+from types import MappingProxyType
 from django.conf import settings as django_settings
 
 #### CONSTANTS ####
 
 sectors = ["Electricity", "Heat", "Gas", "H2"]
 
-KPIS = {}
 MANAGEMENT_CAT = "management"
 ECONOMIC_CAT = "economic"
 TECHNICAL_CAT = "technical"
 ENVIRONEMENTAL_CAT = "environemental"
-TABLES = {
-    MANAGEMENT_CAT: {"General": []},
-    # ECONOMIC_CAT: {},
-    # TECHNICAL_CAT: {},
-    # ENVIRONEMENTAL_CAT: {},
-}
 EMPTY_SUBCAT = "none"
 
-KPI_PARAMETERS = {}
-KPI_PARAMETERS_ASSETS = {}
-
-if os.path.exists(staticfiles_storage.path("MVS_kpis_list.csv")) is True:
-    with open(staticfiles_storage.path("MVS_kpis_list.csv"), encoding="utf-8") as csvfile:
-        csvreader = csv.reader(csvfile, delimiter=",", quotechar='"')
-        for i, row in enumerate(csvreader):
-            if i == 0:
-                hdr = row
-                label_idx = hdr.index("label")
-                verbose_idx = hdr.index("verbose")
-                unit_idx = hdr.index(":Unit:")
-                cat_idx = hdr.index("category")
-                subcat_idx = hdr.index("subcategory")
-            else:
-                label = row[label_idx]
-                verbose = row[verbose_idx]
-                unit = row[unit_idx]
-                KPIS[label] = {k: v for k, v in zip(hdr, row)}
-
-                # cat = row[cat_idx]
-                # subcat = row[subcat_idx]
-                # if subcat == MANAGEMENT_CAT:
-                #     # reverse the category and the subcategory for this special table (management is not a parameter type, whereas all other table are also parameter types)
-                #     subcat = cat
-                #     cat = MANAGEMENT_CAT
-                if label in (
-                    "degree_of_autonomy",
-                    "onsite_energy_fraction",
-                    "renewable_factor",
-                    "renewable_share_of_local_generation",
-                    "levelized_costs_of_electricity_equivalent",
-                ):
-                    TABLES[MANAGEMENT_CAT]["General"].append(
-                        {
-                            "name": _(verbose),
-                            "id": label,
-                            "unit": _(unit) if unit != "Factor" else "",
-                        }
-                    )
-                # if subcat != EMPTY_SUBCAT:
-                #     if cat in TABLES:
-                #         if subcat not in TABLES[cat]:
-                #             TABLES[cat][subcat] = []
-                #         if label not in TABLES[cat][subcat]:
-                #             # the _() make the text translatable if it is mentionned in the django.po file
-                #             TABLES[cat][subcat].append(
-                #                 {"name": _(verbose), "id": label, "unit": _(unit)}
-                #             )
-
-    with open(staticfiles_storage.path("MVS_kpis_list.csv"), encoding="utf-8") as csvfile:
-        csvreader = csv.reader(csvfile, delimiter=",", quotechar='"')
-        for i, row in enumerate(csvreader):
-            if i == 0:
-                hdr = [el.replace(" ", "_").replace(":", "").lower() for el in row]
-                label_idx = hdr.index("label")
-                cat_idx = hdr.index("category")
-                scope_idx = hdr.index("scope")
-            else:
-                label = row[label_idx]
-                category = row[cat_idx]
-                scope = row[scope_idx]
-
-                if category != "files":
-                    KPI_PARAMETERS[label] = {
-                        k: _(v) if k == "verbose" or k == "definition" else v for k, v in zip(hdr, row)
-                    }
-                    if "asset" in scope:
-                        KPI_PARAMETERS_ASSETS[label] = {
-                            k: _(v) if k == "verbose" or k == "definition" else v for k, v in zip(hdr, row)
-                        }
+
+@lru_cache(maxsize=None)
+def load_kpi_registries():
+    """Parse MVS_kpis_list.csv into the KPIS, TABLES, KPI_PARAMETERS and KPI_PARAMETERS_ASSETS registries"""
+    kpis = {}
+    tables = {
+        MANAGEMENT_CAT: {"General": []},
+        # ECONOMIC_CAT: {},
+        # TECHNICAL_CAT: {},
+        # ENVIRONEMENTAL_CAT: {},
+    }
+    kpi_parameters = {}
+    kpi_parameters_assets = {}
+
+    rows = csv_rows("MVS_kpis_list.csv")
+    if len(rows) == 0:
+        return kpis, tables, kpi_parameters, kpi_parameters_assets
+
+    hdr = rows[0]
+    label_idx = hdr.index("label")
+    verbose_idx = hdr.index("verbose")
+    unit_idx = hdr.index(":Unit:")
+    for row in rows[1:]:
+        label = row[label_idx]
+        verbose = row[verbose_idx]
+        unit = row[unit_idx]
+        kpis[label] = {k: v for k, v in zip(hdr, row)}
+
+        # cat = row[cat_idx]
+        # subcat = row[subcat_idx]
+        # if subcat == MANAGEMENT_CAT:
+        #     # reverse the category and the subcategory for this special table (management is not a parameter type, whereas all other table are also parameter types)
+        #     subcat = cat
+        #     cat = MANAGEMENT_CAT
+        if label in (
+            "degree_of_autonomy",
+            "onsite_energy_fraction",
+            "renewable_factor",
+            "renewable_share_of_local_generation",
+            "levelized_costs_of_electricity_equivalent",
+        ):
+            tables[MANAGEMENT_CAT]["General"].append(
+                {
+                    "name": _(verbose),
+                    "id": label,
+                    "unit": _(unit) if unit != "Factor" else "",
+                }
+            )
+
+    hdr = [el.replace(" ", "_").replace(":", "").lower() for el in rows[0]]
+    label_idx = hdr.index("label")
+    cat_idx = hdr.index("category")
+    scope_idx = hdr.index("scope")
+    for row in rows[1:]:
+        label = row[label_idx]
+        category = row[cat_idx]
+        scope = row[scope_idx]
+
+        if category != "files":
+            kpi_parameters[label] = {k: _(v) if k == "verbose" or k == "definition" else v for k, v in zip(hdr, row)}
+            if "asset" in scope:
+                kpi_parameters_assets[label] = {
+                    k: _(v) if k == "verbose" or k == "definition" else v for k, v in zip(hdr, row)
+                }
+
+    # the table definitions are shared by the requests, their rows are frozen so that they cannot be altered
+    tables = {
+        style: {title: tuple(MappingProxyType(row) for row in rows) for title, rows in subtables.items()}
+        for style, subtables in tables.items()
+    }
+    return kpis, tables, kpi_parameters, kpi_parameters_assets
+
+
+KPIS = LazyRegistry(lambda: load_kpi_registries()[0])
+TABLES = LazyRegistry(lambda: load_kpi_registries()[1])
+KPI_PARAMETERS = LazyRegistry(lambda: load_kpi_registries()[2])
+KPI_PARAMETERS_ASSETS = LazyRegistry(lambda: load_kpi_registries()[3])
 
                 #### FUNCTIONS ####
 
@@ -51,6 +51,8 @@ from projects.constants import (
     MVS_TYPE,
 )
 from projects.models import Simulation, Scenario
+from projects.profiling import profile_section
+from dashboard.results import DecodedFlows, bus_results_flows, simulation_flows
 
 logger = logging.getLogger(__name__)
 
@@ -165,32 +167,13 @@ class KPICostsMatrixResults(models.Model):
 
 class OemofBusResults(pd.DataFrame):  # real results
     def __init__(self, results):
-        js = json.loads(results)
-        mindex = pd.MultiIndex.from_tuples(
-            js["columns"],
-            names=[
-                "bus",
-                "energy_vector",
-                "direction",
-                "asset",
-                "asset_type",
-                "oemof_type",
-            ],
-        )
-        df = pd.DataFrame(data=js["data"], columns=mindex)
+        # results is either the json of the bus results dataframe or its DecodedFlows
+        if not isinstance(results, DecodedFlows):
+            results = DecodedFlows.from_bus_results(results)
 
-        ts_df = df.iloc[:-1]
-        ts_index = pd.to_datetime(js["index"][:-1], unit="ms")
-        investments = df.iloc[-1]
-        ts_df.index = ts_index
+        super().__init__(data=results.flows, index=results.multi_index(), columns=results.index)
 
-        super().__init__(
-            data=ts_df.T.to_dict(orient="split")["data"],
-            index=mindex,
-            columns=ts_df.index,
-        )
-
-        self["investments"] = investments
+        self["investments"] = results.capacities
         self.sort_index(inplace=True)
 
     def to_json(self, **kwargs):
@@ -257,16 +240,20 @@ class FlowResults(models.Model):
     __df_flows = None
     __df_capacities = None
 
+    @property
+    def decoded_flows(self):
+        return bus_results_flows(self)
+
     @property
     def df_flows(self):
         if self.__df_flows is None:
-            self.__df_flows = OemofBusResults(self.flow_data).bus_flows()
+            self.__df_flows = OemofBusResults(self.decoded_flows).bus_flows()
 
         return self.__df_flows
 
     def asset_optimized_capacity(self, asset_name):
         if self.__df_capacities is None:
-            self.__df_capacities = OemofBusResults(self.flow_data)
+            self.__df_capacities = OemofBusResults(self.decoded_flows)
         return self.__df_capacities.asset_optimized_capacity(asset_name)
 
     @property
@@ -460,42 +447,26 @@ class FlowResults(models.Model):
         return fig.to_json()
 
     def load_duration_figure(self, energy_vector):
-        df_consumption = (
-            self.df_flows.loc[
-                (self.df_flows.index.get_level_values("direction") == "out")
-                & (self.df_flows.index.get_level_values("energy_vector") == energy_vector)
-            ]
-            .groupby(level="asset_type")
-            .sum()
-            .T
-        )
-
-        # df_consumption["excess"] *= 0
-        df_consumption = df_consumption.sum(axis=1)
-        df_production = (
-            self.df_flows.loc[
-                (self.df_flows.index.get_level_values("direction") == "in")
-                & (self.df_flows.index.get_level_values("energy_vector") == energy_vector)
-            ]
-            .groupby(level="asset_type")
-            .sum()
-            .T
-        )
-        percentage = np.linspace(0, 100, df_production.index.size)
+        flows = self.decoded_flows
+        sector = flows.select(energy_vector=energy_vector)
+        consumption = flows.total_timeseries(sector & flows.select(direction="out"))
+        asset_types, production = flows.aggregate("asset_type", sector & flows.select(direction="in"))
+        production = -np.sort(-production, axis=1)
+        percentage = np.linspace(0, 100, flows.n_timesteps)
         fig = go.Figure(
             data=[
                 go.Scatter(
                     x=percentage.tolist(),
-                    y=df_production.loc[:, col].sort_values(ascending=False).values.tolist(),
-                    name=col,
+                    y=production[i].tolist(),
+                    name=asset_type,
                     stackgroup="production",
                 )
-                for col in df_production.columns
+                for i, asset_type in enumerate(asset_types)
             ]
             + [
                 go.Scatter(
                     x=percentage.tolist(),
-                    y=df_consumption.sort_values(ascending=False).values.tolist(),
+                    y=np.sort(consumption)[::-1].tolist(),
                     name="demand",
                 )
             ],
@@ -819,6 +790,7 @@ def parse_manytomany_object_list(object_list, model):
     return object_list
 
 
+@profile_section("plotly")
 def graph_timeseries(simulations, y_variables=None):
     simulations_results = []
     for sim in simulations:
@@ -856,15 +828,15 @@ def graph_timeseries(simulations, y_variables=None):
                 default=Value(1),
             ),
             unit=Value("kW"),
-            value=F("flow_data"),
         )
         # FilteredRelation() objects
         y_values = []
         # TODO asset_type filtering here
+        flows = simulation_flows(sim)
         for y_val in qs.order_by("-group", "oemof_type", "-asset_type").values(
-            "value", "label", "total_flow", "unit", "group"
+            "id", "label", "total_flow", "unit", "group"
         ):
-            y_val["value"] = (y_val["group"] * np.array(json.loads(y_val["value"]))).tolist()
+            y_val["value"] = (y_val["group"] * flows.timeseries(y_val.pop("id"))).tolist()
             y_values.append(y_val)
 
         simulations_results.append(
@@ -878,6 +850,7 @@ def graph_timeseries(simulations, y_variables=None):
     return simulations_results
 
 
+@profile_section("plotly")
 def graph_timeseries_stacked(simulations, y_variables, energy_vector):
     simulations_results = []
     for simulation in simulations:
@@ -908,7 +881,6 @@ def graph_timeseries_stacked(simulations, y_variables, energy_vector):
                 default="asset",
             ),
             unit=Value("kW"),
-            value=F("flow_data"),
             fill=Case(
                 When(Q(oemof_type="sink"), then=Value("none")),
                 When(Q(oemof_type="storage") & Q(direction="out"), then=Value("none")),
@@ -943,10 +915,11 @@ def graph_timeseries_stacked(simulations, y_variables, energy_vector):
         )
         y_values = []
         # set the stacked lines order, first demand, then storages and finally dsos
+        flows = simulation_flows(simulation)
         for y_val in qs.order_by("mode", "plot_order").values(
-            "value", "label", "total_flow", "unit", "fill", "group", "mode"
+            "id", "label", "total_flow", "unit", "fill", "group", "mode"
         ):
-            y_val["value"] = json.loads(y_val["value"])
+            y_val["value"] = flows.timeseries(y_val.pop("id")).tolist()
             y_values.append(y_val)
 
         simulations_results.append(
@@ -960,6 +933,7 @@ def graph_timeseries_stacked(simulations, y_variables, energy_vector):
     return simulations_results
 
 
+@profile_section("plotly")
 def graph_timeseries_stacked_cpn(simulations, y_variables, energy_vector):
     simulations_results = []
     for simulation in simulations:
@@ -982,7 +956,6 @@ def graph_timeseries_stacked_cpn(simulations, y_variables, energy_vector):
                 default="asset",
             ),
             unit=Value("kW"),
-            value=F("flow_data"),
             fill=Case(
                 When(Q(oemof_type="sink") & Q(asset_type__contains="demand"), then=Value("none")),
                 default=Value("tonexty"),
@@ -1007,13 +980,14 @@ def graph_timeseries_stacked_cpn(simulations, y_variables, energy_vector):
         excess_indices = []
         battery_indices = []
         # set the stacked lines order, first demand, then storages and finally dsos
+        flows = simulation_flows(simulation)
         for idx, y_val in enumerate(
-            qs.order_by("-plot_order").values("value", "label", "total_flow", "unit", "fill", "group", "mode")
+            qs.order_by("-plot_order").values("id", "label", "total_flow", "unit", "fill", "group", "mode")
         ):
             if "neg" in y_val["group"]:
-                y_val["value"] = [-val for val in json.loads(y_val["value"])]
+                y_val["value"] = (-flows.timeseries(y_val.pop("id"))).tolist()
             else:
-                y_val["value"] = json.loads(y_val["value"])
+                y_val["value"] = flows.timeseries(y_val.pop("id")).tolist()
 
             if "excess" in y_val["label"]:
                 excess_indices.append(idx)
@@ -1023,11 +997,13 @@ def graph_timeseries_stacked_cpn(simulations, y_variables, energy_vector):
             y_values.append(y_val)
 
         # add the aggregated total and fulfilled demand from demand sinks to the y vals for the plot
-        qs_total = Asset.objects.filter(scenario=simulation.scenario, asset_type__asset_type="reducable_demand")
+        qs_total = Asset.objects.filter(
+            scenario=simulation.scenario, asset_type__asset_type="reducable_demand"
+        ).with_payload()
 
         qs_fulfilled = FancyResults.objects.filter(
             simulation=simulation, direction="out", bus="ac_bus", asset__contains="demand", total_flow__gt=0
-        )
+        ).only("id")
 
         if qs_total.exists():
             demand_queries = [qs_total, qs_fulfilled]
@@ -1042,7 +1018,7 @@ def graph_timeseries_stacked_cpn(simulations, y_variables, energy_vector):
                 if label == "total":
                     total_demand.append(json.loads(dem.input_timeseries))
                 else:
-                    total_demand.append(dem.timeseries)
+                    total_demand.append(flows.timeseries(dem.id))
             demand[label] = np.vstack(total_demand).sum(axis=0).tolist()
 
             y_values.append(
@@ -1078,20 +1054,21 @@ def graph_timeseries_stacked_cpn(simulations, y_variables, energy_vector):
             y_val = y_values.pop(idx)
             excess_flows[y_val["label"]] = y_val["value"]
 
-        # aggregate excess flows
-        total_value = np.sum(list(excess_flows.values()), axis=0)
-        total_flow = np.sum(total_value)
-        y_values.append(
-            {
-                "total_flow": total_flow,
-                "value": total_value.tolist(),
-                "label": "excess",
-                "unit": "kW",
-                "fill": "tonexty",
-                "group": "production",
-                "mode": "none",
-            }
-        )
+        # aggregate excess flows, a system without excess has no excess flow to display
+        if excess_flows:
+            total_value = np.sum(list(excess_flows.values()), axis=0)
+            total_flow = np.sum(total_value)
+            y_values.append(
+                {
+                    "total_flow": total_flow,
+                    "value": total_value.tolist(),
+                    "label": "excess",
+                    "unit": "kW",
+                    "fill": "tonexty",
+                    "group": "production",
+                    "mode": "none",
+                }
+            )
 
         simulations_results.append(
             simulation_timeseries_to_json(
@@ -1104,6 +1081,7 @@ def graph_timeseries_stacked_cpn(simulations, y_variables, energy_vector):
     return simulations_results
 
 
+@profile_section("plotly")
 def graph_capacities(simulations, y_variables):
     simulations_results = []
     multi_scenario = False
@@ -1225,6 +1203,7 @@ def graph_capacities(simulations, y_variables):
     return simulations_results
 
 
+@profile_section("pandas")
 def get_costs(simulation, y_variables=None):
     if y_variables is None:
         y_variables = (
@@ -1359,6 +1338,7 @@ def get_costs(simulation, y_variables=None):
     return df * exchange_rate
 
 
+@profile_section("plotly")
 def graph_costs(simulations, y_variables=None, arrangement=COSTS_PER_CATEGORY):  # COSTS_PER_CATEGORY
     simulations_results = []
     multi_scenario = False
@@ -1437,6 +1417,7 @@ def graph_costs(simulations, y_variables=None, arrangement=COSTS_PER_CATEGORY):
     return simulations_results
 
 
+@profile_section("plotly")
 def graph_sankey(simulation, energy_vector, timestep=None):
     ts = timestep
     if isinstance(energy_vector, list) is False:
@@ -1457,6 +1438,8 @@ def graph_sankey(simulation, energy_vector, timestep=None):
             chp_in_flow = {}
 
         qs = FancyResults.objects.filter(simulation=sim)
+        if ts is not None:
+            flows = simulation_flows(sim)
 
         for bus in Bus.objects.filter(scenario__simulation=sim, type__in=energy_vector):
             bus_label = bus.name
@@ -1465,7 +1448,7 @@ def graph_sankey(simulation, energy_vector, timestep=None):
             if ts is None:
                 asset_to_bus_names = qs.filter(bus=bus.name, direction="in").values_list("asset", "total_flow")
             else:
-                asset_to_bus_names = qs.filter(bus=bus.name, direction="in").values_list("asset", "flow_data")
+                asset_to_bus_names = qs.filter(bus=bus.name, direction="in").values_list("asset", "id")
 
             for component_label, val in asset_to_bus_names:
                 # draw link from the component to the bus
@@ -1477,8 +1460,7 @@ def graph_sankey(simulation, energy_vector, timestep=None):
                 targets.append(labels.index(bus_label))
 
                 if ts is not None:
-                    val = json.loads(val)
-                    val = val[ts]
+                    val = float(flows.timeseries(val)[ts])
 
                 if component_label in chp_in_flow:
                     chp_in_flow[component_label]["value"] += val
@@ -1489,7 +1471,7 @@ def graph_sankey(simulation, energy_vector, timestep=None):
             if ts is None:
                 bus_to_asset_names = qs.filter(bus=bus.name, direction="out").values_list("asset", "total_flow")
             else:
-                bus_to_asset_names = qs.filter(bus=bus.name, direction="out").values_list("asset", "flow_data")
+                bus_to_asset_names = qs.filter(bus=bus.name, direction="out").values_list("asset", "id")
 
             # TODO potentially rename feedin period and consumption period
             for component_label, val in bus_to_asset_names:
@@ -1505,8 +1487,7 @@ def graph_sankey(simulation, energy_vector, timestep=None):
                     chp_in_flow[component_label]["bus"] = bus_label
 
                 if ts is not None:
-                    val = json.loads(val)
-                    val = val[ts]
+                    val = float(flows.timeseries(val)[ts])
 
                 if val == 0:
                     val = 1e-9
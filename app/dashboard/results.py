@@ -0,0 +1,294 @@
+r"""Decoded flow results of the simulations.
+
+The flows of a simulation are stored as json text: one list per flow in the FancyResults rows and, for the older
+results, whole bus dataframes in FlowResults. DecodedFlows parses such a payload once into a contiguous numpy array
+holding one row per flow, along with the labels of the flows (bus, energy vector, direction, asset, ...). The decoded
+results are kept in memory per process, so that the graphs compute their load duration curves, peaks, aggregates and
+percentiles with vectorized operations instead of parsing the json on every request.
+
+The scalar KPIs of the simulations are decoded and memoized the same way, kpi_table() assembles the KPI table of a
+set of simulations from them without altering the shared table definitions.
+
+The memoized results of a simulation are dropped when one of its FancyResults or KPIScalarResults is saved or when
+it is deleted.
+"""
+
+import json
+import logging
+import threading
+from collections import Counter, OrderedDict
+
+import numpy as np
+import pandas as pd
+from django.apps import apps
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils.translation import get_language
+
+from dashboard.helpers import KPI_helper, MANAGEMENT_CAT, TABLES, round_only_numbers
+from projects.constants import DONE
+
+logger = logging.getLogger(__name__)
+
+LEVELS = ("bus", "energy_vector", "direction", "asset", "asset_type", "oemof_type")
+# number of decoded results kept in memory, a simulation of one year with 50 flows takes 3.5 MB
+CACHE_SIZE = 32
+KPI_NOT_IMPLEMENTED = "not implemented yet"
+
+
+def _decode_flow(flow_data):
+    try:
+        flow = np.asarray(json.loads(flow_data), dtype=float)
+    except (TypeError, ValueError):
+        return None
+    return flow if flow.ndim == 1 else None
+
+
+def _flow_matrix(rows):
+    """Return the flows of the FancyResults rows as a 2D array, see DecodedFlows.from_fancy_results()"""
+    decoded = [_decode_flow(row["flow_data"]) for row in rows]
+    try:
+        flows = np.array(decoded, dtype=float)
+    except (TypeError, ValueError):
+        flows = None
+    if flows is not None and flows.ndim == 2:
+        return flows
+
+    lengths = Counter(len(flow) for flow in decoded if flow is not None)
+    n_timesteps = lengths.most_common(1)[0][0] if lengths else 0
+    flows = np.full((len(rows), n_timesteps), np.nan)
+    for i, (row, flow) in enumerate(zip(rows, decoded)):
+        if flow is None:
+            logger.warning(f"The flow of the FancyResults {row['id']} could not be decoded, it is filled with NaN")
+            continue
+        if len(flow) != n_timesteps:
+            logger.warning(
+                f"The flow of the FancyResults {row['id']} has {len(flow)} timesteps instead of {n_timesteps}, "
+                "it is padded with NaN or truncated"
+            )
+        flows[i, : min(len(flow), n_timesteps)] = flow[:n_timesteps]
+    return flows
+
+
+class DecodedFlows:
+    """Flows of a simulation as a 2D array (one row per flow, one column per timestep) and the labels of the flows"""
+
+    def __init__(self, labels, flows, capacities=None, ids=None, index=None):
+        self.labels = {level: np.asarray(labels[level], dtype=object) for level in LEVELS}
+        n_flows = len(self.labels["asset"])
+        self.flows = np.ascontiguousarray(flows, dtype=float).reshape(n_flows, -1 if n_flows else 0)
+        # the decoded flows are shared between the requests of a process
+        self.flows.flags.writeable = False
+        self.capacities = np.full(n_flows, np.nan) if capacities is None else np.asarray(capacities, dtype=float)
+        self.ids = np.arange(n_flows) if ids is None else np.asarray(ids)
+        self.index = index
+        self._rows = {flow_id: row for row, flow_id in enumerate(self.ids.tolist())}
+
+    def __len__(self):
+        return self.flows.shape[0]
+
+    @property
+    def n_timesteps(self):
+        return self.flows.shape[1]
+
+    @classmethod
+    def from_bus_results(cls, results):
+        """Decode the bus results dataframe saved with the "split" orientation, its last row holds the capacities"""
+        js = json.loads(results)
+        data = np.array(js["data"], dtype=float).reshape(len(js["index"]), len(js["columns"]))
+        labels = dict(zip(LEVELS, zip(*js["columns"]))) if js["columns"] else {level: [] for level in LEVELS}
+        return cls(
+            labels=labels,
+            flows=data[:-1].T,
+            capacities=data[-1],
+            index=pd.to_datetime(js["index"][:-1], unit="ms"),
+        )
+
+    @classmethod
+    def from_fancy_results(cls, rows):
+        """Decode FancyResults rows, given as dicts of their id, flow_data, optimized_capacity and LEVELS
+
+        A flow which cannot be decoded or whose number of timesteps differs from the one of most flows is padded
+        with NaN (or truncated) to that number of timesteps and a warning is logged, so that its row still exists
+        """
+        rows = list(rows)
+        return cls(
+            labels={level: [row[level] for row in rows] for level in LEVELS},
+            flows=_flow_matrix(rows),
+            capacities=[row["optimized_capacity"] for row in rows],
+            ids=[row["id"] for row in rows],
+        )
+
+    def multi_index(self):
+        return pd.MultiIndex.from_arrays([self.labels[level] for level in LEVELS], names=LEVELS)
+
+    def select(self, **filters):
+        """Return the mask of the flows whose labels match the filters, a filter value may be a list of values"""
+        mask = np.ones(len(self), dtype=bool)
+        for level, value in filters.items():
+            if isinstance(value, (list, tuple, set)):
+                mask &= np.isin(self.labels[level], list(value))
+            else:
+                mask &= self.labels[level] == value
+        return mask
+
+    def select_ids(self, ids):
+        """Return the mask of the flows of the FancyResults with the given ids"""
+        return np.isin(self.ids, list(ids))
+
+    def _rows_of(self, mask):
+        return self.flows if mask is None else self.flows[mask]
+
+    def timeseries(self, flow_id):
+        """Return the flow of the FancyResults with the given id"""
+        return self.flows[self._rows[flow_id]]
+
+    def total(self, mask=None):
+        """Return the sum over time of each flow"""
+        return self._rows_of(mask).sum(axis=1)
+
+    def total_timeseries(self, mask=None):
+        """Return the sum of the flows at each timestep"""
+        return self._rows_of(mask).sum(axis=0)
+
+    def peak(self, mask=None):
+        return self._rows_of(mask).max(axis=1, initial=0)
+
+    def percentile(self, q, mask=None):
+        return np.percentile(self._rows_of(mask), q, axis=1)
+
+    def load_duration(self, mask=None):
+        """Return the flows sorted in descending order"""
+        return -np.sort(-self._rows_of(mask), axis=1)
+
+    def aggregate(self, level, mask=None):
+        """Sum the flows with the same label at the given level, return the sorted labels and their summed flows"""
+        labels = self.labels[level] if mask is None else self.labels[level][mask]
+        keys, groups = np.unique(labels.astype(str), return_inverse=True)
+        # one-hot matrix of the groups, the sums are a single matrix product
+        membership = (groups == np.arange(len(keys))[:, None]).astype(float)
+        return keys, membership @ self._rows_of(mask)
+
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def _memoized(key, decode):
+    with _cache_lock:
+        if key in _cache:
+            _cache.move_to_end(key)
+            return _cache[key]
+    decoded = decode()
+    with _cache_lock:
+        _cache[key] = decoded
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+    return decoded
+
+
+def clear_decoded_results(key=None):
+    with _cache_lock:
+        if key is None:
+            _cache.clear()
+        else:
+            _cache.pop(key, None)
+
+
+def clear_simulation_results(simulation_id):
+    """Drop the memoized results of the simulation, including the KPI tables of the simulation sets it belongs to"""
+    with _cache_lock:
+        for key in [key for key in _cache if key[0] != "flow_results" and simulation_id in key[1]]:
+            del _cache[key]
+
+
+def _decode_simulation(simulation):
+    return DecodedFlows.from_fancy_results(
+        simulation.fancyresults_set.order_by("id").values("id", "flow_data", "optimized_capacity", *LEVELS)
+    )
+
+
+def simulation_flows(simulation):
+    """Return the DecodedFlows of the FancyResults of the simulation, memoized once the simulation is done"""
+    if simulation.status != DONE:
+        return _decode_simulation(simulation)
+    return _memoized(("simulation", (simulation.pk,)), lambda: _decode_simulation(simulation))
+
+
+def _decode_kpis(simulation_ids):
+    KPIScalarResults = apps.get_model("dashboard", "KPIScalarResults")
+    payloads = dict(
+        KPIScalarResults.objects.filter(simulation_id__in=simulation_ids).values_list("simulation_id", "scalar_values")
+    )
+    missing = [simulation_id for simulation_id in simulation_ids if simulation_id not in payloads]
+    if missing:
+        raise KPIScalarResults.DoesNotExist(f"The simulations {missing} have no KPI results")
+    return {simulation_id: json.loads(payloads[simulation_id]) for simulation_id in simulation_ids}
+
+
+def kpi_table(simulations, currency, style=MANAGEMENT_CAT):
+    """Return the KPI table of the simulations, one value per simulation for each KPI of the table style
+
+    The table maps the titles of the subtables to their rows: dicts with the name, id, unit, description and the
+    values of the KPI in the order of the simulations. The KPIs of all simulations are fetched in a single query and
+    the table is memoized per simulation set once all simulations are done, it must not be modified.
+    """
+    subtables = TABLES[style]
+    simulation_ids = tuple(simulation.pk for simulation in simulations)
+
+    def build():
+        kpis = _decode_kpis(simulation_ids)
+        rows = [row for subtable in subtables.values() for row in subtable]
+        values = pd.DataFrame(
+            [
+                [
+                    round_only_numbers(kpis[simulation_id].get(row["id"], KPI_NOT_IMPLEMENTED), 2)
+                    for simulation_id in simulation_ids
+                ]
+                for row in rows
+            ],
+            columns=simulation_ids,
+            dtype=object,
+        )
+        table = {}
+        position = 0
+        for title, subtable in subtables.items():
+            table[title] = []
+            for row in subtable:
+                unit = row["unit"]
+                table[title].append(
+                    {
+                        **row,
+                        "unit": unit.replace("currency", currency) if "currency" in unit else unit,
+                        "scen_values": values.iloc[position].tolist(),
+                        "description": KPI_helper.get_doc_definition(row["id"]),
+                    }
+                )
+                position += 1
+        return table
+
+    if all(simulation.status == DONE for simulation in simulations):
+        # the units are translated when the table is built
+        return _memoized(("kpi_table", simulation_ids, style, currency, get_language()), build)
+    return build()
+
+
+def bus_results_flows(flow_results):
+    """Return the DecodedFlows of a FlowResults, memoized per FlowResults"""
+    return _memoized(("flow_results", flow_results.pk), lambda: DecodedFlows.from_bus_results(flow_results.flow_data))
+
+
+@receiver(post_save, sender="dashboard.FancyResults")
+@receiver(post_save, sender="dashboard.KPIScalarResults")
+def simulation_results_saved(sender, instance, **kwargs):
+    clear_simulation_results(instance.simulation_id)
+
+
+@receiver(post_save, sender="dashboard.FlowResults")
+def flow_results_saved(sender, instance, **kwargs):
+    clear_decoded_results(("flow_results", instance.pk))
+
+
+@receiver(post_delete, sender="projects.Simulation")
+def simulation_deleted(sender, instance, **kwargs):
+    clear_simulation_results(instance.pk)
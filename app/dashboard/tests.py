@@ -1,12 +1,17 @@
+import json
+
+import numpy as np
+import pandas as pd
 from django.test import TestCase
 
 # import uuid
 # from .models import Project, Simulation
 # from io import BytesIO
 # from django.urls import reverse
-from dashboard.models import SensitivityAnalysis
-from dashboard.helpers import dict_keyword_mapper, nested_dict_crawler, KPIFinder
-from projects.models import Asset
+from dashboard.models import FancyResults, KPIScalarResults, OemofBusResults, SensitivityAnalysis, graph_timeseries
+from dashboard.helpers import dict_keyword_mapper, nested_dict_crawler, KPIFinder, TABLES
+from dashboard.results import LEVELS, DecodedFlows, clear_decoded_results, kpi_table, simulation_flows
+from projects.models import Asset, Simulation
 
 # class SimulationServiceTest(TestCase):
 #    fixtures = ['fixtures/benchmarks_fixture.json',]
@@ -105,3 +110,128 @@ class TestKPIFinder(TestCase):
 
     def test_kpi_finder_finds_doubled_path(self):
         self.assertEqual(self.kpis.get("b11"), [("b", "b1", "b11"), ("c", "b1", "b11")])
+
+
+def bus_results_payload(n_timesteps=24, seed=0):
+    """Bus results dataframe as saved by the MVS, the last row holds the optimized capacities"""
+    rng = np.random.default_rng(seed)
+    columns = [
+        ["ac_bus", "Electricity", "in", "pv_plant", "pv_plant", "source"],
+        ["ac_bus", "Electricity", "in", "wind_plant", "wind_plant", "source"],
+        ["ac_bus", "Electricity", "in", "pv_roof", "pv_plant", "source"],
+        ["ac_bus", "Electricity", "out", "demand", "demand", "sink"],
+        ["heat_bus", "Heat", "out", "heat_demand", "heat_demand", "sink"],
+    ]
+    data = (rng.random((n_timesteps + 1, len(columns))) * 10).tolist()
+    index = (pd.date_range("2023-01-01", periods=n_timesteps + 1, freq="h").astype("int64") // 10**6).tolist()
+    return json.dumps({"columns": columns, "index": index, "data": data})
+
+
+class DecodedFlowsTest(TestCase):
+    fixtures = ["fixtures/benchmarks_fixture.json"]
+
+    def setUp(self):
+        clear_decoded_results()
+
+    def test_bus_results_statistics(self):
+        payload = bus_results_payload()
+        flows = DecodedFlows.from_bus_results(payload)
+        df = OemofBusResults(payload).bus_flows()
+        self.assertEqual((len(flows), flows.n_timesteps), (5, 24))
+
+        electricity_in = flows.select(energy_vector="Electricity", direction="in")
+        asset_types, production = flows.aggregate("asset_type", electricity_in)
+        expected = df.loc[(slice(None), "Electricity", "in"), :].groupby(level="asset_type").sum()
+        self.assertEqual(asset_types.tolist(), expected.index.tolist())
+        np.testing.assert_allclose(production, expected.values)
+
+        demand = flows.select(asset="demand")
+        np.testing.assert_allclose(flows.load_duration(demand)[0], np.sort(flows.flows[demand][0])[::-1])
+        self.assertEqual(flows.peak(demand)[0], df.xs("demand", level="asset").values.max())
+        self.assertEqual(flows.percentile(50, demand)[0], np.median(flows.flows[demand][0]))
+
+    def test_invalid_fancy_results_flows_are_padded(self):
+        labels = {level: "" for level in LEVELS}
+        flow_data = ["[1.0, 2.0, 3.0]", "[4.0, 5.0]", None, "null", "[1.0, 1.0, null]", "[0.0, 1.0, 2.0, 3.0]"]
+        rows = [dict(labels, id=i, flow_data=data, optimized_capacity=None) for i, data in enumerate(flow_data)]
+        with self.assertLogs("dashboard.results", level="WARNING") as logs:
+            flows = DecodedFlows.from_fancy_results(rows)
+        self.assertEqual(len(logs.output), 4)
+        self.assertEqual((len(flows), flows.n_timesteps), (6, 3))
+        np.testing.assert_array_equal(flows.timeseries(1), [4.0, 5.0, np.nan])
+        self.assertTrue(np.isnan(flows.timeseries(2)).all())
+        self.assertTrue(np.isnan(flows.timeseries(3)).all())
+        np.testing.assert_array_equal(flows.timeseries(4), [1.0, 1.0, np.nan])
+        np.testing.assert_array_equal(flows.timeseries(5), [0.0, 1.0, 2.0])
+
+    def test_simulation_flows_are_decoded_once(self):
+        simulation = Simulation.objects.get()
+        for i, asset in enumerate(("pv_plant", "demand")):
+            FancyResults.objects.create(
+                bus="ac_bus",
+                energy_vector="Electricity",
+                direction="in" if i == 0 else "out",
+                asset=asset,
+                asset_type=asset,
+                oemof_type="source" if i == 0 else "sink",
+                flow_data=[float(i), 2.0, 3.0],
+                optimized_capacity=None,
+                simulation=simulation,
+            )
+        with self.assertNumQueries(1):
+            flows = simulation_flows(simulation)
+        with self.assertNumQueries(0):
+            self.assertIs(simulation_flows(simulation), flows)
+        self.assertEqual(flows.total(flows.select(direction="out")).tolist(), [6.0])
+
+        # saving a result of the simulation drops its decoded flows
+        FancyResults.objects.create(
+            bus="ac_bus",
+            energy_vector="Electricity",
+            direction="out",
+            asset="excess",
+            asset_type="excess",
+            oemof_type="sink",
+            flow_data=[0.0, 0.0, 1.0],
+            optimized_capacity=None,
+            simulation=simulation,
+        )
+        self.assertEqual(len(simulation_flows(simulation)), 3)
+        FancyResults.objects.filter(asset="excess").delete()
+        clear_decoded_results()
+
+        graph = graph_timeseries([simulation])[0]
+        self.assertEqual([y["value"] for y in graph["timeseries"]], [[0.0, 2.0, 3.0], [-1.0, -2.0, -3.0]])
+
+
+class KPITableTest(TestCase):
+    fixtures = ["fixtures/benchmarks_fixture.json"]
+
+    def setUp(self):
+        clear_decoded_results()
+        self.simulation = Simulation.objects.get()
+        KPIScalarResults.objects.filter(simulation=self.simulation).update(
+            scalar_values=json.dumps({"degree_of_autonomy": 0.43533, "levelized_costs_of_electricity_equivalent": 1})
+        )
+
+    def test_kpi_table_does_not_alter_the_table_definitions(self):
+        definitions = [dict(row) for row in TABLES["management"]["General"]]
+        with self.assertNumQueries(1):
+            table = kpi_table([self.simulation, self.simulation], "NGN")
+        with self.assertNumQueries(0):
+            self.assertIs(kpi_table([self.simulation, self.simulation], "NGN"), table)
+        self.assertEqual([dict(row) for row in TABLES["management"]["General"]], definitions)
+
+        rows = {row["id"]: row for row in table["General"]}
+        self.assertEqual(rows["degree_of_autonomy"]["scen_values"], [0.44, 0.44])
+        self.assertEqual(rows["renewable_factor"]["scen_values"], ["not implemented yet"] * 2)
+        self.assertEqual(rows["levelized_costs_of_electricity_equivalent"]["unit"], "NGN/kWheleq")
+        self.assertEqual(kpi_table([self.simulation], "EUR")["General"][1]["unit"], "EUR/kWheleq")
+
+    def test_kpi_table_is_rebuilt_when_the_kpis_are_saved(self):
+        table = kpi_table([self.simulation], "EUR")
+        kpis = KPIScalarResults.objects.get(simulation=self.simulation)
+        kpis.scalar_values = json.dumps({"renewable_factor": 0.5})
+        kpis.save()
+        rows = {row["id"]: row for row in kpi_table([self.simulation], "EUR")["General"]}
+        self.assertEqual(rows["renewable_factor"]["scen_values"], [0.5])
@@ -50,6 +50,7 @@ from dashboard.models import (
     STORAGE_SUB_CATEGORIES,
     OUTPUT_POWER,
 )
+from dashboard.results import kpi_table, simulation_flows
 from business_model.models import EquityData
 from projects.scenario_topology_helpers import load_scenario_topology_from_db
 from dashboard.forms import (
@@ -60,12 +61,12 @@ from dashboard.forms import (
 from django.utils.translation import gettext_lazy as _
 from django.utils.safestring import mark_safe
 from io import BytesIO
-import xlsxwriter
 import json
 import datetime
 import logging
 import traceback
 from projects.helpers import parameters_helper
+from cp_nigeria.financial_sweep import FinancialSweep
 from cp_nigeria.helpers import (
     FinancialTool,
     get_project_summary,
@@ -74,6 +75,14 @@ from cp_nigeria.helpers import (
     OUTPUT_PARAMS,
     save_table_for_report,
 )
+from cp_nigeria.graphs import (
+    cash_flow_graph_data,
+    system_costs_data,
+    capex_by_category,
+    opex_by_category,
+    demand_graph_data,
+    stacked_timeseries_descriptions,
+)
 from users.templatetags.custom_template_tags import field_to_title
 
 logger = logging.getLogger(__name__)
@@ -584,38 +593,17 @@ def request_kpi_table(request, proj_id=None):
 
     if compare_scen is not None:
         selected_scenarios = [compare_scen]
-    kpis = {}
-    scen_names = []
-    for scenario_id in selected_scenarios:
-        scenario = get_object_or_404(Scenario, pk=scenario_id)
-        scen_names.append(scenario.name)
-        kpi_scalar_results_obj = KPIScalarResults.objects.get(simulation=scenario.simulation)
-        kpi_scalar_results_dict = json.loads(kpi_scalar_results_obj.scalar_values)
-        kpis[scenario_id] = kpi_scalar_results_dict
-
-    proj = get_object_or_404(Project, id=scenario.project.id)
-    unit_conv = {"currency": proj.economic_data.currency, "Faktor": "%"}
-    table = TABLES.get("management", None)
-
-    # do some unit substitution
-    for l in table.values():
-        for e in l:
-            if e["unit"] in unit_conv:
-                sub = unit_conv[e["unit"]]
-                e["unit"] = sub
-
-    if table is not None:
-        for subtable_title, subtable_content in table.items():
-            for param in subtable_content:
-                param["scen_values"] = [
-                    round_only_numbers(kpis[scen_id].get(param["id"], "not implemented yet"), 2)
-                    for scen_id in selected_scenarios
-                ]
-                param["description"] = KPI_helper.get_doc_definition(param["id"])
-                if "currency" in param["unit"]:
-                    param["unit"] = param["unit"].replace("currency", scenario.get_currency())
+
+    table_style = MANAGEMENT_CAT
+    if table_style in TABLES:
+        scenarios = Scenario.objects.select_related("simulation", "project__economic_data").in_bulk(selected_scenarios)
+        scenarios = [scenarios.get(int(scenario_id)) for scenario_id in selected_scenarios]
+        if len(scenarios) == 0 or None in scenarios:
+            raise Http404("Scenario does not exist")
+        currency = scenarios[-1].get_currency()
+        table = kpi_table([scenario.simulation for scenario in scenarios], currency, style=table_style)
         answer = JsonResponse(
-            {"data": table, "hdrs": ["Indicator"] + scen_names},
+            {"data": table, "hdrs": ["Indicator"] + [scenario.name for scenario in scenarios]},
             status=200,
             content_type="application/json",
         )
@@ -713,6 +701,8 @@ def view_asset_parameters(request, scen_id, asset_type_name, asset_uuid):
         total_flows = []
         timestamps = scenario.get_timestamps(json_format=True)
 
+        flows = simulation_flows(scenario.simulation)
+        qs_fine = qs_fine.defer("flow_data")
         if len(qs_fine) == 1:
             asset_results = qs_fine.get()
             total_flows.append(
@@ -733,7 +723,7 @@ def view_asset_parameters(request, scen_id, asset_type_name, asset_uuid):
                 )
             traces.append(
                 {
-                    "value": json.loads(asset_results.flow_data),
+                    "value": flows.timeseries(asset_results.id).tolist(),
                     "name": existing_asset.name,
                     "unit": "kW",
                 }
@@ -771,15 +761,14 @@ def view_asset_parameters(request, scen_id, asset_type_name, asset_uuid):
                     When(Q(asset_type__contains="ess"), then=Value("kWh")),
                     default=Value("kW"),
                 ),
-                value=F("flow_data"),
             )
 
-            for y_vals in qs_fine.order_by("direction").values("name", "value", "unit", "direction", "total_flow"):
+            for y_vals in qs_fine.order_by("direction").values("name", "id", "unit", "direction", "total_flow"):
                 # make consumption values negative other wise inflow of asset is negative
                 if y_vals["direction"] == negative_direction:
-                    y_vals["value"] = (-1 * np.array(json.loads(y_vals["value"]))).tolist()
+                    y_vals["value"] = (-1 * flows.timeseries(y_vals.pop("id"))).tolist()
                 else:
-                    y_vals["value"] = json.loads(y_vals["value"])
+                    y_vals["value"] = flows.timeseries(y_vals.pop("id")).tolist()
 
                 traces.append(y_vals)
 
@@ -983,34 +972,11 @@ def scenario_visualize_cpn_stacked_timeseries(request, scen_id):
             )
         )
 
-    color_mapping = {
-        "pv_plant_flow": "#F2CD5D",
-        "battery_flow": "#12AB6D",
-        "battery_charge_flow": "#12AB6D",
-        "battery_discharge_flow": "#71D0A1",
-        "total_demand_flow": "#A69F99",
-        "fulfilled_demand_flow": "#716A64",
-        "electricity_demand_flow": "#716A64",
-        "diesel_generator_flow": "#814400",
-        "diesel_fuel_consumption_flow": "#814400",
-        "excess_flow": "#EA9822",
-        "ac_bus_excess_flow": "#EA9822",
-        "dc_bus_excess_flow": "#EA9822",
-    }
-
     timeseries_labels = [
         f"{ts['label']}_flow" for i in range(len(results_json)) for ts in results_json[i]["data"][0]["timeseries"]
     ]
 
-    descriptions = {
-        param: {
-            "verbose": OUTPUT_PARAMS[param]["verbose"] if param in OUTPUT_PARAMS else param,
-            "description": OUTPUT_PARAMS[param]["description"] if param in OUTPUT_PARAMS else "bla",
-            "line": {"shape": "hv", "dash": "dash" if param == "total_demand_flow" else "solid"},
-            "color": color_mapping[param],
-        }
-        for param in timeseries_labels
-    }
+    descriptions = stacked_timeseries_descriptions(timeseries_labels)
 
     for scenario in results_json:
         scenario["descriptions"] = descriptions
@@ -1112,31 +1078,8 @@ def scenario_visualize_cash_flow(request, scen_id):
 
     # Initialize financial tool to calculate financial flows and test output graphs
     ft = FinancialTool(scenario.project)
-    initial_loan = ft.initial_loan_table
-    replacement_loan = ft.replacement_loan_table
-    revenue = ft.revenue_over_lifetime
-    costs = ft.om_costs_over_lifetime
 
-    graph_contents = {
-        "Cash flow after debt service": {
-            "values": ft.cash_flow_over_lifetime.loc["Cash flow after debt service"].tolist()
-        },
-        "Debt repayments": {"values": (initial_loan.loc["Principal"] + replacement_loan.loc["Principal"]).tolist()[1:]},
-        "Debt interest payments": {
-            "values": (initial_loan.loc["Interest"] + replacement_loan.loc["Interest"]).tolist()[1:]
-        },
-        "Operating revenues net": {
-            "values": revenue.loc[("Total operating revenues", "operating_revenues_total"), :].tolist()
-        },
-        "Operating expenses": {"values": costs.loc["opex_total"].tolist()},
-    }
-
-    x = ft.cash_flow_over_lifetime.columns.tolist()
-    title = "Cash flow"
-    for trace in graph_contents:
-        graph_contents[trace]["description"] = OUTPUT_PARAMS[trace]["description"]
-
-    return JsonResponse({"x": x, "graph_contents": graph_contents, "title": title})
+    return JsonResponse(cash_flow_graph_data(ft))
 
 
 def scenario_visualize_revenue(request, scen_id):
@@ -1168,13 +1111,7 @@ def scenario_visualize_system_costs(request, scen_id):
     scenario = get_object_or_404(Scenario, pk=scen_id)
     # Initialize financial tool to get system costs for graph
     ft = FinancialTool(scenario.project)
-    system_costs = ft.system_params[
-        ft.system_params["category"].isin(["capex_initial", "opex_total", "fuel_costs_total"])
-    ].copy()
-    system_costs.drop(columns=["growth_rate", "label"], inplace=True)
-    system_costs = system_costs.pivot(columns="category", index="supply_source")
-    system_costs.columns = [col[1] for col in system_costs.columns]
-    system_costs.loc["total"] = system_costs.sum()
+    system_costs = system_costs_data(ft)
 
     assets = [OUTPUT_PARAMS[asset]["verbose"] for asset in system_costs.index]
     graph_contents = system_costs.to_dict()
@@ -1218,20 +1155,16 @@ def scenario_visualize_capex(request, scen_id):
     scenario = get_object_or_404(Scenario, pk=scen_id)
     save_to_db = True if request.GET.get("save_to_db") == "true" else False
     ft = FinancialTool(scenario.project)
-    currency = ft.currency
-    capex_df = ft.capex
-    capex_by_category = capex_df.groupby("Category")[f"Total costs [{currency}]"].sum()
-    capex_by_category.loc["total"] = capex_by_category.sum()
 
     # create table from data
-    capex_by_category = capex_by_category.to_dict()
+    capex = capex_by_category(ft).to_dict()
     table_content = {}
 
     headers = ["costs"]
     descriptions = []
-    for param in capex_by_category:
+    for param in capex:
         table_content[param] = set_outputs_table_format(param, ft.currency_symbol)
-        table_content[param]["value"] = f"{round(capex_by_category[param], -ft.rounding_magnitude):,.0f}"
+        table_content[param]["value"] = f"{round(capex[param], -ft.rounding_magnitude):,.0f}"
         descriptions.append(OUTPUT_PARAMS[param]["description"])
 
     table_headers = {}
@@ -1254,13 +1187,10 @@ def scenario_visualize_capex(request, scen_id):
 
 def scenario_visualize_opex(request, scen_id):
     scenario = get_object_or_404(Scenario, pk=scen_id)
-    currency = scenario.project.economic_data.currency
     save_to_db = True if request.GET.get("save_to_db") == "true" else False
     ft = FinancialTool(scenario.project)
-    opex_df = ft.om_costs[f"Total costs [{currency}]"]
-    opex_df.loc["total"] = opex_df.sum()
     # create table from data
-    opex = opex_df.to_dict()
+    opex = opex_by_category(ft).to_dict()
     table_content = {}
 
     headers = ["costs"]
@@ -1321,15 +1251,10 @@ def request_community_summary_table(request, scen_id):
     currency_symbol = scenario.project.economic_data.currency_symbol
     save_to_db = True if request.GET.get("save_to_db") == "true" else False
     # dict for community characteristics table
-    graph_data = {"labels": [], "values": [], "descriptions": []}
     aggregated_cgs = get_aggregated_cgs(scenario.project, as_ts=True)
-    graph_data["timestamps"] = scenario.get_timestamps(json_format=True)
+    graph_data = demand_graph_data(scenario, aggregated_cgs)
 
     for key in aggregated_cgs:
-        if key != "shs":
-            graph_data["labels"].append(OUTPUT_PARAMS[key]["verbose"])
-            graph_data["descriptions"].append(OUTPUT_PARAMS[key]["description"])
-            graph_data["values"].append(aggregated_cgs[key]["total_demand"].tolist())
         aggregated_cgs[key]["total_demand"] = round(sum(aggregated_cgs[key]["total_demand"]), 0)
 
     aggregated_cgs = pd.DataFrame.from_dict(aggregated_cgs, orient="index")
@@ -1405,31 +1330,19 @@ def request_financial_kpi_table(request, scen_id):
     save_to_db = True if request.GET.get("save_to_db") == "true" else False
     # dict for community characteristics table
     ft = FinancialTool(scenario.project)
-    tariff = ft.calculate_tariff()
-    financing_structure = ft.financial_kpis
+    financing_structure = ft.financial_kpis.copy()
     # TODO discuss if this should be in table, excluded or included in total investments
     financing_structure.pop("replacement_loan_amount")
-    # calculate the financial KPIs with 0% grant
-    irr_kpis = {
-        "irr_10": ft.internal_return_on_investment(10),
-        "irr_20": ft.internal_return_on_investment(20),
-    }
-
-    ft.remove_grant()
-    no_grant_tariff = ft.calculate_tariff()
-
-    no_grant_irr_kpis = {
-        "irr_10": ft.internal_return_on_investment(10),
-        "irr_20": ft.internal_return_on_investment(20),
-    }
-
-    comparison_kpi_df = pd.DataFrame([irr_kpis, no_grant_irr_kpis], index=["with_grant", "without_grant"]).T
-    comparison_kpi_df.loc["tariff"] = {
-        "with_grant": tariff * ft.exchange_rate,
-        "without_grant": no_grant_tariff * ft.exchange_rate,
-    }
-
-    comparison_kpis = comparison_kpi_df.T.to_dict()
+    # calculate the financial KPIs with and without grant at once
+    sweep = FinancialSweep(ft)
+    grant_shares = [ft.financial_params["grant_share"], 0.0]
+    tariffs = sweep.tariffs(grant_share=grant_shares)
+    result = sweep.evaluate(tariff=tariffs, grant_share=grant_shares)
+
+    comparison_kpis = pd.DataFrame(
+        {"irr_10": result.irr(10), "irr_20": result.irr(20), "tariff": tariffs * ft.exchange_rate},
+        index=["with_grant", "without_grant"],
+    ).to_dict()
     tables = {"financial_kpi_table": {}, "financing_structure_table": {}}
 
     for name, data in zip(["financial_kpi_table", "financing_structure_table"], [comparison_kpis, financing_structure]):
@@ -1484,6 +1397,9 @@ def download_scalar_results(request, scen_id):
         kpi_scalar_values_dict = json.loads(kpi_scalar_results_obj.scalar_values)
         scalar_kpis_json = kpi_scalars_list(kpi_scalar_values_dict, KPI_SCALAR_UNITS, KPI_SCALAR_TOOLTIPS)
 
+        # only needed for the downloads, imported here to keep it out of the startup time of every process
+        import xlsxwriter
+
         output = BytesIO()
         workbook = xlsxwriter.Workbook(output)
         worksheet = workbook.add_worksheet("Scalars")
@@ -1525,6 +1441,8 @@ def download_cost_results(request, scen_id):
         kpi_cost_results_obj = KPICostsMatrixResults.objects.get(simulation=scenario.simulation)
         kpi_cost_values_dict = json.loads(kpi_cost_results_obj.cost_values)
 
+        import xlsxwriter
+
         output = BytesIO()
         workbook = xlsxwriter.Workbook(output)
         worksheet = workbook.add_worksheet("Costs")
@@ -1578,6 +1496,8 @@ def download_timeseries_results(request, scen_id):
             )
         ]
 
+        import xlsxwriter
+
         output = BytesIO()
         workbook = xlsxwriter.Workbook(output)
         merge_format = workbook.add_format({"bold": True, "align": "center", "valign": "vcenter"})
@@ -1,3 +1,4 @@
 #!/usr/local/bin/python
 python manage.py collectstatic && \
+python manage.py compile_parameter_registry && \
 python manage.py qcluster
\ No newline at end of file
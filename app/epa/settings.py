@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/3.0/ref/settings/
 """
 import ast
 import os
+import tempfile
 
 from django.contrib.messages import constants as messages
 
@@ -71,6 +72,8 @@ if DEBUG is True:
     INSTALLED_APPS.append("sass_processor")
 
 MIDDLEWARE = [
+    # removed from the stack unless PROFILING_ENABLED is True
+    "projects.profiling.ProfilingMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.locale.LocaleMiddleware",
@@ -128,6 +131,28 @@ DATABASES = {
     }
 }
 
+# The web and qcluster workers keep their connection open for SQL_CONN_MAX_AGE seconds instead of opening one per
+# request or task, a connection which was closed by the server is detected by the health check and replaced.
+# Under ASGI every request runs in its own thread, the connections should rather be pooled with SQL_POOL=True (postgres
+# only, requires psycopg[pool]), the pool keeps up to SQL_POOL_MAX_SIZE connections open per worker process.
+WEB_SERVER_MODE = os.getenv("WEB_SERVER_MODE", "wsgi").lower()
+SQL_POOL = ast.literal_eval(os.getenv("SQL_POOL", "False"))
+if SQL_POOL is True and DATABASES["default"]["ENGINE"] == "django.db.backends.postgresql":
+    DATABASES["default"]["OPTIONS"] = {
+        "pool": {
+            "min_size": int(os.getenv("SQL_POOL_MIN_SIZE", "2")),
+            "max_size": int(os.getenv("SQL_POOL_MAX_SIZE", "10")),
+            "timeout": float(os.getenv("SQL_POOL_TIMEOUT", "10")),
+        }
+    }
+    # the pooled connections are returned to the pool at the end of the request, they cannot be persistent
+    DATABASES["default"]["CONN_MAX_AGE"] = 0
+else:
+    DATABASES["default"]["CONN_MAX_AGE"] = int(
+        os.getenv("SQL_CONN_MAX_AGE", "0" if WEB_SERVER_MODE == "asgi" else "60")
+    )
+DATABASES["default"]["CONN_HEALTH_CHECKS"] = True
+
 DEFAULT_AUTO_FIELD = "django.db.models.AutoField"
 
 # Password validation
@@ -198,6 +223,10 @@ MVS_GET_URL = f"{MVS_API_HOST}/check/"
 MVS_LP_FILE_URL = f"{MVS_API_HOST}/get_lp_file/"
 MVS_SA_POST_URL = f"{MVS_API_HOST}/sendjson/openplan/sensitivity-analysis"
 MVS_SA_GET_URL = f"{MVS_API_HOST}/check-sensitivity-analysis/"
+# Maximum number of the scenarios of a simulation batch which are simulated by the MVS at the same time
+SIMULATION_BATCH_CONCURRENCY = int(os.getenv("SIMULATION_BATCH_CONCURRENCY", "4"))
+# Number of times a scenario of a simulation batch is sent to an unreachable MVS before it is marked as failed
+SIMULATION_BATCH_SUBMISSION_ATTEMPTS = int(os.getenv("SIMULATION_BATCH_SUBMISSION_ATTEMPTS", "5"))
 
 # Allow iframes to show in page
 X_FRAME_OPTIONS = "SAMEORIGIN"
@@ -206,6 +235,28 @@ X_FRAME_OPTIONS = "SAMEORIGIN"
 EXCHANGE_RATES_API_TOKEN = os.getenv("EXCHANGE_RATES_API_TOKEN")
 EXCHANGE_RATES_URL = f"https://v6.exchangerate-api.com/v6/{EXCHANGE_RATES_API_TOKEN}/latest/USD"
 
+# Renewables profiles providers, tried in the given order. Available are "renewables_ninja" (remote API), "local"
+# (precomputed profiles in RENEWABLES_DATA_DIR) and "clear_sky" (synthetic PV profile, i.e. to run offline)
+RN_API_TOKEN = os.getenv("RN_API_TOKEN")
+RENEWABLES_PROVIDERS = os.getenv("RENEWABLES_PROVIDERS", "renewables_ninja,local").split(",")
+RENEWABLES_DATA_DIR = os.getenv("RENEWABLES_DATA_DIR", os.path.join(BASE_DIR, "renewables_data"))
+RENEWABLES_API_TIMEOUT = float(os.getenv("RENEWABLES_API_TIMEOUT", "30"))
+
+# Providers resolving the state of a community, tried in the given order. Available are "nominatim" (remote reverse
+# geocoding) and "nearest_capital" (offline approximation), resolved locations are stored in the database
+REGION_PROVIDERS = os.getenv("REGION_PROVIDERS", "nominatim,nearest_capital").split(",")
+GEOCODING_TIMEOUT = float(os.getenv("GEOCODING_TIMEOUT", "5"))
+
+# Directory of the lock files coordinating the fetches of external data between the workers of a host, only used when
+# the database is not postgres (which provides advisory locks shared by all the workers), see projects/single_flight.py
+SINGLE_FLIGHT_LOCK_DIR = os.getenv("SINGLE_FLIGHT_LOCK_DIR", os.path.join(tempfile.gettempdir(), "epa-single-flight"))
+
+# Profiling of the views and Django-Q tasks (wall and SQL time, repeated queries, outbound calls), see
+# projects/profiling.py. The records are kept in memory per process unless PROFILING_STORE is the path of a sqlite file
+PROFILING_ENABLED = ast.literal_eval(os.getenv("PROFILING_ENABLED", "False"))
+PROFILING_STORE = os.getenv("PROFILING_STORE", "")
+PROFILING_BUFFER_SIZE = int(os.getenv("PROFILING_BUFFER_SIZE", "1000"))
+
 import sys
 
 LOGGING = {
@@ -18,10 +18,11 @@ from django.conf.urls.i18n import i18n_patterns
 from django.urls import path, re_path, include
 from django.contrib.staticfiles.urls import staticfiles_urlpatterns
 
-from .views import imprint, privacy, about, license
+from .views import imprint, privacy, about, license, profiling_report
 
 urlpatterns = (
     i18n_patterns(
+        path("admin/profiling/", admin.site.admin_view(profiling_report), name="profiling_report"),
         path("admin/", admin.site.urls),
         path("users/", include("django.contrib.auth.urls")),
         path("users/", include("users.urls")),
@@ -1,6 +1,9 @@
+from django.conf import settings
+from django.contrib import admin
 from django.shortcuts import render
 from django.views.decorators.http import require_http_methods
 import logging
+from projects.profiling import get_store, rank_endpoints
 from projects.services import excuses_design_under_development
 
 logger = logging.getLogger(__name__)
@@ -24,3 +27,25 @@ def about(request):
 @require_http_methods(["GET"])
 def license(request):
     return render(request, "legal/license.html")
+
+
+PROFILING_ORDERS = ("total_time", "mean_time", "max_time", "mean_queries", "duplicate_queries")
+
+
+@require_http_methods(["GET"])
+def profiling_report(request):
+    """Rank the views and tasks recorded by projects.profiling, the url is restricted to staff by the admin site"""
+    order_by = request.GET.get("order_by")
+    if order_by not in PROFILING_ORDERS:
+        order_by = PROFILING_ORDERS[0]
+    records = get_store().all()
+    context = {
+        **admin.site.each_context(request),
+        "title": "Profiling",
+        "profiling_enabled": settings.PROFILING_ENABLED,
+        "n_records": len(records),
+        "orders": PROFILING_ORDERS,
+        "order_by": order_by,
+        "ranking": rank_endpoints(records, order_by=order_by),
+    }
+    return render(request, "admin/profiling.html", context)
@@ -0,0 +1,25 @@
+r"""Gunicorn configuration, the server mode is chosen with the WEB_SERVER_MODE environment variable
+
+- "wsgi" (default): sync workers serving epa.wsgi, each worker handles one request at a time
+- "asgi": uvicorn workers serving epa.asgi, the async views (MVS status polling, renewables.ninja and Nominatim
+  requests) then wait for the upstream services without blocking the worker
+
+    gunicorn --config gunicorn.conf.py
+"""
+
+import os
+
+WEB_SERVER_MODE = os.environ.get("WEB_SERVER_MODE", "wsgi").lower()
+if WEB_SERVER_MODE not in ("wsgi", "asgi"):
+    raise ValueError(f"WEB_SERVER_MODE should be 'wsgi' or 'asgi', not '{WEB_SERVER_MODE}'")
+
+bind = os.environ.get("GUNICORN_BIND", "0.0.0.0:8000")
+workers = int(os.environ.get("GUNICORN_WORKERS", 2))
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 30))
+
+if WEB_SERVER_MODE == "asgi":
+    wsgi_app = "epa.asgi:application"
+    worker_class = "uvicorn_worker.UvicornWorker"
+else:
+    wsgi_app = "epa.wsgi:application"
+    worker_class = "sync"
@@ -4,4 +4,5 @@ python manage.py makemigrations users projects dashboard && \
 python manage.py migrate && \
 python manage.py loaddata 'fixtures/fixture.json' && \
 python manage.py collectstatic --no-input && \
+python manage.py compile_parameter_registry && \
 echo 'Completed initial setup of WEFEgui app successfully!!'
@@ -1,5 +1,6 @@
 #!/usr/local/bin/python
 echo yes | python manage.py collectstatic && \
+python manage.py compile_parameter_registry && \
 python manage.py compilemessages
 python manage.py makemigrations users projects dashboard wefe && \
 python manage.py migrate && \
@@ -1,5 +1,37 @@
+import os
+
 from django.apps import AppConfig
+from django.conf import settings
+from django.db import connections
+
+# connections and pools inherited from the parent process, referenced so that they are never garbage collected
+_inherited = []
+
+
+def forget_inherited_connections():
+    """Discard the database connections and pools inherited by a forked process (i.e. the qcluster workers)
+
+    They are not closed, which would terminate the sessions still used by the parent process, the child opens its own
+    connections on its first query.
+    """
+    for connection in connections.all(initialized_only=True):
+        if connection.connection is not None:
+            _inherited.append(connection.connection)
+            connection.connection = None
+        pools = getattr(connection, "_connection_pools", None)
+        if pools:
+            _inherited.extend(pools.values())
+            pools.clear()
 
 
 class ProjectsConfig(AppConfig):
     name = "projects"
+
+    def ready(self):
+        if settings.PROFILING_ENABLED is True:
+            from projects.profiling import connect_task_signals
+
+            connect_task_signals()
+        # the qcluster workers are forked, os.register_at_fork() does not exist where fork does not (Windows)
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=forget_inherited_connections)
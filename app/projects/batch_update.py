@@ -0,0 +1,171 @@
+r"""Chunked and resumable rewrite of the columns of a model, for the update_* management commands.
+
+A ColumnMigration reads the primary key and the value of one column with iterator() (a server-side cursor on
+postgres), hands the rows to its transform function one chunk at a time and writes the changed values back with
+bulk_update, one transaction per chunk. After each chunk the last primary key is stored in a Checkpoint file, so that
+an interrupted migration resumes where it stopped instead of starting over. The new values of a payload field are
+interned and only their digest is written.
+
+    migration = ColumnMigration("energy_price", Asset.objects.filter(energy_price__isnull=False), "energy_price", fn)
+    report = migration.run(checkpoint=Checkpoint(".update_asset_input_timeseries.json"))
+"""
+
+import json
+import logging
+import os
+import time
+from dataclasses import dataclass, field
+
+from django.db import transaction
+from django.db.models import Case, Value, When
+
+from projects.models.payloads import PayloadFieldMixin, TimeseriesPayload
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_SIZE = 2000
+
+
+class Checkpoint:
+    """Last primary key processed by each migration, stored in a json file"""
+
+    def __init__(self, path):
+        self.path = path
+        self.positions = {}
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as fp:
+                self.positions = json.load(fp)
+
+    def get(self, name):
+        return self.positions.get(name)
+
+    def save(self, name, pk):
+        self.positions[name] = pk
+        # the file is replaced atomically, an interruption cannot leave it half written
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as fp:
+            json.dump(self.positions, fp)
+        os.replace(tmp_path, self.path)
+
+    def clear(self):
+        self.positions = {}
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+@dataclass
+class MigrationReport:
+    name: str
+    rows: int = 0
+    updated: int = 0
+    elapsed: float = 0.0
+    # primary keys of the rows which could not be migrated
+    problems: list = field(default_factory=list)
+    resumed_after: object = None
+
+    @property
+    def throughput(self):
+        """Rows processed per second"""
+        return self.rows / self.elapsed if self.elapsed > 0 else 0.0
+
+    def __str__(self):
+        resumed = f" (resumed after pk {self.resumed_after})" if self.resumed_after is not None else ""
+        return (
+            f"{self.name}: {self.rows} rows read, {self.updated} updated, {len(self.problems)} problems in "
+            f"{self.elapsed:.2f}s ({self.throughput:.0f} rows/s){resumed}"
+        )
+
+
+@dataclass
+class ColumnMigration:
+    """Rewrite the values of a column of the queryset's model
+
+    transform receives the list of (pk, value) of a chunk and returns a dict mapping the pk of the rows to update to
+    their new value, and the list of the pk of the rows which could not be migrated. The values are read from source
+    (a field name or an expression) if given, otherwise from the field itself.
+    """
+
+    name: str
+    queryset: object
+    field: str
+    transform: callable
+    source: object = None
+
+    def chunks(self, chunk_size, after=None):
+        qs = self.queryset.order_by("pk")
+        if after is not None:
+            qs = qs.filter(pk__gt=after)
+        chunk = []
+        for row in qs.values_list("pk", self.source or self.field).iterator(chunk_size=chunk_size):
+            chunk.append(row)
+            if len(chunk) == chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+    def write(self, updates, batch_size):
+        model = self.queryset.model
+        field = model._meta.get_field(self.field)
+        if isinstance(field, PayloadFieldMixin):
+            # writing the column would take precedence over the payloads
+            digests = TimeseriesPayload.intern_many([field.to_payload(value) for value in updates.values()])
+            model.objects.filter(pk__in=updates).update(
+                **{
+                    field.attname: Value(field.stored_empty_value, output_field=field),
+                    field.get_payload_field().attname: Case(
+                        *[When(pk=pk, then=Value(digest)) for pk, digest in zip(updates, digests)]
+                    ),
+                }
+            )
+            return
+        model.objects.bulk_update(
+            [model(pk=pk, **{self.field: value}) for pk, value in updates.items()], [self.field], batch_size=batch_size
+        )
+
+    def run(self, chunk_size=DEFAULT_CHUNK_SIZE, checkpoint=None, dry_run=False):
+        """Migrate the column and return a MigrationReport, nothing is written nor checkpointed if dry_run is True"""
+        after = checkpoint.get(self.name) if checkpoint is not None else None
+        report = MigrationReport(name=self.name, resumed_after=after)
+        start = time.perf_counter()
+        for chunk in self.chunks(chunk_size, after=after):
+            updates, problems = self.transform(chunk)
+            report.rows += len(chunk)
+            report.updated += len(updates)
+            report.problems.extend(problems)
+            if dry_run is True:
+                continue
+            if updates:
+                with transaction.atomic():
+                    self.write(updates, chunk_size)
+            if checkpoint is not None:
+                checkpoint.save(self.name, chunk[-1][0])
+            logger.debug(f"{self.name}: migrated the rows up to pk {chunk[-1][0]}")
+        report.elapsed = time.perf_counter() - start
+        return report
+
+
+def _decode_json_rows(chunk):
+    decoded, problems = [], []
+    for pk, value in chunk:
+        try:
+            decoded.append((pk, json.loads(value)))
+        except json.JSONDecodeError:
+            problems.append(pk)
+    return decoded, problems
+
+
+def decode_json_chunk(chunk):
+    """Decode the json values of a chunk of (pk, value) with a single parser call
+
+    Return the list of (pk, decoded value) and the pk of the values which are not valid json
+    """
+    try:
+        values = json.loads("[" + ",".join(value for _, value in chunk) + "]")
+    except json.JSONDecodeError:
+        # decode the rows one by one to find the invalid ones
+        return _decode_json_rows(chunk)
+    if len(values) != len(chunk):
+        # a value which is not valid json on its own (i.e. "1, 2" or "") shifted the other ones
+        return _decode_json_rows(chunk)
+    return [(pk, value) for (pk, _), value in zip(chunk, values)], []
@@ -407,6 +407,8 @@ DONE = "DONE"
 PENDING = "PENDING"
 ERROR = "ERROR"
 MODIFIED = "MODIFIED"
+# scenario of a simulation batch which was not submitted to the MVS yet
+QUEUED = "QUEUED"
 
 SIMULATION_STATUS = (
     (ERROR, ERROR),
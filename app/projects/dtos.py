@@ -260,15 +260,58 @@ class MVSRequestDto:
 
 
 # Function to serialize scenario topology models to JSON
-def convert_to_dto(scenario: Scenario, testing: bool = False):
+def value_type_units():
+    """Return the unit of each value type, to be passed to to_value_type() and to_timeseries_data()"""
+    return dict(ValueType.objects.values_list("type", "unit"))
+
+
+def scenario_connections(scenario: Scenario):
+    """Return the connection links of the scenario grouped by asset and flow direction and by bus, ordered by id"""
+    links = (
+        ConnectionLink.objects.filter(Q(asset__scenario=scenario) | Q(bus__scenario=scenario))
+        .select_related("bus", "asset")
+        .order_by("pk")
+    )
+    by_asset = {}
+    by_bus = {}
+    for link in links:
+        by_asset.setdefault((link.asset_id, link.flow_direction), []).append(link)
+        by_bus.setdefault(link.bus_id, []).append(link)
+    return by_asset, by_bus
+
+
+def get_link(links, bus_type=None):
+    """Return the single link (of a bus of the given type) as QuerySet.get() would"""
+    matches = [link for link in links if bus_type is None or link.bus.type == bus_type]
+    if len(matches) == 0:
+        raise ConnectionLink.DoesNotExist("ConnectionLink matching query does not exist.")
+    if len(matches) > 1:
+        raise ConnectionLink.MultipleObjectsReturned(f"get() returned {len(matches)} ConnectionLink")
+    return matches[0]
+
+
+def convert_to_dto(scenario: Scenario, testing: bool = False, units: dict = None):
+    """Convert the scenario to the MVS request dto
+
+    The scenario's assets, their types and connection links are loaded in bulk, the units of the value types are
+    loaded once, or given by units (see value_type_units()) when converting several scenarios.
+    """
+    if units is None:
+        units = value_type_units()
     # Retrieve models
     project = Project.objects.get(scenario=scenario)
     economic_data = EconomicData.objects.get(project=project)
-    ess_list = Asset.objects.filter(Q(scenario=scenario), Q(asset_type__asset_type__contains="ess"))
+    ess_list = Asset.objects.filter(Q(scenario=scenario), Q(asset_type__asset_type__contains="ess")).select_related(
+        "asset_type"
+    )
     # Exclude ESS related assets
-    asset_list = Asset.objects.filter(Q(scenario=scenario)).exclude(
-        Q(asset_type__asset_type__contains="ess") | Q(parent_asset__asset_type__asset_type__contains="ess")
+    asset_list = (
+        Asset.objects.filter(Q(scenario=scenario))
+        .exclude(Q(asset_type__asset_type__contains="ess") | Q(parent_asset__asset_type__asset_type__contains="ess"))
+        .select_related("asset_type")
+        .with_payload()
     )
+    links_by_asset, links_by_bus = scenario_connections(scenario)
     bus_list = Bus.objects.filter(scenario=scenario).exclude(
         Q(connectionlink__asset__parent_asset__asset_type__asset_type__contains="ess")
     )
@@ -294,14 +337,14 @@ def convert_to_dto(scenario: Scenario, testing: bool = False):
 
     economic_data_dto = EconomicDataDto(
         economic_data.currency,
-        to_value_type(economic_data, "duration"),
+        to_value_type(economic_data, "duration", units),
         # to_value_type(economic_data, 'annuity_factor'),
-        to_value_type(economic_data, "discount"),
-        to_value_type(economic_data, "tax"),
+        to_value_type(economic_data, "discount", units),
+        to_value_type(economic_data, "tax", units),
         # to_value_type(economic_data, 'crf'),
     )
 
-    evaluated_period = to_value_type(scenario, "evaluated_period")
+    evaluated_period = to_value_type(scenario, "evaluated_period", units)
     # For testing purposes the number of simulated days is restricted to 3 or less
     if testing is True and evaluated_period.value > 3:
         evaluated_period.value = 3
@@ -327,14 +370,14 @@ def convert_to_dto(scenario: Scenario, testing: bool = False):
     # Iterate over ess_assets
     for ess in ess_list:
         # Find all connections to ess
-        input_connection = ConnectionLink.objects.filter(asset=ess, flow_direction="B2A").first()
-        output_connection = ConnectionLink.objects.filter(asset=ess, flow_direction="A2B").first()
+        input_connection = links_by_asset.get((ess.id, "B2A"), [None])[0]
+        output_connection = links_by_asset.get((ess.id, "A2B"), [None])[0]
 
         inflow_direction = input_connection.bus.name if input_connection is not None else None
         outflow_direction = output_connection.bus.name if output_connection is not None else None
         ess_sub_assets = {}
 
-        for asset in Asset.objects.filter(parent_asset=ess):
+        for asset in Asset.objects.filter(parent_asset=ess).select_related("asset_type").with_payload():
             if asset.asset_type.asset_type == "capacity":
                 # This is the loss_rate in oemof
                 # As we take the efficiency provided by the user to be the roundtrip efficiency
@@ -342,7 +385,7 @@ def convert_to_dto(scenario: Scenario, testing: bool = False):
                 # assigned to inflow_conversion_factor and outflow_conversion_factor parameters of
                 # solph.components.GenericStorage and we fix the loss_rate to 1
                 asset.efficiency = 1
-            efficiency = to_value_type(asset, "efficiency")
+            efficiency = to_value_type(asset, "efficiency", units)
 
             asset_dto = AssetDto(
                 asset.asset_type.asset_type,
@@ -353,33 +396,33 @@ def convert_to_dto(scenario: Scenario, testing: bool = False):
                 None,
                 None,
                 asset.dispatchable,
-                to_value_type(asset, "age_installed"),
-                to_value_type(asset, "crate"),
-                to_value_type(asset, "soc_max"),
-                to_value_type(asset, "soc_min"),
-                to_value_type(asset, "capex_fix"),
-                to_value_type(asset, "opex_var"),
+                to_value_type(asset, "age_installed", units),
+                to_value_type(asset, "crate", units),
+                to_value_type(asset, "soc_max", units),
+                to_value_type(asset, "soc_min", units),
+                to_value_type(asset, "capex_fix", units),
+                to_value_type(asset, "opex_var", units),
                 efficiency,
-                to_value_type(asset, "installed_capacity"),
-                to_value_type(asset, "lifetime"),
-                to_value_type(asset, "maximum_capacity"),
-                to_value_type(asset, "energy_price"),
-                to_value_type(asset, "feedin_tariff"),
-                to_value_type(asset, "feedin_cap"),
-                to_value_type(asset, "optimize_cap"),
-                to_value_type(asset, "peak_demand_pricing"),
-                to_value_type(asset, "peak_demand_pricing_period"),
-                to_value_type(asset, "renewable_share"),
-                to_value_type(asset, "renewable_asset"),
-                to_value_type(asset, "capex_var"),
-                to_value_type(asset, "opex_fix"),
-                to_timeseries_data(asset, "input_timeseries"),
+                to_value_type(asset, "installed_capacity", units),
+                to_value_type(asset, "lifetime", units),
+                to_value_type(asset, "maximum_capacity", units),
+                to_value_type(asset, "energy_price", units),
+                to_value_type(asset, "feedin_tariff", units),
+                to_value_type(asset, "feedin_cap", units),
+                to_value_type(asset, "optimize_cap", units),
+                to_value_type(asset, "peak_demand_pricing", units),
+                to_value_type(asset, "peak_demand_pricing_period", units),
+                to_value_type(asset, "renewable_share", units),
+                to_value_type(asset, "renewable_asset", units),
+                to_value_type(asset, "capex_var", units),
+                to_value_type(asset, "opex_fix", units),
+                to_timeseries_data(asset, "input_timeseries", units),
                 asset.asset_type.unit,
             )
             if ess.asset_type.asset_type == "hess" and asset.asset_type.asset_type == "capacity":
-                asset_dto.thermal_loss_rate = to_value_type(asset, "thermal_loss_rate")
-                asset_dto.fixed_thermal_losses_relative = to_value_type(asset, "fixed_thermal_losses_relative")
-                fixed_thermal_losses_absolute = to_value_type(asset, "fixed_thermal_losses_absolute")
+                asset_dto.thermal_loss_rate = to_value_type(asset, "thermal_loss_rate", units)
+                asset_dto.fixed_thermal_losses_relative = to_value_type(asset, "fixed_thermal_losses_relative", units)
+                fixed_thermal_losses_absolute = to_value_type(asset, "fixed_thermal_losses_absolute", units)
                 fixed_thermal_losses_absolute.value = float(fixed_thermal_losses_absolute.value)
                 asset_dto.fixed_thermal_losses_absolute = fixed_thermal_losses_absolute
                 efficiency = asset_dto.efficiency.value
@@ -403,36 +446,36 @@ def convert_to_dto(scenario: Scenario, testing: bool = False):
     # Iterate over assets
     for asset in asset_list:
         # Find all connections to asset
-        input_connection = ConnectionLink.objects.filter(asset=asset, flow_direction="B2A")
-        output_connection = ConnectionLink.objects.filter(asset=asset, flow_direction="A2B")
+        input_connection = links_by_asset.get((asset.id, "B2A"), [])
+        output_connection = links_by_asset.get((asset.id, "A2B"), [])
 
         inflow_direction = None
-        num_inputs = input_connection.count()
+        num_inputs = len(input_connection)
         if num_inputs == 1:
-            inflow_direction = input_connection.first().bus.name
+            inflow_direction = input_connection[0].bus.name
         elif num_inputs > 1:
-            inflow_direction = [n for n in input_connection.values_list("bus__name", flat=True)]
+            inflow_direction = [link.bus.name for link in input_connection]
 
         outflow_direction = None
-        num_outputs = output_connection.count()
+        num_outputs = len(output_connection)
         if num_outputs == 1:
-            outflow_direction = output_connection.first().bus.name
+            outflow_direction = output_connection[0].bus.name
         elif num_outputs > 1:
-            outflow_direction = [n for n in output_connection.values_list("bus__name", flat=True)]
+            outflow_direction = [link.bus.name for link in output_connection]
 
-        asset_efficiency = to_value_type(asset, "efficiency")
+        asset_efficiency = to_value_type(asset, "efficiency", units)
 
         optional_parameters = {}
         if asset.asset_type.asset_type in ("chp", "chp_fixed_ratio"):
             if asset.asset_type.asset_type == "chp":
-                optional_parameters["beta"] = to_value_type(asset, "thermal_loss_rate")
+                optional_parameters["beta"] = to_value_type(asset, "thermal_loss_rate", units)
 
             # for chp it corresponds to efficiency_el_wo_heat_extraction
             e_el = asset_efficiency.value
             # for chp it corresponds to efficiency_th_max_heat_extraction
-            e_th = to_value_type(asset, "efficiency_multiple").value
+            e_th = to_value_type(asset, "efficiency_multiple", units).value
 
-            output_mapping = [ev for ev in output_connection.values_list("bus__type", flat=True)]
+            output_mapping = [link.bus.type for link in output_connection]
 
             efficiencies = []
             outflow_direction = []
@@ -440,7 +483,7 @@ def convert_to_dto(scenario: Scenario, testing: bool = False):
             for energy_vector in ["Electricity", "Heat"]:
                 if energy_vector in output_mapping:
                     # TODO get the case where get fails --> projects.models.base_models.ConnectionLink.DoesNotExist: ConnectionLink matching query does not exist
-                    outflow_direction.append(output_connection.get(bus__type=energy_vector).bus.name)
+                    outflow_direction.append(get_link(output_connection, bus_type=energy_vector).bus.name)
 
                     efficiency = e_el if energy_vector == "Electricity" else e_th
 
@@ -456,7 +499,7 @@ def convert_to_dto(scenario: Scenario, testing: bool = False):
 
         if asset.asset_type.asset_type == "heat_pump":
             cop = asset_efficiency.value
-            input_mapping = [ev for ev in input_connection.values_list("bus__type", flat=True)]
+            input_mapping = [link.bus.type for link in input_connection]
 
             efficiencies = []
             inflow_direction = []
@@ -468,13 +511,13 @@ def convert_to_dto(scenario: Scenario, testing: bool = False):
                     efficiency = np.array(cop).tolist()
                 else:
                     efficiency = cop
-                inflow_direction.append(input_connection.get().bus.name)
+                inflow_direction.append(get_link(input_connection).bus.name)
                 efficiencies.append(efficiency)
             else:
                 for energy_vector in ["Electricity", "Heat"]:
                     if energy_vector in input_mapping:
                         # TODO get the case where get fails
-                        inflow_direction.append(input_connection.get(bus__type=energy_vector).bus.name)
+                        inflow_direction.append(get_link(input_connection, bus_type=energy_vector).bus.name)
                         if isinstance(cop, list):
                             efficiency = (
                                 (1 / np.array(cop)).tolist()
@@ -497,8 +540,8 @@ def convert_to_dto(scenario: Scenario, testing: bool = False):
                 inflow_direction = inflow_direction[0]
 
             asset_efficiency.value = efficiencies
-        dso_energy_price = to_value_type(asset, "energy_price")
-        dso_feedin_tariff = to_value_type(asset, "feedin_tariff")
+        dso_energy_price = to_value_type(asset, "energy_price", units)
+        dso_feedin_tariff = to_value_type(asset, "feedin_tariff", units)
         if "dso" in asset.asset_type.asset_type:
             dso_energy_price.value = json.loads(dso_energy_price.value)
             dso_feedin_tariff.value = json.loads(dso_feedin_tariff.value)
@@ -512,29 +555,29 @@ def convert_to_dto(scenario: Scenario, testing: bool = False):
             inflow_direction,
             outflow_direction,
             asset.dispatchable,
-            to_value_type(asset, "age_installed"),
-            to_value_type(asset, "crate"),
-            to_value_type(asset, "soc_max"),
-            to_value_type(asset, "soc_min"),
-            to_value_type(asset, "capex_fix"),
-            to_value_type(asset, "opex_var"),
+            to_value_type(asset, "age_installed", units),
+            to_value_type(asset, "crate", units),
+            to_value_type(asset, "soc_max", units),
+            to_value_type(asset, "soc_min", units),
+            to_value_type(asset, "capex_fix", units),
+            to_value_type(asset, "opex_var", units),
             asset_efficiency,
-            to_value_type(asset, "installed_capacity"),
-            to_value_type(asset, "lifetime"),
-            to_value_type(asset, "maximum_capacity"),
+            to_value_type(asset, "installed_capacity", units),
+            to_value_type(asset, "lifetime", units),
+            to_value_type(asset, "maximum_capacity", units),
             dso_energy_price,
             dso_feedin_tariff,
-            to_value_type(asset, "feedin_cap"),
-            to_value_type(asset, "optimize_cap"),
-            to_value_type(asset, "peak_demand_pricing"),
-            to_value_type(asset, "peak_demand_pricing_period"),
-            to_value_type(asset, "renewable_share"),
-            to_value_type(asset, "renewable_asset"),
-            to_value_type(asset, "capex_var"),
-            to_value_type(asset, "opex_fix"),
-            to_timeseries_data(asset, "input_timeseries"),
+            to_value_type(asset, "feedin_cap", units),
+            to_value_type(asset, "optimize_cap", units),
+            to_value_type(asset, "peak_demand_pricing", units),
+            to_value_type(asset, "peak_demand_pricing_period", units),
+            to_value_type(asset, "renewable_share", units),
+            to_value_type(asset, "renewable_asset", units),
+            to_value_type(asset, "capex_var", units),
+            to_value_type(asset, "opex_fix", units),
+            to_timeseries_data(asset, "input_timeseries", units),
             asset.asset_type.unit,
-            **optional_parameters
+            **optional_parameters,
         )
 
         # set maximum capacity to None if it is equal to 0
@@ -568,7 +611,7 @@ def convert_to_dto(scenario: Scenario, testing: bool = False):
     # Iterate over busses
     for bus in bus_list:
         # Find all connections with bus
-        connections_list = ConnectionLink.objects.filter(bus=bus)
+        connections_list = links_by_bus.get(bus.id, [])
 
         # Find all assets associated with the connections
         bus_asset_list = list(set([connection.asset.name for connection in connections_list]))
@@ -606,9 +649,15 @@ def map_to_dto(model_obj, dto_obj):
                 setattr(dto_obj, f.name, getattr(model_obj, f.name))
 
 
-def to_value_type(model_obj, field_name):
+def field_unit(field_name, units=None):
+    if units is not None:
+        return units.get(field_name)
     value_type = ValueType.objects.filter(type=field_name).first()
-    unit = value_type.unit if value_type is not None else None
+    return value_type.unit if value_type is not None else None
+
+
+def to_value_type(model_obj, field_name, units=None):
+    unit = field_unit(field_name, units)
     value = getattr(model_obj, field_name)
 
     if value is not None:
@@ -620,9 +669,8 @@ def to_value_type(model_obj, field_name):
         return None
 
 
-def to_timeseries_data(model_obj, field_name):
-    value_type = ValueType.objects.filter(type=field_name).first()
-    unit = value_type.unit if value_type is not None else None
+def to_timeseries_data(model_obj, field_name, units=None):
+    unit = field_unit(field_name, units)
     value_list = json.loads(getattr(model_obj, field_name)) if getattr(model_obj, field_name) is not None else None
     if value_list is not None:
         return TimeseriesDataDto(unit, value_list)
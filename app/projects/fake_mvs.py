@@ -0,0 +1,170 @@
+r"""Local stand-in of the MVS API, to run the simulation flows offline and in the tests.
+
+The server implements the two endpoints used by projects.requests, the submission of a payload (POST /sendjson/) and
+the status of a simulation (GET /check/<token>). A submitted simulation stays pending for the given number of status
+requests, then its results are synthetic flows of one unit per time step for the production and consumption assets
+of the payload. The scenarios whose id is in fail_scenarios end with an error. Every answer can be delayed by a given
+number of seconds to emulate a slow server.
+
+    with FakeMVSServer(checks_until_done=2) as server:
+        with override_settings(MVS_POST_URL=server.post_url, MVS_GET_URL=server.get_url, PROXY_CONFIG={}):
+            ...
+
+It can also be started on its own with the run_fake_mvs management command, and used with MVS_API_HOST.
+"""
+
+import json
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from projects.constants import DONE, ERROR, PENDING
+
+MVS_VERSION = "fake"
+# asset categories whose flows are synthesized, and the direction of their flows from the bus point of view
+FLOW_CATEGORIES = {"energy_providers": "in", "energy_production": "in", "energy_consumption": "out"}
+
+
+def fake_results(payload):
+    """Return the json dumped results of a simulation, in the format returned by the MVS"""
+    simulation_settings = payload.get("simulation_settings", {})
+    days = simulation_settings.get("evaluated_period", {}).get("value", 1)
+    time_step = simulation_settings.get("time_step", 60) or 60
+    n_timesteps = int(days * 24 * 60 / time_step)
+
+    columns = []
+    for category, direction in FLOW_CATEGORIES.items():
+        for asset in payload.get(category, []):
+            bus = asset.get("outflow_direction" if direction == "in" else "inflow_direction")
+            if isinstance(bus, list):
+                bus = bus[0]
+            columns.append(
+                [
+                    bus,
+                    asset.get("energy_vector", ""),
+                    direction,
+                    asset["label"],
+                    asset.get("asset_type", ""),
+                    asset.get("type_oemof", "source" if direction == "in" else "sink"),
+                ]
+            )
+    # the last row holds the optimized capacities
+    data = [[1.0] * len(columns) for _ in range(n_timesteps)] + [[0.0] * len(columns)]
+    raw_results = json.dumps({"columns": columns, "index": list(range(n_timesteps + 1)), "data": data})
+
+    results = {category: payload.get(category, []) for category in (*FLOW_CATEGORIES, "energy_conversion")}
+    results["energy_storage"] = payload.get("energy_storage", [])
+    results["kpi"] = {
+        "scalars": {"total_flow": float(n_timesteps * len(columns))},
+        "cost_matrix": {},
+    }
+    results["raw_results"] = raw_results
+    return json.dumps(results)
+
+
+class FakeMVSServer:
+    """Threaded HTTP server answering like the MVS API, on a free local port by default"""
+
+    def __init__(self, host="127.0.0.1", port=0, checks_until_done=1, fail_scenarios=(), delay=0):
+        self.checks_until_done = checks_until_done
+        self.delay = delay
+        self.fail_scenarios = set(fail_scenarios)
+        # token: {"payload", "checks"}
+        self.jobs = {}
+        self.submissions = 0
+        # number of simulations pending at the same time, and its maximum
+        self.running = 0
+        self.max_running = 0
+        self.lock = threading.Lock()
+        self.httpd = ThreadingHTTPServer((host, port), self.handler_class())
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def post_url(self):
+        return f"{self.url}/sendjson/"
+
+    @property
+    def get_url(self):
+        return f"{self.url}/check/"
+
+    def submit(self, payload):
+        token = str(uuid.uuid4())
+        with self.lock:
+            self.jobs[token] = {"payload": payload, "checks": 0}
+            self.submissions += 1
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+        return {"id": token, "status": PENDING, "mvs_version": MVS_VERSION, "server_info": "fake", "results": None}
+
+    def check(self, token):
+        with self.lock:
+            job = self.jobs.get(token)
+            if job is None:
+                return None
+            job["checks"] += 1
+            checks = job["checks"]
+            if checks == self.checks_until_done:
+                self.running -= 1
+        answer = {"id": token, "status": PENDING, "mvs_version": MVS_VERSION, "server_info": "fake", "results": None}
+        if checks < self.checks_until_done:
+            return answer
+        scenario_id = job["payload"].get("project_data", {}).get("scenario_id")
+        if scenario_id in self.fail_scenarios:
+            answer.update(status=ERROR, results={ERROR: f"The scenario {scenario_id} failed"})
+        else:
+            answer.update(status=DONE, results=fake_results(job["payload"]))
+        return answer
+
+    def handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def reply(self, status, body):
+                if server.delay:
+                    time.sleep(server.delay)
+                content = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(content)))
+                self.end_headers()
+                self.wfile.write(content)
+
+            def do_POST(self):
+                if self.path.rstrip("/") != "/sendjson":
+                    return self.reply(404, {"error": "not found"})
+                payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+                self.reply(200, server.submit(payload))
+
+            def do_GET(self):
+                answer = None
+                if self.path.startswith("/check/"):
+                    answer = server.check(self.path.rstrip("/").rsplit("/", 1)[-1])
+                if answer is None:
+                    return self.reply(404, {"error": "not found"})
+                self.reply(200, answer)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
@@ -1,10 +1,9 @@
-import pickle
-import os
 import json
 import io
 import csv
-from openpyxl import load_workbook
 import numpy as np
+from collections import namedtuple
+from types import MappingProxyType
 
 from crispy_forms.bootstrap import AppendedText, PrependedText, FormActions
 from crispy_forms.helper import FormHelper
@@ -21,8 +20,8 @@ from django import forms
 from django.forms import ModelForm
 from django.core.exceptions import ValidationError
 from django.core.validators import MaxValueValidator, MinValueValidator
-from django.utils.translation import gettext_lazy as _
-from django.conf import settings as django_settings
+from django.utils.functional import cached_property
+from django.utils.translation import get_language, gettext_lazy as _
 from projects.models import *
 from projects.constants import MAP_EPA_MVS, RENEWABLE_ASSETS, CURRENCY_SYMBOLS, ENERGY_DENSITY_DIESEL
 
@@ -35,30 +34,16 @@ from projects.helpers import (
 )
 
 
-def gettext_variables(some_string, lang="de"):
-    """Save some expressions to be translated to a temporary file
-    Because django makemessages cannot detect gettext with variables
-    """
-
-    some_string = str(some_string)
-
-    trans_file = os.path.join(django_settings.STATIC_ROOT, f"personal_translation_{lang}.pickle")
-
-    if os.path.exists(trans_file):
-        with open(trans_file, "rb") as handle:
-            trans_dict = pickle.load(handle)
-    else:
-        trans_dict = {}
-
-    if some_string is not None:
-        if some_string not in trans_dict:
-            trans_dict[some_string] = ""
-
-        with open(trans_file, "wb") as handle:
-            pickle.dump(trans_dict, handle, protocol=pickle.HIGHEST_PROTOCOL)
+# label, help text and initial value of a form field, as given by the parameters registry
+FieldInfo = namedtuple("FieldInfo", ["label", "help_text", "initial"])
+# FieldInfo of the base fields of each form class, parameters registry and language, see form_field_info()
+_FORM_FIELD_INFO = {}
+# labels and help texts of the fields of the asset forms, see AssetCreateForm.field_labels()
+_ASSET_FIELD_LABELS = {}
 
 
-def set_parameter_info(param_name, field, parameters=PARAMETERS):
+def parameter_field_info(param_name, label, parameters=PARAMETERS):
+    """Return the FieldInfo of the parameter param_name, label being the default label of the field"""
     # For the storage unit
     if param_name.split("_")[0] in ("cp", "dchp", "chp"):
         param_name = "_".join(param_name.split("_")[1:])
@@ -87,17 +72,50 @@ def set_parameter_info(param_name, field, parameters=PARAMETERS):
         # print(f"{param_name} not in the parameters file")
 
     if verbose is not None:
-        field.label = verbose
+        label = verbose
     if unit is not None:
-        field.label = _(str(field.label)) + " (" + _(unit) + ")"
+        label = _(str(label)) + " (" + _(unit) + ")"
     else:
-        field.label = _(str(field.label))
+        label = _(str(label))
 
     if help_text is not None:
-        field.help_text = _(help_text)
+        help_text = _(help_text)
+
+    return FieldInfo(label, help_text, default_value)
+
+
+def apply_field_info(field, info):
+    field.label = info.label
+    if info.help_text is not None:
+        field.help_text = info.help_text
+    if info.initial is not None:
+        field.initial = info.initial
+
+
+def set_parameter_info(param_name, field, parameters=PARAMETERS):
+    apply_field_info(field, parameter_field_info(param_name, field.label, parameters))
 
-    if default_value is not None:
-        field.initial = default_value
+
+def form_field_info(form_class, parameters=PARAMETERS):
+    """Return the FieldInfo of the base fields of a form class in the active language
+
+    They are compiled on first use and kept in memory, the translations of the parameters registry are collected
+    offline by the collect_parameter_strings command.
+    """
+    key = (form_class, id(parameters), get_language())
+    if key not in _FORM_FIELD_INFO:
+        field_info = {
+            name: parameter_field_info(name, field.label, parameters) for name, field in form_class.base_fields.items()
+        }
+        # the parameters are kept so that their id is not reused while they are a key of the cache
+        _FORM_FIELD_INFO[key] = (parameters, MappingProxyType(field_info))
+    return _FORM_FIELD_INFO[key][1]
+
+
+def apply_form_field_info(form, parameters=PARAMETERS):
+    for fieldname, info in form_field_info(type(form), parameters).items():
+        if fieldname in form.fields:
+            apply_field_info(form.fields[fieldname], info)
 
 
 class OpenPlanModelForm(ModelForm):
@@ -105,8 +123,7 @@ class OpenPlanModelForm(ModelForm):
 
     def __init__(self, *args, **kwargs):
         super(OpenPlanModelForm, self).__init__(*args, **kwargs)
-        for fieldname, field in self.fields.items():
-            set_parameter_info(fieldname, field)
+        apply_form_field_info(self)
 
 
 class OpenPlanForm(forms.Form):
@@ -114,8 +131,7 @@ class OpenPlanForm(forms.Form):
 
     def __init__(self, *args, **kwargs):
         super(OpenPlanForm, self).__init__(*args, **kwargs)
-        for fieldname, field in self.fields.items():
-            set_parameter_info(fieldname, field)
+        apply_form_field_info(self)
 
 
 class FeedbackForm(ModelForm):
@@ -637,7 +653,7 @@ class AssetCreateForm(OpenPlanModelForm):
     def __init__(self, *args, **kwargs):
         self.asset_type_name = kwargs.pop("asset_type", None)
         proj_id = kwargs.pop("proj_id", None)
-        scenario_id = kwargs.pop("scenario_id", None)
+        self.scenario_id = kwargs.pop("scenario_id", None)
         view_only = kwargs.pop("view_only", False)
         self.existing_asset = kwargs.get("instance", None)
         # get the connections with busses
@@ -652,23 +668,19 @@ class AssetCreateForm(OpenPlanModelForm):
         asset_type = AssetType.objects.get(asset_type=self.asset_type_name)
         [self.fields.pop(field) for field in list(self.fields) if field not in asset_type.visible_fields]
 
-        self.timestamps = None
-        if self.existing_asset is not None:
-            self.timestamps = self.existing_asset.timestamps
-        elif scenario_id is not None:
-            qs = Scenario.objects.filter(id=scenario_id)
-            if qs.exists():
-                self.timestamps = qs.get().get_timestamps()
-                if proj_id is None:
-                    proj_id = qs.get().project.id
+        if proj_id is None and self.existing_asset is None and self.scenario_id is not None:
+            proj_id = Scenario.objects.filter(id=self.scenario_id).values_list("project_id", flat=True).first()
 
         currency = None
         if proj_id is not None:
-            qs = Project.objects.filter(id=proj_id)
-            if qs.exists():
-                currency = qs.values_list("economic_data__currency", flat=True).get()
-                currency = CURRENCY_SYMBOLS[currency]
-                self.exchange_rate = qs.values_list("economic_data__exchange_rate", flat=True).get()
+            economic_data = (
+                Project.objects.filter(id=proj_id)
+                .values_list("economic_data__currency", "economic_data__exchange_rate")
+                .first()
+            )
+            if economic_data is not None:
+                currency = CURRENCY_SYMBOLS[economic_data[0]]
+                self.exchange_rate = economic_data[1]
 
         self.fields["inputs"] = forms.CharField(widget=forms.HiddenInput(), required=False)
 
@@ -720,6 +732,7 @@ class AssetCreateForm(OpenPlanModelForm):
             the data to json.
             !! This addition doesn't affect the previous behavior !!
         """
+        field_labels = self.field_labels(asset_type)
         for field in self.fields:
             if field == "renewable_asset" and self.asset_type_name in RENEWABLE_ASSETS:
                 self.fields[field].initial = True
@@ -728,32 +741,12 @@ class AssetCreateForm(OpenPlanModelForm):
                 self.fields[field].required = self.is_input_timeseries_empty()
             if view_only is True:
                 self.fields[field].disabled = True
-            if self.fields[field].help_text is not None:
-                help_text = self.fields[field].help_text
-                self.fields[field].help_text = None
-            else:
-                help_text = ""
-            if self.fields[field].label is not None:
-                RTD_url = "https://open-plan-documentation.readthedocs.io/en/latest/model/input_parameters.html#"
-                if field in PARAMETERS:
-                    param_ref = PARAMETERS[field]["ref"]
-                else:
-                    param_ref = ""
-                if field != "name":
-                    question_icon = f'<a href="{RTD_url}{param_ref}"><span class="icon icon-question" data-bs-toggle="tooltip" title="{help_text}"></span></a>'
-                else:
-                    question_icon = ""
-                self.fields[field].label = self.fields[field].label + question_icon
-
-                if "capex_fix" in field:
-                    self.fields[field].label = (
-                        self.fields[field].label.replace("project", "").replace("Feste Projektkosten", "Fixkosten")
-                    )
-
-                if "€" in self.fields[field].label and currency is not None:
-                    self.fields[field].label = self.fields[field].label.replace("€", currency)
-                if ":unit:" in self.fields[field].label:
-                    self.fields[field].label = self.fields[field].label.replace(":unit:", asset_type.unit)
+            self.fields[field].help_text = None
+            label = field_labels[field]
+            if label is not None:
+                if "€" in label and currency is not None:
+                    label = label.replace("€", currency)
+                self.fields[field].label = label
 
         """ ----------------------------------------------------- """
 
@@ -802,6 +795,54 @@ class AssetCreateForm(OpenPlanModelForm):
 
                         self.initial[field] = round(self.initial[field], 2)
 
+    def field_labels(self, asset_type):
+        """Return the labels of the fields, with the question icon showing their help text, for the asset type in the
+        active language
+
+        They only depend on the asset type and are compiled for the first form of each asset type, the currency of
+        the project is set by the form.
+        """
+        key = (type(self), asset_type.asset_type, asset_type.unit, tuple(self.fields), get_language())
+        if key in _ASSET_FIELD_LABELS:
+            return _ASSET_FIELD_LABELS[key]
+
+        RTD_url = "https://open-plan-documentation.readthedocs.io/en/latest/model/input_parameters.html#"
+        labels = {}
+        for field in self.fields:
+            help_text = self.fields[field].help_text
+            if help_text is None:
+                help_text = ""
+            label = self.fields[field].label
+            if label is not None:
+                if field in PARAMETERS:
+                    param_ref = PARAMETERS[field]["ref"]
+                else:
+                    param_ref = ""
+                if field != "name":
+                    question_icon = f'<a href="{RTD_url}{param_ref}"><span class="icon icon-question" data-bs-toggle="tooltip" title="{help_text}"></span></a>'
+                else:
+                    question_icon = ""
+                label = label + question_icon
+
+                if "capex_fix" in field:
+                    label = label.replace("project", "").replace("Feste Projektkosten", "Fixkosten")
+                if ":unit:" in label:
+                    label = label.replace(":unit:", asset_type.unit)
+            labels[field] = label
+        _ASSET_FIELD_LABELS[key] = MappingProxyType(labels)
+        return _ASSET_FIELD_LABELS[key]
+
+    @cached_property
+    def timestamps(self):
+        """Timestamps of the scenario, only needed to validate the timeseries parameters"""
+        if self.existing_asset is not None:
+            return self.existing_asset.timestamps
+        if self.scenario_id is not None:
+            scenario = Scenario.objects.filter(id=self.scenario_id).first()
+            if scenario is not None:
+                return scenario.get_timestamps()
+        return None
+
     def is_input_timeseries_empty(self):
         if self.existing_asset is not None:
             return self.existing_asset.is_input_timeseries_empty()
@@ -1,9 +1,11 @@
+import hashlib
 import json
 import os
 import io
 import csv
-from openpyxl import load_workbook
+from functools import lru_cache
 from django import forms
+from django.conf import settings
 from django.contrib.staticfiles.storage import staticfiles_storage
 from django.core.exceptions import ValidationError
 from django.utils.translation import gettext_lazy as _
@@ -12,23 +14,27 @@ from projects.dtos import convert_to_dto
 from projects.models import Timeseries, AssetType
 from projects.constants import MAP_MVS_EPA
 from dashboard.helpers import KPIFinder
+from projects.registry import LazyRegistry, csv_rows
 
-PARAMETERS = {}
-if os.path.exists(staticfiles_storage.path("MVS_parameters_list.csv")) is True:
-    with open(staticfiles_storage.path("MVS_parameters_list.csv"), encoding="utf-8") as csvfile:
-        csvreader = csv.reader(csvfile, delimiter=",", quotechar='"')
-        for i, row in enumerate(csvreader):
-            if i == 0:
-                hdr = row
-                label_idx = hdr.index("label")
-            else:
-                label = row[label_idx]
-                label = MAP_MVS_EPA.get(label, label)
-                PARAMETERS[label] = {}
-                for k, v in zip(hdr, row):
-                    if k == "sensitivity_analysis":
-                        v = bool(int(v))
-                    PARAMETERS[label][k] = v
+
+def load_parameters():
+    parameters = {}
+    rows = csv_rows("MVS_parameters_list.csv")
+    if len(rows) > 0:
+        hdr = rows[0]
+        label_idx = hdr.index("label")
+        for row in rows[1:]:
+            label = row[label_idx]
+            label = MAP_MVS_EPA.get(label, label)
+            parameters[label] = {}
+            for k, v in zip(hdr, row):
+                if k == "sensitivity_analysis":
+                    v = bool(int(v))
+                parameters[label][k] = v
+    return parameters
+
+
+PARAMETERS = LazyRegistry(load_parameters, name="parameters")
 
 parameters_helper = KPIFinder(param_info_dict=PARAMETERS, unit_header=":Unit:")
 
@@ -47,8 +53,8 @@ def remove_empty_elements(d):
 
 
 # Helper to convert Scenario data to MVS importable json
-def format_scenario_for_mvs(scenario_to_convert, testing=False):
-    mvs_request_dto = convert_to_dto(scenario_to_convert, testing=testing)
+def format_scenario_for_mvs(scenario_to_convert, testing=False, units=None):
+    mvs_request_dto = convert_to_dto(scenario_to_convert, testing=testing, units=units)
     dumped_data = json.loads(json.dumps(mvs_request_dto.__dict__, default=lambda o: o.__dict__))
 
     # format the constraints in MVS format directly, thus avoiding the need to maintain MVS-EPA
@@ -62,6 +68,53 @@ def format_scenario_for_mvs(scenario_to_convert, testing=False):
     return remove_empty_elements(dumped_data)
 
 
+# the identifiers of the project, scenario and assets only label the simulation, they do not change its results
+SIMULATION_PAYLOAD_LABELS = ("project_id", "project_name", "scenario_id", "scenario_name", "unique_id")
+# lists of the simulation payload whose order does not matter to the MVS
+UNORDERED_PAYLOAD_LISTS = (
+    "energy_providers",
+    "energy_consumption",
+    "energy_conversion",
+    "energy_production",
+    "energy_storage",
+    "energy_busses",
+    "assets",
+)
+
+
+def canonical_payload(data, key=None):
+    """Return a copy of the simulation payload without its labels and whose unordered lists are sorted"""
+    if isinstance(data, dict):
+        return {k: canonical_payload(v, k) for k, v in data.items() if k not in SIMULATION_PAYLOAD_LABELS}
+    if isinstance(data, list):
+        items = [canonical_payload(v) for v in data]
+        if key in UNORDERED_PAYLOAD_LISTS:
+            items.sort(key=lambda v: json.dumps(v, sort_keys=True))
+        return items
+    return data
+
+
+@lru_cache(maxsize=1)
+def parameters_digest():
+    """Digest of the parameter definitions, the simulations run with other definitions are not comparable"""
+    return hashlib.sha256(json.dumps(PARAMETERS.data, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def simulation_payload_hash(data):
+    """Return the sha256 digest of a simulation payload (as returned by format_scenario_for_mvs)
+
+    The digest does not depend on the order of the assets and busses nor on the identifiers of the project, scenario
+    and assets, so that unmodified and duplicated scenarios share it. It changes with the parameter definitions and
+    the MVS server.
+    """
+    dump = json.dumps(
+        {"payload": canonical_payload(data), "parameters": parameters_digest(), "server": settings.MVS_API_HOST},
+        sort_keys=True,
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(dump.encode("utf-8")).hexdigest()
+
+
 def sensitivity_analysis_payload(
     variable_parameter_name="",
     variable_parameter_range="",
@@ -497,6 +550,9 @@ def parse_csv_timeseries(file_str):
 
 def parse_input_timeseries(timeseries_file):
     if timeseries_file.name.endswith("xls") or timeseries_file.name.endswith("xlsx"):
+        # openpyxl is only needed to upload timeseries, it is imported here to speed up the startup
+        from openpyxl import load_workbook
+
         wb = load_workbook(filename=timeseries_file)
         worksheet = wb.active
         timeseries_values = []
@@ -0,0 +1,37 @@
+import json
+import os
+
+from django.core.management.base import BaseCommand
+from projects.registry import parameter_strings
+
+import projects
+
+HEADER = '''r"""Texts of the parameter csv files which are translated in the forms.
+
+This module is generated by the collect_parameter_strings management command, it is never imported but lets
+makemessages collect the texts which the forms translate from variables. Run the command before makemessages when the
+csv files changed.
+"""
+
+from django.utils.translation import gettext_noop
+
+'''
+MAX_LINE_LENGTH = 120
+
+
+class Command(BaseCommand):
+    help = "Collect the labels, definitions and units of the parameter csv files for makemessages"
+
+    def handle(self, *args, **options):
+        strings = parameter_strings()
+        module_path = os.path.join(os.path.dirname(projects.__file__), "parameter_strings.py")
+        with open(module_path, "w", encoding="utf-8") as fp:
+            fp.write(HEADER)
+            for string in strings:
+                literal = json.dumps(string, ensure_ascii=False)
+                line = f"gettext_noop({literal})"
+                # wrapped as black would wrap it
+                if len(line) > MAX_LINE_LENGTH:
+                    line = f"gettext_noop(\n    {literal}\n)"
+                fp.write(line + "\n")
+        self.stdout.write(self.style.SUCCESS(f"Collected {len(strings)} strings into {module_path}"))
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from projects.registry import compile_registry
+
+
+class Command(BaseCommand):
+    help = "Compile the parameter, kpi and business model csv files of the static files into a single json artifact"
+
+    def handle(self, *args, **options):
+        registry_path = compile_registry()
+        self.stdout.write(self.style.SUCCESS(f"Compiled the parameter registry into {registry_path}"))
@@ -0,0 +1,68 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from projects.batch_update import DEFAULT_CHUNK_SIZE, Checkpoint, ColumnMigration
+from projects.models import Asset, Timeseries, TimeseriesPayload
+from projects.models.payloads import is_empty
+
+
+def payload_migration(queryset, field_name):
+    """Move the values stored in the column of a payload field to TimeseriesPayload rows"""
+
+    def to_payloads(chunk):
+        return {pk: value for pk, value in chunk if not is_empty(value)}, []
+
+    return ColumnMigration(
+        name=f"{queryset.model.__name__}.{field_name}", queryset=queryset, field=field_name, transform=to_payloads
+    )
+
+
+class Command(BaseCommand):
+    help = "Store the timeseries values once per distinct timeseries and delete the values not referenced anymore"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="Number of rows read and written at once"
+        )
+        parser.add_argument(
+            "--checkpoint",
+            default=".dedup_timeseries.json",
+            help="File storing the progress of the deduplication, an interrupted run resumes from it",
+        )
+        parser.add_argument("--restart", action="store_true", help="Ignore the progress stored in the checkpoint")
+        parser.add_argument(
+            "--min-age",
+            type=float,
+            default=1,
+            help="Only delete the unreferenced values stored more than this number of hours ago",
+        )
+        parser.add_argument(
+            "--dry-run", action="store_true", help="Only report the number of rows which would be deduplicated"
+        )
+
+    def handle(self, *args, **options):
+        checkpoint = Checkpoint(options["checkpoint"])
+        if options["restart"] is True:
+            checkpoint.clear()
+        migrations = [
+            payload_migration(Timeseries.objects.all(), "values"),
+            payload_migration(
+                Asset.objects.filter(input_timeseries__isnull=False).exclude(input_timeseries=""), "input_timeseries"
+            ),
+        ]
+        for migration in migrations:
+            report = migration.run(
+                chunk_size=options["chunk_size"],
+                checkpoint=None if options["dry_run"] else checkpoint,
+                dry_run=options["dry_run"],
+            )
+            self.stdout.write(str(report))
+
+        collected = TimeseriesPayload.collect_garbage(
+            min_age=timedelta(hours=options["min_age"]), dry_run=options["dry_run"]
+        )
+        verb = "Would delete" if options["dry_run"] else "Deleted"
+        self.stdout.write(f"{verb} {collected} unreferenced timeseries payloads")
+        if options["dry_run"] is False:
+            checkpoint.clear()
@@ -0,0 +1,43 @@
+import pandas as pd
+from django.core.management.base import BaseCommand, CommandError
+from projects.models import Project
+from projects.services import prefetch_renewables_resources
+
+
+class Command(BaseCommand):
+    help = "Fetch the renewables.ninja profiles of a list of sites into the shared renewables resource cache"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sites", nargs="+", default=[], help="sites given as 'latitude,longitude'")
+        parser.add_argument("--file", help="csv file with 'latitude' and 'longitude' columns")
+        parser.add_argument("--projects", nargs="+", type=int, default=[], help="ids of projects to prefetch")
+        parser.add_argument("--datasets", nargs="+", choices=["pv", "wind"], default=["pv", "wind"])
+
+    def handle(self, *args, **options):
+        sites = []
+        for site in options["sites"]:
+            try:
+                latitude, longitude = (float(coordinate) for coordinate in site.split(","))
+            except ValueError:
+                raise CommandError(f"Site '{site}' is not of the form 'latitude,longitude'")
+            sites.append((latitude, longitude))
+
+        if options["file"]:
+            df = pd.read_csv(options["file"])
+            if not {"latitude", "longitude"}.issubset(df.columns):
+                raise CommandError("The file needs to contain a 'latitude' and a 'longitude' column")
+            sites += list(df[["latitude", "longitude"]].itertuples(index=False, name=None))
+
+        if options["projects"]:
+            sites += list(Project.objects.filter(id__in=options["projects"]).values_list("latitude", "longitude"))
+
+        if not sites:
+            raise CommandError("No sites provided, use --sites, --file or --projects")
+
+        counts = prefetch_renewables_resources(sites, datasets=options["datasets"])
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Renewables resources: {counts['fetched']} fetched, {counts['cached']} already cached, "
+                f"{counts['failed']} failed"
+            )
+        )
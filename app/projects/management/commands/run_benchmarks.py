@@ -0,0 +1,79 @@
+import json
+from django.core.management.base import BaseCommand, CommandError
+from django.test.runner import DiscoverRunner
+from django.test.utils import setup_test_environment, teardown_test_environment
+from benchmarks.harness import (
+    BASELINE_FILE,
+    DEFAULT_BUDGET,
+    as_dict,
+    compare,
+    load_baseline,
+    run_benchmarks,
+    save_baseline,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Time the hot paths of the app on the shipped fixtures (wall time, peak memory, SQL queries and file "
+        "operations) in a test database and compare them with the stored baseline"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--cases", nargs="+", help="names of the benchmark cases to run, default is all")
+        parser.add_argument("--repeat", type=int, default=5, help="number of timed runs of each case")
+        parser.add_argument("--baseline", default=BASELINE_FILE, help="json file with the baseline metrics")
+        parser.add_argument("--save-baseline", action="store_true", help="store the results as the new baseline")
+        parser.add_argument(
+            "--budget",
+            type=float,
+            help=f"allowed relative increase of the wall time and peak memory, default {DEFAULT_BUDGET['wall_time']}",
+        )
+        parser.add_argument(
+            "--query-budget",
+            type=float,
+            help=f"allowed relative increase of the number of queries, default {DEFAULT_BUDGET['queries']}",
+        )
+        parser.add_argument("--output", help="write the results as json to this file")
+
+    def handle(self, *args, **options):
+        budget = {}
+        if options["budget"] is not None:
+            budget["wall_time"] = budget["peak_memory"] = options["budget"]
+        if options["query_budget"] is not None:
+            budget["queries"] = options["query_budget"]
+        baseline = load_baseline(options["baseline"])
+
+        setup_test_environment()
+        runner = DiscoverRunner(verbosity=0, interactive=False)
+        old_config = runner.setup_databases()
+        try:
+            results = []
+            for result in run_benchmarks(options["cases"], repeat=options["repeat"]):
+                compare(result, baseline, budget)
+                results.append(result)
+                self.stdout.write(
+                    f"{result.name:<28} {result.wall_time * 1000:>10.1f} ms {result.peak_memory:>9.1f} MB "
+                    f"{result.queries:>6} queries {result.file_operations:>5} file operations"
+                )
+                for regression in result.regressions:
+                    self.stderr.write(f"    {regression}")
+        except KeyError as e:
+            raise CommandError(e)
+        finally:
+            runner.teardown_databases(old_config)
+            teardown_test_environment()
+
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8") as fp:
+                json.dump([as_dict(result) for result in results], fp, indent=4)
+
+        if options["save_baseline"]:
+            save_baseline(results, options["baseline"])
+            self.stdout.write(self.style.SUCCESS(f"Saved the baseline of {len(results)} benchmarks"))
+            return
+
+        regressed = [result.name for result in results if result.regressions]
+        if regressed:
+            raise CommandError(f"Benchmarks {regressed} exceed the regression budget")
+        self.stdout.write(self.style.SUCCESS(f"{len(results)} benchmarks within the regression budget"))
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+from django.test.runner import DiscoverRunner
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from benchmarks.connections import CONFIGURATIONS, is_available, run_connection_benchmark
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the latency of small endpoints with a new, a persistent or a pooled database connection per request, "
+        "in a test database"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=50, help="number of timed requests per endpoint")
+        parser.add_argument("--configurations", nargs="+", default=list(CONFIGURATIONS), choices=list(CONFIGURATIONS))
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        runner = DiscoverRunner(verbosity=0, interactive=False)
+        old_config = runner.setup_databases()
+        try:
+            skipped = [name for name in options["configurations"] if is_available(name) is False]
+            results = run_connection_benchmark(n_requests=options["requests"], configurations=options["configurations"])
+        finally:
+            runner.teardown_databases(old_config)
+            teardown_test_environment()
+
+        for result in results:
+            self.stdout.write(str(result))
+        for name in skipped:
+            self.stdout.write(f"{name:<10} skipped, not available with this database or without psycopg[pool]")
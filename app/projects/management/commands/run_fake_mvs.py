@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from projects.fake_mvs import FakeMVSServer
+
+
+class Command(BaseCommand):
+    help = "Run a local stand-in of the MVS API, to simulate scenarios offline with MVS_API_HOST=http://<host>:<port>"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--host", default="127.0.0.1")
+        parser.add_argument("--port", type=int, default=5001)
+        parser.add_argument(
+            "--checks-until-done",
+            type=int,
+            default=2,
+            help="Number of status requests during which a simulation is pending",
+        )
+        parser.add_argument("--delay", type=float, default=0, help="Seconds to wait before answering a request")
+
+    def handle(self, *args, **options):
+        server = FakeMVSServer(
+            host=options["host"],
+            port=options["port"],
+            checks_until_done=options["checks_until_done"],
+            delay=options["delay"],
+        )
+        self.stdout.write(f"Fake MVS API listening on {server.url}")
+        try:
+            server.httpd.serve_forever()
+        except KeyboardInterrupt:
+            server.httpd.server_close()
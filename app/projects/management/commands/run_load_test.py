@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+from django.test.runner import DiscoverRunner
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from benchmarks.load_test import run_load_test
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the throughput of the app served as WSGI and as ASGI with a slow simulation server, in a test "
+        "database and against a local fake MVS API"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=20, help="number of concurrent requests")
+        parser.add_argument("--delay", type=float, default=0.2, help="seconds the simulation server takes to answer")
+        parser.add_argument("--workers", type=int, default=2, help="number of sync workers of the wsgi mode")
+        parser.add_argument("--modes", nargs="+", default=["wsgi", "asgi"], choices=["wsgi", "asgi"])
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        runner = DiscoverRunner(verbosity=0, interactive=False)
+        old_config = runner.setup_databases()
+        try:
+            results = run_load_test(
+                n_requests=options["requests"],
+                delay=options["delay"],
+                workers=options["workers"],
+                modes=options["modes"],
+            )
+        finally:
+            runner.teardown_databases(old_config)
+            teardown_test_environment()
+
+        for result in results:
+            self.stdout.write(str(result))
@@ -1,144 +1,82 @@
-from django.core.management.base import BaseCommand, CommandError
 import json
+from functools import partial
 
-from projects.models import *
-from dashboard.models import *
-from projects.helpers import *
+from django.core.management.base import BaseCommand
 
+from projects.batch_update import DEFAULT_CHUNK_SIZE, Checkpoint, ColumnMigration, decode_json_chunk
+from projects.models import Asset
 
-class Command(BaseCommand):
-    help = "Change the format of the json dumped timeseries"
-
-    def handle(self, *args, **options):
-        save = False
-        qs = Asset.objects.filter(input_timeseries__isnull=False)
-        asset_with_problems = []
-        for asset in qs:
-            val = json.loads(asset.input_timeseries)
-            if isinstance(val, list):
-                asset.input_timeseries = json.dumps(
-                    dict(values=val, input_method=dict(type="manuel"))
-                )
-                if save is True:
-                    asset.save()
-            else:
-                asset_with_problems.append(asset.id)
-        print(asset_with_problems)
+# the columns holding a json dumped timeseries, and whether a scalar value is a valid timeseries of length one
+TIMESERIES_FIELDS = {
+    "input_timeseries": False,
+    "energy_price": True,
+    "feedin_tariff": True,
+    "efficiency": False,
+    "efficiency_multiple": False,
+    "fixed_thermal_losses_relative": False,
+    "fixed_thermal_losses_absolute": False,
+}
+# the input timeseries stored in a payload are read from it, the migrated values are interned in new payloads
+PAYLOAD_SOURCES = {"input_timeseries": Asset._meta.get_field("input_timeseries").value_expression()}
 
-        # TODO maybe make the float/int into []
 
-        qs = Asset.objects.filter(energy_price__isnull=False)
-        asset_with_problems = []
-        for asset in qs:
-            val = json.loads(asset.energy_price)
-            if isinstance(val, list):
-                asset.energy_price = json.dumps(
-                    dict(values=val, input_method=dict(type="manuel"))
-                )
-                if save is True:
-                    asset.save()
-            elif isinstance(val, float) or isinstance(val, int):
-                asset.energy_price = json.dumps(
-                    dict(values=[val], input_method=dict(type="manuel"))
-                )
-                if save is True:
-                    asset.save()
-            else:
-                asset_with_problems.append(asset.id)
-        print(asset_with_problems)
+def timeseries_to_dict(chunk, accept_scalar=False):
+    """Convert the json dumped lists of a chunk of (pk, value) to dicts with the values and the input method
 
-        qs = Asset.objects.filter(feedin_tariff__isnull=False)
-        asset_with_problems = []
-        for asset in qs:
-            val = json.loads(asset.feedin_tariff)
-            if isinstance(val, list):
-                asset.feedin_tariff = json.dumps(
-                    dict(values=val, input_method=dict(type="manuel"))
-                )
-                if save is True:
-                    asset.save()
-            elif isinstance(val, float) or isinstance(val, int):
-                asset.energy_price = json.dumps(
-                    dict(values=[val], input_method=dict(type="manuel"))
-                )
-                if save is True:
-                    asset.save()
-            elif isinstance(val, dict):
-                if "values" in val and "input_method" in val:
-                    if not isinstance(val["values"], list):
-                        val["values"] = [val["values"]]
-                else:
-                    asset_with_problems.append(asset.id)
-            else:
-                asset_with_problems.append(asset.id)
-        print(asset_with_problems)
+    The values already in the dict format are only updated if their values are not a list
+    """
+    decoded, problems = decode_json_chunk(chunk)
+    updates = {}
+    for pk, val in decoded:
+        if accept_scalar is True and isinstance(val, (float, int)):
+            val = [val]
+        if isinstance(val, list):
+            updates[pk] = json.dumps(dict(values=val, input_method=dict(type="manuel")))
+        elif isinstance(val, dict) and "values" in val and "input_method" in val:
+            if not isinstance(val["values"], list):
+                val["values"] = [val["values"]]
+                updates[pk] = json.dumps(val)
+        else:
+            problems.append(pk)
+    return updates, problems
 
-        qs = Asset.objects.filter(efficiency__isnull=False)
-        asset_with_problems = []
-        for asset in qs:
-            val = json.loads(asset.efficiency)
-            if isinstance(val, list):
-                asset.efficiency = json.dumps(
-                    dict(values=val, input_method=dict(type="manuel"))
-                )
-                if save is True:
-                    asset.save()
-            else:
-                asset_with_problems.append(asset.id)
-        print(asset_with_problems)
 
-        qs = Asset.objects.filter(efficiency_multiple__isnull=False)
-        asset_with_problems = []
-        for asset in qs:
-            val = json.loads(asset.efficiency)
-            if isinstance(val, list):
-                asset.efficiency = json.dumps(
-                    dict(values=val, input_method=dict(type="manuel"))
-                )
-                if save is True:
-                    asset.save()
-            else:
-                asset_with_problems.append(asset.id)
-        print(asset_with_problems)
-
-        qs = Asset.objects.filter(efficiency_multiple__isnull=False)
-        asset_with_problems = []
-        for asset in qs:
-            val = json.loads(asset.efficiency_multiple)
-            if isinstance(val, list):
-                asset.efficiency_multiple = json.dumps(
-                    dict(values=val, input_method=dict(type="manuel"))
-                )
-                if save is True:
-                    asset.save()
-            else:
-                asset_with_problems.append(asset.id)
-        print(asset_with_problems)
+class Command(BaseCommand):
+    help = "Change the format of the json dumped timeseries"
 
-        qs = Asset.objects.filter(fixed_thermal_losses_relative__isnull=False)
-        asset_with_problems = []
-        for asset in qs:
-            val = json.loads(asset.fixed_thermal_losses_relative)
-            if isinstance(val, list):
-                asset.fixed_thermal_losses_relative = json.dumps(
-                    dict(values=val, input_method=dict(type="manuel"))
-                )
-                if save is True:
-                    asset.save()
-            else:
-                asset_with_problems.append(asset.id)
-        print(asset_with_problems)
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="Number of assets read and written at once"
+        )
+        parser.add_argument(
+            "--checkpoint",
+            default=".update_asset_input_timeseries.json",
+            help="File storing the progress of the migration, an interrupted migration resumes from it",
+        )
+        parser.add_argument("--restart", action="store_true", help="Ignore the progress stored in the checkpoint")
+        parser.add_argument(
+            "--dry-run", action="store_true", help="Only report the number of assets which would be updated"
+        )
 
-        qs = Asset.objects.filter(fixed_thermal_losses_relative__isnull=False)
-        asset_with_problems = []
-        for asset in qs:
-            val = json.loads(asset.fixed_thermal_losses_relative)
-            if isinstance(val, list):
-                asset.fixed_thermal_losses_relative = json.dumps(
-                    dict(values=val, input_method=dict(type="manuel"))
-                )
-                if save is True:
-                    asset.save()
-            else:
-                asset_with_problems.append(asset.id)
-        print(asset_with_problems)
+    def handle(self, *args, **options):
+        checkpoint = Checkpoint(options["checkpoint"])
+        if options["restart"] is True:
+            checkpoint.clear()
+        for field, accept_scalar in TIMESERIES_FIELDS.items():
+            migration = ColumnMigration(
+                name=field,
+                queryset=Asset.objects.filter(**{f"{field}__isnull": False}),
+                field=field,
+                transform=partial(timeseries_to_dict, accept_scalar=accept_scalar),
+                source=PAYLOAD_SOURCES.get(field),
+            )
+            report = migration.run(
+                chunk_size=options["chunk_size"],
+                checkpoint=None if options["dry_run"] else checkpoint,
+                dry_run=options["dry_run"],
+            )
+            self.stdout.write(str(report))
+            if report.problems:
+                self.stdout.write(f"{field}: assets with problems {report.problems}")
+        if options["dry_run"] is False:
+            checkpoint.clear()
@@ -1,7 +1,7 @@
 from django.core.management.base import BaseCommand, CommandError
 from projects.models import Scenario
 from projects.models import *
-from projects.models.usecases import load_usecase_from_dict
+from projects.scenario_topology_helpers import load_projects_in_bulk
 
 
 class Command(BaseCommand):
@@ -9,12 +9,18 @@ class Command(BaseCommand):
 
     def add_arguments(self, parser):
         parser.add_argument("proj_id", nargs="+", type=int)
+        parser.add_argument(
+            "--dry-run", action="store_true", help="Only report the number of rows which would be inserted"
+        )
 
     def handle(self, *args, **options):
+        projects = Project.objects.in_bulk(options["proj_id"])
         for proj_id in options["proj_id"]:
-            try:
-                project = Project.objects.get(pk=proj_id)
-                dm = project.export()
-                load_usecase_from_dict(dm)
-            except Scenario.DoesNotExist:
+            if proj_id not in projects:
                 raise CommandError('proj_id "%s" does not exist' % proj_id)
+        loader = load_projects_in_bulk(
+            [projects[proj_id].export() for proj_id in options["proj_id"]], model=UseCase, dry_run=options["dry_run"]
+        )
+        verb = "Would insert" if options["dry_run"] else "Inserted"
+        for model, count in sorted(loader.counts.items()):
+            self.stdout.write(f"{verb} {count} {model}")
@@ -0,0 +1,37 @@
+# Generated by Django 5.1.3 on 2026-10-19 18:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("projects", "0024_bus_price_alter_assettype_asset_type"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="RenewablesResource",
+            fields=[
+                ("id", models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("dataset", models.CharField(max_length=10)),
+                ("latitude", models.FloatField()),
+                ("longitude", models.FloatField()),
+                ("parameters", models.TextField()),
+                ("parameters_hash", models.CharField(max_length=64)),
+                ("data", models.TextField()),
+                ("start_time", models.DateTimeField(blank=True, null=True)),
+                ("end_time", models.DateTimeField(blank=True, null=True)),
+                ("time_step", models.IntegerField(default=60)),
+                ("date_created", models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("dataset", "latitude", "longitude", "parameters_hash"),
+                        name="unique_renewables_resource",
+                    )
+                ],
+            },
+        ),
+    ]
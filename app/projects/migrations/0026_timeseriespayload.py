@@ -0,0 +1,66 @@
+# Generated by Django 5.1.3 on 2026-10-19 19:57
+
+import django.db.models.deletion
+import projects.models.base_models
+import projects.models.payloads
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("projects", "0025_renewablesresource"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="TimeseriesPayload",
+            fields=[
+                ("id", models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("digest", models.CharField(max_length=64, unique=True)),
+                ("data", models.TextField()),
+                ("date_created", models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name="asset",
+            name="input_timeseries",
+            field=projects.models.payloads.PayloadTextField(null=True, payload_field="input_timeseries_payload"),
+        ),
+        migrations.AlterField(
+            model_name="timeseries",
+            name="values",
+            field=projects.models.payloads.PayloadArrayField(
+                base_field=models.FloatField(),
+                default=projects.models.base_models.get_default_timeseries,
+                payload_field="payload",
+                size=None,
+            ),
+        ),
+        migrations.AddField(
+            model_name="asset",
+            name="input_timeseries_payload",
+            field=models.ForeignKey(
+                blank=True,
+                editable=False,
+                null=True,
+                on_delete=django.db.models.deletion.PROTECT,
+                related_name="assets",
+                to="projects.timeseriespayload",
+                to_field="digest",
+            ),
+        ),
+        migrations.AddField(
+            model_name="timeseries",
+            name="payload",
+            field=models.ForeignKey(
+                blank=True,
+                editable=False,
+                null=True,
+                on_delete=django.db.models.deletion.PROTECT,
+                related_name="timeseries",
+                to="projects.timeseriespayload",
+                to_field="digest",
+            ),
+        ),
+    ]
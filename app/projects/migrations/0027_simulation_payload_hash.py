@@ -0,0 +1,18 @@
+# Generated by Django 5.1.3 on 2026-10-19 20:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("projects", "0026_timeseriespayload"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="simulation",
+            name="payload_hash",
+            field=models.CharField(blank=True, db_index=True, max_length=64, null=True),
+        ),
+    ]
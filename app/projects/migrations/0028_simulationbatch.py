@@ -0,0 +1,66 @@
+# Generated by Django 5.1.3 on 2026-10-19 20:17
+
+import django.core.validators
+import django.db.models.deletion
+import projects.models.simulation_models
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("projects", "0027_simulation_payload_hash"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SimulationBatch",
+            fields=[
+                ("id", models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("name", models.CharField(blank=True, default="", max_length=120)),
+                (
+                    "max_concurrent",
+                    models.PositiveSmallIntegerField(
+                        default=projects.models.simulation_models.default_batch_concurrency,
+                        validators=[django.core.validators.MinValueValidator(1)],
+                    ),
+                ),
+                ("date_created", models.DateTimeField(auto_now_add=True)),
+                ("date_finished", models.DateTimeField(null=True)),
+                (
+                    "user",
+                    models.ForeignKey(
+                        null=True, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL
+                    ),
+                ),
+            ],
+        ),
+        migrations.CreateModel(
+            name="SimulationBatchItem",
+            fields=[
+                ("id", models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("date_submitted", models.DateTimeField(null=True)),
+                (
+                    "batch",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE, related_name="items", to="projects.simulationbatch"
+                    ),
+                ),
+                ("scenario", models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to="projects.scenario")),
+                (
+                    "simulation",
+                    models.ForeignKey(
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="batch_items",
+                        to="projects.simulation",
+                    ),
+                ),
+            ],
+            options={
+                "constraints": [models.UniqueConstraint(fields=("batch", "scenario"), name="unique_batch_scenario")],
+            },
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.1.3 on 2026-10-19 21:23
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("projects", "0028_simulationbatch"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="simulation",
+            name="payload_snapshot",
+            field=models.TextField(blank=True, null=True),
+        ),
+        migrations.CreateModel(
+            name="ScenarioDiff",
+            fields=[
+                ("id", models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("scenario_hash", models.CharField(max_length=64)),
+                ("reference_hash", models.CharField(max_length=64)),
+                ("changes", models.TextField()),
+                ("date_updated", models.DateTimeField(auto_now=True)),
+                (
+                    "reference",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE, related_name="+", to="projects.scenario"
+                    ),
+                ),
+                (
+                    "scenario",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE, related_name="diffs", to="projects.scenario"
+                    ),
+                ),
+            ],
+            options={
+                "constraints": [models.UniqueConstraint(fields=("scenario", "reference"), name="unique_scenario_diff")],
+            },
+        ),
+    ]
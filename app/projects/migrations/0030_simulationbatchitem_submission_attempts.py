@@ -0,0 +1,18 @@
+# Generated by Django 5.1.3 on 2026-10-19 21:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("projects", "0029_scenario_diff"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="simulationbatchitem",
+            name="submission_attempts",
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+    ]
@@ -1,8 +1,11 @@
 from projects.models.base_models import *
 from projects.models.simulation_models import (
     Simulation,
+    SimulationBatch,
+    SimulationBatchItem,
     ParameterChangeTracker,
     AssetChangeTracker,
+    ScenarioDiff,
     SensitivityAnalysis,
     get_project_sensitivity_analysis,
 )
@@ -37,6 +37,13 @@ from projects.constants import (
     TIMESERIES_TYPES,
 )
 from users.models import CustomUser
+from projects.models.payloads import (
+    PayloadArrayField,
+    PayloadQuerySet,
+    PayloadTextField,
+    TimeseriesPayload,
+    payload_update_fields,
+)
 
 
 class Feedback(models.Model):
@@ -286,14 +293,16 @@ def get_default_timeseries():
     return list([])
 
 
-class TimeseriesManager(models.Manager):
+class TimeseriesManager(models.Manager.from_queryset(PayloadQuerySet)):
     def get_by_natural_key(self, name):
         return self.get(name=name)
 
 
 class Timeseries(models.Model):
     name = models.CharField(max_length=120, blank=True, default="")
-    values = ArrayField(models.FloatField(), blank=False, default=get_default_timeseries)
+    values = PayloadArrayField(
+        models.FloatField(), blank=False, default=get_default_timeseries, payload_field="payload"
+    )
     units = models.CharField(max_length=50, choices=TIMESERIES_UNITS, blank=True, null=True)
     category = models.CharField(max_length=6, choices=TIMESERIES_CATEGORIES, blank=True, null=True)
 
@@ -312,6 +321,15 @@ class Timeseries(models.Model):
     start_time = models.DateTimeField(blank=True, default=None, null=True)
     end_time = models.DateTimeField(blank=True, default=None, null=True)
     time_step = models.IntegerField(blank=True, default=None, null=True, validators=[MinValueValidator(1)])
+    payload = models.ForeignKey(
+        TimeseriesPayload,
+        to_field="digest",
+        on_delete=models.PROTECT,
+        null=True,
+        blank=True,
+        editable=False,
+        related_name="timeseries",
+    )
     objects = TimeseriesManager()
 
     def save(self, *args, **kwargs):
@@ -320,6 +338,8 @@ class Timeseries(models.Model):
             self.ts_type = "scalar"
         elif n > 1:
             self.ts_type = "vector"
+        if "update_fields" in kwargs:
+            kwargs["update_fields"] = payload_update_fields(self, kwargs["update_fields"])
         super().save(*args, **kwargs)
 
     @property
@@ -353,6 +373,37 @@ class Timeseries(models.Model):
         return (self.name,)
 
 
+class RenewablesResource(models.Model):
+    """Renewables profile of a location, shared by all projects located at the same rounded coordinates"""
+
+    dataset = models.CharField(max_length=10)  # "pv" or "wind"
+    latitude = models.FloatField()
+    longitude = models.FloatField()
+    # parameters of the request other than the location, the hash is part of the lookup key
+    parameters = models.TextField()
+    parameters_hash = models.CharField(max_length=64)
+    # json dict with the profile columns as keys (i.e. "electricity", "irradiance_direct") and the values as lists
+    data = models.TextField()
+    start_time = models.DateTimeField(blank=True, null=True)
+    end_time = models.DateTimeField(blank=True, null=True)
+    time_step = models.IntegerField(default=60)
+    date_created = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["dataset", "latitude", "longitude", "parameters_hash"], name="unique_renewables_resource"
+            )
+        ]
+
+    @cached_property
+    def profiles(self):
+        return json.loads(self.data)
+
+    def get_profile(self, column):
+        return self.profiles[column]
+
+
 class AssetType(models.Model):
     asset_type = models.CharField(max_length=30, choices=ASSET_TYPE, null=False, unique=True)
     asset_category = models.CharField(max_length=30, choices=ASSET_CATEGORY)
@@ -408,6 +459,8 @@ class Asset(TopologyNode):
     def save(self, *args, **kwargs):
         if self.asset_type.asset_type in ["dso", "gas_dso", "h2_dso", "heat_dso"]:
             self.optimize_cap = False
+        if "update_fields" in kwargs:
+            kwargs["update_fields"] = payload_update_fields(self, kwargs["update_fields"])
         super().save(*args, **kwargs)
 
     unique_id = models.CharField(max_length=120, default=uuid.uuid4, unique=True, editable=False)
@@ -418,7 +471,9 @@ class Asset(TopologyNode):
     opex_var_extra = models.FloatField(null=True, default=0, blank=True, validators=[MinValueValidator(0.0)])
 
     lifetime = models.IntegerField(null=True, blank=False, validators=[MinValueValidator(0)])
-    input_timeseries = models.TextField(null=True, blank=False)  # , validators=[validate_timeseries])
+    input_timeseries = PayloadTextField(
+        null=True, blank=False, payload_field="input_timeseries_payload"
+    )  # , validators=[validate_timeseries])
     crate = models.FloatField(null=True, blank=False, default=1, validators=[MinValueValidator(0.0)])
     efficiency = models.TextField(null=True, blank=False)
     # used in the case of transformers with one input and two outputs
@@ -458,6 +513,17 @@ class Asset(TopologyNode):
     thermal_loss_rate = models.FloatField(null=True, blank=False, validators=[MinValueValidator(0.0)])
     fixed_thermal_losses_relative = models.TextField(null=True, blank=False)
     fixed_thermal_losses_absolute = models.TextField(null=True, blank=False)
+    input_timeseries_payload = models.ForeignKey(
+        TimeseriesPayload,
+        to_field="digest",
+        on_delete=models.PROTECT,
+        null=True,
+        blank=True,
+        editable=False,
+        related_name="assets",
+    )
+
+    objects = PayloadQuerySet.as_manager()
 
     @property
     def fields(self):
@@ -0,0 +1,202 @@
+r"""Content-addressed storage of the timeseries values.
+
+The same profiles (renewables.ninja production, standard demand profiles, ...) are copied by every scenario
+duplication, usecase instantiation and project import. A TimeseriesPayload holds the json dump of a timeseries once,
+keyed by its sha256 digest, and the models reference it instead of storing the values themselves:
+
+    class Timeseries(models.Model):
+        values = PayloadArrayField(models.FloatField(), payload_field="payload", ...)
+        payload = models.ForeignKey(TimeseriesPayload, to_field="digest", ...)
+
+When the instance is saved the values of a payload field are interned and only the digest is written to the
+database, the column itself is left empty. Reading the field returns the values stored in the column if any,
+otherwise the values of the payload, so that the rows written before the payloads existed or with bulk_update()
+keep working. Copying an instance only copies the digest.
+
+The payloads are fetched on first access, the querysets whose values are read for many rows should select them:
+
+    Asset.objects.filter(scenario=scenario).with_payload()
+
+values() and values_list() read the column only, the json dump of a PayloadTextField is read from the column or
+from the payload with field.value_expression().
+
+The payload foreign key must be declared after the payload field, as the fields are saved in their declaration order.
+Unreferenced payloads are deleted by TimeseriesPayload.collect_garbage(), see the dedup_timeseries command.
+"""
+
+import hashlib
+import json
+from datetime import timedelta
+
+from django.contrib.postgres.fields import ArrayField
+from django.db import models
+from django.db.models import Exists, OuterRef, TextField, Value
+from django.db.models.functions import Coalesce, NullIf
+from django.db.models.query_utils import DeferredAttribute
+from django.utils import timezone
+from django.utils.functional import cached_property
+
+
+class TimeseriesPayload(models.Model):
+    """Json dumped timeseries values, shared by the Timeseries and Asset rows holding the same values"""
+
+    digest = models.CharField(max_length=64, unique=True)
+    data = models.TextField()
+    date_created = models.DateTimeField(auto_now_add=True)
+
+    @staticmethod
+    def digest_of(data):
+        return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+    @cached_property
+    def decoded(self):
+        return json.loads(self.data)
+
+    @classmethod
+    def intern_many(cls, data):
+        """Store the payloads of the json dumps which are not stored yet and return the digests of the dumps
+
+        Takes at most two queries whatever the number of dumps
+        """
+        digests = [cls.digest_of(dump) for dump in data]
+        unique = dict(zip(digests, data))
+        existing = set(cls.objects.filter(digest__in=unique).values_list("digest", flat=True))
+        missing = [cls(digest=digest, data=dump) for digest, dump in unique.items() if digest not in existing]
+        if missing:
+            # another process may store the same payload in the meantime
+            cls.objects.bulk_create(missing, ignore_conflicts=True)
+        return digests
+
+    @classmethod
+    def intern(cls, data):
+        return cls.intern_many([data])[0]
+
+    @classmethod
+    def unreferenced(cls):
+        """Return the payloads which are not referenced by any row"""
+        qs = cls.objects.all()
+        for relation in cls._meta.related_objects:
+            referencing = relation.related_model._base_manager.filter(**{relation.field.attname: OuterRef("digest")})
+            qs = qs.filter(~Exists(referencing))
+        return qs
+
+    @classmethod
+    def collect_garbage(cls, min_age=timedelta(hours=1), dry_run=False):
+        """Delete the unreferenced payloads and return their number
+
+        The payloads created less than min_age ago are kept, they may have been interned for a row not saved yet
+        """
+        qs = cls.unreferenced().filter(date_created__lt=timezone.now() - min_age)
+        if dry_run is True:
+            return qs.count()
+        return qs.delete()[0]
+
+
+def is_empty(value):
+    return value is None or len(value) == 0
+
+
+class PayloadAttribute(DeferredAttribute):
+    """Read the values of the payload when the column is empty, assigning an empty value detaches the payload"""
+
+    def __get__(self, instance, cls=None):
+        if instance is None:
+            return self
+        value = super().__get__(instance, cls)
+        payload_field = self.field.get_payload_field()
+        if is_empty(value) and getattr(instance, payload_field.attname, None) is not None:
+            return self.field.from_payload(getattr(instance, payload_field.name))
+        return value
+
+    def __set__(self, instance, value):
+        payload_field = self.field.get_payload_field()
+        # the payload is only set after the column when the instance is initialized
+        if is_empty(value) and payload_field.attname in instance.__dict__:
+            setattr(instance, payload_field.attname, None)
+        instance.__dict__[self.field.attname] = value
+
+
+class PayloadFieldMixin:
+    descriptor_class = PayloadAttribute
+    # value written to the column when the values are stored in the payload
+    stored_empty_value = ""
+
+    def __init__(self, *args, payload_field, **kwargs):
+        self.payload_field = payload_field
+        super().__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        kwargs["payload_field"] = self.payload_field
+        return name, path, args, kwargs
+
+    def get_payload_field(self):
+        return self.model._meta.get_field(self.payload_field)
+
+    def to_payload(self, value):
+        return self.get_prep_value(value)
+
+    def from_payload(self, payload):
+        return payload.data
+
+    def intern(self, instances):
+        """Intern the values of the instances in bulk, i.e. before a bulk_create()"""
+        instances = [instance for instance in instances if not is_empty(instance.__dict__.get(self.attname))]
+        digests = TimeseriesPayload.intern_many(
+            [self.to_payload(instance.__dict__[self.attname]) for instance in instances]
+        )
+        attname = self.get_payload_field().attname
+        for instance, digest in zip(instances, digests):
+            setattr(instance, attname, digest)
+
+    def pre_save(self, model_instance, add):
+        value = model_instance.__dict__.get(self.attname)
+        if is_empty(value):
+            # either no values or values already stored in the payload
+            return value
+        data = self.to_payload(value)
+        digest = TimeseriesPayload.digest_of(data)
+        payload_field = self.get_payload_field()
+        if getattr(model_instance, payload_field.attname) != digest:
+            TimeseriesPayload.intern(data)
+            setattr(model_instance, payload_field.attname, digest)
+        return self.stored_empty_value
+
+
+class PayloadTextField(PayloadFieldMixin, models.TextField):
+    """TextField holding a json dumped timeseries, stored in a TimeseriesPayload"""
+
+    def value_expression(self):
+        """Expression of the json dump of the field, read from the payload if the column is empty"""
+        return Coalesce(NullIf(self.attname, Value("")), f"{self.payload_field}__data", output_field=TextField())
+
+
+class PayloadArrayField(PayloadFieldMixin, ArrayField):
+    """ArrayField holding the values of a timeseries, stored in a TimeseriesPayload"""
+
+    stored_empty_value = []
+
+    def to_payload(self, value):
+        return json.dumps(list(value))
+
+    def from_payload(self, payload):
+        return payload.decoded
+
+
+class PayloadQuerySet(models.QuerySet):
+    def with_payload(self):
+        """Select the payloads of the payload fields along with the rows"""
+        return self.select_related(
+            *[field.payload_field for field in self.model._meta.concrete_fields if isinstance(field, PayloadFieldMixin)]
+        )
+
+
+def payload_update_fields(instance, update_fields):
+    """Add the payload foreign keys of the updated payload fields of the instance to the update_fields of save()"""
+    if update_fields is None:
+        return None
+    update_fields = set(update_fields)
+    for field in instance._meta.concrete_fields:
+        if isinstance(field, PayloadFieldMixin) and field.name in update_fields:
+            update_fields.add(field.payload_field)
+    return update_fields
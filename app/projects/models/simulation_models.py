@@ -7,7 +7,9 @@ import numpy as np
 import logging
 
 logger = logging.getLogger(__name__)
+from django.conf import settings
 from django.db import models
+from django.db.models import Count, Q
 from django.core.validators import MaxValueValidator, MinValueValidator
 
 from django.utils.translation import gettext_lazy as _
@@ -18,6 +20,7 @@ from projects.constants import (
     DONE,
     PENDING,
     ERROR,
+    QUEUED,
     PARAM_CATEGORY,
     PARAM_TYPE,
 )
@@ -38,6 +41,64 @@ class Simulation(AbstractSimulation):
     user_rating = models.PositiveSmallIntegerField(
         null=True, choices=USER_RATING, default=None
     )
+    # digest of the payload sent to the MVS, see projects.helpers.simulation_payload_hash
+    payload_hash = models.CharField(max_length=64, null=True, blank=True, db_index=True)
+    # json of the compact nodes of the payload sent to the MVS, see projects.scenario_diff.payload_nodes
+    payload_snapshot = models.TextField(null=True, blank=True)
+
+
+def default_batch_concurrency():
+    return settings.SIMULATION_BATCH_CONCURRENCY
+
+
+class SimulationBatch(models.Model):
+    """Scenarios simulated together, at most max_concurrent of them are simulated by the MVS at the same time
+
+    The batches are advanced by projects.services.advance_simulation_batch
+    """
+
+    name = models.CharField(max_length=120, blank=True, default="")
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, null=True)
+    max_concurrent = models.PositiveSmallIntegerField(
+        default=default_batch_concurrency, validators=[MinValueValidator(1)]
+    )
+    date_created = models.DateTimeField(auto_now_add=True)
+    date_finished = models.DateTimeField(null=True)
+
+    def progress(self):
+        """Number of scenarios of the batch per status, in a single query"""
+        counts = self.items.aggregate(
+            total=Count("pk"),
+            queued=Count("pk", filter=Q(date_submitted__isnull=True)),
+            pending=Count("pk", filter=Q(simulation__status=PENDING)),
+            done=Count("pk", filter=Q(simulation__status=DONE)),
+        )
+        # the simulations which failed or were deleted since their submission
+        counts["failed"] = counts["total"] - counts["queued"] - counts["pending"] - counts["done"]
+        finished = counts["done"] + counts["failed"]
+        counts["progress"] = finished / counts["total"] if counts["total"] else 1.0
+        counts["finished"] = self.date_finished is not None
+        return counts
+
+
+class SimulationBatchItem(models.Model):
+    batch = models.ForeignKey(SimulationBatch, on_delete=models.CASCADE, related_name="items")
+    scenario = models.ForeignKey(Scenario, on_delete=models.CASCADE)
+    simulation = models.ForeignKey(Simulation, on_delete=models.SET_NULL, null=True, related_name="batch_items")
+    # an item which could not be submitted is marked as submitted without a simulation, i.e. as failed
+    date_submitted = models.DateTimeField(null=True)
+    submission_attempts = models.PositiveSmallIntegerField(default=0)
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=["batch", "scenario"], name="unique_batch_scenario")]
+
+    @property
+    def status(self):
+        if self.date_submitted is None:
+            return QUEUED
+        if self.simulation is None:
+            return ERROR
+        return self.simulation.status
 
 
 class ParameterChangeTracker(models.Model):
@@ -68,6 +129,29 @@ class AssetChangeTracker(models.Model):
     )
 
 
+class ScenarioDiff(models.Model):
+    """Changes of the simulation payload of a scenario compared to the one of a reference scenario
+
+    The payload hashes are those of the scenarios when the diff was computed, see projects.scenario_diff.scenario_diff
+    """
+
+    scenario = models.ForeignKey(Scenario, on_delete=models.CASCADE, related_name="diffs")
+    reference = models.ForeignKey(Scenario, on_delete=models.CASCADE, related_name="+")
+    scenario_hash = models.CharField(max_length=64)
+    reference_hash = models.CharField(max_length=64)
+    # json of the compacted PayloadDiff, see projects.scenario_diff.PayloadDiff.to_dict
+    changes = models.TextField()
+    date_updated = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=["scenario", "reference"], name="unique_scenario_diff")]
+
+    def diff(self):
+        from projects.scenario_diff import PayloadDiff
+
+        return PayloadDiff.from_dict(json.loads(self.changes))
+
+
 class SensitivityAnalysis(AbstractSimulation):
     name = models.CharField(max_length=50)
     # attribute linked to output_parameter_names
@@ -0,0 +1,164 @@
+r"""Texts of the parameter csv files which are translated in the forms.
+
+This module is generated by the collect_parameter_strings management command, it is never imported but lets
+makemessages collect the texts which the forms translate from variables. Run the command before makemessages when the
+csv files changed.
+"""
+
+from django.utils.translation import gettext_noop
+
+gettext_noop(":unit:")
+gettext_noop("Accounts for the depreciation in the future value of money compared to its current value")
+gettext_noop("Age of the installed plant")
+gettext_noop("Already existing installed capacity")
+gettext_noop("Asset lifetime")
+gettext_noop("Assign a project ID as per your preference.")
+gettext_noop("Assign a project name as per your preference.")
+gettext_noop("Assign a scenario ID as per your preference.")
+gettext_noop("Assign a scenario name as per your preference.")
+gettext_noop("Battery")
+gettext_noop("Brief description of the scenario being simulated")
+gettext_noop("C-Rate")
+gettext_noop("Choose if capacity optimization should be performed for this asset.")
+gettext_noop("Choose if this asset should be considered as renewable.")
+gettext_noop("Commodity")
+gettext_noop("Community tariff")
+gettext_noop("Connection fee")
+gettext_noop("Construction")
+gettext_noop("Contingency")
+gettext_noop("Costs associated with a flow through/from the asset (OPEX_var or fuel costs)")
+gettext_noop("Costs for custom storage")
+gettext_noop("Customs clearance costs")
+gettext_noop("DEVEX (incl feasibility studies, project development, planning)")
+gettext_noop("Date and time when the simulation starts with the first step")
+gettext_noop("Degree of autonomy")
+gettext_noop("Diesel Genset")
+gettext_noop("Diesel fuel price")
+gettext_noop("Discount factor")
+gettext_noop("Emissions per unit dispatch of an asset")
+gettext_noop(
+    "Enables the output of the linear programming (lp) file with the linear equation system describing the optimization problem"
+)
+gettext_noop("Energy commodity")
+gettext_noop("Equity Community")
+gettext_noop("Equity Interest Rate")
+gettext_noop("Equity project developer company")
+gettext_noop("Excess power PPA tariff")
+gettext_noop("Factor")
+gettext_noop("Financial Fees & DDs")
+gettext_noop("Fix operational costs")
+gettext_noop("Fix project costs")
+gettext_noop("Fixed absolute thermal losses")
+gettext_noop("Fixed relative thermal losses")
+gettext_noop("Grace Period")
+gettext_noop("Grant")
+gettext_noop("Grant Grace Period")
+gettext_noop("Grant Maturity")
+gettext_noop("Grid connection")
+gettext_noop("Grid fee to be paid based on the peak demand of a given period")
+gettext_noop("Initial state of charge")
+gettext_noop("Input the type of OEMOF component")
+gettext_noop("Installation (labour) for system ")
+gettext_noop("Installed capacity")
+gettext_noop("Interest Rate")
+gettext_noop("Investment costs")
+gettext_noop("Label of bus/component towards which the energyVector is leaving from the asset")
+gettext_noop("Label of the bus/component from which the energyVector is arriving into the asset")
+gettext_noop("Latitude coordinate of the project's geographical location")
+gettext_noop("Length of the time steps")
+gettext_noop("Loan Maturity")
+gettext_noop("Local transporlabelt")
+gettext_noop("Location's latitude")
+gettext_noop("Location's longitude")
+gettext_noop("Longitude coordinate of the project's geographical location")
+gettext_noop("Maximum amount of total emissions which are allowed in the optimized energy system")
+gettext_noop("Maximum capacity")
+gettext_noop("Maximum capacity for feeding electricity into the grid")
+gettext_noop("Maximum feedin capacity")
+gettext_noop(
+    "Maximum permissable power at which the storage can be charged or discharged relative to the nominal capacity of the storage"
+)
+gettext_noop("Maximum state of charge")
+gettext_noop("Maximum total capacity of an asset that can be installed at the project site")
+gettext_noop("Metering and fixed costs")
+gettext_noop("Minimum degree of autonomy that needs to be met by the optimization")
+gettext_noop("Minimum share of energy supplied by renewable generation that needs to be met by the optimization")
+gettext_noop("Minimum state of charge")
+gettext_noop("NA")
+gettext_noop("Name of a csv file containing the properties of a storage component")
+gettext_noop("Name of the asset")
+gettext_noop("Name of the country where the project is being deployed")
+gettext_noop("Name of the csv file containing the input generation or demand timeseries")
+gettext_noop("None or factor")
+gettext_noop("Number of operational years of the asset until it has to be replaced")
+gettext_noop("Number of reference periods in one year for the peak demand pricing")
+gettext_noop("Number of years the asset has already been in operation")
+gettext_noop("Optimize capacity")
+gettext_noop("Other PV Materials (AC/ DC cabling, Gpas, Monitoring system, Fences, CCTV, etc)")
+gettext_noop("Payment Guarantees")
+gettext_noop("Peak demand price")
+gettext_noop("Period of peak demand pricing")
+gettext_noop("Planning and development costs")
+gettext_noop("Political risk policy")
+gettext_noop("Power and Battery Inverter ")
+gettext_noop("Power loss index")
+gettext_noop("Power loss index for CHPs, usually known as beta coefficient")
+gettext_noop("Price of the energy carrier sourced from the utility grid")
+gettext_noop("Price received for feeding electricity into the grid")
+gettext_noop("Project Management during construction")
+gettext_noop("Ratio of energy output to energy input")
+gettext_noop("Renewable asset")
+gettext_noop("Renewable share")
+gettext_noop("Renewable share of the generation mix")
+gettext_noop("SHS Fosera Ignite incl. Mounting system")
+gettext_noop("Senior Loan (mixed sources)")
+gettext_noop("Service & Maintenance SHS")
+gettext_noop("Share of renewables in the generation mix of the energy supplied by the DSO utility")
+gettext_noop("Shipping")
+gettext_noop("Solar Panels incl. mounting structure")
+gettext_noop("Specific emissions")
+gettext_noop("Specific investment costs of the asset related to the installed capacity (CAPEX)")
+gettext_noop("Specific operational and maintenance costs of the asset related to the installed capacity (OPEX_fix)")
+gettext_noop("Specifies whether optimization needs to result into a net zero energy system (True) or not (False)")
+gettext_noop("Stands for Demand Side Management. Currently not implemented.")
+gettext_noop("State of charge of the storage in the zeroth time step")
+gettext_noop("Tax factor")
+gettext_noop("Tax factor (i.e. VAT)")
+gettext_noop("The currency of the country where the project is implemented")
+gettext_noop("The maximum permissible level of charge of the storage as a factor of the nominal capacity")
+gettext_noop("The minimum permissible level of charge of the storage as a factor of the nominal capacity")
+gettext_noop("The number of days for which the simulation is to be run")
+gettext_noop("The number of years the project is intended to be operational")
+gettext_noop(
+    "Thermal losses of storage independent of state of charge between two consecutive timesteps relative to nominal storage capacity"
+)
+gettext_noop(
+    "Thermal losses of the storage independent of the state of charge and independent of nominal storage capacity between two consecutive timesteps"
+)
+gettext_noop("Transportation")
+gettext_noop("Type of the component")
+gettext_noop("Unit associated with the capacity of the component")
+gettext_noop("Variable operational costs")
+gettext_noop("WACC")
+gettext_noop("a")
+gettext_noop("beta")
+gettext_noop("currency")
+gettext_noop("currency/(:unit:*a)")
+gettext_noop("currency/:unit:")
+gettext_noop("currency/L")
+gettext_noop("currency/Mini-grid consumer")
+gettext_noop("currency/Mini-grid user")
+gettext_noop("currency/SHS consumer")
+gettext_noop("currency/SHS users/year")
+gettext_noop("currency/kVA_cap")
+gettext_noop("currency/kW")
+gettext_noop("currency/kW_cap")
+gettext_noop("currency/kWh")
+gettext_noop("currency/kWh_cap")
+gettext_noop("currency/kWp_cap")
+gettext_noop("factor")
+gettext_noop("kgCO2eq/a")
+gettext_noop("kgCO2eq/asset unit")
+gettext_noop("percentage")
+gettext_noop("times per year")
+gettext_noop("years")
@@ -0,0 +1,360 @@
+r"""Opt-in profiling of the views and of the Django-Q tasks.
+
+Enabled with the PROFILING_ENABLED setting, the ProfilingMiddleware and the Django-Q signal receivers then record for
+each request or task
+
+- wall_time: total time in seconds
+- db_time and queries: time spent in and number of the SQL queries
+- duplicates: the SQL fingerprints (query without its parameters) executed more than once, the sign of a N+1 pattern
+- sections: time spent in the code marked with profile_section(), i.e. "http" for the outbound calls (MVS,
+  renewables.ninja, Nominatim), "plotly" for the graphs and "pandas" for the cost computations
+
+The records are kept in a ring buffer of PROFILING_BUFFER_SIZE entries, in memory or, if PROFILING_STORE is the
+path of a file, in a local sqlite database shared by the web and qcluster processes. The admin page
+/admin/profiling/ ranks the worst endpoints.
+
+When profiling is disabled the middleware is removed from the stack at startup and profile_section() only checks a
+context variable. The profile() and query_budget() context managers do not depend on the setting and can be used in
+tests to assert query budgets.
+"""
+
+import json
+import logging
+import re
+import sqlite3
+import statistics
+import threading
+import time
+from collections import Counter, deque
+from contextlib import ContextDecorator, ExitStack, contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from functools import lru_cache
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+VIEW = "view"
+TASK = "task"
+
+_current_record = ContextVar("profiling_record", default=None)
+
+
+@dataclass
+class ProfileRecord:
+    kind: str
+    name: str
+    wall_time: float = 0.0
+    db_time: float = 0.0
+    queries: int = 0
+    status: str = ""
+    sections: dict = field(default_factory=dict)
+    fingerprints: Counter = field(default_factory=Counter)
+    timestamp: float = field(default_factory=time.time)
+    # names of the sections being measured
+    active_sections: set = field(default_factory=set, repr=False, compare=False)
+
+    @property
+    def duplicates(self):
+        """Fingerprints of the queries executed more than once and their number of executions"""
+        return {fingerprint: n for fingerprint, n in self.fingerprints.items() if n > 1}
+
+    @property
+    def duplicate_queries(self):
+        return sum(n - 1 for n in self.duplicates.values())
+
+
+_IN_CLAUSE = re.compile(r"\bIN \((?:%s, )*%s\)", re.IGNORECASE)
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def fingerprint(sql):
+    """Return the query without its parameters and literals, the IN clauses reduced to a single placeholder"""
+    sql = _STRING_LITERAL.sub("%s", sql)
+    sql = _NUMBER_LITERAL.sub("%s", sql)
+    sql = _IN_CLAUSE.sub("IN (...)", sql)
+    return _WHITESPACE.sub(" ", sql).strip()
+
+
+class _QueryRecorder:
+    def __init__(self, record):
+        self.record = record
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.record.db_time += time.perf_counter() - start
+            self.record.queries += 1
+            self.record.fingerprints[fingerprint(sql)] += 1
+
+
+@contextmanager
+def profile(name, kind=VIEW, store=True):
+    """Profile the enclosed code and yield its ProfileRecord, which is added to the store on exit if store is True"""
+    record = ProfileRecord(kind=kind, name=name)
+    token = _current_record.set(record)
+    start = time.perf_counter()
+    try:
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(_QueryRecorder(record)))
+            yield record
+    finally:
+        record.wall_time = time.perf_counter() - start
+        _current_record.reset(token)
+        if store is True:
+            get_store().add(record)
+
+
+def current_record():
+    return _current_record.get()
+
+
+class profile_section(ContextDecorator):
+    """Add the time spent in the enclosed code (or decorated function) to a section of the current record
+
+    Does nothing outside of a profiled request or task, nested sections of the same name are only counted once.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.record = None
+        self.start = None
+
+    def _recreate_cm(self):
+        # a new instance per call so that the decorated functions are reentrant
+        return profile_section(self.name)
+
+    def __enter__(self):
+        record = _current_record.get()
+        if record is not None and self.name not in record.active_sections:
+            self.record = record
+            record.active_sections.add(self.name)
+            self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        if self.record is not None:
+            elapsed = time.perf_counter() - self.start
+            self.record.sections[self.name] = self.record.sections.get(self.name, 0.0) + elapsed
+            self.record.active_sections.discard(self.name)
+        return False
+
+
+@contextmanager
+def query_budget(max_queries, max_duplicates=None):
+    """Fail if the enclosed code executes more than max_queries queries, or more than max_duplicates repeated ones
+
+    with query_budget(30, max_duplicates=0):
+        self.client.get(url)
+    """
+    with profile("query_budget", store=False) as record:
+        yield record
+    errors = []
+    if record.queries > max_queries:
+        errors.append(f"{record.queries} queries executed, the budget is {max_queries}")
+    if max_duplicates is not None and record.duplicate_queries > max_duplicates:
+        errors.append(f"{record.duplicate_queries} repeated queries, the budget is {max_duplicates}")
+    if errors:
+        details = "\n".join(f"    {n}x {sql}" for sql, n in sorted(record.duplicates.items(), key=lambda x: -x[1]))
+        raise AssertionError("; ".join(errors) + (f"\nRepeated queries:\n{details}" if details else ""))
+
+
+class MemoryStore:
+    """Ring buffer of the records of the current process"""
+
+    def __init__(self, size):
+        self.records = deque(maxlen=size)
+        self.lock = threading.Lock()
+
+    def add(self, record):
+        with self.lock:
+            self.records.append(record)
+
+    def all(self):
+        with self.lock:
+            return list(self.records)
+
+    def clear(self):
+        with self.lock:
+            self.records.clear()
+
+
+class SQLiteStore:
+    """Ring buffer of the records in a local sqlite database, shared by the processes of the host"""
+
+    columns = ("kind", "name", "wall_time", "db_time", "queries", "status", "sections", "fingerprints", "timestamp")
+
+    def __init__(self, path, size):
+        self.path = path
+        self.size = size
+        with self.connect() as db:
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS profile_record (id INTEGER PRIMARY KEY AUTOINCREMENT, "
+                "kind TEXT, name TEXT, wall_time REAL, db_time REAL, queries INTEGER, status TEXT, sections TEXT, "
+                "fingerprints TEXT, timestamp REAL)"
+            )
+
+    @contextmanager
+    def connect(self):
+        db = sqlite3.connect(self.path, timeout=5)
+        try:
+            with db:
+                yield db
+        finally:
+            db.close()
+
+    def add(self, record):
+        values = [getattr(record, column) for column in self.columns]
+        values[6] = json.dumps(record.sections)
+        # only the repeated queries are kept to bound the size of the store
+        values[7] = json.dumps(record.duplicates)
+        try:
+            with self.connect() as db:
+                cursor = db.execute(
+                    f"INSERT INTO profile_record ({', '.join(self.columns)}) VALUES ({', '.join('?' * 9)})", values
+                )
+                db.execute("DELETE FROM profile_record WHERE id <= ?", (cursor.lastrowid - self.size,))
+        except sqlite3.Error as e:
+            logger.warning(f"The profile of {record.name} could not be stored: {e}")
+
+    def all(self):
+        with self.connect() as db:
+            rows = db.execute(f"SELECT {', '.join(self.columns)} FROM profile_record ORDER BY id").fetchall()
+        records = []
+        for row in rows:
+            record = ProfileRecord(**dict(zip(self.columns, row)))
+            record.sections = json.loads(record.sections)
+            record.fingerprints = Counter(json.loads(record.fingerprints))
+            records.append(record)
+        return records
+
+    def clear(self):
+        with self.connect() as db:
+            db.execute("DELETE FROM profile_record")
+
+
+@lru_cache(maxsize=None)
+def _get_store(path, size):
+    return SQLiteStore(path, size) if path else MemoryStore(size)
+
+
+def get_store():
+    return _get_store(settings.PROFILING_STORE, settings.PROFILING_BUFFER_SIZE)
+
+
+def rank_endpoints(records, order_by="total_time"):
+    """Aggregate the records per view or task, the worst endpoints first
+
+    order_by is one of the keys of the aggregates: total_time, mean_time, max_time, mean_queries, duplicate_queries
+    """
+    grouped = {}
+    for record in records:
+        grouped.setdefault((record.kind, record.name), []).append(record)
+
+    ranking = []
+    for (kind, name), group in grouped.items():
+        wall_times = [record.wall_time for record in group]
+        duplicates = Counter()
+        sections = Counter()
+        for record in group:
+            duplicates.update(record.duplicates)
+            sections.update(record.sections)
+        ranking.append(
+            {
+                "kind": kind,
+                "name": name,
+                "count": len(group),
+                "total_time": sum(wall_times),
+                "mean_time": statistics.mean(wall_times),
+                "max_time": max(wall_times),
+                "mean_db_time": statistics.mean(record.db_time for record in group),
+                "mean_queries": statistics.mean(record.queries for record in group),
+                "duplicate_queries": max(record.duplicate_queries for record in group),
+                "sections": {section: total / len(group) for section, total in sections.items()},
+                "duplicates": duplicates.most_common(5),
+            }
+        )
+    return sorted(ranking, key=lambda x: x[order_by], reverse=True)
+
+
+class ProfilingMiddleware:
+    """Profile every request, removed from the middleware stack if PROFILING_ENABLED is False
+
+    Under ASGI the queries are executed in the threads of sync_to_async, whose connections are not wrapped, only the
+    wall time and the sections of the async requests are recorded.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if settings.PROFILING_ENABLED is not True:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        with profile(request.path, kind=VIEW) as record:
+            response = self.get_response(request)
+            self.finish(request, response, record)
+        return response
+
+    async def __acall__(self, request):
+        with profile(request.path, kind=VIEW) as record:
+            response = await self.get_response(request)
+            self.finish(request, response, record)
+        return response
+
+    @staticmethod
+    def finish(request, response, record):
+        # the view is only known once the url was resolved
+        if request.resolver_match is not None:
+            record.name = request.resolver_match.view_name
+        record.status = str(response.status_code)
+
+
+# stacks of the profiles of the tasks being executed by the worker, by task id
+_running_tasks = {}
+
+
+def task_name(func, task):
+    if callable(func):
+        return f"{func.__module__}.{func.__qualname__}"
+    return str(task.get("func"))
+
+
+def task_started(sender, func, task, **kwargs):
+    """Receiver of the django_q pre_execute signal"""
+    stack = ExitStack()
+    stack.enter_context(profile(task_name(func, task), kind=TASK))
+    _running_tasks[task.get("id")] = stack
+
+
+def task_finished(sender, func, task, **kwargs):
+    """Receiver of the django_q post_execute_in_worker signal"""
+    stack = _running_tasks.pop(task.get("id"), None)
+    if stack is None:
+        return
+    record = current_record()
+    if record is not None:
+        record.status = "success" if task.get("success") else "failure"
+    stack.close()
+
+
+def connect_task_signals():
+    from django_q.signals import post_execute_in_worker, pre_execute
+
+    pre_execute.connect(task_started, dispatch_uid="profiling_task_started")
+    post_execute_in_worker.connect(task_finished, dispatch_uid="profiling_task_finished")
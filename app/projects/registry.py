@@ -0,0 +1,158 @@
+r"""Compiled registry of the csv files describing parameters, kpis, business models and cost assumptions.
+
+The csv files are parsed once into a json artifact stored next to them in STATIC_ROOT, by the
+compile_parameter_registry management command which runs after collectstatic at deploy time. The artifact holds the
+rows of the csv files as well as the dicts of the named LazyRegistry instances, built from these rows. It is checked
+against the modification times of the csv files once, when a process loads it: the rows of the csv files which
+changed are parsed from the files again and the registries are built again if any csv file changed.
+
+The registries are LazyRegistry dicts, they are only loaded or built when first accessed so that processes which
+never need them (i.e. qcluster workers, most management commands) do not pay for them.
+"""
+
+import copy
+import csv
+import importlib
+import json
+import os
+from collections import UserDict
+from functools import lru_cache
+from django.contrib.staticfiles.storage import staticfiles_storage
+
+REGISTRY_FILE = "parameter_registry.json"
+# csv files of the registry and their delimiter
+REGISTRY_SOURCES = {
+    "MVS_parameters_list.csv": ",",
+    "MVS_kpis_list.csv": ",",
+    "business_model_list.csv": ",",
+    "business_model_report_criteria.csv": ",",
+    "cpn_output_params.csv": ",",
+    "financial_tool/financial_parameters_list.csv": ",",
+    "financial_tool/cost_assumptions.csv": ";",
+}
+# csv files and columns of the parameters whose texts are displayed in the forms, see parameter_strings()
+PARAMETER_STRING_SOURCES = ("MVS_parameters_list.csv", "financial_tool/financial_parameters_list.csv")
+PARAMETER_STRING_COLUMNS = ("verbose", ":Definition_Short:", ":Unit:")
+# modules defining the named LazyRegistry instances, which are compiled into the artifact
+REGISTRY_MODULES = ("projects.helpers", "business_model.helpers", "cp_nigeria.helpers")
+# LazyRegistry instances compiled into the artifact, by name
+COMPILED_REGISTRIES = {}
+
+
+class LazyRegistry(UserDict):
+    """Dict which is filled by the builder function on first access
+
+    The dict of a registry with a name is compiled into the json artifact and read from it instead of being built,
+    its keys and values must then be json serializable (i.e. no lazy translations)
+    """
+
+    def __init__(self, builder, name=None):
+        self._builder = builder
+        self._data = None
+        self.name = name
+        if name is not None:
+            COMPILED_REGISTRIES[name] = self
+
+    @property
+    def data(self):
+        if self._data is None:
+            compiled = load_compiled_registry()["registries"]
+            self._data = compiled[self.name] if self.name in compiled else self._builder()
+        return self._data
+
+    @data.setter
+    def data(self, value):
+        self._data = value
+
+    def __deepcopy__(self, memo):
+        return LazyRegistry(lambda: copy.deepcopy(self.data))
+
+
+def read_csv_rows(filepath, delimiter=","):
+    """Parse a csv file from the static files into a list of rows, the first row being the header"""
+    path = staticfiles_storage.path(filepath)
+    if os.path.exists(path) is False:
+        return []
+    with open(path, encoding="utf-8") as csvfile:
+        return [row for row in csv.reader(csvfile, delimiter=delimiter, quotechar='"')]
+
+
+def source_mtime(filepath):
+    path = staticfiles_storage.path(filepath)
+    return os.path.getmtime(path) if os.path.exists(path) else None
+
+
+def compile_registry():
+    """Parse all the csv files of the registry, build the named registries and store them in the json artifact,
+    return the artifact's path"""
+    files = {}
+    for filepath, delimiter in REGISTRY_SOURCES.items():
+        mtime = source_mtime(filepath)
+        if mtime is not None:
+            files[filepath] = {"mtime": mtime, "rows": read_csv_rows(filepath, delimiter)}
+
+    for module in REGISTRY_MODULES:
+        importlib.import_module(module)
+    # the registries are built from the csv files, not read from the previous artifact
+    registries = {name: registry._builder() for name, registry in COMPILED_REGISTRIES.items()}
+
+    registry_path = staticfiles_storage.path(REGISTRY_FILE)
+    with open(registry_path, "w", encoding="utf-8") as fp:
+        json.dump({"files": files, "registries": registries}, fp)
+    load_compiled_registry.cache_clear()
+    return registry_path
+
+
+@lru_cache(maxsize=None)
+def load_compiled_registry():
+    """Return the rows of the csv files and the registries of the json artifact which are not older than the csv
+    files"""
+    registry_path = staticfiles_storage.path(REGISTRY_FILE)
+    if os.path.exists(registry_path) is False:
+        return {"files": {}, "registries": {}}
+    with open(registry_path, encoding="utf-8") as fp:
+        compiled = json.load(fp)
+
+    files = compiled.get("files", {})
+    changed = {
+        filepath for filepath in REGISTRY_SOURCES if source_mtime(filepath) != files.get(filepath, {}).get("mtime")
+    }
+    return {
+        "files": {filepath: entry for filepath, entry in files.items() if filepath not in changed},
+        # a registry may be built from several csv files
+        "registries": {} if changed else compiled.get("registries", {}),
+    }
+
+
+def csv_rows(filepath):
+    """Return the rows of one of the registry's csv files, the first row being the header"""
+    entry = load_compiled_registry()["files"].get(filepath)
+    # fall back on parsing the csv file if the artifact was not compiled since the file changed
+    if entry is None:
+        return read_csv_rows(filepath, REGISTRY_SOURCES.get(filepath, ","))
+    return entry["rows"]
+
+
+def parameter_strings():
+    """Return the labels, definitions and units of the parameter csv files, which are translated in the forms"""
+    strings = set()
+    for filepath in PARAMETER_STRING_SOURCES:
+        rows = csv_rows(filepath)
+        if len(rows) == 0:
+            continue
+        columns = [rows[0].index(column) for column in PARAMETER_STRING_COLUMNS if column in rows[0]]
+        for row in rows[1:]:
+            strings.update(row[idx] for idx in columns if idx < len(row))
+    # the numbers and placeholders are not translated
+    return sorted(string for string in strings if any(c.isalpha() for c in string) and string.strip() != "None")
+
+
+def csv_to_dict(filepath, label_col="label"):
+    # the csv must contain a column named "label" containing the variable name, which will be used to construct the
+    # nested dictionaries
+    rows = csv_rows(filepath)
+    if len(rows) == 0:
+        return {}
+    hdr = rows[0]
+    label_idx = hdr.index(label_col)
+    return {row[label_idx]: {k: v for k, v in zip(hdr, row)} for row in rows[1:]}
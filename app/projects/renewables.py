@@ -0,0 +1,257 @@
+r"""Providers of hourly renewables profiles (PV and wind) for a location.
+
+The providers are tried in the order given by the RENEWABLES_PROVIDERS setting:
+
+- "renewables_ninja": fetches the profiles from the renewables.ninja API, asynchronously and with a timeout
+- "local": serves precomputed profiles stored as parquet or csv files in RENEWABLES_DATA_DIR
+- "clear_sky": generates a synthetic clear-sky PV profile, used when no data is available (i.e. offline)
+
+Every provider returns a DataFrame with an hourly index and the same columns as the raw renewables.ninja data
+("electricity" for both datasets, "irradiance_direct" and "irradiance_diffuse" for PV, "wind_speed" for wind)
+"""
+
+import asyncio
+import json
+import logging
+import os
+from io import StringIO
+
+import httpx
+import numpy as np
+import pandas as pd
+from asgiref.sync import async_to_sync, sync_to_async
+from django.conf import settings
+from projects.profiling import profile_section
+
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None
+
+logger = logging.getLogger(__name__)
+
+# the profiles cover one (non leap) year in hourly resolution
+PROFILE_YEAR = 2019
+PROFILE_LENGTH = 8760
+
+
+class RenewablesDataUnavailable(Exception):
+    pass
+
+
+def profile_index():
+    return pd.date_range(f"{PROFILE_YEAR}-01-01", periods=PROFILE_LENGTH, freq="h")
+
+
+class RenewablesProvider:
+    name = ""
+    # profiles of cacheable providers are stored in the shared RenewablesResource table
+    cacheable = True
+
+    def get_data(self, dataset, latitude, longitude):
+        """Return the profiles of the dataset ("pv" or "wind") at the location, raise RenewablesDataUnavailable
+        if the provider has no data for it"""
+        raise NotImplementedError
+
+    async def aget_data(self, dataset, latitude, longitude):
+        """Async version of get_data(), run in a thread by default"""
+        return await sync_to_async(self.get_data, thread_sensitive=False)(dataset, latitude, longitude)
+
+
+class RenewablesNinjaProvider(RenewablesProvider):
+    name = "renewables_ninja"
+    api_base = "https://www.renewables.ninja/api/"
+    # request parameters besides the location, panels are assumed to be latitude tilted
+    parameters = {
+        "pv": {
+            "date_from": "2019-01-01",
+            "date_to": "2019-12-31",
+            "dataset": "merra2",
+            "capacity": 1.0,
+            "system_loss": 0.1,
+            "tracking": 0,
+            "azim": 180,
+            "format": "json",
+            "raw": "true",
+        },
+        "wind": {
+            "date_from": "2019-01-01",
+            "date_to": "2019-12-31",
+            "capacity": 1.0,
+            "height": 100,
+            "turbine": "Vestas V80 2000",
+            "format": "json",
+            "raw": "true",
+        },
+    }
+
+    def __init__(self, token=None, timeout=None):
+        # read at instantiation so that a missing token does not prevent the app from starting
+        self.token = token if token is not None else settings.RN_API_TOKEN
+        self.timeout = timeout if timeout is not None else settings.RENEWABLES_API_TIMEOUT
+
+    def request_args(self, dataset, latitude, longitude):
+        args = {"lat": latitude, "lon": longitude, **self.parameters[dataset]}
+        if dataset == "pv":
+            args["tilt"] = latitude
+        return args
+
+    async def fetch(self, dataset, latitude, longitude):
+        if not self.token:
+            raise RenewablesDataUnavailable("The RN_API_TOKEN environment variable is not set")
+        async with httpx.AsyncClient(headers={"Authorization": "Token " + self.token}) as client:
+            logger.info("Sending request to renewables.ninja")
+            try:
+                r = await asyncio.wait_for(
+                    client.get(
+                        self.api_base + f"data/{dataset}", params=self.request_args(dataset, latitude, longitude)
+                    ),
+                    timeout=self.timeout,
+                )
+            except asyncio.TimeoutError:
+                raise RenewablesDataUnavailable(f"renewables.ninja did not answer within {self.timeout} seconds")
+            except httpx.HTTPError as e:
+                raise RenewablesDataUnavailable(f"Request to renewables.ninja failed: {e}")
+        return self.parse_response(r)
+
+    @staticmethod
+    def parse_response(r):
+        try:
+            r.raise_for_status()  # Raise HTTPError for bad responses (4xx and 5xx)
+            parsed_response = json.loads(r.text)
+            return pd.read_json(StringIO(json.dumps(parsed_response["data"])), orient="index")
+        except (httpx.HTTPStatusError, json.decoder.JSONDecodeError, KeyError, ValueError) as e:
+            raise RenewablesDataUnavailable(f"Could not parse the renewables.ninja response: {e}")
+
+    @profile_section("http")
+    def get_data(self, dataset, latitude, longitude):
+        return async_to_sync(self.fetch)(dataset, latitude, longitude)
+
+    async def aget_data(self, dataset, latitude, longitude):
+        with profile_section("http"):
+            return await self.fetch(dataset, latitude, longitude)
+
+
+class LocalFileProvider(RenewablesProvider):
+    """Serve precomputed profiles from files named <dataset>_<latitude>_<longitude>.parquet (or .csv) with the
+    coordinates formatted with 2 decimals, i.e. pv_9.08_7.49.csv, the first column holds the timestamps"""
+
+    name = "local"
+    # the files are a fallback for the API, storing their profiles would shadow the API data of the location
+    cacheable = False
+
+    def __init__(self, data_dir=None):
+        self.data_dir = data_dir if data_dir is not None else settings.RENEWABLES_DATA_DIR
+
+    def file_path(self, dataset, latitude, longitude, extension):
+        return os.path.join(self.data_dir, f"{dataset}_{latitude:.2f}_{longitude:.2f}.{extension}")
+
+    def get_data(self, dataset, latitude, longitude):
+        parquet_file = self.file_path(dataset, latitude, longitude, "parquet")
+        csv_file = self.file_path(dataset, latitude, longitude, "csv")
+        if pyarrow is not None and os.path.exists(parquet_file):
+            return pd.read_parquet(parquet_file)
+        if os.path.exists(csv_file):
+            return pd.read_csv(csv_file, index_col=0, parse_dates=True)
+        raise RenewablesDataUnavailable(f"No local {dataset} profile found for ({latitude}, {longitude})")
+
+
+class ClearSkyPVProvider(RenewablesProvider):
+    """Synthetic PV profile of a latitude tilted, equator facing panel under clear sky conditions
+
+    The global horizontal irradiance follows the Haurwitz clear sky model, 15% of it are assumed to be diffuse
+    """
+
+    name = "clear_sky"
+    # synthetic profiles are cheap to compute and should not be shared as if they were measured data
+    cacheable = False
+    system_loss = 0.1
+    diffuse_fraction = 0.15
+
+    def get_data(self, dataset, latitude, longitude):
+        if dataset != "pv":
+            raise RenewablesDataUnavailable(f"No synthetic {dataset} profile available")
+
+        index = profile_index()
+        day_of_year = index.dayofyear.to_numpy()
+        # the timestamps are in UTC, the local solar time is shifted by the longitude
+        solar_time = index.hour.to_numpy() + 0.5 + longitude / 15
+        latitude_rad = np.radians(latitude)
+        declination = np.radians(23.45) * np.sin(2 * np.pi * (284 + day_of_year) / 365)
+        hour_angle = np.radians(15 * (solar_time - 12))
+
+        cos_zenith = np.sin(latitude_rad) * np.sin(declination) + np.cos(latitude_rad) * np.cos(declination) * np.cos(
+            hour_angle
+        )
+        cos_zenith = np.clip(cos_zenith, 0, 1)
+        with np.errstate(divide="ignore"):
+            ghi = np.where(cos_zenith > 0, 1098 * cos_zenith * np.exp(-0.057 / cos_zenith), 0)  # W/m2
+
+        direct_horizontal = (1 - self.diffuse_fraction) * ghi
+        diffuse = self.diffuse_fraction * ghi
+        # angle of incidence on a panel tilted by the latitude towards the equator
+        cos_incidence = np.clip(np.cos(declination) * np.cos(hour_angle), 0, None)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            direct_normal = np.where(cos_zenith > 0.05, direct_horizontal / cos_zenith, 0)
+        plane_of_array = direct_normal * cos_incidence + diffuse * (1 + np.cos(latitude_rad)) / 2
+
+        return pd.DataFrame(
+            {
+                "electricity": np.clip(plane_of_array / 1000 * (1 - self.system_loss), 0, 1),
+                "irradiance_direct": direct_horizontal / 1000,
+                "irradiance_diffuse": diffuse / 1000,
+            },
+            index=index,
+        )
+
+
+RENEWABLES_PROVIDERS = {
+    provider.name: provider for provider in (RenewablesNinjaProvider, LocalFileProvider, ClearSkyPVProvider)
+}
+
+
+def get_renewables_providers(names=None):
+    if names is None:
+        names = settings.RENEWABLES_PROVIDERS
+    return [RENEWABLES_PROVIDERS[name.strip()]() for name in names]
+
+
+def _is_valid(provider, dataset, data):
+    if isinstance(data, pd.DataFrame) and not data.empty:
+        return True
+    logger.warning(f"Provider {provider.name} returned empty {dataset} data")
+    return False
+
+
+def fetch_renewables_data(dataset, latitude, longitude, providers=None):
+    """Return the profiles of the first provider which has data for the location, along with that provider"""
+    if providers is None:
+        providers = get_renewables_providers()
+    for provider in providers:
+        try:
+            data = provider.get_data(dataset, latitude, longitude)
+        except RenewablesDataUnavailable as e:
+            logger.warning(f"Provider {provider.name} could not provide {dataset} data: {e}")
+            continue
+        if _is_valid(provider, dataset, data):
+            return data, provider
+    raise RenewablesDataUnavailable(
+        f"None of the renewables providers has {dataset} data for ({latitude}, {longitude})"
+    )
+
+
+async def afetch_renewables_data(dataset, latitude, longitude, providers=None):
+    """Async version of fetch_renewables_data()"""
+    if providers is None:
+        providers = get_renewables_providers()
+    for provider in providers:
+        try:
+            data = await provider.aget_data(dataset, latitude, longitude)
+        except RenewablesDataUnavailable as e:
+            logger.warning(f"Provider {provider.name} could not provide {dataset} data: {e}")
+            continue
+        if _is_valid(provider, dataset, data):
+            return data, provider
+    raise RenewablesDataUnavailable(
+        f"None of the renewables providers has {dataset} data for ({latitude}, {longitude})"
+    )
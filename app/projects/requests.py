@@ -1,227 +1,323 @@
-from datetime import datetime
-import httpx as requests
-import json
-import numpy as np
-
-# from requests.exceptions import HTTPError
-from epa.settings import PROXY_CONFIG, MVS_POST_URL, MVS_GET_URL, MVS_SA_POST_URL, MVS_SA_GET_URL, EXCHANGE_RATES_URL
-from dashboard.models import (
-    FancyResults,
-    AssetsResults,
-    KPICostsMatrixResults,
-    KPIScalarResults,
-    FlowResults,
-)
-from projects.constants import DONE, PENDING, ERROR
-import logging
-
-logger = logging.getLogger(__name__)
-
-
-def request_exchange_rate(currency):
-    try:
-        response = requests.get(EXCHANGE_RATES_URL)
-        response.raise_for_status()
-
-    except requests.HTTPError as http_err:
-        logger.warning(
-            f"An error occurred: {http_err}. Custom exchange rate could not "
-            f"be fetched, please enter it manually instead."
-        )
-        exchange_rate = 1
-    else:
-        data = response.json()
-        exchange_rate = round(data["conversion_rates"][currency], 2)
-
-    return exchange_rate
-
-
-def mvs_simulation_request(data: dict):
-    headers = {"content-type": "application/json"}
-    payload = json.dumps(data)
-
-    try:
-        response = requests.post(
-            MVS_POST_URL,
-            data=payload,
-            headers=headers,
-            proxies=PROXY_CONFIG,
-            verify=False,
-        )
-
-        # If the response was successful, no Exception will be raised
-        response.raise_for_status()
-    except requests.HTTPError as http_err:
-        logger.error(f"HTTP error occurred: {http_err}")
-        return None
-    except Exception as err:
-        logger.error(f"Other error occurred: {err}")
-        return None
-    else:
-        logger.info("The simulation was sent successfully to MVS API.")
-        return json.loads(response.text)
-
-
-def mvs_simulation_check_status(token):
-    try:
-        response = requests.get(MVS_GET_URL + token, proxies=PROXY_CONFIG, verify=False)
-        response.raise_for_status()
-    except requests.HTTPError as http_err:
-        logger.error(f"HTTP error occurred: {http_err}")
-        return None
-    except Exception as err:
-        logger.error(f"Other error occurred: {err}")
-        return None
-    else:
-        logger.info("Success!")
-        return json.loads(response.text)
-
-
-def mvs_sa_check_status(token):
-    try:
-        response = requests.get(MVS_SA_GET_URL + token, proxies=PROXY_CONFIG, verify=False)
-        response.raise_for_status()
-    except requests.HTTPError as http_err:
-        logger.error(f"HTTP error occurred: {http_err}")
-        return None
-    except Exception as err:
-        logger.error(f"Other error occurred: {err}")
-        return None
-    else:
-        logger.info("Success!")
-        return json.loads(response.text)
-
-
-def fetch_mvs_simulation_results(simulation):
-    if simulation.status == PENDING:
-        response = mvs_simulation_check_status(token=simulation.mvs_token)
-        try:
-            simulation.status = response["status"]
-            simulation.errors = json.dumps(response["results"][ERROR]) if simulation.status == ERROR else None
-            simulation.results = (
-                parse_mvs_results(simulation, response["results"]) if simulation.status == DONE else None
-            )
-            simulation.mvs_version = response["mvs_version"]
-            logger.info(f"The simulation {simulation.id} is finished")
-        except:
-            simulation.status = ERROR
-            simulation.results = None
-
-        simulation.elapsed_seconds = (datetime.now() - simulation.start_date).seconds
-        simulation.end_date = datetime.now() if response["status"] in [ERROR, DONE] else None
-        simulation.save()
-
-    return simulation.status != PENDING
-
-
-def fetch_mvs_sa_results(simulation):
-    if simulation.status == PENDING:
-        response = mvs_sa_check_status(token=simulation.mvs_token)
-
-        simulation.parse_server_response(response)
-
-        if simulation.status == DONE:
-            logger.info(f"The simulation {simulation.id} is finished")
-
-    return simulation.status != PENDING
-
-
-def parse_mvs_results(simulation, response_results):
-    data = json.loads(response_results)
-    asset_key_list = [
-        "energy_consumption",
-        "energy_conversion",
-        "energy_production",
-        "energy_providers",
-        "energy_storage",
-    ]
-
-    if not set(asset_key_list).issubset(data.keys()):
-        raise KeyError("There are missing keys from the received dictionary.")
-
-    # Write Scalar KPIs to db
-    qs = KPIScalarResults.objects.filter(simulation=simulation)
-    if qs.exists():
-        kpi_scalar = qs.first()
-        kpi_scalar.scalar_values = json.dumps(data["kpi"]["scalars"])
-        kpi_scalar.save()
-    else:
-        KPIScalarResults.objects.create(scalar_values=json.dumps(data["kpi"]["scalars"]), simulation=simulation)
-    # Write Cost Matrix KPIs to db
-    qs = KPICostsMatrixResults.objects.filter(simulation=simulation)
-    if qs.exists():
-        kpi_costs = qs.first()
-        kpi_costs.cost_values = json.dumps(data["kpi"]["cost_matrix"])
-        kpi_costs.save()
-    else:
-        KPICostsMatrixResults.objects.create(cost_values=json.dumps(data["kpi"]["cost_matrix"]), simulation=simulation)
-    # Write Assets to db
-    data_subdict = {category: v for category, v in data.items() if category in asset_key_list}
-    qs = AssetsResults.objects.filter(simulation=simulation)
-    if qs.exists():
-        asset_results = qs.first()
-        asset_results.asset_list = json.dumps(data_subdict)
-        asset_results.save()
-    else:
-        AssetsResults.objects.create(assets_list=json.dumps(data_subdict), simulation=simulation)
-
-    qs = FancyResults.objects.filter(simulation=simulation)
-    if qs.exists():
-        raise ValueError("Already existing FancyResults")
-    else:
-        # TODO add safety here with json schema
-        # Raw results is a panda dataframe which was saved to json using "split"
-        if "raw_results" in data:
-            results = data["raw_results"]
-            js = json.loads(results)
-            js_data = np.array(js["data"])
-
-            hdrs = [
-                "bus",
-                "energy_vector",
-                "direction",
-                "asset",
-                "asset_type",
-                "oemof_type",
-                "flow_data",
-                "optimized_capacity",
-            ]
-
-            # each columns already contains the values of the hdrs except for flow_data and optimized_capacity
-            # we append those values here
-            for i, col in enumerate(js["columns"]):
-                col.append(js_data[:-1, i].tolist())
-                col.append(js_data[-1, i])
-
-                kwargs = {hdr: item for hdr, item in zip(hdrs, col)}
-                kwargs["simulation"] = simulation
-                fr = FancyResults(**kwargs)
-                fr.save()
-
-    return response_results
-
-
-def mvs_sensitivity_analysis_request(data: dict):
-    headers = {"content-type": "application/json"}
-    payload = json.dumps(data)
-
-    try:
-        response = requests.post(
-            MVS_SA_POST_URL,
-            data=payload,
-            headers=headers,
-            proxies=PROXY_CONFIG,
-            verify=False,
-        )
-
-        # If the response was successful, no Exception will be raised
-        response.raise_for_status()
-    except requests.HTTPError as http_err:
-        logger.error(f"HTTP error occurred: {http_err}")
-        return None
-    except Exception as err:
-        logger.error(f"Other error occurred: {err}")
-        return None
-    else:
-        logger.info("The simulation was sent successfully to MVS API.")
-        return json.loads(response.text)
+from datetime import datetime
+import httpx as requests
+import json
+import numpy as np
+from asgiref.sync import sync_to_async
+from django.db import transaction
+
+# from requests.exceptions import HTTPError
+from django.conf import settings
+from epa.settings import MVS_SA_POST_URL, MVS_SA_GET_URL, EXCHANGE_RATES_URL
+from dashboard.models import (
+    FancyResults,
+    AssetsResults,
+    KPICostsMatrixResults,
+    KPIScalarResults,
+    FlowResults,
+)
+from projects.constants import DONE, PENDING, ERROR
+from projects.models import Simulation
+from projects.profiling import profile_section
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+@profile_section("http")
+def request_exchange_rate(currency):
+    try:
+        response = requests.get(EXCHANGE_RATES_URL)
+        response.raise_for_status()
+
+    except requests.HTTPError as http_err:
+        logger.warning(
+            f"An error occurred: {http_err}. Custom exchange rate could not "
+            f"be fetched, please enter it manually instead."
+        )
+        exchange_rate = 1
+    else:
+        data = response.json()
+        exchange_rate = round(data["conversion_rates"][currency], 2)
+
+    return exchange_rate
+
+
+def mvs_client():
+    """Client of the MVS API, whose requests go through the proxies of the PROXY_CONFIG setting"""
+    mounts = {
+        pattern: requests.HTTPTransport(proxy=proxy, verify=False) for pattern, proxy in settings.PROXY_CONFIG.items()
+    }
+    return requests.Client(mounts=mounts, verify=False)
+
+
+def async_mvs_client():
+    """Async version of mvs_client(), for the async views"""
+    mounts = {
+        pattern: requests.AsyncHTTPTransport(proxy=proxy, verify=False)
+        for pattern, proxy in settings.PROXY_CONFIG.items()
+    }
+    return requests.AsyncClient(mounts=mounts, verify=False)
+
+
+@profile_section("http")
+def mvs_simulation_request(data: dict):
+    headers = {"content-type": "application/json"}
+    payload = json.dumps(data)
+
+    try:
+        with mvs_client() as client:
+            response = client.post(settings.MVS_POST_URL, content=payload, headers=headers)
+
+        # If the response was successful, no Exception will be raised
+        response.raise_for_status()
+    except requests.HTTPError as http_err:
+        logger.error(f"HTTP error occurred: {http_err}")
+        return None
+    except Exception as err:
+        logger.error(f"Other error occurred: {err}")
+        return None
+    else:
+        logger.info("The simulation was sent successfully to MVS API.")
+        return json.loads(response.text)
+
+
+@profile_section("http")
+def mvs_simulation_check_status(token):
+    try:
+        with mvs_client() as client:
+            response = client.get(settings.MVS_GET_URL + token)
+        response.raise_for_status()
+    except requests.HTTPError as http_err:
+        logger.error(f"HTTP error occurred: {http_err}")
+        return None
+    except Exception as err:
+        logger.error(f"Other error occurred: {err}")
+        return None
+    else:
+        logger.info("Success!")
+        return json.loads(response.text)
+
+
+async def amvs_simulation_check_status(token):
+    """Async version of mvs_simulation_check_status(), which does not block the worker while MVS answers"""
+    try:
+        with profile_section("http"):
+            async with async_mvs_client() as client:
+                response = await client.get(settings.MVS_GET_URL + token)
+        response.raise_for_status()
+    except requests.HTTPError as http_err:
+        logger.error(f"HTTP error occurred: {http_err}")
+        return None
+    except Exception as err:
+        logger.error(f"Other error occurred: {err}")
+        return None
+    else:
+        return json.loads(response.text)
+
+
+@profile_section("http")
+def mvs_sa_check_status(token):
+    try:
+        with mvs_client() as client:
+            response = client.get(MVS_SA_GET_URL + token)
+        response.raise_for_status()
+    except requests.HTTPError as http_err:
+        logger.error(f"HTTP error occurred: {http_err}")
+        return None
+    except Exception as err:
+        logger.error(f"Other error occurred: {err}")
+        return None
+    else:
+        logger.info("Success!")
+        return json.loads(response.text)
+
+
+def fetch_mvs_simulation_results(simulation, response=None):
+    """Update a pending simulation from the status of its MVS job, which is requested unless response is given"""
+    if simulation.status == PENDING:
+        if response is None:
+            response = mvs_simulation_check_status(token=simulation.mvs_token)
+        try:
+            simulation.status = response["status"]
+            simulation.errors = json.dumps(response["results"][ERROR]) if simulation.status == ERROR else None
+            simulation.results = (
+                parse_mvs_results(simulation, response["results"]) if simulation.status == DONE else None
+            )
+            simulation.mvs_version = response["mvs_version"]
+            logger.info(f"The simulation {simulation.id} is finished")
+        except:
+            simulation.status = ERROR
+            simulation.results = None
+
+        simulation.elapsed_seconds = (datetime.now() - simulation.start_date).seconds
+        simulation.end_date = datetime.now() if response["status"] in [ERROR, DONE] else None
+        simulation.save()
+
+    return simulation.status != PENDING
+
+
+async def afetch_mvs_simulation_results(simulation):
+    """Async version of fetch_mvs_simulation_results(), the simulation stays pending if MVS could not be reached"""
+    if simulation.status != PENDING:
+        return True
+    response = await amvs_simulation_check_status(token=simulation.mvs_token)
+    if response is None:
+        return False
+    return await sync_to_async(_store_mvs_simulation_results)(simulation, response)
+
+
+def _store_mvs_simulation_results(simulation, response):
+    # a concurrent request for the same simulation might have stored the results while waiting for MVS
+    simulation.refresh_from_db(fields=["status"])
+    return fetch_mvs_simulation_results(simulation, response)
+
+
+def fetch_mvs_sa_results(simulation):
+    if simulation.status == PENDING:
+        response = mvs_sa_check_status(token=simulation.mvs_token)
+
+        simulation.parse_server_response(response)
+
+        if simulation.status == DONE:
+            logger.info(f"The simulation {simulation.id} is finished")
+
+    return simulation.status != PENDING
+
+
+def parse_mvs_results(simulation, response_results):
+    data = json.loads(response_results)
+    asset_key_list = [
+        "energy_consumption",
+        "energy_conversion",
+        "energy_production",
+        "energy_providers",
+        "energy_storage",
+    ]
+
+    if not set(asset_key_list).issubset(data.keys()):
+        raise KeyError("There are missing keys from the received dictionary.")
+
+    # Write Scalar KPIs to db
+    qs = KPIScalarResults.objects.filter(simulation=simulation)
+    if qs.exists():
+        kpi_scalar = qs.first()
+        kpi_scalar.scalar_values = json.dumps(data["kpi"]["scalars"])
+        kpi_scalar.save()
+    else:
+        KPIScalarResults.objects.create(scalar_values=json.dumps(data["kpi"]["scalars"]), simulation=simulation)
+    # Write Cost Matrix KPIs to db
+    qs = KPICostsMatrixResults.objects.filter(simulation=simulation)
+    if qs.exists():
+        kpi_costs = qs.first()
+        kpi_costs.cost_values = json.dumps(data["kpi"]["cost_matrix"])
+        kpi_costs.save()
+    else:
+        KPICostsMatrixResults.objects.create(cost_values=json.dumps(data["kpi"]["cost_matrix"]), simulation=simulation)
+    # Write Assets to db
+    data_subdict = {category: v for category, v in data.items() if category in asset_key_list}
+    qs = AssetsResults.objects.filter(simulation=simulation)
+    if qs.exists():
+        asset_results = qs.first()
+        asset_results.asset_list = json.dumps(data_subdict)
+        asset_results.save()
+    else:
+        AssetsResults.objects.create(assets_list=json.dumps(data_subdict), simulation=simulation)
+
+    qs = FancyResults.objects.filter(simulation=simulation)
+    if qs.exists():
+        raise ValueError("Already existing FancyResults")
+    else:
+        # TODO add safety here with json schema
+        # Raw results is a panda dataframe which was saved to json using "split"
+        if "raw_results" in data:
+            results = data["raw_results"]
+            js = json.loads(results)
+            js_data = np.array(js["data"])
+
+            hdrs = [
+                "bus",
+                "energy_vector",
+                "direction",
+                "asset",
+                "asset_type",
+                "oemof_type",
+                "flow_data",
+                "optimized_capacity",
+            ]
+
+            # each columns already contains the values of the hdrs except for flow_data and optimized_capacity
+            # we append those values here
+            for i, col in enumerate(js["columns"]):
+                col.append(js_data[:-1, i].tolist())
+                col.append(js_data[-1, i])
+
+                kwargs = {hdr: item for hdr, item in zip(hdrs, col)}
+                kwargs["simulation"] = simulation
+                fr = FancyResults(**kwargs)
+                fr.save()
+
+    return response_results
+
+
+# result rows of a simulation, copied when the results of a simulation are reused
+SIMULATION_RESULT_MODELS = (KPIScalarResults, KPICostsMatrixResults, AssetsResults, FlowResults, FancyResults)
+
+
+def reusable_simulation(payload_hash):
+    """Return the latest completed simulation of the same payload, if it was run by the current MVS version
+
+    The current MVS version is the one of the latest completed simulation, so that the results of an older version
+    are not reused anymore as soon as a simulation was run by a newer one
+    """
+    completed = Simulation.objects.filter(status=DONE, mvs_version__isnull=False, results__isnull=False)
+    mvs_version = completed.order_by("-end_date").values_list("mvs_version", flat=True).first()
+    return completed.filter(payload_hash=payload_hash, mvs_version=mvs_version).order_by("-end_date").first()
+
+
+def clone_simulation_results(source, scenario_id):
+    """Replace the simulation of the scenario by a copy of a completed simulation and of its results"""
+    if source.scenario_id == scenario_id:
+        return source
+    with transaction.atomic():
+        Simulation.objects.filter(scenario_id=scenario_id).delete()
+        simulation = Simulation.objects.create(
+            scenario_id=scenario_id,
+            end_date=datetime.now(),
+            elapsed_seconds=0,
+            mvs_token=source.mvs_token,
+            mvs_version=source.mvs_version,
+            status=DONE,
+            results=source.results,
+            payload_hash=source.payload_hash,
+            payload_snapshot=source.payload_snapshot,
+        )
+        for model in SIMULATION_RESULT_MODELS:
+            rows = list(model.objects.filter(simulation=source))
+            for row in rows:
+                row.pk = None
+                row.simulation = simulation
+            model.objects.bulk_create(rows)
+    logger.info(f"The results of the simulation {source.id} were reused for the scenario {scenario_id}")
+    return simulation
+
+
+@profile_section("http")
+def mvs_sensitivity_analysis_request(data: dict):
+    headers = {"content-type": "application/json"}
+    payload = json.dumps(data)
+
+    try:
+        with mvs_client() as client:
+            response = client.post(MVS_SA_POST_URL, content=payload, headers=headers)
+
+        # If the response was successful, no Exception will be raised
+        response.raise_for_status()
+    except requests.HTTPError as http_err:
+        logger.error(f"HTTP error occurred: {http_err}")
+        return None
+    except Exception as err:
+        logger.error(f"Other error occurred: {err}")
+        return None
+    else:
+        logger.info("The simulation was sent successfully to MVS API.")
+        return json.loads(response.text)
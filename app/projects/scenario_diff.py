@@ -0,0 +1,260 @@
+r"""Structural diff of the simulation payloads of scenarios.
+
+A payload (as returned by format_scenario_for_mvs) is split into nodes: each asset, storage and bus is a node keyed by
+its section and label (i.e. "energy_production/pv_plant"), the other sections (economic data, simulation settings,
+constraints) are nodes keyed by their name. The parameters of a node are its nested keys joined by dots (i.e.
+"capex_var.value"), lists (timeseries, bus assets) are compared as a whole. As for simulation_payload_hash, the
+identifiers of the project, scenario and assets are not part of the nodes.
+
+    diff = diff_payloads(reference_payload, payload)
+    diff.changed  # {"energy_production/pv_plant": {"capex_var.value": [1000, 1200]}}
+    diff.apply(reference_payload)  # the payload, up to the identifiers, without converting the scenario again
+
+The diffs of scenarios compared with a reference scenario are stored as ScenarioDiff, and each simulation keeps the
+compact nodes of its payload so that the changes made to a scenario since its simulation can be listed. In compact
+nodes and diffs the long lists are replaced by their digest, a stored diff only holds the new value of the changed
+long lists. The settings which are set by the simulation request rather than by the scenario (REQUEST_PARAMETERS) are
+not part of the snapshots.
+"""
+
+import copy
+import hashlib
+import json
+from dataclasses import dataclass, field
+
+from projects.dtos import value_type_units
+from projects.helpers import (
+    UNORDERED_PAYLOAD_LISTS,
+    canonical_payload,
+    format_scenario_for_mvs,
+    simulation_payload_hash,
+)
+from projects.models import ScenarioDiff, Simulation
+
+# lists longer than this are replaced by their digest in the compact nodes
+COMPACT_LIST_LENGTH = 24
+PARAMETER_SEPARATOR = "."
+NODE_SEPARATOR = "/"
+# parameters of the payload set by the simulation request, i.e. the lp file requested with request_mvs_simulation
+REQUEST_PARAMETERS = {"simulation_settings": ("output_lp_file",)}
+
+
+def compact(value):
+    """Replace the long lists of a value by their digest and length"""
+    if isinstance(value, dict):
+        return {k: compact(v) for k, v in value.items()}
+    if isinstance(value, list) and len(value) > COMPACT_LIST_LENGTH:
+        dump = json.dumps(value, sort_keys=True, separators=(",", ":"))
+        return {"sha256": hashlib.sha256(dump.encode("utf-8")).hexdigest(), "length": len(value)}
+    return value
+
+
+def is_digest(value):
+    return isinstance(value, dict) and set(value) == {"sha256", "length"}
+
+
+def node_key(section, label, occurrence):
+    key = f"{section}{NODE_SEPARATOR}{label}"
+    # the labels are unique within a scenario, but nothing prevents two assets from having the same name
+    return key if occurrence == 1 else f"{key}#{occurrence}"
+
+
+def split_node_key(key):
+    """Return the section, label and occurrence of a node key, the label is None for the nodes of a section"""
+    if NODE_SEPARATOR not in key:
+        return key, None, 1
+    section, label = key.split(NODE_SEPARATOR, 1)
+    occurrence = 1
+    if "#" in label:
+        name, suffix = label.rsplit("#", 1)
+        if suffix.isdigit():
+            label, occurrence = name, int(suffix)
+    return section, label, occurrence
+
+
+def payload_nodes(payload, compact_lists=False):
+    """Return the nodes of a simulation payload keyed by their node key"""
+    nodes = {}
+    for section, value in canonical_payload(payload).items():
+        if section in UNORDERED_PAYLOAD_LISTS and isinstance(value, list):
+            occurrences = {}
+            for item in value:
+                label = item.get("label")
+                occurrences[label] = occurrences.get(label, 0) + 1
+                nodes[node_key(section, label, occurrences[label])] = item
+        else:
+            nodes[section] = value
+    if compact_lists is True:
+        nodes = {key: compact(node) for key, node in nodes.items()}
+    return nodes
+
+
+def node_parameters(node, prefix=""):
+    """Flatten the nested dicts of a node into {parameter: value}"""
+    if not isinstance(node, dict) or is_digest(node):
+        return {prefix: node}
+    parameters = {}
+    for k, v in node.items():
+        parameters.update(node_parameters(v, f"{prefix}{PARAMETER_SEPARATOR}{k}" if prefix else k))
+    return parameters
+
+
+def set_parameter(node, parameter, value):
+    """Set a parameter of a node, a value of None removes it"""
+    *path, name = parameter.split(PARAMETER_SEPARATOR)
+    for k in path:
+        node = node.setdefault(k, {})
+    if value is None:
+        node.pop(name, None)
+    else:
+        node[name] = copy.deepcopy(value)
+
+
+@dataclass
+class PayloadDiff:
+    """Nodes added and removed and parameters changed ([old value, new value]) of a payload compared to a reference"""
+
+    added: dict = field(default_factory=dict)
+    removed: dict = field(default_factory=dict)
+    changed: dict = field(default_factory=dict)
+
+    def __bool__(self):
+        return bool(self.added or self.removed or self.changed)
+
+    @property
+    def nodes(self):
+        """Keys of the nodes which differ"""
+        return sorted({*self.added, *self.removed, *self.changed})
+
+    def to_dict(self):
+        return {"added": self.added, "removed": self.removed, "changed": self.changed}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(added=data.get("added", {}), removed=data.get("removed", {}), changed=data.get("changed", {}))
+
+    def compact(self):
+        """Return the diff with the long lists of the removed nodes and of the old values replaced by their digest"""
+        return PayloadDiff(
+            added=self.added,
+            removed={key: compact(node) for key, node in self.removed.items()},
+            changed={
+                key: {parameter: [compact(old), new] for parameter, (old, new) in parameters.items()}
+                for key, parameters in self.changed.items()
+            },
+        )
+
+    def apply(self, payload):
+        """Return a copy of the reference payload with the changes applied
+
+        The identifiers of the project, scenario and existing assets are those of the reference payload and the added
+        nodes have none, but the simulation_payload_hash of the result is the one of the compared payload.
+        """
+        payload = copy.deepcopy(payload)
+        for key, parameters in self.changed.items():
+            section, label, occurrence = split_node_key(key)
+            node = payload.setdefault(section, {}) if label is None else self._find(payload, section, label, occurrence)
+            for parameter, (_, new) in parameters.items():
+                if is_digest(new):
+                    raise ValueError(f"The diff only holds the digest of {key} {parameter}, it cannot be applied")
+                if parameter == "":
+                    payload[section] = copy.deepcopy(new)
+                else:
+                    set_parameter(node, parameter, new)
+        # the occurrences of the labels are those of the reference payload until the nodes are removed
+        for key in self.removed:
+            section, label, occurrence = split_node_key(key)
+            if label is None:
+                payload.pop(section, None)
+            else:
+                item = self._find(payload, section, label, occurrence)
+                payload[section] = [other for other in payload[section] if other is not item]
+        for key, node in self.added.items():
+            section, label, _ = split_node_key(key)
+            if label is None:
+                payload[section] = copy.deepcopy(node)
+            else:
+                payload.setdefault(section, []).append(copy.deepcopy(node))
+        return payload
+
+    @staticmethod
+    def _find(payload, section, label, occurrence):
+        items = [item for item in payload.get(section, []) if item.get("label") == label]
+        # the occurrences are counted in the order of the canonical payload
+        items.sort(key=lambda item: json.dumps(canonical_payload(item), sort_keys=True))
+        if len(items) < occurrence:
+            raise KeyError(f"The payload has no node {node_key(section, label, occurrence)}")
+        return items[occurrence - 1]
+
+
+def diff_nodes(reference_nodes, nodes):
+    """Return the PayloadDiff of the nodes compared to the reference nodes, in a single pass over both"""
+    diff = PayloadDiff()
+    for key in sorted({*reference_nodes, *nodes}):
+        if key not in nodes:
+            diff.removed[key] = reference_nodes[key]
+        elif key not in reference_nodes:
+            diff.added[key] = nodes[key]
+        elif reference_nodes[key] != nodes[key]:
+            old, new = node_parameters(reference_nodes[key]), node_parameters(nodes[key])
+            diff.changed[key] = {
+                parameter: [old.get(parameter), new.get(parameter)]
+                for parameter in sorted({*old, *new})
+                if old.get(parameter) != new.get(parameter)
+            }
+    return diff
+
+
+def diff_payloads(reference_payload, payload):
+    return diff_nodes(payload_nodes(reference_payload), payload_nodes(payload))
+
+
+def scenario_payloads(scenarios, testing=False):
+    """Return the simulation payloads of the scenarios, the units of the value types are loaded once for all"""
+    units = value_type_units()
+    return [format_scenario_for_mvs(scenario, testing=testing, units=units) for scenario in scenarios]
+
+
+def scenario_diff(scenario, reference, save=True):
+    """Return the PayloadDiff of the scenario compared to the reference scenario, stored as a ScenarioDiff if save"""
+    reference_payload, payload = scenario_payloads([reference, scenario])
+    diff = diff_payloads(reference_payload, payload)
+    if save is True:
+        ScenarioDiff.objects.update_or_create(
+            scenario=scenario,
+            reference=reference,
+            defaults={
+                "scenario_hash": simulation_payload_hash(payload),
+                "reference_hash": simulation_payload_hash(reference_payload),
+                "changes": json.dumps(diff.compact().to_dict()),
+            },
+        )
+    return diff
+
+
+def snapshot_nodes(payload):
+    """Compact nodes of the payload, without the parameters set by the simulation request"""
+    nodes = payload_nodes(payload, compact_lists=True)
+    for key, parameters in REQUEST_PARAMETERS.items():
+        if isinstance(nodes.get(key), dict):
+            nodes[key] = {name: value for name, value in nodes[key].items() if name not in parameters}
+    return nodes
+
+
+def payload_snapshot(payload):
+    """Json of the snapshot nodes of the payload, stored with the simulation of the payload"""
+    return json.dumps(snapshot_nodes(payload), sort_keys=True)
+
+
+def simulation_diff(scenario, payload=None):
+    """Return the PayloadDiff of the scenario since its simulation, None if the simulated payload is not known
+
+    An empty diff means that the results of the simulation are those of the scenario. The long lists of the changed
+    parameters are compared with their digest.
+    """
+    snapshot = Simulation.objects.filter(scenario=scenario).values_list("payload_snapshot", flat=True).first()
+    if snapshot is None:
+        return None
+    if payload is None:
+        payload = format_scenario_for_mvs(scenario)
+    return diff_nodes(json.loads(snapshot), snapshot_nodes(payload))
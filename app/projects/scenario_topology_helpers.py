@@ -1,5 +1,9 @@
 import uuid
+from collections import Counter
+from dataclasses import dataclass, field
 import numpy as np
+from django.db import transaction
+from django.http import Http404
 from django.shortcuts import get_object_or_404
 from projects.models import (
     Bus,
@@ -17,6 +21,7 @@ from projects.models import (
 import json
 from django.core.exceptions import NON_FIELD_ERRORS, ValidationError
 from projects.forms import AssetCreateForm, BusForm, StorageForm
+from projects.models.payloads import PayloadFieldMixin
 from django.template.loader import get_template
 from django.utils.translation import gettext_lazy as _
 
@@ -429,6 +434,166 @@ def duplicate_scenario_connections(connections_list, scenario, asset_map, bus_ma
 
 
 # endregion
+
+
+# region Bulk loading of exported projects and scenarios
+class BulkLoader:
+    """Insert the projects and scenarios produced by the export() methods in bulk
+
+    The rows are inserted with one query per model and batch (all the scenarios of a project at once, then all their
+    assets, ...), the foreign keys between the new rows are resolved in memory and the existing asset types are reused,
+    the missing ones are created from the exported asset_info. In a dry run nothing is written and counts holds the
+    number of rows which would be inserted per model.
+    The loader does not open a transaction, see load_projects_in_bulk().
+    """
+
+    def __init__(self, dry_run=False, batch_size=None):
+        self.dry_run = dry_run
+        self.batch_size = batch_size
+        self.counts = Counter()
+        self.asset_types = {}
+
+    def bulk_create(self, model, objs):
+        self.counts[model.__name__] += len(objs)
+        if self.dry_run is False and len(objs) > 0:
+            # the timeseries of all the objects are interned at once instead of one object at a time
+            for field in model._meta.concrete_fields:
+                if isinstance(field, PayloadFieldMixin):
+                    field.intern(objs)
+            model.objects.bulk_create(objs, batch_size=self.batch_size)
+        return objs
+
+    def load_projects(self, projects_data, user=None, model=Project):
+        """Create the projects (or usecases if model is UseCase) and their scenarios, return the projects"""
+        projects_data = [dict(project_data) for project_data in projects_data]
+        scenario_sets = [project_data.pop("scenario_set_data", None) or [] for project_data in projects_data]
+        economic_data = self.bulk_create(
+            EconomicData, [EconomicData(**project_data["economic_data"]) for project_data in projects_data]
+        )
+        projects = [
+            model(**dict(project_data, economic_data=economic, user=user))
+            for project_data, economic in zip(projects_data, economic_data)
+        ]
+        if model._meta.parents:
+            # bulk_create does not support multi-table inheritance (i.e. UseCase)
+            self.counts[model.__name__] += len(projects)
+            if self.dry_run is False:
+                for project in projects:
+                    project.save()
+        else:
+            self.bulk_create(model, projects)
+
+        self.load_scenarios(
+            [
+                (scenario_data, project)
+                for project, scenario_set in zip(projects, scenario_sets)
+                for scenario_data in scenario_set
+            ]
+        )
+        return projects
+
+    def load_scenarios(self, scenarios_data):
+        """Create the scenarios given as a list of (exported scenario, project), return the scenarios"""
+        scenarios = []
+        scenario_assets = []
+        scenario_busses = []
+        for scenario_data, project in scenarios_data:
+            scenario_data = dict(scenario_data)
+            scenario_assets.append(scenario_data.pop("assets"))
+            scenario_busses.append(scenario_data.pop("busses"))
+            scenario_data.pop("project", None)
+            scenarios.append(Scenario(**dict(scenario_data, project=project)))
+        self.bulk_create(Scenario, scenarios)
+
+        assets = self.create_assets(list(zip(scenarios, scenario_assets)))
+        self.create_busses(list(zip(scenarios, scenario_busses)), assets)
+        return scenarios
+
+    def resolve_asset_types(self, assets_data):
+        """Map the asset types of the exported assets to AssetType rows, create the missing ones"""
+        asset_types = {asset_data["asset_info"]["asset_type"] for asset_data in assets_data}
+        unknown = asset_types - self.asset_types.keys()
+        if unknown:
+            self.asset_types.update(
+                {asset_type.asset_type: asset_type for asset_type in AssetType.objects.filter(asset_type__in=unknown)}
+            )
+        missing = {}
+        for asset_data in assets_data:
+            asset_info = asset_data["asset_info"]
+            if asset_info["asset_type"] not in self.asset_types:
+                missing[asset_info["asset_type"]] = AssetType(**asset_info)
+        self.bulk_create(AssetType, list(missing.values()))
+        self.asset_types.update(missing)
+
+    def create_assets(self, scenario_assets):
+        """Create the assets given as a list of (scenario, exported assets)
+
+        Return a map (index of the scenario in the list, asset name) -> Asset
+        """
+        self.resolve_asset_types([asset_data for _, assets_data in scenario_assets for asset_data in assets_data])
+        assets = {}
+        cop_parameters = []
+        # the parents are created before their children (i.e. the capacity of a storage asset)
+        for children in (False, True):
+            batch = []
+            for index, (scenario, assets_data) in enumerate(scenario_assets):
+                for asset_data in assets_data:
+                    if ("parent_asset" in asset_data) is not children:
+                        continue
+                    asset_data = dict(asset_data)
+                    asset_type = asset_data.pop("asset_info")["asset_type"]
+                    cop_data = asset_data.pop("COP_parameters", None)
+                    if children is True:
+                        asset_data["parent_asset"] = self.get_asset(assets, index, asset_data["parent_asset"])
+                    asset = Asset(**dict(asset_data, asset_type=self.asset_types[asset_type], scenario=scenario))
+                    # same as Asset.save()
+                    if asset.is_provider:
+                        asset.optimize_cap = False
+                    assets.setdefault((index, asset.name), asset)
+                    batch.append(asset)
+                    if cop_data is not None:
+                        cop_parameters.append(COPCalculator(**dict(cop_data, asset=asset, scenario=scenario)))
+            self.bulk_create(Asset, batch)
+        self.bulk_create(COPCalculator, cop_parameters)
+        return assets
+
+    @staticmethod
+    def get_asset(assets, index, name):
+        try:
+            return assets[(index, name)]
+        except KeyError:
+            raise Asset.DoesNotExist(f"The asset '{name}' is not part of the scenario")
+
+    def create_busses(self, scenario_busses, assets):
+        """Create the busses given as a list of (scenario, exported busses) and their connection links
+
+        assets maps (index of the scenario in the list, asset name) to the Asset instances the links refer to
+        """
+        busses = []
+        links = []
+        for index, (scenario, busses_data) in enumerate(scenario_busses):
+            for bus_data in busses_data:
+                bus_data = dict(bus_data)
+                links_data = bus_data.pop("inputs") + bus_data.pop("outputs")
+                bus = Bus(**dict(bus_data, scenario=scenario))
+                busses.append(bus)
+                for link_data in links_data:
+                    link_data = dict(link_data)
+                    asset = self.get_asset(assets, index, link_data.pop("asset"))
+                    links.append(ConnectionLink(**dict(link_data, bus=bus, asset=asset, scenario=scenario)))
+        self.bulk_create(Bus, busses)
+        self.bulk_create(ConnectionLink, links)
+        return busses
+
+
+def load_projects_in_bulk(projects_data, user=None, model=Project, dry_run=False):
+    """Create the projects within a single transaction, return the BulkLoader with the inserted (or planned) counts"""
+    loader = BulkLoader(dry_run=dry_run)
+    with transaction.atomic():
+        loader.load_projects(projects_data, user=user, model=model)
+    return loader
+
+
 def load_project_from_dict(model_data, user=None):
     """Create a new project for a user
 
@@ -439,62 +604,20 @@ def load_project_from_dict(model_data, user=None):
     user: users.models.CustomUser
         the user which loads the scenario
     """
-    scenario_set = model_data.pop("scenario_set_data", None)
-
-    model_data["user"] = user
-    economic_data = EconomicData(**model_data["economic_data"])
-    economic_data.save()
-    model_data["economic_data"] = economic_data
-    project = Project(**model_data)
-    project.save()
-
-    if scenario_set is not None:
-        for scenario_data in scenario_set:
-            load_scenario_from_dict(scenario_data, user, project)
-
+    with transaction.atomic():
+        (project,) = BulkLoader().load_projects([model_data], user=user)
     return project.id
 
 
 def assign_busses(scenario, busses):
     """Assign a list of busses produced by the export function"""
-
-    for bus_data in busses:
-        bus_inputs = bus_data.pop("inputs")
-        bus_outputs = bus_data.pop("outputs")
-        bus = Bus(**bus_data)
-        bus.scenario = scenario
-        bus.save()
-        for link_data in bus_inputs + bus_outputs:
-            asset_name = link_data.pop("asset")
-            new_connection = ConnectionLink(**link_data)
-            new_connection.scenario = scenario
-            new_connection.bus = bus
-            new_connection.asset = scenario.asset_set.get(name=asset_name)
-            new_connection.save()
+    assets = {(0, asset.name): asset for asset in scenario.asset_set.all()}
+    BulkLoader().create_busses([(scenario, busses)], assets)
 
 
 def assign_assets(scenario, assets):
     """Assign a list of assets produced by the export function"""
-    # push the children asset at the end of the list to make sure we create the parents first
-    assets.sort(key=lambda asset_data: 1 if "parent_asset" in asset_data else 0)
-
-    for asset_data in assets:
-        if "parent_asset" in asset_data:
-            asset_data["parent_asset"] = Asset.objects.get(name=asset_data["parent_asset"], scenario=scenario)
-        asset_type = asset_data.pop("asset_info")
-        asset_data["asset_type"] = AssetType.objects.get(asset_type=asset_type["asset_type"])
-
-        COP_parameters = asset_data.pop("COP_parameters", None)
-
-        asset = Asset(**asset_data)
-        asset.scenario = scenario
-        asset.save()
-
-        if COP_parameters is not None:
-            COP_parameters["asset"] = asset
-            COP_parameters["scenario"] = scenario
-            cop_parameters = COPCalculator(**COP_parameters)
-            cop_parameters.save()
+    BulkLoader().create_assets([(scenario, assets)])
 
 
 def load_scenario_from_dict(model_data, user, project=None):
@@ -510,34 +633,26 @@ def load_scenario_from_dict(model_data, user, project=None):
         bind the scenario to a project if not None.
         If None and 'project' field not in model_data an error is raised
     """
-    assets = model_data.pop("assets")
-    busses = model_data.pop("busses")
-
     if project is None:
         if "project" in model_data:
-            project_data = model_data.pop("project")
-            load_project_from_dict(project_data, user)
+            load_project_from_dict(model_data["project"], user)
         else:
             raise ValueError("Project of a scenario cannot be None")
-    else:
-        if "project" in model_data:
-            project_data = model_data.pop("project")
 
-    scenario = Scenario(**model_data)
-    scenario.project = project
-    scenario.save()
+    with transaction.atomic():
+        (scenario,) = BulkLoader().load_scenarios([(model_data, project)])
+    return scenario.id
 
-    assign_assets(scenario, assets)
-    assign_busses(scenario, busses)
 
-    return scenario.id
+# endregion
 
 
 class NodeObject:
-    def __init__(self, node_data=None):
+    def __init__(self, node_data=None, asset_ids=None):
+        """asset_ids maps the unique ids of the assets to their database ids, they are queried one by one if None"""
         self.name = node_data["name"]  # asset type name : e.g. bus, pv_plant, etc
         self.data = node_data["data"]  # name: eg. demand_01, parent_asset_id, unique_id
-        self.db_obj_id = self.uuid_2_db_id(node_data)
+        self.db_obj_id = self.uuid_2_db_id(node_data, asset_ids)
         self.group_id = node_data["data"]["parent_asset_id"] if "parent_asset_id" in node_data["data"] else None
         self.node_obj_type = "bus" if self.name == "bus" else "asset"
         self.inputs = node_data["inputs"]
@@ -556,11 +671,13 @@ class NodeObject:
         )
 
     @staticmethod
-    def uuid_2_db_id(data):
+    def uuid_2_db_id(data, asset_ids=None):
         if "db_id" in data and data["db_id"]:
             if isinstance(data["db_id"], int):
                 return data["db_id"]
             elif isinstance(data["db_id"], str):
+                if asset_ids is not None:
+                    return asset_ids.get(data["db_id"])
                 asset = Asset.objects.filter(unique_id=data["db_id"]).first()
                 return asset.id if asset else None
             else:
@@ -568,32 +685,6 @@ class NodeObject:
         else:
             return None
 
-    def create_connection_links(self, scen_id):
-        """Create ConnectionLink from the node object (asset or bus) to all of its outputs"""
-        for port_key, connections_list in self.outputs.items():
-            for output_connection in connections_list:
-                # node_obj is a bus connecting to asset(s)
-                if self.node_obj_type == "bus" and isinstance(output_connection["node"], str):  # i.e. unique_id
-                    ConnectionLink.objects.create(
-                        bus=get_object_or_404(Bus, pk=self.db_obj_id),
-                        asset=get_object_or_404(Asset, unique_id=output_connection["node"]),
-                        flow_direction="B2A",
-                        bus_connection_port=port_key,
-                        scenario=get_object_or_404(Scenario, pk=scen_id),
-                    )
-                # node_obj is an asset connecting to bus(ses)
-                elif self.node_obj_type != "bus" and isinstance(output_connection["node"], int):
-                    ConnectionLink.objects.create(
-                        bus=get_object_or_404(Bus, pk=output_connection["node"]),
-                        asset=get_object_or_404(Asset, pk=self.db_obj_id),
-                        flow_direction="A2B",
-                        bus_connection_port=output_connection["output"],
-                        scenario=get_object_or_404(Scenario, pk=scen_id),
-                    )
-        logger.debug(
-            f"Nodes interconnection links for {self.name} '{self.data['name']}' were created successfully in scenario: {scen_id}."
-        )
-
     def assign_asset_to_proper_group(self, node_to_db_mapping):
         """Seems to be unused here"""
         try:
@@ -613,61 +704,143 @@ class NodeObject:
             return {"success": True, "obj_type": self.node_obj_type}
 
 
-def update_deleted_objects_from_database(scenario_id, topo_node_list):
-    """Delete Database Scenario Related Objects which are not in the topology before inserting or updating data."""
-    all_scenario_assets = Asset.objects.filter(scenario_id=scenario_id)
-    # dont include storage unit children assets
-    scenario_assets_ids_excluding_storage_children = all_scenario_assets.filter(parent_asset=None).values_list(
-        "id", flat=True
-    )
-    all_scenario_busses_ids = Bus.objects.filter(scenario_id=scenario_id).values_list("id", flat=True)
-
-    # lists the DB ids of the assets and busses coming from the topology
-    topology_asset_ids = list()
-    topology_busses_ids = list()
-    # TODO fix this complicated logic with duplicate od DB with NodeObject ...
-    asset_node_positions = {}
-    bus_node_positions = {}
-    for node in topo_node_list:
-        if node.name != "bus" and node.db_obj_id:
-            topology_asset_ids.append(node.db_obj_id)
-            asset_node_positions[node.db_obj_id] = dict(pos_x=node.pos_x, pos_y=node.pos_y)
-        elif node.name == "bus" and node.db_obj_id:
-            topology_busses_ids.append(node.db_obj_id)
-            bus_node_positions[node.db_obj_id] = dict(pos_x=node.pos_x, pos_y=node.pos_y)
-
-    scenario = get_object_or_404(Scenario, id=scenario_id)
-    qs_sim = Simulation.objects.filter(scenario=scenario)
-
-    # deletes asset or bus which DB id is not in the topology anymore (was removed by user)
-    for asset_id in scenario_assets_ids_excluding_storage_children:
-        qs = Asset.objects.filter(id=asset_id)
-        if asset_id not in topology_asset_ids:
-            logger.debug(
-                f"Deleting asset {asset_id} of scenario {scenario_id} which was removed from the topology by the user."
+@dataclass
+class TopologyChanges:
+    """Changes which bring the graph of a scenario in the database in line with the topology of the GUI editor"""
+
+    scenario: Scenario
+    # nodes which were moved in the editor, with their new position
+    moved_assets: list = field(default_factory=list)
+    moved_busses: list = field(default_factory=list)
+    # nodes which were removed in the editor
+    deleted_assets: list = field(default_factory=list)
+    deleted_busses: list = field(default_factory=list)
+    # unsaved ConnectionLink instances and ids of the ConnectionLink to delete
+    new_links: list = field(default_factory=list)
+    deleted_links: list = field(default_factory=list)
+
+    def __bool__(self):
+        return any(
+            (
+                self.moved_assets,
+                self.moved_busses,
+                self.deleted_assets,
+                self.deleted_busses,
+                self.new_links,
+                self.deleted_links,
             )
-            if qs_sim.exists():
-                for name in qs.values_list("name", flat=True):
-                    # TODO export asset dto to be able to undo the changes
-                    AssetChangeTracker.objects.create(simulation=scenario.simulation, name=name, action=0)
-            qs.delete()
+        )
+
 
+def diff_scenario_topology(scenario, topologies):
+    """Compare the topology sent by the GUI editor with the graph of the scenario in the database
+
+    The graph is loaded in three queries (assets, busses and links), the changes are computed in memory.
+    :param scenario: the Scenario instance
+    :param topologies: the list of nodes of the editor, each with its db_id, name, data, outputs and position
+    :return: a TopologyChanges instance
+    """
+    assets = {
+        asset.id: asset
+        for asset in Asset.objects.filter(scenario=scenario).only(
+            "id", "name", "unique_id", "parent_asset", "pos_x", "pos_y"
+        )
+    }
+    asset_ids = {asset.unique_id: asset.id for asset in assets.values()}
+    busses = {bus.id: bus for bus in Bus.objects.filter(scenario=scenario).only("id", "name", "pos_x", "pos_y")}
+    existing_links = ConnectionLink.objects.filter(scenario=scenario).values_list(
+        "id", "bus_id", "asset_id", "flow_direction", "bus_connection_port"
+    )
+
+    changes = TopologyChanges(scenario=scenario)
+    node_list = [NodeObject(topology, asset_ids=asset_ids) for topology in topologies]
+    topology_ids = {"asset": set(), "bus": set()}
+    # (bus id, asset id, flow direction, bus connection port) of the links drawn in the editor
+    links = Counter()
+    for node in node_list:
+        nodes, moved = (busses, changes.moved_busses) if node.node_obj_type == "bus" else (assets, changes.moved_assets)
+        if node.db_obj_id in nodes:
+            topology_ids[node.node_obj_type].add(node.db_obj_id)
+            db_node = nodes[node.db_obj_id]
+            if (db_node.pos_x, db_node.pos_y) != (node.pos_x, node.pos_y):
+                db_node.pos_x, db_node.pos_y = node.pos_x, node.pos_y
+                moved.append(db_node)
+
+        for port_key, connections_list in node.outputs.items():
+            for output_connection in connections_list:
+                # node_obj is a bus connecting to asset(s)
+                if node.node_obj_type == "bus" and isinstance(output_connection["node"], str):  # i.e. unique_id
+                    link = (node.db_obj_id, asset_ids.get(output_connection["node"]), "B2A", port_key)
+                # node_obj is an asset connecting to bus(ses)
+                elif node.node_obj_type != "bus" and isinstance(output_connection["node"], int):
+                    link = (output_connection["node"], node.db_obj_id, "A2B", output_connection["output"])
+                else:
+                    continue
+                if link[0] not in busses or link[1] not in assets:
+                    raise Http404(f"The link {link} does not connect a bus and an asset of the scenario {scenario.id}")
+                links[link] += 1
+
+    # storage children assets are not part of the topology
+    changes.deleted_assets = [
+        asset for asset in assets.values() if asset.parent_asset_id is None and asset.id not in topology_ids["asset"]
+    ]
+    changes.deleted_busses = [bus for bus in busses.values() if bus.id not in topology_ids["bus"]]
+
+    for link_id, *link in existing_links:
+        link = tuple(link)
+        if links[link] > 0:
+            links[link] -= 1
         else:
-            qs.update(**asset_node_positions[asset_id])
+            changes.deleted_links.append(link_id)
+    changes.new_links = [
+        ConnectionLink(
+            bus_id=bus_id,
+            asset_id=asset_id,
+            flow_direction=flow_direction,
+            bus_connection_port=bus_connection_port,
+            scenario=scenario,
+        )
+        for (bus_id, asset_id, flow_direction, bus_connection_port), n in links.items()
+        for _ in range(n)
+    ]
+    return changes
+
 
-    for bus_id in all_scenario_busses_ids:
-        qs = Bus.objects.filter(id=bus_id)
-        if bus_id not in topology_busses_ids:
+def save_scenario_topology(scenario, topologies):
+    """Save the topology of the GUI editor: remove the deleted nodes, move the nodes and update the links
+
+    The changes are applied in bulk within a single transaction, see diff_scenario_topology()
+    :return: the applied TopologyChanges
+    """
+    with transaction.atomic():
+        changes = diff_scenario_topology(scenario, topologies)
+        if changes.deleted_links:
+            ConnectionLink.objects.filter(id__in=changes.deleted_links).delete()
+
+        deleted_nodes = changes.deleted_assets + changes.deleted_busses
+        if deleted_nodes:
+            simulation = Simulation.objects.filter(scenario=scenario).first()
+            if simulation is not None:
+                # TODO export asset dto to be able to undo the changes
+                AssetChangeTracker.objects.bulk_create(
+                    [AssetChangeTracker(simulation=simulation, name=node.name, action=0) for node in deleted_nodes]
+                )
             logger.debug(
-                f"Deleting bus {bus_id} of scenario {scenario_id} which was removed from the topology by the user."
+                f"Deleting the nodes {[node.name for node in deleted_nodes]} of scenario {scenario.id} which were "
+                "removed from the topology by the user."
             )
-            if qs_sim.exists():
-                for name in qs.values_list("name", flat=True):
-                    # TODO export asset dto to be able to undo the changes
-                    AssetChangeTracker.objects.create(simulation=scenario.simulation, name=name, action=0)
-            qs.delete()
-        else:
-            qs.update(**bus_node_positions[bus_id])
+        if changes.deleted_assets:
+            Asset.objects.filter(id__in=[asset.id for asset in changes.deleted_assets]).delete()
+        if changes.deleted_busses:
+            Bus.objects.filter(id__in=[bus.id for bus in changes.deleted_busses]).delete()
+
+        if changes.moved_assets:
+            Asset.objects.bulk_update(changes.moved_assets, ["pos_x", "pos_y"])
+        if changes.moved_busses:
+            Bus.objects.bulk_update(changes.moved_busses, ["pos_x", "pos_y"])
+        if changes.new_links:
+            ConnectionLink.objects.bulk_create(changes.new_links)
+    return changes
 
 
 def create_ESS_objects(all_ess_assets_node_list, scen_id):
@@ -1,7 +1,9 @@
+import hashlib
 import logging
 import traceback
 
 from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
 
 import os
 from io import StringIO
@@ -10,9 +12,13 @@ import requests
 import pandas as pd
 import numpy as np
 import json
+from asgiref.sync import sync_to_async
 from django_q.models import Schedule
 
+from django.conf import settings
 from django.contrib import messages
+from django.db import IntegrityError, transaction
+from django.db.models import Q
 from django.urls import reverse
 from django.utils.safestring import mark_safe
 from django.utils.translation import gettext_lazy as _
@@ -44,9 +50,24 @@ from epa.settings import (
 from plotly.offline import plot
 from plotly.graph_objs import Scatter
 
-from projects.constants import PENDING
-from projects.models import Simulation
-from projects.requests import fetch_mvs_simulation_results
+from projects.constants import DONE, ERROR, PENDING, QUEUED
+from projects.helpers import format_scenario_for_mvs, simulation_payload_hash
+from projects.models import Simulation, SimulationBatch, SimulationBatchItem, RenewablesResource
+from projects.requests import (
+    clone_simulation_results,
+    fetch_mvs_simulation_results,
+    mvs_simulation_check_status,
+    mvs_simulation_request,
+    reusable_simulation,
+)
+from projects.renewables import (
+    RenewablesNinjaProvider,
+    RenewablesDataUnavailable,
+    afetch_renewables_data,
+    fetch_renewables_data,
+)
+from projects.scenario_diff import payload_snapshot
+from projects.single_flight import aget_or_compute, get_or_compute, single_flight
 
 logger = logging.getLogger(__name__)
 
@@ -68,13 +89,21 @@ To achieve this `python manage.py qcluster` command needs to be executed.
 
 
 def check_simulation_objects(**kwargs):
-    pending_simulations = Simulation.objects.filter(status=PENDING)
-    if pending_simulations.count() == 0:
+    # the simulations of the batches are checked with their batch
+    pending_simulations = Simulation.objects.filter(status=PENDING, batch_items__isnull=True)
+    active_batches = SimulationBatch.objects.filter(date_finished__isnull=True)
+    if pending_simulations.count() == 0 and active_batches.count() == 0:
         logger.debug(f"No pending simulation found. Deleting Scheduler.")
         Schedule.objects.all().delete()
     # fetch_mvs_simulation_results mostly waits for MVS API to respond, so no ProcessPool is required.
     with ThreadPoolExecutor() as pool:
         pool.map(fetch_mvs_simulation_results, pending_simulations)
+    for batch in active_batches:
+        # a failing batch should not prevent the other batches from advancing
+        try:
+            advance_simulation_batch(batch)
+        except Exception:
+            logger.exception(f"The simulation batch {batch.id} could not be advanced")
     logger.debug(f"Finished round for checking Simulation objects status.")
 
     logger.debug(f"Finished round for checking Simulation objects status.")
@@ -118,6 +147,144 @@ def create_or_delete_simulation_scheduler(**kwargs):
             return False
 
 
+def start_simulation(scenario_id, payload_hash, response, schedule=True, payload=None):
+    """Replace the simulation of the scenario by the one the MVS created, given the MVS response to its submission
+
+    If schedule is True and the simulation is pending, the Django-Q Scheduler checking the simulations is created. The
+    snapshot of the submitted payload is stored with the simulation if it is given, see projects.scenario_diff
+    """
+    # delete existing simulation
+    Simulation.objects.filter(scenario_id=scenario_id).delete()
+
+    # Create empty Simulation model object
+    simulation = Simulation(start_date=datetime.now(), scenario_id=scenario_id, payload_hash=payload_hash)
+    if payload is not None:
+        simulation.payload_snapshot = payload_snapshot(payload)
+
+    simulation.mvs_token = response["id"] if response["id"] else None
+
+    if "status" in response.keys() and (response["status"] == DONE or response["status"] == ERROR):
+        simulation.status = response["status"]
+        simulation.results = response["results"]
+        simulation.end_date = datetime.now()
+    else:  # PENDING
+        simulation.status = response["status"]
+        if schedule is True:
+            # create a task which will update simulation status
+            create_or_delete_simulation_scheduler(mvs_token=simulation.mvs_token)
+
+    simulation.elapsed_seconds = (datetime.now() - simulation.start_date).seconds
+    simulation.save()
+    return simulation
+
+
+def create_simulation_batch(scenarios, name="", user=None, max_concurrent=None):
+    r"""Simulate a set of scenarios, at most max_concurrent of them at the same time
+
+    The first scenarios are submitted right away, the remaining ones as the simulations of the batch finish. The
+    batch is then advanced by the Django-Q Scheduler checking the simulations, along with the single simulations.
+
+    Returns
+    -------
+    SimulationBatch
+
+    """
+    batch = SimulationBatch(name=name, user=user)
+    if max_concurrent is not None:
+        batch.max_concurrent = max_concurrent
+    batch.save()
+    SimulationBatchItem.objects.bulk_create(
+        [SimulationBatchItem(batch=batch, scenario=scenario) for scenario in scenarios]
+    )
+    advance_simulation_batch(batch)
+    if batch.date_finished is None:
+        create_or_delete_simulation_scheduler(mvs_token=f"batch-{batch.id}")
+    return batch
+
+
+def _fail_batch_item(item, reason):
+    """Mark an item of a batch as failed, so that the batch can finish without it"""
+    logger.error(f"The scenario {item.scenario_id} of the simulation batch {item.batch_id} is not simulated: {reason}")
+    item.date_submitted = datetime.now()
+    item.save(update_fields=["date_submitted", "submission_attempts"])
+
+
+def _submit_batch_items(items, capacity):
+    """Submit queued items of a batch until capacity simulations are running on the MVS
+
+    The items whose payload was already simulated reuse those results and do not count towards the capacity. The
+    payloads are posted to the MVS in parallel, the database is only accessed from the calling thread. The items whose
+    payload cannot be built, or which could not be sent to the MVS in SIMULATION_BATCH_SUBMISSION_ATTEMPTS rounds, are
+    marked as failed.
+    """
+    submissions = []
+    for item in items:
+        if len(submissions) >= capacity:
+            break
+        try:
+            payload = format_scenario_for_mvs(item.scenario)
+        except Exception as e:
+            _fail_batch_item(item, f"its payload could not be built ({e!r})")
+            continue
+        payload_hash = simulation_payload_hash(payload)
+        previous_simulation = reusable_simulation(payload_hash)
+        if previous_simulation is not None:
+            item.simulation = clone_simulation_results(previous_simulation, item.scenario_id)
+            item.date_submitted = datetime.now()
+            item.save(update_fields=["simulation", "date_submitted"])
+        else:
+            submissions.append((item, payload, payload_hash))
+    if not submissions:
+        return
+
+    with ThreadPoolExecutor(max_workers=len(submissions)) as pool:
+        responses = list(pool.map(mvs_simulation_request, [payload for _, payload, _ in submissions]))
+    for (item, payload, payload_hash), response in zip(submissions, responses):
+        if response is None:
+            item.submission_attempts += 1
+            if item.submission_attempts >= settings.SIMULATION_BATCH_SUBMISSION_ATTEMPTS:
+                _fail_batch_item(item, f"the MVS could not be reached in {item.submission_attempts} attempts")
+            else:
+                # the scenario is submitted again on the next round
+                item.save(update_fields=["submission_attempts"])
+            continue
+        item.simulation = start_simulation(item.scenario_id, payload_hash, response, schedule=False, payload=payload)
+        item.date_submitted = datetime.now()
+        item.save(update_fields=["simulation", "date_submitted"])
+
+
+def advance_simulation_batch(batch):
+    """Ingest the results of the finished simulations of the batch and submit its queued scenarios
+
+    Returns the progress of the batch, see SimulationBatch.progress()
+    """
+    if batch.date_finished is not None:
+        return batch.progress()
+    # the batch might be advanced by the scheduler and by a user request at the same time
+    with single_flight(f"simulation_batch:{batch.id}"):
+        items = list(batch.items.select_related("scenario", "simulation").order_by("pk"))
+        pending = [item.simulation for item in items if item.status == PENDING]
+        if pending:
+            # one status request per running simulation, sent in parallel
+            with ThreadPoolExecutor(max_workers=len(pending)) as pool:
+                responses = list(pool.map(mvs_simulation_check_status, [sim.mvs_token for sim in pending]))
+            for simulation, response in zip(pending, responses):
+                # an unanswered status request is repeated on the next round
+                if response is not None:
+                    fetch_mvs_simulation_results(simulation, response=response)
+
+        running = sum(simulation.status == PENDING for simulation in pending)
+        queued = [item for item in items if item.status == QUEUED]
+        if queued and running < batch.max_concurrent:
+            _submit_batch_items(queued, batch.max_concurrent - running)
+
+        if not batch.items.filter(Q(date_submitted__isnull=True) | Q(simulation__status=PENDING)).exists():
+            batch.date_finished = datetime.now()
+            batch.save(update_fields=["date_finished"])
+            logger.info(f"The simulation batch {batch.id} is finished")
+    return batch.progress()
+
+
 def send_feedback_email(subject, body):
 
     # smtp_server = config.MAIL_HOST
@@ -268,87 +435,119 @@ def get_selected_scenarios_in_cache(request, proj_id):
     return [int(scen_id) for scen_id in selected_scenario]
 
 
-class RenewablesNinja:
-    token = os.environ["RN_API_TOKEN"]
-    api_base = "https://www.renewables.ninja/api/"
-
-    def __init__(self):
-        self.s = requests.session()
-        # Send token header with each request
-        self.s.headers = {"Authorization": "Token " + self.token}
-        self.data = dict.fromkeys(["pv", "wind"])
-
-    def get_pv_data(self, coordinates):
-        ##
-        # Get PV data
-        ##
-
-        url = self.api_base + "data/pv"
-
-        # Panels are assumed to be latitude tilted
-        args = {
-            "lat": coordinates["lat"],
-            "lon": coordinates["lon"],
-            "date_from": "2019-01-01",
-            "date_to": "2019-12-31",
-            "dataset": "merra2",
-            "capacity": 1.0,
-            "system_loss": 0.1,
-            "tracking": 0,
-            "tilt": coordinates["lat"],
-            "azim": 180,
-            "format": "json",
-            "raw": "true",
-        }
-
-        r = self.s.get(url, params=args)
-        logger.info("Sending request to renewables.ninja")
-        data = self.fetch_and_parse_data(r)
-        self.data["pv"] = data
-        return
+# renewables.ninja data is based on reanalysis grids of ~50 km, rounding to 2 decimals (~1 km) does not change profiles
+RESOURCE_LOCATION_DECIMALS = 2
+
+
+def renewables_resource_key(dataset, latitude, longitude):
+    """Return the lookup of the RenewablesResource matching a dataset and location"""
+    parameters = json.dumps(RenewablesNinjaProvider.parameters[dataset], sort_keys=True)
+    return {
+        "dataset": dataset,
+        "latitude": round(float(latitude), RESOURCE_LOCATION_DECIMALS),
+        "longitude": round(float(longitude), RESOURCE_LOCATION_DECIMALS),
+        "parameters_hash": hashlib.sha256(parameters.encode()).hexdigest(),
+    }
+
+
+def _fetch_renewables_resource(lookup):
+    try:
+        data, provider = fetch_renewables_data(lookup["dataset"], lookup["latitude"], lookup["longitude"])
+    except RenewablesDataUnavailable as e:
+        # the failed request is not cached so that it is repeated on the next call
+        logger.error(f"An error occurred while fetching the {lookup['dataset']} data: {e}")
+        return None
+    return _store_renewables_resource(lookup, data, provider)
+
+
+async def _afetch_renewables_resource(lookup):
+    try:
+        data, provider = await afetch_renewables_data(lookup["dataset"], lookup["latitude"], lookup["longitude"])
+    except RenewablesDataUnavailable as e:
+        logger.error(f"An error occurred while fetching the {lookup['dataset']} data: {e}")
+        return None
+    return await sync_to_async(_store_renewables_resource)(lookup, data, provider)
+
+
+def _store_renewables_resource(lookup, data, provider):
+    resource = RenewablesResource(
+        **lookup,
+        parameters=json.dumps(RenewablesNinjaProvider.parameters[lookup["dataset"]], sort_keys=True),
+        data=json.dumps({column: data[column].tolist() for column in data.columns}),
+        start_time=data.index[0],
+        end_time=data.index[-1],
+        time_step=60,
+    )
+    if provider.cacheable is False:
+        return resource
+
+    try:
+        with transaction.atomic():
+            resource.save()
+    except IntegrityError:
+        # another process stored the same resource in the meantime
+        resource = RenewablesResource.objects.get(**lookup)
+    return resource
+
+
+def get_renewables_resource(dataset, latitude, longitude):
+    r"""Read-through cache of the renewables profiles
+
+    The profiles are stored per rounded location, dataset and request parameters and shared between projects.
+    Concurrent requests for the same resource, from any worker, are coalesced into a single call to the providers
+    configured in RENEWABLES_PROVIDERS. Profiles of providers which are not cacheable (local files and synthetic
+    profiles) are returned as unsaved instances.
 
-    def get_wind_data(self, coordinates):
-        ##
-        # Get Wind data
-        ##
-
-        url = self.api_base + "data/wind"
-
-        args = {
-            "lat": coordinates["lat"],
-            "lon": coordinates["lon"],
-            "date_from": "2019-01-01",
-            "date_to": "2019-12-31",
-            "capacity": 1.0,
-            "height": 100,
-            "turbine": "Vestas V80 2000",
-            "format": "json",
-            "raw": "true",
-        }
-
-        r = self.s.get(url, params=args)
-        data = self.fetch_and_parse_data(r)
-        self.data["wind"] = data
-        return
+    Parameters
+    ----------
+    dataset : str
+        either "pv" or "wind"
+    latitude : float
+    longitude : float
 
-    @staticmethod
-    def fetch_and_parse_data(r):
-        """
-        Fetch data from the API, parse it, and handle errors.
-        """
-        try:
-            r.raise_for_status()  # Raise HTTPError for bad responses (4xx and 5xx)
-            parsed_response = json.loads(r.text)
-            data = pd.read_json(StringIO(json.dumps(parsed_response["data"])), orient="index")
-            metadata = parsed_response["metadata"]
-            return data
+    Returns
+    -------
+    RenewablesResource or None if none of the providers has data for the location
 
-        except json.decoder.JSONDecodeError as e:
-            logger.error(f"An error occurred while fetching the data from renewables.ninja: {e}")
-            # TODO: Set some default timeseries if needed
-            return {"default": []}
+    """
+    lookup = renewables_resource_key(dataset, latitude, longitude)
+    return get_or_compute(
+        "renewables_resource:" + ":".join(str(value) for value in lookup.values()),
+        lookup=lambda: RenewablesResource.objects.filter(**lookup).first(),
+        compute=lambda: _fetch_renewables_resource(lookup),
+    )
 
-        except Exception as e:
-            logger.error(f"An error occurred while fetching the data from renewables.ninja: {e}")
-            # TODO: Set some default timeseries if needed
-            return {"default": []}
+
+async def aget_renewables_resource(dataset, latitude, longitude):
+    """Async version of get_renewables_resource(), for the async views"""
+    lookup = renewables_resource_key(dataset, latitude, longitude)
+    return await aget_or_compute(
+        "renewables_resource:" + ":".join(str(value) for value in lookup.values()),
+        lookup=lambda: RenewablesResource.objects.filter(**lookup).first(),
+        compute=lambda: _afetch_renewables_resource(lookup),
+    )
+
+
+def prefetch_renewables_resources(sites, datasets=("pv", "wind")):
+    """Fill the renewables resource cache for a list of (latitude, longitude) sites
+
+    Returns the number of resources which were already cached, fetched and failed
+    """
+    counts = {"cached": 0, "fetched": 0, "failed": 0}
+    lookups = {}
+    for latitude, longitude in sites:
+        for dataset in datasets:
+            lookup = renewables_resource_key(dataset, latitude, longitude)
+            lookups[tuple(lookup.values())] = lookup
+
+    for lookup in lookups.values():
+        if RenewablesResource.objects.filter(**lookup).exists():
+            counts["cached"] += 1
+            continue
+        resource = get_renewables_resource(lookup["dataset"], lookup["latitude"], lookup["longitude"])
+        # synthetic profiles are not stored, the site would be fetched again on the next call
+        if resource is None or resource.pk is None:
+            counts["failed"] += 1
+        else:
+            counts["fetched"] += 1
+    return counts
@@ -0,0 +1,138 @@
+r"""Single-flight execution of the expensive fetches and computations shared by the web and qcluster workers.
+
+Only one worker performs a given fetch (renewables profiles, reverse geocoding, ...), the other workers asking for the
+same key wait for it and then read its result from the database instead of fetching it again:
+
+    resource = get_or_compute(
+        f"renewables_resource:{dataset}:{latitude}:{longitude}",
+        lookup=lambda: RenewablesResource.objects.filter(...).first(),
+        compute=lambda: fetch_and_save(...),
+    )
+
+On postgres the lock is an advisory lock, shared by all the workers connected to the database. It is held until the
+end of the transaction when called within one, so that the result is committed before the lock is released. The other
+databases (sqlite in the tests and in local development) use a file lock in SINGLE_FLIGHT_LOCK_DIR, which only
+coordinates the workers of the same host. Where file locks are not available (Windows), a lock per key only
+coordinates the threads of the same process.
+
+The async views use asingle_flight() and aget_or_compute(), whose lock is taken and released in the thread running
+the ORM calls of the request, the compute() coroutine is awaited in the event loop while the lock is held.
+"""
+
+import hashlib
+import logging
+import os
+import threading
+from contextlib import asynccontextmanager, contextmanager
+
+from asgiref.sync import sync_to_async
+
+from django.conf import settings
+from django.db import connection
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# locks of the keys when file locks are not available, see _thread_lock()
+_thread_locks = {}
+_thread_locks_lock = threading.Lock()
+
+
+def lock_id(key):
+    """Map a key to the signed 64 bit integer identifying its postgres advisory lock"""
+    return int.from_bytes(hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest(), "big", signed=True)
+
+
+@contextmanager
+def _advisory_lock(key):
+    with connection.cursor() as cursor:
+        if connection.in_atomic_block:
+            # released by postgres at the end of the transaction, once the result is visible to the other workers
+            cursor.execute("SELECT pg_advisory_xact_lock(%s)", [lock_id(key)])
+            yield
+            return
+        cursor.execute("SELECT pg_advisory_lock(%s)", [lock_id(key)])
+    try:
+        yield
+    finally:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT pg_advisory_unlock(%s)", [lock_id(key)])
+
+
+@contextmanager
+def _file_lock(key):
+    os.makedirs(settings.SINGLE_FLIGHT_LOCK_DIR, exist_ok=True)
+    path = os.path.join(settings.SINGLE_FLIGHT_LOCK_DIR, f"{lock_id(key) & 0xFFFFFFFFFFFFFFFF:016x}.lock")
+    # each call opens its own file description, so that the lock also excludes the threads of the same process
+    with open(path, "a") as fp:
+        fcntl.flock(fp, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(fp, fcntl.LOCK_UN)
+
+
+@contextmanager
+def _thread_lock(key):
+    with _thread_locks_lock:
+        lock = _thread_locks.setdefault(key, threading.Lock())
+    with lock:
+        yield
+
+
+def single_flight(key):
+    """Context manager excluding the other workers entering it with the same key"""
+    if connection.vendor == "postgresql":
+        return _advisory_lock(key)
+    if fcntl is None:
+        return _thread_lock(key)
+    return _file_lock(key)
+
+
+def get_or_compute(key, lookup, compute):
+    """Return the result of lookup() if it is not None, otherwise the result of compute() run by a single worker
+
+    compute() is expected to store its result where lookup() finds it, the workers which waited for the lock read it
+    from there instead of computing it again. Results which are not stored (i.e. a failed fetch) are computed again
+    by the next caller.
+    """
+    result = lookup()
+    if result is not None:
+        return result
+    with single_flight(key):
+        # the result might have been computed while waiting for the lock
+        result = lookup()
+        if result is None:
+            logger.debug(f"Computing {key}")
+            result = compute()
+    return result
+
+
+@asynccontextmanager
+async def asingle_flight(key):
+    """Async version of single_flight()"""
+    lock = single_flight(key)
+    await sync_to_async(lock.__enter__)()
+    try:
+        yield
+    finally:
+        await sync_to_async(lock.__exit__)(None, None, None)
+
+
+async def aget_or_compute(key, lookup, compute):
+    """Async version of get_or_compute(), lookup is a sync function run with sync_to_async and compute a coroutine
+    function"""
+    lookup = sync_to_async(lookup)
+    result = await lookup()
+    if result is not None:
+        return result
+    async with asingle_flight(key):
+        result = await lookup()
+        if result is None:
+            logger.debug(f"Computing {key}")
+            result = await compute()
+    return result
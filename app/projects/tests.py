@@ -1,17 +1,94 @@
 import pytest
+import copy
 import json
-from django.test import TestCase
+import os
+import asyncio
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from asgiref.sync import async_to_sync
+from datetime import datetime, timedelta
+from io import StringIO
+import pandas as pd
+from unittest import mock, skipUnless
+from django.core.management import call_command
+from django.db import connection
+from django.test import AsyncClient, SimpleTestCase, TestCase, TransactionTestCase, override_settings
 from django.urls import reverse
 from django.conf import settings as django_settings
 from django.test.client import RequestFactory
-from projects.models import Project, Scenario, Viewer, Asset
+from projects.models import (
+    Project,
+    Scenario,
+    Viewer,
+    Asset,
+    AssetType,
+    Bus,
+    ConnectionLink,
+    RenewablesResource,
+    Simulation,
+    SimulationBatch,
+    UseCase,
+    Timeseries,
+    TimeseriesPayload,
+    ScenarioDiff,
+)
+from dashboard.models import AssetsResults, FancyResults, KPIScalarResults
+from projects.constants import DONE, ERROR, PENDING, QUEUED
+from projects.fake_mvs import FakeMVSServer
+from projects.helpers import format_scenario_for_mvs, simulation_payload_hash
+from projects.requests import reusable_simulation
+from projects.services import (
+    advance_simulation_batch,
+    check_simulation_objects,
+    start_simulation,
+    get_renewables_resource,
+    prefetch_renewables_resources,
+)
+from projects.single_flight import get_or_compute, single_flight
+from projects.renewables import (
+    RenewablesNinjaProvider,
+    LocalFileProvider,
+    ClearSkyPVProvider,
+    RenewablesDataUnavailable,
+)
+from projects.profiling import (
+    SQLiteStore,
+    ProfileRecord,
+    fingerprint,
+    get_store,
+    profile,
+    query_budget,
+    task_finished,
+    task_started,
+)
+from projects.requests import mvs_simulation_check_status
 from users.models import CustomUser
 from django.core.exceptions import ValidationError
 
 from projects.scenario_topology_helpers import (
     load_scenario_from_dict,
     load_project_from_dict,
+    load_projects_in_bulk,
+    save_scenario_topology,
 )
+from projects.batch_update import Checkpoint, ColumnMigration, decode_json_chunk
+from projects.management.commands.update_asset_input_timeseries import TIMESERIES_FIELDS, timeseries_to_dict
+from projects.forms import AssetCreateForm, EconomicDataDetailForm, form_field_info
+from projects.registry import (
+    COMPILED_REGISTRIES,
+    REGISTRY_SOURCES,
+    LazyRegistry,
+    compile_registry,
+    csv_rows,
+    load_compiled_registry,
+    parameter_strings,
+)
+from projects.scenario_diff import diff_payloads, payload_snapshot, scenario_diff, scenario_payloads, simulation_diff
+from benchmarks.harness import FileOperationCounter
+from django.utils import translation
 
 
 class BasicOperationsTest(TestCase):
@@ -316,3 +393,986 @@ class UploadTimeseriesTest(TestCase):
             }
             response = self.client.post(self.post_url, data, format="multipart")
             self.assertEqual(response.status_code, 422)
+
+
+
+def fake_pv_data(self, dataset, latitude, longitude):
+    index = pd.date_range("2019-01-01", periods=8760, freq="h")
+    return pd.DataFrame({"electricity": [0.5] * 8760, "irradiance_direct": [0.2] * 8760}, index=index)
+
+
+@override_settings(RENEWABLES_PROVIDERS=["renewables_ninja"])
+class RenewablesResourceTest(TestCase):
+    def test_resource_is_fetched_once_per_location(self):
+        with mock.patch.object(RenewablesNinjaProvider, "get_data", autospec=True, side_effect=fake_pv_data) as fetch:
+            resource = get_renewables_resource("pv", 9.0811, 7.4918)
+            # a nearby site with the same rounded coordinates reads the cached profile
+            cached = get_renewables_resource("pv", 9.0809, 7.4921)
+        self.assertEqual(fetch.call_count, 1)
+        self.assertEqual(resource.pk, cached.pk)
+        self.assertEqual(cached.get_profile("electricity"), [0.5] * 8760)
+
+    def test_failed_fetch_is_not_cached(self):
+        def failed_pv_data(self, dataset, latitude, longitude):
+            raise RenewablesDataUnavailable("no network")
+
+        with mock.patch.object(RenewablesNinjaProvider, "get_data", autospec=True, side_effect=failed_pv_data) as fetch:
+            self.assertIsNone(get_renewables_resource("pv", 9.08, 7.49))
+            self.assertIsNone(get_renewables_resource("pv", 9.08, 7.49))
+        self.assertEqual(fetch.call_count, 2)
+        self.assertFalse(RenewablesResource.objects.exists())
+
+    def test_prefetch_skips_duplicated_and_cached_sites(self):
+        with mock.patch.object(RenewablesNinjaProvider, "get_data", autospec=True, side_effect=fake_pv_data) as fetch:
+            counts = prefetch_renewables_resources([(9.08, 7.49), (9.0801, 7.4899), (6.5, 3.4)], datasets=["pv"])
+            self.assertEqual(counts, {"cached": 0, "fetched": 2, "failed": 0})
+            counts = prefetch_renewables_resources([(6.5, 3.4)], datasets=["pv"])
+            self.assertEqual(counts, {"cached": 1, "fetched": 0, "failed": 0})
+        self.assertEqual(fetch.call_count, 2)
+
+
+def run_concurrently(fn, n_workers=8):
+    """Call fn from n_workers threads at once, each with its own database connection, and return the results"""
+    barrier = threading.Barrier(n_workers)
+
+    def call():
+        barrier.wait()
+        try:
+            return fn()
+        finally:
+            connection.close()
+
+    with ThreadPoolExecutor(n_workers) as executor:
+        futures = [executor.submit(call) for _ in range(n_workers)]
+        return [future.result() for future in futures]
+
+
+# the threads use their own connections, the data must be committed to be visible to them
+class SingleFlightTest(TransactionTestCase):
+    def test_lock_excludes_the_other_callers_of_the_same_key(self):
+        active, overlaps = [], []
+
+        def critical_section():
+            with single_flight("test:exclusive"):
+                active.append(1)
+                overlaps.append(len(active))
+                time.sleep(0.01)
+                active.pop()
+
+        run_concurrently(critical_section)
+        self.assertEqual(overlaps, [1] * 8)
+
+        # without file locks (Windows) the lock only excludes the threads of the process
+        overlaps.clear()
+        with mock.patch("projects.single_flight.fcntl", None):
+            run_concurrently(critical_section)
+        self.assertEqual(overlaps, [1] * 8)
+
+    def test_result_is_computed_once(self):
+        stored = {}
+
+        def slow_compute():
+            time.sleep(0.1)
+            stored["value"] = 42
+            return 42
+
+        compute = mock.Mock(side_effect=slow_compute)
+        values = run_concurrently(lambda: get_or_compute("test:compute", lambda: stored.get("value"), compute))
+        self.assertEqual(compute.call_count, 1)
+        self.assertEqual(values, [42] * 8)
+
+    def test_parallel_callers_fetch_the_renewables_resource_once(self):
+        def slow_pv_data(self, dataset, latitude, longitude):
+            time.sleep(0.2)
+            return fake_pv_data(self, dataset, latitude, longitude)
+
+        with mock.patch.object(RenewablesNinjaProvider, "get_data", autospec=True, side_effect=slow_pv_data) as fetch:
+            resources = run_concurrently(lambda: get_renewables_resource("pv", 9.08, 7.49))
+        self.assertEqual(fetch.call_count, 1)
+        self.assertEqual({resource.pk for resource in resources}, {RenewablesResource.objects.get().pk})
+
+
+class RenewablesProviderTest(TestCase):
+    def test_remote_provider_times_out(self):
+        async def slow_get(*args, **kwargs):
+            await asyncio.sleep(1)
+
+        provider = RenewablesNinjaProvider(token="dummy", timeout=0.01)
+        with mock.patch("httpx.AsyncClient.get", side_effect=slow_get):
+            with self.assertRaises(RenewablesDataUnavailable):
+                provider.get_data("pv", 9.08, 7.49)
+
+    def test_remote_provider_without_token_is_unavailable(self):
+        with self.assertRaises(RenewablesDataUnavailable):
+            RenewablesNinjaProvider(token="").get_data("pv", 9.08, 7.49)
+
+    def test_local_provider_reads_csv_profiles(self):
+        with tempfile.TemporaryDirectory() as data_dir:
+            fake_pv_data(None, "pv", 9.08, 7.49).to_csv(os.path.join(data_dir, "pv_9.08_7.49.csv"))
+            data = LocalFileProvider(data_dir=data_dir).get_data("pv", 9.08, 7.49)
+            self.assertEqual(data["electricity"].tolist(), [0.5] * 8760)
+            with self.assertRaises(RenewablesDataUnavailable):
+                LocalFileProvider(data_dir=data_dir).get_data("wind", 9.08, 7.49)
+
+    def test_clear_sky_profile(self):
+        data = ClearSkyPVProvider().get_data("pv", 9.08, 7.49)
+        self.assertEqual(len(data.index), 8760)
+        self.assertTrue(((data["electricity"] >= 0) & (data["electricity"] <= 1)).all())
+        # no production at midnight local time, production around noon
+        self.assertEqual(data["electricity"].iloc[23], 0)
+        self.assertGreater(data["electricity"].iloc[11], 0.5)
+
+    @override_settings(RENEWABLES_PROVIDERS=["renewables_ninja", "clear_sky"])
+    def test_offline_fallback_to_synthetic_profile_is_not_cached(self):
+        with override_settings(RN_API_TOKEN=""):
+            resource = get_renewables_resource("pv", 9.08, 7.49)
+        self.assertIsNone(resource.pk)
+        self.assertEqual(len(resource.get_profile("electricity")), 8760)
+        self.assertFalse(RenewablesResource.objects.exists())
+
+    @override_settings(RENEWABLES_PROVIDERS=["renewables_ninja", "local"], RN_API_TOKEN="")
+    def test_offline_fallback_to_local_profile_is_not_cached(self):
+        with tempfile.TemporaryDirectory() as data_dir:
+            fake_pv_data(None, "pv", 9.08, 7.49).to_csv(os.path.join(data_dir, "pv_9.08_7.49.csv"))
+            with override_settings(RENEWABLES_DATA_DIR=data_dir):
+                resource = get_renewables_resource("pv", 9.08, 7.49)
+        self.assertIsNone(resource.pk)
+        self.assertEqual(resource.get_profile("electricity"), [0.5] * 8760)
+        self.assertFalse(RenewablesResource.objects.exists())
+
+
+class ProfilingTest(TestCase):
+    fixtures = ["fixtures/benchmarks_fixture.json", "fixtures/test_users.json"]
+
+    def setUp(self):
+        get_store().clear()
+        self.client.login(username="testUser", password="ASas12,.")
+
+    @override_settings(PROFILING_ENABLED=True)
+    def test_middleware_records_the_view(self):
+        self.client.get(reverse("project_search"))
+        (record,) = get_store().all()
+        self.assertEqual((record.kind, record.name, record.status), ("view", "project_search", "200"))
+        self.assertGreater(record.queries, 0)
+        self.assertGreater(record.wall_time, record.db_time)
+
+    def test_middleware_is_not_used_when_disabled(self):
+        self.client.get(reverse("project_search"))
+        self.assertEqual(get_store().all(), [])
+
+    def test_query_budget(self):
+        with query_budget(2, max_duplicates=1) as record:
+            Project.objects.filter(id=1).exists()
+            Project.objects.filter(id=2).exists()
+        self.assertEqual(record.duplicate_queries, 1)
+        with self.assertRaisesRegex(AssertionError, "2 queries executed, the budget is 1"):
+            with query_budget(1):
+                list(Project.objects.filter(id__in=[1, 2]))
+                list(Project.objects.filter(id__in=[1, 2, 3]))
+
+    def test_fingerprint_ignores_parameters(self):
+        self.assertEqual(
+            fingerprint("SELECT * FROM t WHERE id IN (%s, %s, %s) AND name = 'a' LIMIT 21"),
+            fingerprint("SELECT *  FROM t WHERE id IN (%s) AND name = 'b' LIMIT 1"),
+        )
+
+    def test_outbound_calls_are_timed(self):
+        with mock.patch("httpx.get", side_effect=RuntimeError("no network")):
+            with profile("check", store=False) as record:
+                self.assertIsNone(mvs_simulation_check_status("token"))
+        self.assertIn("http", record.sections)
+
+    def test_task_is_recorded(self):
+        task = {"id": "abc", "func": "projects.services.check_simulation_objects"}
+        task_started(sender="django_q", func=None, task=task)
+        Project.objects.count()
+        task_finished(sender="django_q", func=None, task=dict(task, success=True))
+        (record,) = get_store().all()
+        self.assertEqual((record.kind, record.name, record.status), ("task", task["func"], "success"))
+        self.assertEqual(record.queries, 1)
+
+    def test_sqlite_store_is_a_ring_buffer(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            store = SQLiteStore(os.path.join(tmp_dir, "profiling.sqlite3"), size=2)
+            for name in ("a", "b", "c"):
+                store.add(ProfileRecord(kind="view", name=name, queries=3, fingerprints={"SELECT 1": 2, "SELECT 2": 1}))
+            records = store.all()
+        self.assertEqual([record.name for record in records], ["b", "c"])
+        self.assertEqual(records[0].duplicates, {"SELECT 1": 2})
+
+    @override_settings(PROFILING_ENABLED=True)
+    def test_admin_ranking(self):
+        CustomUser.objects.filter(username="testUser").update(is_staff=True)
+        self.client.get(reverse("project_search"))
+        response = self.client.get(reverse("profiling_report"), {"order_by": "mean_queries"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context["ranking"][0]["name"], "project_search")
+
+
+def topology_payload(scenario):
+    """Nodes of the scenario as sent by the GUI editor when the topology is saved"""
+    nodes = {}
+    for bus in Bus.objects.filter(scenario=scenario):
+        nodes[("bus", bus.id)] = {
+            "db_id": bus.id,
+            "name": "bus",
+            "data": {"name": bus.name},
+            "pos_x": bus.pos_x,
+            "pos_y": bus.pos_y,
+        }
+    for asset in Asset.objects.filter(scenario=scenario, parent_asset=None).select_related("asset_type"):
+        nodes[("asset", asset.id)] = {
+            "db_id": asset.unique_id,
+            "name": asset.asset_type.asset_type,
+            "data": {"name": asset.name, "unique_id": asset.unique_id},
+            "pos_x": asset.pos_x,
+            "pos_y": asset.pos_y,
+        }
+    for node in nodes.values():
+        node.update(inputs={}, outputs={})
+    for link in ConnectionLink.objects.filter(scenario=scenario).select_related("asset"):
+        if link.flow_direction == "B2A":
+            connection = {"node": link.asset.unique_id, "output": "input_1"}
+            nodes[("bus", link.bus_id)]["outputs"].setdefault(link.bus_connection_port, []).append(connection)
+        else:
+            connection = {"node": link.bus_id, "output": link.bus_connection_port}
+            nodes[("asset", link.asset_id)]["outputs"].setdefault("output_1", []).append(connection)
+    return list(nodes.values())
+
+
+class TopologySaveTest(TestCase):
+    fixtures = ["fixtures/fixture.json", "fixtures/multivector_fixture.json"]
+
+    def setUp(self):
+        self.scenario = Scenario.objects.get(pk=1)
+        self.client.force_login(self.scenario.project.user)
+        self.url = reverse("scenario_create_topology", args=[self.scenario.project.id, self.scenario.id])
+
+    def links(self):
+        return sorted(
+            ConnectionLink.objects.filter(scenario=self.scenario).values_list(
+                "id", "bus_id", "asset__name", "flow_direction", "bus_connection_port"
+            )
+        )
+
+    def test_unchanged_topology_is_not_written(self):
+        links = self.links()
+        topologies = topology_payload(self.scenario)
+        # the assets, busses and links of the scenario
+        with self.assertNumQueries(5):
+            changes = save_scenario_topology(self.scenario, topologies)
+        self.assertFalse(changes)
+        self.assertEqual(self.links(), links)
+
+    def test_topology_changes_are_saved_in_bulk(self):
+        positions = dict(Asset.objects.values_list("name", "pos_x"))
+        topologies = [node for node in topology_payload(self.scenario) if node["data"]["name"] != "Heat_DSO"]
+        for node in topologies:
+            node["pos_x"] += 10
+            if node["data"]["name"] == "Electricity":
+                node["outputs"]["output_1"] = [c for c in node["outputs"]["output_1"] if "input_1" == c["output"]]
+                node["outputs"]["output_1"].append(
+                    {"node": Asset.objects.get(name="demand_heat").unique_id, "output": "input_1"}
+                )
+        with self.assertNumQueries(23):
+            response = self.client.post(self.url, json.dumps(topologies), content_type="application/json")
+        self.assertEqual(response.status_code, 200)
+
+        self.assertFalse(Asset.objects.filter(name="Heat_DSO").exists())
+        self.assertEqual(
+            dict(Asset.objects.values_list("name", "pos_x")),
+            {name: pos_x + 10 for name, pos_x in positions.items() if name != "Heat_DSO"},
+        )
+        self.assertEqual(
+            sorted(link[1:] for link in self.links()),
+            sorted(
+                [
+                    (1, "demand_elec", "B2A", "output_1"),
+                    (1, "heat_pump", "B2A", "output_1"),
+                    (2, "demand_heat", "B2A", "output_1"),
+                    (2, "heat_pump", "A2B", "input_1"),
+                    (1, "Grid_DSO", "A2B", "input_1"),
+                    (1, "demand_heat", "B2A", "output_1"),
+                ]
+            ),
+        )
+        self.assertEqual(
+            list(Simulation.objects.get(scenario=self.scenario).assetchangetracker_set.values_list("name", "action")),
+            [("Heat_DSO", 0)],
+        )
+
+    def test_link_to_another_scenario_is_rejected(self):
+        topologies = topology_payload(self.scenario)
+        topologies[0]["outputs"]["output_1"].append({"node": "unknown", "output": "input_1"})
+        response = self.client.post(self.url, json.dumps(topologies), content_type="application/json")
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(ConnectionLink.objects.filter(scenario=self.scenario).count(), 6)
+
+
+class AssetFormTest(TestCase):
+    fixtures = ["fixtures/fixture.json", "fixtures/multivector_fixture.json"]
+
+    def setUp(self):
+        self.scenario = Scenario.objects.get(pk=1)
+
+    def asset_form(self, **kwargs):
+        return AssetCreateForm(asset_type="pv_plant", proj_id=self.scenario.project_id, **kwargs)
+
+    def test_field_info_is_compiled_once_per_language(self):
+        field_info = form_field_info(EconomicDataDetailForm)
+        self.assertIs(form_field_info(EconomicDataDetailForm), field_info)
+        with self.assertRaises(TypeError):
+            field_info["discount"] = None
+        with translation.override("de"):
+            self.assertIsNot(form_field_info(EconomicDataDetailForm), field_info)
+        form = EconomicDataDetailForm()
+        self.assertEqual(form.fields["discount"].label, field_info["discount"].label)
+
+    def test_form_construction_is_write_free(self):
+        self.asset_form()
+        # the project's currency and exchange rate, the asset type
+        with FileOperationCounter() as file_operations, self.assertNumQueries(2):
+            form = self.asset_form()
+        self.assertEqual(len(file_operations), 0)
+        self.assertEqual(form.fields["capex_var"].label, self.asset_form().fields["capex_var"].label)
+        self.assertIn("icon-question", form.fields["capex_var"].label)
+        self.assertIsNone(form.fields["capex_var"].help_text)
+
+    def test_timestamps_are_loaded_on_demand(self):
+        form = AssetCreateForm(asset_type="pv_plant", scenario_id=self.scenario.id)
+        self.assertEqual(form.timestamps, self.scenario.get_timestamps())
+        self.assertIsNone(self.asset_form().timestamps)
+
+    def test_parameter_strings_are_collected(self):
+        with open(os.path.join(os.path.dirname(__file__), "parameter_strings.py"), encoding="utf-8") as fp:
+            module = fp.read()
+        # the module should be generated again by the collect_parameter_strings command when the csv files changed
+        for string in parameter_strings():
+            self.assertIn(json.dumps(string, ensure_ascii=False), module)
+
+
+class CompiledRegistryTest(SimpleTestCase):
+    def setUp(self):
+        static_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, static_root)
+        for filepath in REGISTRY_SOURCES:
+            os.makedirs(os.path.dirname(os.path.join(static_root, filepath)), exist_ok=True)
+            shutil.copy(os.path.join(django_settings.STATIC_ROOT, filepath), os.path.join(static_root, filepath))
+        self.static_root = static_root
+        self.enterContext(override_settings(STATIC_ROOT=static_root))
+        self.addCleanup(load_compiled_registry.cache_clear)
+        compile_registry()
+
+    def test_registries_are_read_from_the_artifact(self):
+        compiled = load_compiled_registry()
+        self.assertEqual(set(compiled["files"]), set(REGISTRY_SOURCES))
+        self.assertEqual(
+            set(compiled["registries"]), {"parameters", "business_models", "financial_parameters", "output_parameters"}
+        )
+        for name, registry in COMPILED_REGISTRIES.items():
+            self.assertEqual(compiled["registries"][name], registry._builder())
+
+        builder = mock.Mock()
+        with mock.patch.dict(COMPILED_REGISTRIES):
+            self.assertEqual(dict(LazyRegistry(builder, name="parameters")), compiled["registries"]["parameters"])
+        builder.assert_not_called()
+
+    def test_changed_csv_file_is_parsed_again(self):
+        load_compiled_registry()
+        path = os.path.join(self.static_root, "business_model_list.csv")
+        with open(path, "a", encoding="utf-8") as fp:
+            fp.write("\n")
+        os.utime(path, (time.time() + 10, time.time() + 10))
+
+        # the artifact is only checked when it is loaded
+        self.assertIn("business_model_list.csv", load_compiled_registry()["files"])
+        load_compiled_registry.cache_clear()
+        compiled = load_compiled_registry()
+        self.assertNotIn("business_model_list.csv", compiled["files"])
+        self.assertIn("MVS_parameters_list.csv", compiled["files"])
+        self.assertEqual(compiled["registries"], {})
+        self.assertEqual(csv_rows("business_model_list.csv")[-1], [])
+
+
+class ScenarioDiffTest(TestCase):
+    fixtures = ["fixtures/two_scenarios_fixture.json"]
+
+    def setUp(self):
+        self.reference, self.scenario = Scenario.objects.order_by("id")
+        self.client.force_login(self.scenario.project.user)
+
+    def test_payloads_are_loaded_in_bulk(self):
+        # the value types, then per scenario its project, economic data, assets, busses, links and constraints
+        with self.assertNumQueries(23):
+            scenario_payloads([self.reference, self.scenario])
+
+    def test_diff(self):
+        reference_payload, payload = scenario_payloads([self.reference, self.scenario])
+        self.assertFalse(diff_payloads(reference_payload, copy.deepcopy(reference_payload)))
+
+        diff = diff_payloads(reference_payload, payload)
+        self.assertEqual(
+            diff.changed["energy_conversion/transformer_station_in"], {"installed_capacity.value": [1250.0, 2250.0]}
+        )
+        self.assertEqual(list(diff.added), ["energy_consumption/demand_02", "energy_storage/ESS1"])
+        self.assertEqual(list(diff.removed), ["energy_storage/storage"])
+        # the payload is rebuilt from the reference payload and the diff
+        self.assertEqual(simulation_payload_hash(diff.apply(reference_payload)), simulation_payload_hash(payload))
+
+    def test_diff_is_stored(self):
+        diff = scenario_diff(self.scenario, self.reference)
+        stored = ScenarioDiff.objects.get(scenario=self.scenario, reference=self.reference)
+        self.assertEqual(stored.diff().nodes, diff.nodes)
+        reference_payload, payload = scenario_payloads([self.reference, self.scenario])
+        self.assertEqual(stored.scenario_hash, simulation_payload_hash(payload))
+        # the new values of the stored diff are enough to rebuild the payload
+        self.assertEqual(
+            simulation_payload_hash(stored.diff().apply(reference_payload)), simulation_payload_hash(payload)
+        )
+
+    def test_changes_since_the_simulation(self):
+        self.assertIsNone(simulation_diff(self.scenario))
+        payload = format_scenario_for_mvs(self.scenario)
+        start_simulation(
+            self.scenario.id,
+            simulation_payload_hash(payload),
+            {"id": "token", "status": DONE, "results": None},
+            payload=payload,
+        )
+        self.assertFalse(simulation_diff(self.scenario))
+        # the lp file requested with the simulation is not a change of the scenario
+        payload["simulation_settings"]["output_lp_file"] = "true"
+        Simulation.objects.filter(scenario=self.scenario).update(payload_snapshot=payload_snapshot(payload))
+        self.assertFalse(simulation_diff(self.scenario))
+
+        Asset.objects.filter(scenario=self.scenario, name="demand_02").delete()
+        response = self.client.get(reverse("scenario_changes", args=[self.scenario.id]))
+        self.assertEqual(response.json()["nodes"], ["energy_busses/Electricity", "energy_consumption/demand_02"])
+
+    def test_changes_compared_to_a_reference(self):
+        url = reverse("scenario_changes", args=[self.scenario.id, self.reference.id])
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("energy_storage/storage", response.json()["changes"]["removed"])
+        self.assertFalse(ScenarioDiff.objects.exists())
+        # the diff is only stored on request
+        self.assertEqual(self.client.post(url).json(), response.json())
+        self.assertTrue(ScenarioDiff.objects.filter(scenario=self.scenario, reference=self.reference).exists())
+
+        other = CustomUser.objects.create(username="other", email="other@localhost")
+        self.client.force_login(other)
+        self.assertEqual(self.client.get(url).status_code, 403)
+        # viewers can read the changes but not store them
+        self.scenario.project.viewers.create(user=other, share_rights="read")
+        self.assertEqual(self.client.get(url).status_code, 200)
+        self.assertEqual(self.client.post(url).status_code, 403)
+
+
+class BulkLoaderTest(TestCase):
+    fixtures = ["fixtures/fixture.json"]
+
+    def setUp(self):
+        with open("fixtures/cp_usecases.json", "r") as fp:
+            self.usecase_data = json.load(fp)
+
+    @staticmethod
+    def assets_summary(assets):
+        return {
+            asset["name"]: (asset["pos_x"], asset["asset_info"]["asset_type"], asset.get("parent_asset"))
+            for asset in assets
+        }
+
+    def test_dry_run_reports_the_rows_without_writing(self):
+        with self.assertNumQueries(3):
+            loader = load_projects_in_bulk([self.usecase_data], model=UseCase, dry_run=True)
+        self.assertEqual(
+            dict(loader.counts),
+            {
+                "EconomicData": 1,
+                "UseCase": 1,
+                "Scenario": 6,
+                "AssetType": 0,
+                "Asset": 30,
+                "COPCalculator": 0,
+                "Bus": 10,
+                "ConnectionLink": 28,
+            },
+        )
+        self.assertFalse(UseCase.objects.exists())
+
+    def test_usecase_is_inserted_in_bulk(self):
+        # savepoint, economic data, project and usecase rows, scenarios, asset types, timeseries payloads (lookup and
+        # insert), parent and children assets, busses and links
+        with self.assertNumQueries(13):
+            load_projects_in_bulk([self.usecase_data], model=UseCase)
+        usecase = UseCase.objects.get()
+        self.assertEqual(usecase.scenario_set.count(), 6)
+
+        exported_scenarios = usecase.export()["scenario_set_data"]
+        for exported, scenario_data in zip(exported_scenarios, self.usecase_data["scenario_set_data"]):
+            self.assertEqual(self.assets_summary(exported["assets"]), self.assets_summary(scenario_data["assets"]))
+            self.assertEqual(
+                {bus["name"]: len(bus["inputs"]) + len(bus["outputs"]) for bus in exported["busses"]},
+                {bus["name"]: len(bus["inputs"]) + len(bus["outputs"]) for bus in scenario_data["busses"]},
+            )
+        # the optimize_cap of the providers is disabled as in Asset.save()
+        self.assertFalse(Asset.objects.filter(asset_type__asset_type="gas_dso", optimize_cap=True).exists())
+
+    def test_missing_asset_types_are_created_once(self):
+        AssetType.objects.filter(asset_type="pv_plant").delete()
+        loader = load_projects_in_bulk([self.usecase_data, self.usecase_data], model=UseCase)
+        self.assertEqual(loader.counts["AssetType"], 1)
+        self.assertEqual(Asset.objects.filter(asset_type__asset_type="pv_plant").count(), 8)
+
+
+class AssetTimeseriesMigrationTest(TestCase):
+    fixtures = ["fixtures/benchmarks_fixture.json"]
+
+    def setUp(self):
+        Asset.objects.update(**{field: None for field in TIMESERIES_FIELDS})
+        self.ids = list(Asset.objects.order_by("pk").values_list("pk", flat=True))
+        Asset.objects.filter(pk=self.ids[0]).update(input_timeseries="[1, 2.5]", energy_price="0.3")
+        Asset.objects.filter(pk=self.ids[1]).update(
+            input_timeseries=json.dumps({"values": [3], "input_method": {"type": "upload"}}),
+            feedin_tariff=json.dumps({"values": 0.1, "input_method": {"type": "manuel"}}),
+        )
+        Asset.objects.filter(pk=self.ids[2]).update(input_timeseries="[4, 5]", efficiency="0.9")
+        Asset.objects.filter(pk=self.ids[3]).update(input_timeseries="not json")
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.checkpoint = os.path.join(self.tmp_dir.name, "checkpoint.json")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def migrate(self, *args):
+        out = StringIO()
+        call_command("update_asset_input_timeseries", "--checkpoint", self.checkpoint, *args, stdout=out)
+        return out.getvalue()
+
+    def test_decode_json_chunk_isolates_the_invalid_values(self):
+        self.assertEqual(decode_json_chunk([(1, "[1]"), (2, "2")]), ([(1, [1]), (2, 2)], []))
+        self.assertEqual(decode_json_chunk([(1, "[1]"), (2, "x"), (3, "{}")]), ([(1, [1]), (3, {})], [2]))
+        # values which are not valid json on their own but would be once joined
+        self.assertEqual(decode_json_chunk([(1, "1, 2"), (2, "")]), ([], [1, 2]))
+
+    def test_timeseries_are_migrated_in_chunks(self):
+        output = self.migrate("--chunk-size", "2")
+        assets = Asset.objects.in_bulk(self.ids[:3])
+        self.assertEqual(
+            json.loads(assets[self.ids[0]].input_timeseries), {"values": [1, 2.5], "input_method": {"type": "manuel"}}
+        )
+        self.assertEqual(json.loads(assets[self.ids[0]].energy_price)["values"], [0.3])
+        self.assertEqual(json.loads(assets[self.ids[1]].input_timeseries)["input_method"], {"type": "upload"})
+        self.assertEqual(json.loads(assets[self.ids[1]].feedin_tariff)["values"], [0.1])
+        # a scalar efficiency is not a timeseries
+        self.assertEqual(assets[self.ids[2]].efficiency, "0.9")
+        self.assertIn(f"input_timeseries: assets with problems [{self.ids[3]}]", output)
+        self.assertIn(f"efficiency: assets with problems [{self.ids[2]}]", output)
+        self.assertIn("input_timeseries: 4 rows read, 2 updated, 1 problems", output)
+        self.assertFalse(os.path.exists(self.checkpoint))
+
+    def test_dry_run_does_not_write(self):
+        output = self.migrate("--dry-run")
+        self.assertEqual(Asset.objects.get(pk=self.ids[0]).input_timeseries, "[1, 2.5]")
+        self.assertIn("input_timeseries: 4 rows read, 2 updated", output)
+        self.assertFalse(os.path.exists(self.checkpoint))
+
+    def test_interrupted_migration_resumes_from_the_checkpoint(self):
+        def interrupt(chunk):
+            if chunk[0][0] == self.ids[2]:
+                raise KeyboardInterrupt
+            return timeseries_to_dict(chunk)
+
+        migration = ColumnMigration(
+            "input_timeseries", Asset.objects.filter(input_timeseries__isnull=False), "input_timeseries", interrupt
+        )
+        with self.assertRaises(KeyboardInterrupt):
+            migration.run(chunk_size=2, checkpoint=Checkpoint(self.checkpoint))
+        self.assertEqual(Checkpoint(self.checkpoint).get("input_timeseries"), self.ids[1])
+        self.assertIn("{", Asset.objects.get(pk=self.ids[0]).input_timeseries)
+
+        # the rows of the first chunk are not read again
+        Asset.objects.filter(pk=self.ids[0]).update(input_timeseries="[0]")
+        output = self.migrate()
+        self.assertIn("input_timeseries: 2 rows read, 1 updated, 1 problems", output)
+        self.assertIn(f"(resumed after pk {self.ids[1]})", output)
+        self.assertEqual(Asset.objects.get(pk=self.ids[0]).input_timeseries, "[0]")
+        self.assertEqual(json.loads(Asset.objects.get(pk=self.ids[2]).input_timeseries)["values"], [4, 5])
+
+
+class TimeseriesPayloadTest(TestCase):
+    fixtures = ["fixtures/benchmarks_fixture.json"]
+
+    def setUp(self):
+        self.profile = json.dumps([1.5, 2.0, 0.5])
+        self.asset = Asset.objects.order_by("pk").first()
+        self.asset.input_timeseries = self.profile
+        self.asset.save()
+
+    def stored_column(self, asset):
+        return Asset.objects.filter(pk=asset.pk).values_list("input_timeseries", "input_timeseries_payload")[0]
+
+    def test_values_are_stored_once(self):
+        self.assertEqual(self.stored_column(self.asset), ("", TimeseriesPayload.digest_of(self.profile)))
+        self.assertEqual(Asset.objects.get(pk=self.asset.pk).input_timeseries, self.profile)
+        value = Asset._meta.get_field("input_timeseries").value_expression()
+        self.assertEqual(Asset.objects.filter(pk=self.asset.pk).values_list(value, flat=True).get(), self.profile)
+
+        # duplicating the asset only copies the digest
+        copy = Asset.objects.get(pk=self.asset.pk)
+        copy.pk = None
+        copy.unique_id = "copy"
+        copy.save()
+        self.assertEqual(TimeseriesPayload.objects.count(), 1)
+        self.assertEqual(Asset.objects.get(pk=copy.pk).input_timeseries, self.profile)
+
+    def test_assigned_values_replace_the_payload(self):
+        asset = Asset.objects.get(pk=self.asset.pk)
+        asset.input_timeseries = ""
+        asset.save()
+        self.assertEqual(self.stored_column(asset), ("", None))
+        self.assertEqual(Asset.objects.get(pk=asset.pk).input_timeseries, "")
+
+        # the values written without save() take precedence over the payload
+        Asset.objects.filter(pk=self.asset.pk).update(input_timeseries="[3]")
+        Asset.objects.filter(pk=self.asset.pk).update(input_timeseries_payload=TimeseriesPayload.objects.get())
+        self.assertEqual(Asset.objects.get(pk=self.asset.pk).input_timeseries, "[3]")
+
+    def test_unreferenced_payloads_are_collected(self):
+        TimeseriesPayload.intern("[4]")
+        self.assertEqual(TimeseriesPayload.collect_garbage(), 0)
+        self.assertEqual(TimeseriesPayload.collect_garbage(min_age=timedelta(0), dry_run=True), 1)
+        self.assertEqual(TimeseriesPayload.collect_garbage(min_age=timedelta(0)), 1)
+        self.asset.delete()
+        self.assertEqual(TimeseriesPayload.collect_garbage(min_age=timedelta(0)), 1)
+        self.assertFalse(TimeseriesPayload.objects.exists())
+
+    def test_timeseries_format_migration_reads_the_payloads(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            call_command(
+                "update_asset_input_timeseries",
+                "--checkpoint",
+                os.path.join(tmp_dir, "checkpoint.json"),
+                stdout=StringIO(),
+            )
+        asset = Asset.objects.get(pk=self.asset.pk)
+        self.assertEqual(json.loads(asset.input_timeseries)["values"], [1.5, 2.0, 0.5])
+        # the migrated values are interned, not written to the column
+        self.assertEqual(self.stored_column(asset), ("", TimeseriesPayload.digest_of(asset.input_timeseries)))
+
+    # the values of the Timeseries can only be stored on postgres
+    @skipUnless(connection.vendor == "postgresql", "requires postgres")
+    def test_timeseries_values_are_read_through(self):
+        timeseries = Timeseries.objects.create(name="profile", values=[1.5, 2.0, 0.5], units="kWh")
+        self.assertEqual(timeseries.ts_type, "vector")
+        self.assertEqual(Timeseries.objects.filter(pk=timeseries.pk).values_list("values", flat=True).get(), [])
+        with self.assertNumQueries(1):
+            timeseries = Timeseries.objects.with_payload().get(pk=timeseries.pk)
+            self.assertEqual(timeseries.get_values_with_unit("Wh"), [1500, 2000, 500])
+        self.assertEqual(TimeseriesPayload.objects.get(digest=timeseries.payload_id).decoded, [1.5, 2.0, 0.5])
+
+    def test_dedup_command_moves_the_stored_values_to_payloads(self):
+        legacy_ids = list(Asset.objects.exclude(pk=self.asset.pk).order_by("pk").values_list("pk", flat=True)[:3])
+        Asset.objects.filter(pk__in=legacy_ids).update(input_timeseries=self.profile)
+        TimeseriesPayload.intern("[4]")
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            out = StringIO()
+            call_command(
+                "dedup_timeseries",
+                "--checkpoint",
+                os.path.join(tmp_dir, "checkpoint.json"),
+                "--min-age",
+                "0",
+                "--chunk-size",
+                "2",
+                stdout=out,
+            )
+        self.assertIn("Asset.input_timeseries: 3 rows read, 3 updated", out.getvalue())
+        self.assertIn("Deleted 1 unreferenced timeseries payloads", out.getvalue())
+        digest = TimeseriesPayload.objects.get().digest
+        for asset in Asset.objects.filter(pk__in=legacy_ids):
+            self.assertEqual(self.stored_column(asset), ("", digest))
+            self.assertEqual(asset.input_timeseries, self.profile)
+
+
+class SimulationReuseTest(TestCase):
+    fixtures = ["fixtures/benchmarks_fixture.json"]
+
+    def setUp(self):
+        self.scenario = Scenario.objects.get()
+        self.client.force_login(self.scenario.project.user)
+        # the capacity of the dso of the fixture is optimized, which saving the asset resets
+        Asset.objects.get(scenario=self.scenario, asset_type__asset_type="dso").save()
+
+    def simulate(self, scenario):
+        """Request the simulation of the scenario and return the number of payloads sent to the MVS"""
+        with mock.patch(
+            "projects.views.mvs_simulation_request", return_value={"id": "token", "status": PENDING}
+        ) as post, mock.patch("projects.services.create_or_delete_simulation_scheduler"):
+            self.client.post(reverse("request_mvs_simulation", args=[scenario.id]))
+        return post.call_count
+
+    def test_payload_hash_ignores_the_order_and_the_identifiers(self):
+        data = format_scenario_for_mvs(self.scenario, testing=True)
+        reordered = copy.deepcopy(data)
+        reordered["energy_busses"].reverse()
+        for bus in reordered["energy_busses"]:
+            bus["assets"].reverse()
+        reordered["energy_consumption"].reverse()
+        reordered["project_data"].update(scenario_id=1000, scenario_name="copy")
+        reordered["energy_consumption"][0]["unique_id"] = "copy"
+        self.assertEqual(simulation_payload_hash(reordered), simulation_payload_hash(data))
+
+        modified = copy.deepcopy(data)
+        modified["economic_data"]["tax"]["value"] += 0.1
+        self.assertNotEqual(simulation_payload_hash(modified), simulation_payload_hash(data))
+        payload_hash = simulation_payload_hash(data)
+        with override_settings(MVS_API_HOST="http://localhost:5001"):
+            self.assertNotEqual(simulation_payload_hash(data), payload_hash)
+
+    def test_unchanged_scenarios_reuse_the_results(self):
+        self.assertEqual(self.simulate(self.scenario), 1)
+        simulation = Simulation.objects.get(scenario=self.scenario)
+        self.assertIsNotNone(simulation.payload_hash)
+        # the MVS returned the results
+        Simulation.objects.filter(pk=simulation.pk).update(
+            status=DONE, mvs_version="1.1.0", results="{}", end_date=datetime.now()
+        )
+        AssetsResults.objects.create(assets_list="{}", simulation=simulation)
+        KPIScalarResults.objects.create(scalar_values="{}", simulation=simulation)
+        FancyResults.objects.create(
+            bus="ac_bus",
+            energy_vector="Electricity",
+            direction="out",
+            asset="demand",
+            asset_type="demand",
+            oemof_type="sink",
+            flow_data=[1.0, 2.0],
+            optimized_capacity=None,
+            simulation=simulation,
+        )
+
+        self.assertEqual(self.simulate(self.scenario), 0)
+        self.assertEqual(Simulation.objects.get(scenario=self.scenario).pk, simulation.pk)
+
+        self.client.get(reverse("scenario_duplicate", args=[self.scenario.id]))
+        duplicate = Scenario.objects.exclude(pk=self.scenario.pk).get()
+        self.assertEqual(self.simulate(duplicate), 0)
+        clone = Simulation.objects.get(scenario=duplicate)
+        self.assertEqual(
+            (clone.status, clone.mvs_version, clone.payload_hash), (DONE, "1.1.0", simulation.payload_hash)
+        )
+        self.assertEqual(FancyResults.objects.get(simulation=clone).total_flow, 3.0)
+        self.assertEqual(AssetsResults.objects.filter(simulation=clone).count(), 1)
+        self.assertEqual(KPIScalarResults.objects.filter(simulation=clone).count(), 1)
+
+        # once a newer MVS version ran a simulation, the results of the older versions are not reused anymore
+        Simulation.objects.filter(pk=simulation.pk).update(mvs_version="1.0.0")
+        Simulation.objects.filter(pk=clone.pk).update(payload_hash="other")
+        self.assertIsNone(reusable_simulation(simulation.payload_hash))
+        self.assertEqual(self.simulate(self.scenario), 1)
+
+
+class SimulationBatchTest(TestCase):
+    fixtures = ["fixtures/benchmarks_fixture.json"]
+
+    def setUp(self):
+        scenario = Scenario.objects.get()
+        self.client.force_login(scenario.project.user)
+        Asset.objects.get(scenario=scenario, asset_type__asset_type="dso").save()
+        for _ in range(4):
+            self.client.get(reverse("scenario_duplicate", args=[scenario.id]))
+        self.scenarios = list(Scenario.objects.order_by("pk"))
+        # variants of the same scenario
+        for i, variant in enumerate(self.scenarios):
+            Asset.objects.filter(scenario=variant).update(capex_var=100 + i)
+
+        self.server = FakeMVSServer(checks_until_done=1, fail_scenarios=[self.scenarios[-1].id]).start()
+        self.addCleanup(self.server.stop)
+        mvs_settings = override_settings(
+            MVS_POST_URL=self.server.post_url, MVS_GET_URL=self.server.get_url, PROXY_CONFIG={}
+        )
+        mvs_settings.enable()
+        self.addCleanup(mvs_settings.disable)
+
+    def request_batch(self):
+        response = self.client.post(
+            reverse("request_simulation_batch", args=[self.scenarios[0].project.id]),
+            {"scenario_ids": json.dumps([scenario.id for scenario in self.scenarios])},
+        )
+        return response.json()
+
+    @override_settings(SIMULATION_BATCH_CONCURRENCY=2)
+    def test_batch_is_simulated_with_bounded_concurrency(self):
+        progress = self.request_batch()
+        batch = SimulationBatch.objects.get(pk=progress["batch_id"])
+        self.assertEqual(batch.max_concurrent, 2)
+        self.assertEqual((progress["total"], progress["pending"], progress["queued"]), (5, 2, 3))
+        self.assertEqual(self.server.submissions, 2)
+
+        # each round ingests the finished simulations and submits the next scenarios
+        progress = advance_simulation_batch(batch)
+        self.assertEqual((progress["done"], progress["pending"], progress["queued"]), (2, 2, 1))
+        for _ in range(3):
+            status = self.client.get(reverse("simulation_batch_status", args=[batch.id])).json()
+            if status["finished"] is True:
+                break
+
+        self.assertEqual((status["done"], status["failed"], status["progress"]), (4, 1, 1.0))
+        self.assertEqual([item["status"] for item in status["scenarios"]], [DONE] * 4 + [ERROR])
+        self.assertEqual(self.server.max_running, 2)
+        self.assertEqual(self.server.submissions, 5)
+        simulation = Simulation.objects.get(scenario=self.scenarios[0])
+        self.assertEqual(simulation.mvs_version, "fake")
+        self.assertTrue(FancyResults.objects.filter(simulation=simulation).exists())
+        self.assertTrue(SimulationBatch.objects.get(pk=batch.pk).date_finished)
+
+    def test_simulated_scenarios_are_not_submitted_again(self):
+        with mock.patch("projects.services.create_or_delete_simulation_scheduler") as scheduler:
+            batch = SimulationBatch.objects.get(pk=self.request_batch()["batch_id"])
+            scheduler.assert_called_once()
+            for _ in range(3):
+                progress = advance_simulation_batch(batch)
+            self.assertTrue(progress["finished"])
+            self.assertEqual(self.server.submissions, 5)
+
+            # only the scenario which failed is submitted again
+            progress = self.request_batch()
+            self.assertEqual((progress["done"], progress["pending"], progress["queued"]), (4, 1, 0))
+            self.assertEqual(self.server.submissions, 6)
+        items = SimulationBatch.objects.get(pk=progress["batch_id"]).items.order_by("pk")
+        self.assertEqual([item.status for item in items], [DONE] * 4 + [PENDING])
+        self.assertNotIn(QUEUED, [item.status for item in batch.items.all()])
+
+    @override_settings(SIMULATION_BATCH_SUBMISSION_ATTEMPTS=2)
+    def test_items_which_cannot_be_submitted_fail(self):
+        failing = self.scenarios[1].id
+
+        def format_payload(scenario, *args, **kwargs):
+            if scenario.id == failing:
+                raise ValueError("invalid scenario")
+            return format_scenario_for_mvs(scenario, *args, **kwargs)
+
+        with mock.patch("projects.services.format_scenario_for_mvs", side_effect=format_payload), mock.patch(
+            "projects.services.mvs_simulation_request", return_value=None
+        ):
+            batch = SimulationBatch.objects.get(pk=self.request_batch()["batch_id"])
+            self.assertEqual(batch.items.get(scenario_id=failing).status, ERROR)
+            progress = advance_simulation_batch(batch)
+        # the unreachable MVS was retried once
+        self.assertEqual([item.submission_attempts for item in batch.items.order_by("pk")], [2, 0, 2, 2, 2])
+        self.assertEqual((progress["failed"], progress["queued"]), (5, 0))
+        self.assertTrue(progress["finished"])
+
+    def test_failing_batch_does_not_stop_the_other_batches(self):
+        with mock.patch("projects.services.create_or_delete_simulation_scheduler"):
+            first = SimulationBatch.objects.get(pk=self.request_batch()["batch_id"])
+            second = SimulationBatch.objects.create(user=first.user)
+        advance = mock.Mock(side_effect=[RuntimeError("MVS answer"), None])
+        with mock.patch("projects.services.advance_simulation_batch", advance), self.assertLogs("projects.services"):
+            check_simulation_objects()
+        self.assertEqual([call.args[0] for call in advance.call_args_list], [first, second])
+
+
+
+class AsyncViewsTest(TestCase):
+    fixtures = ["fixtures/benchmarks_fixture.json"]
+    delay = 0.5
+
+    def setUp(self):
+        self.scenario = Scenario.objects.get()
+        self.server = FakeMVSServer(checks_until_done=2, delay=self.delay).start()
+        self.addCleanup(self.server.stop)
+        mvs_settings = override_settings(MVS_GET_URL=self.server.get_url, PROXY_CONFIG={})
+        mvs_settings.enable()
+        self.addCleanup(mvs_settings.disable)
+        self.simulation = Simulation.objects.get(scenario=self.scenario)
+        self.simulation.status = PENDING
+        self.simulation.mvs_token = self.server.submit(format_scenario_for_mvs(self.scenario))["id"]
+        self.simulation.save()
+        self.client = AsyncClient()
+        self.client.force_login(self.scenario.project.user)
+
+    def test_status_requests_do_not_block_each_other(self):
+        url = reverse("fetch_simulation_results", args=[self.simulation.id])
+
+        async def burst(n_requests):
+            return await asyncio.gather(*(self.client.get(url) for _ in range(n_requests)))
+
+        start = time.perf_counter()
+        responses = async_to_sync(burst)(4)
+        elapsed = time.perf_counter() - start
+
+        # the sequential requests would take 4 delays
+        self.assertLess(elapsed, 2.5 * self.delay)
+        self.assertEqual([response.status_code for response in responses], [200] * 4)
+        self.assertEqual(Simulation.objects.get(pk=self.simulation.pk).status, DONE)
+
+    def test_status_request_errors_are_answered_with_json(self):
+        url = reverse("fetch_simulation_results", args=[self.simulation.id])
+        # json_view signals the exceptions it answers, which the test client would raise
+        self.client.raise_request_exception = False
+        with mock.patch("projects.views.afetch_mvs_simulation_results", side_effect=RuntimeError("parsing")):
+            with self.assertLogs("django.request", level="ERROR"):
+                response = async_to_sync(self.client.get)(url)
+        self.assertEqual(response.status_code, 500)
+        self.assertEqual(response.json()["error"], 500)
+
+        response = async_to_sync(self.client.get)(reverse("fetch_simulation_results", args=[0]))
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.json()["error"], 404)
+
+    def test_review_page_refreshes_the_pending_simulation(self):
+        url = reverse("scenario_review", args=[self.scenario.project.id, self.scenario.id])
+        response = async_to_sync(self.client.get)(url)
+        self.assertTemplateUsed(response, "scenario/simulation/pending.html")
+        response = async_to_sync(self.client.get)(url)
+        self.assertTemplateUsed(response, "scenario/simulation/success.html")
+        self.assertEqual(self.server.jobs[self.simulation.mvs_token]["checks"], 2)
+
+    def test_review_page_is_not_refreshed_for_other_users(self):
+        other = CustomUser.objects.create(username="other", email="other@localhost")
+        self.client.force_login(other)
+        url = reverse("scenario_review", args=[self.scenario.project.id, self.scenario.id])
+        response = async_to_sync(self.client.get)(url)
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(self.server.jobs[self.simulation.mvs_token]["checks"], 0)
+
+    def test_profiles_are_not_fetched_for_other_users(self):
+        self.client.force_login(CustomUser.objects.create(username="other", email="other@localhost"))
+        project_id = self.scenario.project.id
+        with mock.patch("wefe.views.aget_renewables_resource") as wefe_fetch, mock.patch(
+            "cp_nigeria.views.aget_renewables_resource"
+        ) as cpn_fetch:
+            wefe_response = async_to_sync(self.client.get)(reverse("wefe_steps", args=[project_id, 2]))
+            cpn_response = async_to_sync(self.client.post)(reverse("cpn_steps", args=[project_id, 4]))
+        self.assertEqual((wefe_response.status_code, cpn_response.status_code), (403, 403))
+        wefe_fetch.assert_not_called()
+        cpn_fetch.assert_not_called()
+
+
+@skipUnless(connection.vendor == "postgresql", "backend pids are specific to postgres")
+class ForkedConnectionTest(TransactionTestCase):
+    @staticmethod
+    def backend_pid():
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT pg_backend_pid()")
+            return cursor.fetchone()[0]
+
+    def test_forked_process_opens_its_own_connection(self):
+        parent_pid = self.backend_pid()
+        read, write = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            try:
+                os.write(write, str(self.backend_pid()).encode())
+            finally:
+                os._exit(0)
+        os.waitpid(pid, 0)
+        child_pid = int(os.read(read, 32))
+        os.close(read)
+        os.close(write)
+
+        self.assertNotEqual(child_pid, parent_pid)
+        # the connection of the parent process is still usable
+        self.assertEqual(self.backend_pid(), parent_pid)
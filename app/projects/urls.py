@@ -162,6 +162,8 @@ urlpatterns = [
         reset_scenario_changes,
         name="reset_scenario_changes",
     ),
+    path("scenario_changes/<int:scen_id>", scenario_changes, name="scenario_changes"),
+    path("scenario_changes/<int:scen_id>/<int:ref_scen_id>", scenario_changes, name="scenario_changes"),
     # MVS Simulation
     path(
         "simulation/cancel/<int:scen_id>", simulation_cancel, name="simulation_cancel"
@@ -187,6 +189,16 @@ urlpatterns = [
         name="update_simulation_rating",
     ),
     # path('topology/simulation_status/<int:scen_id>', check_simulation_status, name='check_simulation_status'),
+    path(
+        "project/<int:proj_id>/simulation-batch/create",
+        request_simulation_batch,
+        name="request_simulation_batch",
+    ),
+    path(
+        "simulation-batch/<int:batch_id>/status",
+        simulation_batch_status,
+        name="simulation_batch_status",
+    ),
     path(
         "simulation/fetch-results/<int:sim_id>",
         fetch_simulation_results,
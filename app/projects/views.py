@@ -1,8 +1,10 @@
 # from bootstrap_modal_forms.generic import BSModalCreateView
+from asgiref.sync import iscoroutinefunction, sync_to_async
 from django.contrib.auth.decorators import login_required
 import json
 import logging
 import traceback
+from functools import wraps
 from django.http import HttpResponseForbidden, JsonResponse
 from django.http.response import Http404
 from django.utils.translation import gettext_lazy as _
@@ -20,9 +22,12 @@ from .forms import *
 from .requests import (
     mvs_simulation_request,
     fetch_mvs_simulation_results,
+    afetch_mvs_simulation_results,
     mvs_sensitivity_analysis_request,
     fetch_mvs_sa_results,
     parse_mvs_results,
+    reusable_simulation,
+    clone_simulation_results,
 )
 from projects.models import *
 from dashboard.models import FancyResults
@@ -31,18 +36,21 @@ from .scenario_topology_helpers import (
     handle_bus_form_post,
     handle_asset_form_post,
     load_scenario_topology_from_db,
-    NodeObject,
-    update_deleted_objects_from_database,
+    save_scenario_topology,
     duplicate_scenario_objects,
     duplicate_scenario_connections,
     load_scenario_from_dict,
     load_project_from_dict,
 )
-from projects.helpers import format_scenario_for_mvs, PARAMETERS
+from projects.helpers import format_scenario_for_mvs, simulation_payload_hash, PARAMETERS
+from projects.scenario_diff import scenario_diff, simulation_diff
 from dashboard.helpers import fetch_user_projects
 from .constants import DONE, PENDING, ERROR, MODIFIED
 from .services import (
     create_or_delete_simulation_scheduler,
+    create_simulation_batch,
+    advance_simulation_batch,
+    start_simulation,
     excuses_design_under_development,
     send_feedback_email,
     get_selected_scenarios_in_cache,
@@ -52,6 +60,34 @@ import traceback
 logger = logging.getLogger(__name__)
 
 
+async def call_view(view, request, *args, **kwargs):
+    """Call a view, async or not, from an async view (i.e. the steps dispatching to the view of a step)"""
+    if iscoroutinefunction(view):
+        return await view(request, *args, **kwargs)
+    return await sync_to_async(view)(request, *args, **kwargs)
+
+
+def async_json_view(view):
+    """json_view for async views, the exceptions of the view are answered with the JSON error body of json_view"""
+
+    @wraps(view)
+    async def wrapped(request, *args, **kwargs):
+        try:
+            result, error = await view(request, *args, **kwargs), None
+        except Exception as e:
+            result, error = None, e
+
+        @json_view
+        def respond(request):
+            if error is not None:
+                raise error
+            return result
+
+        return respond(request)
+
+    return wrapped
+
+
 @require_http_methods(["GET"])
 def not_implemented(request):
     """Function returns a message"""
@@ -842,15 +878,8 @@ def scenario_create_topology(request, proj_id, scen_id, step_id=2, max_step=3):
             # raise PermissionDenied
 
         topologies = json.loads(request.body)
-        node_list = [NodeObject(topology) for topology in topologies]
-
-        # delete objects from database which were deleted by the user
-        update_deleted_objects_from_database(scen_id, node_list)
-        # Make sure there are no connections in the Database to prevent inserting the same connections upon updating.
-        ConnectionLink.objects.filter(scenario_id=scen_id).delete()
-        for node_obj in node_list:
-            node_obj.create_connection_links(scen_id)
-            # node_obj.assign_asset_to_proper_group(node_to_db_mapping_dict)
+        # delete the nodes removed by the user, move the other ones and update the connection links
+        save_scenario_topology(scenario, topologies)
         return JsonResponse({"success": True}, status=200)
     else:
         scenario = get_object_or_404(Scenario, pk=scen_id)
@@ -978,9 +1007,43 @@ def scenario_create_constraints(request, proj_id, scen_id, step_id=3, max_step=4
         return HttpResponseRedirect(reverse("scenario_review", args=[proj_id, scen_id]))
 
 
+def editable_project(user, proj_id):
+    """Return the project if the user can edit it, raise Http404 or PermissionDenied as the project pages otherwise"""
+    project = get_object_or_404(Project, id=proj_id)
+    if (
+        project.user_id != user.id
+        and project.viewers.filter(user__email=user.email, share_rights="edit").exists() is False
+    ):
+        raise PermissionDenied
+    return project
+
+
+def viewable_simulation(user, scen_id):
+    """Return the simulation of the scenario if there is one and the user can view it"""
+    simulation = Simulation.objects.filter(scenario_id=scen_id).select_related("scenario__project").first()
+    if simulation is None:
+        return None
+    project = simulation.scenario.project
+    if project.user_id != user.id and project.viewers.filter(user__email=user.email).exists() is False:
+        return None
+    return simulation
+
+
 @login_required
 @require_http_methods(["GET", "POST"])
-def scenario_review(request, proj_id, scen_id, step_id=4, max_step=5):
+async def scenario_review(request, proj_id, scen_id, step_id=4, max_step=5):
+    # MVS is polled without blocking the worker, the page itself is rendered synchronously
+    simulation = None
+    if request.method == "GET":
+        simulation = await sync_to_async(viewable_simulation)(request.user, scen_id)
+        if simulation is not None and simulation.status == PENDING:
+            await afetch_mvs_simulation_results(simulation)
+    return await sync_to_async(scenario_review_page)(
+        request, proj_id, scen_id, step_id=step_id, max_step=max_step, simulation=simulation, refresh=False
+    )
+
+
+def scenario_review_page(request, proj_id, scen_id, step_id=4, max_step=5, simulation=None, refresh=True):
     scenario = get_object_or_404(Scenario, pk=scen_id)
 
     if (scenario.project.user != request.user) and (
@@ -1002,12 +1065,11 @@ def scenario_review(request, proj_id, scen_id, step_id=4, max_step=5):
             "MVS_LP_FILE_URL": MVS_LP_FILE_URL,
         }
 
-        qs = Simulation.objects.filter(scenario_id=scen_id)
+        if simulation is None:
+            simulation = Simulation.objects.filter(scenario_id=scen_id).first()
 
-        if qs.exists():
-            simulation = qs.first()
-
-            if simulation.status == PENDING:
+        if simulation is not None:
+            if simulation.status == PENDING and refresh is True:
                 fetch_mvs_simulation_results(simulation)
 
             context.update(
@@ -1068,7 +1130,7 @@ def back_to_scenario_review(request, proj_id):
 
     if len(selected_scenario) >= 1:
         scen_id = selected_scenario[0]
-        answer = scenario_review(request, proj_id, scen_id)
+        answer = scenario_review_page(request, proj_id, scen_id)
     else:
         messages.error(
             request,
@@ -1091,12 +1153,12 @@ SCENARIOS_STEPS = [
 
 @login_required
 @require_http_methods(["GET"])
-def scenario_steps(request, proj_id, step_id=None, scen_id=None):
+async def scenario_steps(request, proj_id, step_id=None, scen_id=None):
     if request.method == "GET":
         if step_id is None:
             return HttpResponseRedirect(reverse("scenario_steps", args=[proj_id, 1]))
 
-        return SCENARIOS_STEPS[step_id - 1](request, proj_id, scen_id, step_id)
+        return await call_view(SCENARIOS_STEPS[step_id - 1], request, proj_id, scen_id, step_id)
 
 
 # TODO delete this useless code here
@@ -1143,6 +1205,7 @@ def scenario_duplicate(request, scen_id):
 
     # We need to iterate over all the objects related to this scenario and duplicate them
     # and associate them with the new scenario id.
+    # only the digests of the input timeseries are copied, not their values
     asset_list = Asset.objects.filter(scenario=scenario)
     bus_list = Bus.objects.filter(scenario=scenario)
     connections_list = ConnectionLink.objects.filter(scenario=scenario)
@@ -1215,6 +1278,48 @@ def reset_scenario_changes(request, scen_id):
         return HttpResponseRedirect(reverse("scenario_review", args=[scenario.project.id, scen_id]))
 
 
+@login_required
+@require_http_methods(["GET", "POST"])
+def scenario_changes(request, scen_id, ref_scen_id=None):
+    """Changes of the scenario's simulation payload since its simulation, or compared to the reference scenario
+
+    The changes compared to a reference scenario are stored as a ScenarioDiff on POST, which requires the edit rights
+    on the scenario
+    """
+    scenarios = [get_object_or_404(Scenario, id=scen_id)]
+    if ref_scen_id is not None:
+        scenarios.append(get_object_or_404(Scenario, id=ref_scen_id))
+    for scenario in scenarios:
+        if (scenario.project.user != request.user) and (
+            scenario.project.viewers.filter(user__email=request.user.email).exists() is False
+        ):
+            raise PermissionDenied
+
+    if request.method == "POST":
+        if ref_scen_id is None:
+            return JsonResponse(
+                {"error": "The changes are only stored compared to a reference scenario"},
+                status=400,
+                content_type="application/json",
+            )
+        project = scenarios[0].project
+        if (project.user != request.user) and (
+            project.viewers.filter(user__email=request.user.email, share_rights="edit").exists() is False
+        ):
+            raise PermissionDenied
+
+    if ref_scen_id is None:
+        diff = simulation_diff(scenarios[0])
+    else:
+        diff = scenario_diff(scenarios[0], scenarios[1], save=request.method == "POST")
+    if diff is None:
+        # the payload of the simulation is unknown, i.e. the scenario was simulated before the payloads were stored
+        return JsonResponse({"changes": None, "nodes": None}, status=200, content_type="application/json")
+    return JsonResponse(
+        {"changes": diff.compact().to_dict(), "nodes": diff.nodes}, status=200, content_type="application/json"
+    )
+
+
 # end region ParameterChangeTracker
 
 
@@ -1424,18 +1529,17 @@ def get_asset_create_form(request, scen_id=0, asset_type_name="", asset_uuid=Non
                 asset_type=asset_type_name,
                 instance=existing_asset,
                 input_output_mapping=input_output_mapping,
-                proj_id=scenario.project.id,
+                proj_id=scenario.project_id,
             )
             input_timeseries_data = existing_asset.input_timeseries if existing_asset.input_timeseries else ""
         else:
-            asset_list = Asset.objects.filter(asset_type__asset_type=asset_type_name, scenario=scenario)
-            n_asset = len(asset_list)
+            n_asset = Asset.objects.filter(asset_type__asset_type=asset_type_name, scenario=scenario).count()
             default_name = f"{asset_type_name}-{n_asset}"
             form = AssetCreateForm(
                 asset_type=asset_type_name,
                 initial={"name": default_name},
                 input_output_mapping=input_output_mapping,
-                proj_id=scenario.project.id,
+                proj_id=scenario.project_id,
             )
             input_timeseries_data = ""
 
@@ -1588,6 +1692,14 @@ def request_mvs_simulation(request, scen_id=0):
         if output_lp_file == "on":
             data_clean["simulation_settings"]["output_lp_file"] = "true"
 
+    payload_hash = simulation_payload_hash(data_clean)
+    previous_simulation = reusable_simulation(payload_hash)
+    if previous_simulation is not None:
+        # the same payload was already simulated, i.e. an unmodified or a duplicated scenario
+        clone_simulation_results(previous_simulation, scenario.id)
+        messages.info(request, _("An identical scenario was already simulated, its results are displayed."))
+        return HttpResponseRedirect(reverse("scenario_review", args=[scenario.project.id, scen_id]))
+
     # Make simulation request to MVS
     results = mvs_simulation_request(data_clean)
 
@@ -1602,25 +1714,7 @@ def request_mvs_simulation(request, scen_id=0):
             content_type="application/json",
         )
     else:
-        # delete existing simulation
-        Simulation.objects.filter(scenario_id=scen_id).delete()
-
-        # Create empty Simulation model object
-        simulation = Simulation(start_date=datetime.now(), scenario_id=scen_id)
-
-        simulation.mvs_token = results["id"] if results["id"] else None
-
-        if "status" in results.keys() and (results["status"] == DONE or results["status"] == ERROR):
-            simulation.status = results["status"]
-            simulation.results = results["results"]
-            simulation.end_date = datetime.now()
-        else:  # PENDING
-            simulation.status = results["status"]
-            # create a task which will update simulation status
-            create_or_delete_simulation_scheduler(mvs_token=simulation.mvs_token)
-
-        simulation.elapsed_seconds = (datetime.now() - simulation.start_date).seconds
-        simulation.save()
+        start_simulation(scenario.id, payload_hash, results, payload=data_clean)
 
         answer = HttpResponseRedirect(reverse("scenario_review", args=[scenario.project.id, scen_id]))
 
@@ -1646,10 +1740,43 @@ def update_simulation_rating(request):
 
 @json_view
 @login_required
+@require_http_methods(["POST"])
+def request_simulation_batch(request, proj_id):
+    """Simulate the selected scenarios of the project as a batch"""
+    project = get_object_or_404(Project, id=proj_id)
+    if project.user != request.user:
+        raise PermissionDenied
+
+    scenario_ids = json.loads(request.POST.get("scenario_ids", "[]"))
+    scenarios = list(Scenario.objects.filter(project=project, id__in=scenario_ids).order_by("id"))
+    if not scenarios:
+        return JsonResponse({"status": "error", "error": "No scenario selected"}, status=400)
+    batch = create_simulation_batch(scenarios, name=request.POST.get("name", ""), user=request.user)
+    return JsonResponse(dict(batch_id=batch.id, **batch.progress()))
+
+
+@json_view
+@login_required
+@require_http_methods(["GET"])
+def simulation_batch_status(request, batch_id):
+    batch = get_object_or_404(SimulationBatch, id=batch_id)
+    if batch.user != request.user:
+        raise PermissionDenied
+
+    progress = advance_simulation_batch(batch)
+    progress["scenarios"] = [
+        dict(scenario_id=item.scenario_id, simulation_id=item.simulation_id, status=item.status)
+        for item in batch.items.select_related("simulation").order_by("pk")
+    ]
+    return JsonResponse(progress)
+
+
+@async_json_view
+@login_required
 @require_http_methods(["GET"])
-def fetch_simulation_results(request, sim_id):
-    simulation = get_object_or_404(Simulation, id=sim_id)
-    are_result_ready = fetch_mvs_simulation_results(simulation)
+async def fetch_simulation_results(request, sim_id):
+    simulation = await aget_object_or_404(Simulation, id=sim_id)
+    are_result_ready = await afetch_mvs_simulation_results(simulation)
     return JsonResponse(
         dict(areResultReady=are_result_ready),
         status=200,
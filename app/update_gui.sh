@@ -3,4 +3,5 @@ python manage.py compilemessages
 python manage.py makemigrations users projects dashboard && \
 python manage.py migrate && \
 python manage.py collectstatic && \
+python manage.py compile_parameter_registry && \
 echo 'Updated the WEFEgui app successfully!!'
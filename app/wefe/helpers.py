@@ -5,7 +5,8 @@ import logging
 logger = logging.getLogger(__name__)
 
 from projects.models import Project, Timeseries
-from projects.services import RenewablesNinja
+from projects.services import get_renewables_resource
+from projects.single_flight import single_flight
 
 
 def help_icon(help_text=""):
@@ -27,27 +28,24 @@ def get_renewables_output(proj_id, raw=True):
     }
 
     project = Project.objects.get(id=proj_id)
-    coordinates = {"lat": project.latitude, "lon": project.longitude}
-    pv_ts, created = Timeseries.objects.get_or_create(name=f"pv_ts_{suffixes['pv']}", scenario=project.scenario)
-    wind_ts, _ = Timeseries.objects.get_or_create(name=f"wind_ts_{suffixes['wind']}", scenario=project.scenario)
-
-    # only checking for one because if one exists, both should exist
-    if created is True:
-        location = RenewablesNinja()
-        location.get_pv_data(coordinates)
-        location.get_wind_data(coordinates)
-
-        for ts, name in zip([pv_ts, wind_ts], ["pv", "wind"]):
-            data = location.data[name]
-            try:
-                ts.values = np.squeeze(data[suffixes[name]]).tolist()
-            except KeyError:
-                # For the case that data fetching from renewables.ninja did not work
-                # TODO decide how to handle case and if to set default in RN.fetch_and_parse_data()
-                return None, None
-            ts.start_time = data.index[0]
-            ts.end_time = data.index[-1]
-            ts.time_step = 60
-            ts.save()
+    # a concurrent request for the same scenario waits instead of creating and fetching the same timeseries
+    with single_flight(f"renewables_output:{project.scenario.id}"):
+        pv_ts, created = Timeseries.objects.get_or_create(name=f"pv_ts_{suffixes['pv']}", scenario=project.scenario)
+        wind_ts, _ = Timeseries.objects.get_or_create(name=f"wind_ts_{suffixes['wind']}", scenario=project.scenario)
+
+        # only checking for one because if one exists, both should exist
+        if created is True:
+            for ts, name in zip([pv_ts, wind_ts], ["pv", "wind"]):
+                # the profiles are shared between projects at the same location and only fetched once
+                resource = get_renewables_resource(name, project.latitude, project.longitude)
+                if resource is None or suffixes[name] not in resource.profiles:
+                    # For the case that data fetching from renewables.ninja did not work
+                    # TODO decide how to handle case and if to set default in RN.fetch_and_parse_data()
+                    return None, None
+                ts.values = resource.get_profile(suffixes[name])
+                ts.start_time = resource.start_time
+                ts.end_time = resource.end_time
+                ts.time_step = resource.time_step
+                ts.save()
 
     return pv_ts.values, wind_ts.values
@@ -1,5 +1,7 @@
+import asyncio
 import io
 
+from asgiref.sync import sync_to_async
 from django.contrib.auth.decorators import login_required
 import json
 import logging
@@ -22,13 +24,12 @@ from .helpers import *
 from business_model.forms import *
 from projects.requests import fetch_mvs_simulation_results
 from projects.models import *
-from projects.views import project_duplicate, project_delete
+from projects.views import call_view, editable_project, project_duplicate, project_delete
 from business_model.models import *
 from cp_nigeria.models import ConsumerGroup
-from cp_nigeria.helpers import ReportHandler
 from projects.forms import UploadFileForm, ProjectShareForm, ProjectRevokeForm, UseCaseForm
-from projects.services import RenewablesNinja
 from projects.constants import DONE, PENDING, ERROR
+from projects.services import aget_renewables_resource
 from projects.views import request_mvs_simulation, simulation_cancel
 from business_model.helpers import B_MODELS
 from dashboard.models import KPIScalarResults, KPICostsMatrixResults, FancyResults
@@ -75,11 +76,11 @@ def wefe_home(request):
 
 @login_required
 @require_http_methods(["GET", "POST"])
-def wefe_steps(request, proj_id, step_id=None):
+async def wefe_steps(request, proj_id, step_id=None):
     if step_id is None:
         return HttpResponseRedirect(reverse("wefe_steps", args=[proj_id, 1]))
     # import pdb;pdb.set_trace()
-    return WEFE_STEPS[step_id - 1](request, proj_id, step_id)
+    return await call_view(WEFE_STEPS[step_id - 1], request, proj_id, step_id)
 
 
 @login_required
@@ -165,7 +166,19 @@ def wefe_choose_location(request, proj_id=None, step_id=STEP_MAPPING["choose_loc
 
 @login_required
 @require_http_methods(["GET", "POST"])
-def wefe_resources(request, proj_id, step_id=STEP_MAPPING["resources"]):
+async def wefe_resources(request, proj_id, step_id=STEP_MAPPING["resources"]):
+    # both profiles are fetched concurrently and without blocking the worker before the sync view reads them
+    if request.method == "GET":
+        # the profiles are only fetched for the users allowed to see the page
+        project = await sync_to_async(editable_project)(request.user, proj_id)
+        if project.latitude is not None and project.longitude is not None:
+            await asyncio.gather(
+                *(aget_renewables_resource(dataset, project.latitude, project.longitude) for dataset in ("pv", "wind"))
+            )
+    return await sync_to_async(wefe_resources_page)(request, proj_id, step_id=step_id)
+
+
+def wefe_resources_page(request, proj_id, step_id=STEP_MAPPING["resources"]):
     project = get_object_or_404(Project, id=proj_id)
 
     if (project.user != request.user) and (